@@ -0,0 +1,385 @@
+"""每日上下午考勤统计的矩阵计算。
+
+以 用户 × 展示日期 的 NumPy 数组计算日期类型、上下午状态码、迟到/早退/加班打卡标记，
+只在序列化时才展开为 DailyAttendanceItem，避免在计算阶段逐格创建 Pydantic 对象。
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .leave_periods import AFTERNOON, MORNING, LeavePeriodIndex
+from .models import Attendance, AttendanceStatus
+from .schemas import (
+    DailyAttendanceColumnarUser,
+    DailyAttendanceItem,
+    DailyAttendanceStatistics,
+)
+
+DAY_TYPE_WORKDAY = 0
+DAY_TYPE_NOT_HIRED = 1
+DAY_TYPE_OVERTIME_NON_WORKDAY = 2
+DAY_TYPE_NAMES = ("workday", "not_hired", "overtime_non_workday")
+
+WEEKDAY_NAMES = ["一", "二", "三", "四", "五", "六", "日"]
+
+# 分批计算时每批的单元格上限（用户数 × 展示日期数）
+MATRIX_BATCH_CELLS = 50_000
+
+# 上午签到截止时间（含 14:10 之前的签到都计入上午）
+MORNING_CHECKIN_CUTOFF = time(14, 10)
+
+# 状态码 0 表示无状态(None)，其余按出现顺序编码
+STATUS_NONE = 0
+STATUS_LEAVE = 1
+STATUS_ABSENT = 2
+STATUS_NORMAL = 3
+BASE_STATUS_NAMES = (
+    None,
+    AttendanceStatus.LEAVE.value,
+    AttendanceStatus.ABSENT.value,
+    AttendanceStatus.NORMAL.value,
+)
+
+# (user_id, date, checkin_time, checkout_time, morning_status, afternoon_status,
+#  checkin_status, is_late, is_early_leave)
+AttendanceRow = Tuple[int, datetime, Optional[datetime], Optional[datetime], Optional[str],
+                      Optional[str], Optional[str], Optional[bool], Optional[bool]]
+
+
+class StatusCodebook:
+    """考勤状态字符串与 int16 状态码的双向映射"""
+
+    def __init__(self):
+        self.names: List[Optional[str]] = list(BASE_STATUS_NAMES)
+        self._codes: Dict[Optional[str], int] = {name: code for code, name in enumerate(self.names)}
+
+    def encode(self, name: Optional[str]) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            code = len(self.names)
+            self.names.append(name)
+            self._codes[name] = code
+        return code
+
+
+def _as_date(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _morning_status(row: AttendanceRow, codebook: StatusCodebook) -> int:
+    _, _, checkin_time, _, morning_status, _, checkin_status, _, _ = row
+    if morning_status:
+        return codebook.encode(morning_status)
+    if checkin_time:
+        if checkin_time.time() < MORNING_CHECKIN_CUTOFF:
+            return codebook.encode(checkin_status or AttendanceStatus.NORMAL.value)
+    return STATUS_ABSENT
+
+
+def _afternoon_status(row: AttendanceRow, codebook: StatusCodebook) -> int:
+    _, _, _, checkout_time, _, afternoon_status, checkin_status, _, _ = row
+    if afternoon_status:
+        return codebook.encode(afternoon_status)
+    if checkout_time:
+        return codebook.encode(checkin_status or AttendanceStatus.NORMAL.value)
+    return STATUS_ABSENT
+
+
+@dataclass
+class DailyAttendanceMatrix:
+    """用户 × 展示日期的每日考勤矩阵"""
+
+    users: Sequence
+    dates: List[date]
+    day_type: np.ndarray
+    morning_status: np.ndarray
+    afternoon_status: np.ndarray
+    has_overtime_punch: np.ndarray
+    is_late: np.ndarray
+    is_early_leave: np.ndarray
+    status_names: List[Optional[str]]
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.day_type.shape
+
+    def to_statistics(self) -> List[DailyAttendanceStatistics]:
+        """
+        展开为逐用户、逐日的响应对象
+
+        同一日期、同一组状态的单元格共用一个 DailyAttendanceItem（只读），
+        先对 (状态组合, 日期列) 编码去重，再按逆索引组装每个用户的 items；
+        字段已在矩阵阶段算好，用 model_construct 跳过重复校验。
+        """
+        user_count, date_count = self.shape
+        if user_count == 0:
+            return []
+        status_count = len(self.status_names)
+        combo = self.day_type.astype(np.int64)
+        for values, base in (
+            (self.morning_status, status_count),
+            (self.afternoon_status, status_count),
+            (self.has_overtime_punch, 2),
+            (self.is_late, 2),
+            (self.is_early_leave, 2),
+        ):
+            combo = combo * base + values
+        cell_keys = combo * date_count + np.arange(date_count, dtype=np.int64)
+        _, first_positions, inverse = np.unique(cell_keys.ravel(), return_index=True, return_inverse=True)
+
+        date_texts = [d.isoformat() for d in self.dates]
+        weekday_texts = [WEEKDAY_NAMES[d.weekday()] for d in self.dates]
+        names = self.status_names
+        flat = {
+            "day_type": self.day_type.ravel(),
+            "morning_status": self.morning_status.ravel(),
+            "afternoon_status": self.afternoon_status.ravel(),
+            "has_overtime_punch": self.has_overtime_punch.ravel(),
+            "is_late": self.is_late.ravel(),
+            "is_early_leave": self.is_early_leave.ravel(),
+        }
+        shared_items = []
+        for position in first_positions.tolist():
+            column = position % date_count
+            shared_items.append(DailyAttendanceItem.model_construct(
+                date=date_texts[column],
+                weekday=weekday_texts[column],
+                day_type=DAY_TYPE_NAMES[flat["day_type"][position]],
+                morning_status=names[flat["morning_status"][position]],
+                afternoon_status=names[flat["afternoon_status"][position]],
+                has_overtime_punch=bool(flat["has_overtime_punch"][position]),
+                is_late=bool(flat["is_late"][position]),
+                is_early_leave=bool(flat["is_early_leave"][position]),
+            ))
+
+        statistics = []
+        lookup = shared_items.__getitem__
+        for user, row_keys in zip(self.users, inverse.reshape(user_count, date_count).tolist()):
+            statistics.append(DailyAttendanceStatistics.model_construct(
+                user_id=user.id,
+                user_name=user.username,
+                real_name=user.real_name,
+                department=user.department.name if user.department else None,
+                items=list(map(lookup, row_keys)),
+            ))
+        return statistics
+
+
+    def to_columnar_users(self) -> List[DailyAttendanceColumnarUser]:
+        """展开为列式响应的用户数组：每个字段一行整数编码，码表见 DAY_TYPE_NAMES / status_names"""
+        day_types = self.day_type.tolist()
+        mornings = self.morning_status.tolist()
+        afternoons = self.afternoon_status.tolist()
+        overtime_flags = self.has_overtime_punch.astype(np.int8).tolist()
+        late_flags = self.is_late.astype(np.int8).tolist()
+        early_flags = self.is_early_leave.astype(np.int8).tolist()
+        return [
+            DailyAttendanceColumnarUser.model_construct(
+                user_id=user.id,
+                user_name=user.username,
+                real_name=user.real_name,
+                department=user.department.name if user.department else None,
+                day_type=day_types[row],
+                morning_status=mornings[row],
+                afternoon_status=afternoons[row],
+                has_overtime_punch=overtime_flags[row],
+                is_late=late_flags[row],
+                is_early_leave=early_flags[row],
+            )
+            for row, user in enumerate(self.users)
+        ]
+
+
+def build_daily_matrix(
+    users: Sequence,
+    display_dates: List[date],
+    non_workday_dates: Iterable[date],
+    attendance_rows: Iterable[AttendanceRow],
+    leave_index: LeavePeriodIndex,
+) -> DailyAttendanceMatrix:
+    """
+    计算每日考勤矩阵
+
+    规则与逐格判定一致：未入职优先，其次非工作日加班列，其余为工作日；
+    工作日上/下午有请假记为请假，否则取打卡记录的状态，无打卡记为缺勤。
+    """
+    user_count, date_count = len(users), len(display_dates)
+    user_pos = {user.id: i for i, user in enumerate(users)}
+    date_pos = {d: j for j, d in enumerate(display_dates)}
+    codebook = StatusCodebook()
+
+    date_ordinals = np.fromiter((d.toordinal() for d in display_dates), dtype=np.int64, count=date_count)
+    hire_ordinals = np.fromiter(
+        (_as_date(user.hire_date).toordinal() if user.hire_date else 0 for user in users),
+        dtype=np.int64,
+        count=user_count,
+    )
+    not_hired = hire_ordinals[:, None] > date_ordinals[None, :]
+    non_workday_set = set(non_workday_dates)
+    non_workday_cols = np.fromiter((d in non_workday_set for d in display_dates), dtype=bool, count=date_count)
+
+    # 先收集坐标与取值，再一次性批量写入数组
+    att_i, att_j, att_m, att_a, att_ot, att_late, att_early = [], [], [], [], [], [], []
+    overtime_code = AttendanceStatus.OVERTIME_PUNCH.value
+    for row in attendance_rows:
+        i = user_pos.get(row[0])
+        j = date_pos.get(_as_date(row[1]))
+        if i is None or j is None:
+            continue
+        att_i.append(i)
+        att_j.append(j)
+        att_m.append(_morning_status(row, codebook))
+        att_a.append(_afternoon_status(row, codebook))
+        att_ot.append(row[6] == overtime_code)
+        att_late.append(bool(row[7]))
+        att_early.append(bool(row[8]))
+
+    shape = (user_count, date_count)
+    att_morning = np.full(shape, STATUS_ABSENT, dtype=np.int16)
+    att_afternoon = np.full(shape, STATUS_ABSENT, dtype=np.int16)
+    overtime_punch = np.zeros(shape, dtype=bool)
+    late = np.zeros(shape, dtype=bool)
+    early = np.zeros(shape, dtype=bool)
+    if att_i:
+        cells = (np.asarray(att_i), np.asarray(att_j))
+        att_morning[cells] = att_m
+        att_afternoon[cells] = att_a
+        overtime_punch[cells] = att_ot
+        late[cells] = att_late
+        early[cells] = att_early
+
+    leave_i, leave_j, leave_m, leave_a = [], [], [], []
+    for user_id, slot_date, halves in leave_index.iter_halves():
+        i = user_pos.get(user_id)
+        j = date_pos.get(slot_date)
+        if i is None or j is None:
+            continue
+        leave_i.append(i)
+        leave_j.append(j)
+        leave_m.append(MORNING in halves)
+        leave_a.append(AFTERNOON in halves)
+
+    leave_morning = np.zeros(shape, dtype=bool)
+    leave_afternoon = np.zeros(shape, dtype=bool)
+    if leave_i:
+        cells = (np.asarray(leave_i), np.asarray(leave_j))
+        leave_morning[cells] = leave_m
+        leave_afternoon[cells] = leave_a
+
+    day_type = np.zeros(shape, dtype=np.int8)
+    day_type[:, non_workday_cols] = DAY_TYPE_OVERTIME_NON_WORKDAY
+    day_type[not_hired] = DAY_TYPE_NOT_HIRED
+    workday_cells = day_type == DAY_TYPE_WORKDAY
+
+    morning_status = np.where(workday_cells, np.where(leave_morning, STATUS_LEAVE, att_morning), STATUS_NONE)
+    afternoon_status = np.where(workday_cells, np.where(leave_afternoon, STATUS_LEAVE, att_afternoon), STATUS_NONE)
+
+    return DailyAttendanceMatrix(
+        users=users,
+        dates=display_dates,
+        day_type=day_type,
+        morning_status=morning_status.astype(np.int16),
+        afternoon_status=afternoon_status.astype(np.int16),
+        has_overtime_punch=overtime_punch & ~not_hired,
+        is_late=late & workday_cells,
+        is_early_leave=early & workday_cells,
+        status_names=codebook.names,
+    )
+
+
+def load_attendance_rows(db: Session, user_ids: Sequence[int], start_date: date, end_date: date) -> List[AttendanceRow]:
+    """按列加载区间内的打卡记录（不构造 ORM 实例）"""
+    if not user_ids:
+        return []
+    return db.query(
+        Attendance.user_id,
+        Attendance.date,
+        Attendance.checkin_time,
+        Attendance.checkout_time,
+        Attendance.morning_status,
+        Attendance.afternoon_status,
+        Attendance.checkin_status,
+        Attendance.is_late,
+        Attendance.is_early_leave,
+    ).filter(
+        Attendance.user_id.in_(list(user_ids)),
+        Attendance.date >= datetime.combine(start_date, datetime.min.time()),
+        Attendance.date <= datetime.combine(end_date, datetime.max.time())
+    ).all()
+
+
+def load_non_workday_overtime_dates(
+    db: Session,
+    user_ids: Sequence[int],
+    start_date: date,
+    end_date: date,
+    workdays: Iterable[date],
+) -> Set[date]:
+    """区间内有加班打卡的非工作日（只查日期列）"""
+    if not user_ids:
+        return set()
+    workday_set = set(workdays)
+    punch_dates = db.query(Attendance.date).filter(
+        Attendance.user_id.in_(list(user_ids)),
+        Attendance.checkin_status == AttendanceStatus.OVERTIME_PUNCH.value,
+        Attendance.date >= datetime.combine(start_date, datetime.min.time()),
+        Attendance.date <= datetime.combine(end_date, datetime.max.time())
+    ).distinct().all()
+    return {
+        _as_date(punch_date)
+        for (punch_date,) in punch_dates
+        if _as_date(punch_date) not in workday_set
+    }
+
+
+def load_daily_matrix(
+    db: Session,
+    users: Sequence,
+    start_date: date,
+    end_date: date,
+    workdays: List[date],
+    non_workday_overtime_dates: Optional[Set[date]] = None,
+) -> DailyAttendanceMatrix:
+    """
+    加载打卡与请假数据并计算矩阵；非工作日仅在有加班打卡时作为展示列
+
+    non_workday_overtime_dates 为空时按本批用户的打卡记录推算；
+    分批计算时应传入全体用户的结果，保证各批次的展示日期一致。
+    """
+    user_ids = [user.id for user in users]
+    attendance_rows = load_attendance_rows(db, user_ids, start_date, end_date)
+
+    workday_set: Set[date] = set(workdays)
+    if non_workday_overtime_dates is None:
+        overtime_code = AttendanceStatus.OVERTIME_PUNCH.value
+        non_workday_overtime_dates = {
+            _as_date(row[1])
+            for row in attendance_rows
+            if row[6] == overtime_code and _as_date(row[1]) not in workday_set
+        }
+    display_dates = sorted(workday_set | non_workday_overtime_dates)
+    leave_index = LeavePeriodIndex.load(db, user_ids, start_date, end_date)
+    return build_daily_matrix(users, display_dates, non_workday_overtime_dates, attendance_rows, leave_index)
+
+
+def iter_daily_matrices(
+    db: Session,
+    users: Sequence,
+    start_date: date,
+    end_date: date,
+    workdays: List[date],
+    max_cells: int = MATRIX_BATCH_CELLS,
+) -> Iterator[DailyAttendanceMatrix]:
+    """按用户分批计算矩阵，每批不超过 max_cells 个单元格，内存占用与区间长度无关"""
+    overtime_dates = load_non_workday_overtime_dates(
+        db, [user.id for user in users], start_date, end_date, workdays
+    )
+    date_count = len(set(workdays) | overtime_dates)
+    batch_size = max(1, max_cells // max(1, date_count))
+    for offset in range(0, len(users), batch_size):
+        yield load_daily_matrix(
+            db, users[offset:offset + batch_size], start_date, end_date, workdays, overtime_dates
+        )
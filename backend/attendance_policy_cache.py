@@ -0,0 +1,211 @@
+"""
+打卡策略编译与缓存
+打卡高峰期每次签到/签退都要取启用中的打卡策略、解析 weekly_rules JSON、再用 strptime
+解析 "HH:MM"。本模块把启用策略编译为 CompiledPolicy：按星期预先合并好 7 条规则，
+时间与阈值均为 time/timedelta，并预先算好迟到/早退判定的临界时间，按数据库引擎缓存在进程内。
+
+本进程的写入经 cache_invalidation 在提交后清除缓存（会话中有未提交的写入时不使用缓存）；
+其他 worker 进程的修改通过版本检查发现：距上次检查超过 ATTENDANCE_POLICY_CHECK_INTERVAL_SECONDS
+时查询一次 (行数, 最近更新时间)，与缓存时不一致才重新编译。
+"""
+import json
+import threading
+import time as monotonic_time
+import weakref
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .cache_invalidation import watch_tables
+from .models import AttendancePolicy
+
+# 两次版本检查的最小间隔（秒）：其他进程的修改最迟在该时间后生效
+ATTENDANCE_POLICY_CHECK_INTERVAL_SECONDS = 2.0
+
+# 按星期覆盖时可出现的规则字段
+RULE_FIELDS = (
+    "work_start_time",
+    "work_end_time",
+    "checkin_start_time",
+    "checkin_end_time",
+    "checkout_start_time",
+    "checkout_end_time",
+    "late_threshold_minutes",
+    "early_threshold_minutes",
+)
+
+# 计算临界时间用的任意日期（只取时间部分，跨午夜时与原逻辑一样回绕）
+_ANCHOR_DATE = date(2000, 1, 1)
+
+
+def _parse_hhmm(value: str) -> time:
+    return datetime.strptime(value, "%H:%M").time()
+
+
+@dataclass(frozen=True)
+class DayRule:
+    """某个星期几的打卡规则（已解析）"""
+
+    work_start_time: time
+    work_end_time: time
+    checkin_start_time: time
+    checkin_end_time: time
+    checkout_start_time: time
+    checkout_end_time: time
+    late_threshold: timedelta
+    early_threshold: timedelta
+    # 晚于该时间签到为迟到、早于该时间签退为早退
+    late_after: time
+    early_before: time
+    # 合并后的原始规则（"HH:MM" 字符串），用于提示文案与接口返回
+    raw: Dict[str, Any] = field(compare=False)
+
+    @classmethod
+    def from_rules(cls, rules: Dict[str, Any]) -> "DayRule":
+        work_start = _parse_hhmm(rules["work_start_time"])
+        work_end = _parse_hhmm(rules["work_end_time"])
+        late_threshold = timedelta(minutes=rules["late_threshold_minutes"])
+        early_threshold = timedelta(minutes=rules["early_threshold_minutes"])
+        return cls(
+            work_start_time=work_start,
+            work_end_time=work_end,
+            checkin_start_time=_parse_hhmm(rules["checkin_start_time"]),
+            checkin_end_time=_parse_hhmm(rules["checkin_end_time"]),
+            checkout_start_time=_parse_hhmm(rules["checkout_start_time"]),
+            checkout_end_time=_parse_hhmm(rules["checkout_end_time"]),
+            late_threshold=late_threshold,
+            early_threshold=early_threshold,
+            late_after=(datetime.combine(_ANCHOR_DATE, work_start) + late_threshold).time(),
+            early_before=(datetime.combine(_ANCHOR_DATE, work_end) - early_threshold).time(),
+            raw=dict(rules),
+        )
+
+
+@dataclass(frozen=True)
+class CompiledPolicy:
+    """编译后的打卡策略：days[0..6] 对应周一至周日"""
+
+    policy_id: int
+    name: str
+    # 规则无法解析的星期为 None，仅在用到该天时报错，与逐次解析时的行为一致
+    days: Tuple[Optional[DayRule], ...]
+
+    def for_date(self, value: datetime) -> DayRule:
+        rule = self.days[value.weekday()]
+        if rule is None:
+            raise ValueError(f"打卡策略「{self.name}」星期{value.weekday()}的规则无效")
+        return rule
+
+    def is_late(self, checkin_time: datetime) -> bool:
+        return checkin_time.time() > self.for_date(checkin_time).late_after
+
+    def is_early_leave(self, checkout_time: datetime) -> bool:
+        return checkout_time.time() < self.for_date(checkout_time).early_before
+
+
+def merge_policy_rules(policy: AttendancePolicy, weekday: int) -> Dict[str, Any]:
+    """默认规则叠加 weekly_rules 中该星期的覆盖项；JSON 无效时使用默认规则"""
+    rules = {name: getattr(policy, name) for name in RULE_FIELDS}
+    if policy.weekly_rules:
+        try:
+            weekly_rules = json.loads(policy.weekly_rules)
+            if str(weekday) in weekly_rules:
+                rules.update(weekly_rules[str(weekday)])
+        except (json.JSONDecodeError, TypeError):
+            pass
+    return rules
+
+
+def _compile_day(policy: AttendancePolicy, weekday: int) -> Optional[DayRule]:
+    try:
+        return DayRule.from_rules(merge_policy_rules(policy, weekday))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def compile_policy(policy: AttendancePolicy) -> CompiledPolicy:
+    return CompiledPolicy(
+        policy_id=policy.id,
+        name=policy.name,
+        days=tuple(_compile_day(policy, weekday) for weekday in range(7)),
+    )
+
+
+def _load_active_policy(db: Session) -> Optional[CompiledPolicy]:
+    policy = db.query(AttendancePolicy).filter(AttendancePolicy.is_active == True).first()  # noqa: E712
+    return compile_policy(policy) if policy else None
+
+
+def _read_version(db: Session) -> tuple:
+    count, updated_at = db.query(func.count(AttendancePolicy.id), func.max(AttendancePolicy.updated_at)).one()
+    return count, updated_at
+
+
+class _Entry:
+    __slots__ = ("version", "policy", "checked_at")
+
+    def __init__(self, version: tuple, policy: Optional[CompiledPolicy], checked_at: float):
+        self.version = version
+        self.policy = policy
+        self.checked_at = checked_at
+
+
+class AttendancePolicyCache:
+    """进程级启用策略缓存，按数据库引擎分别缓存"""
+
+    def __init__(self, check_interval_seconds: float = ATTENDANCE_POLICY_CHECK_INTERVAL_SECONDS):
+        self.check_interval_seconds = check_interval_seconds
+        self._lock = threading.Lock()
+        # engine -> _Entry
+        self._entries: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self.compiles = 0
+
+    def get(self, db: Session) -> Optional[CompiledPolicy]:
+        if _policy_watch.is_dirty(db):
+            return _load_active_policy(db)
+
+        bind = db.get_bind()
+        now = monotonic_time.monotonic()
+        with self._lock:
+            entry = self._entries.get(bind)
+        if entry is not None and now - entry.checked_at < self.check_interval_seconds:
+            return entry.policy
+
+        version = _read_version(db)
+        if entry is not None and entry.version == version:
+            entry.checked_at = now
+            return entry.policy
+
+        policy = _load_active_policy(db)
+        with self._lock:
+            self.compiles += 1
+            self._entries[bind] = _Entry(version, policy, now)
+        return policy
+
+    def invalidate(self, bind=None) -> None:
+        """清除指定引擎（None 为全部）的缓存"""
+        with self._lock:
+            if bind is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(bind, None)
+
+
+attendance_policy_cache = AttendancePolicyCache()
+
+
+def get_active_policy(db: Session) -> Optional[CompiledPolicy]:
+    """当前启用的打卡策略（已编译），无启用策略时返回 None"""
+    return attendance_policy_cache.get(db)
+
+
+def _invalidate_engines(changes) -> None:
+    for engine in {change.engine for change in changes}:
+        attendance_policy_cache.invalidate(engine)
+
+
+# 创建/启用策略时用 query(...).update() 停用其他策略，由批量写入的监听覆盖
+_policy_watch = watch_tables((AttendancePolicy,), _invalidate_engines)
@@ -0,0 +1,391 @@
+"""按用户、自然月的考勤汇总（attendance_monthly_rollups）。
+
+维护：考勤/请假/加班记录增删改时，模型事件记下受影响的 (用户, 年, 月)，
+在同一次 flush 结束后按明细重算这些月份，和业务数据在同一事务内提交或回滚。
+
+读取：统计区间中完整覆盖的自然月直接累加汇总行，首尾不完整的月份回退到明细查询。
+请假按开始日期归月，区间开始前已开始、延续到区间内的请假另行查询明细，
+保证与"与统计区间有交集即计入"的口径一致，跨月请假不会重复计入。
+汇总表尚未按历史明细回填（见 derived_tables）时整个区间都查询明细。
+
+模型事件在映射配置完成时由 models 注册（见 models._register_derived_table_listeners）。
+"""
+import json
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, case, delete, event, extract, func, insert, inspect, or_, select, union
+from sqlalchemy.orm import Session
+
+from .derived_tables import is_backfilled
+from .models import (
+    Attendance,
+    AttendanceMonthlyRollup,
+    LeaveApplication,
+    LeaveStatus,
+    OvertimeApplication,
+    OvertimeStatus,
+    OvertimeType,
+)
+
+# (user_id, year, month)
+MonthKey = Tuple[int, int, int]
+
+SESSION_DIRTY_KEY = "attendance_rollup_keys"
+
+
+@dataclass
+class UserCounters:
+    """单个用户在某区间内的考勤/请假/加班计数"""
+
+    present_days: int = 0
+    late_days: int = 0
+    early_leave_days: int = 0
+    work_hours: float = 0.0
+    leave_days: float = 0.0
+    leave_count: int = 0
+    # 请假类型ID -> [天数, 次数, 最小申请ID]（最小申请ID用于保持类型出现顺序）
+    leave_types: Dict[int, List] = field(default_factory=dict)
+    active_overtime_days: float = 0.0
+    active_overtime_count: int = 0
+    passive_overtime_days: float = 0.0
+    passive_overtime_count: int = 0
+
+    def add_leave_type(self, leave_type_id: Optional[int], days: float, count: int, first_id: int) -> None:
+        """合并请假类型细分（天数/次数总计由调用方累加）"""
+        if not leave_type_id:
+            return
+        entry = self.leave_types.get(leave_type_id)
+        if entry is None:
+            self.leave_types[leave_type_id] = [days, count, first_id]
+        else:
+            entry[0] += days
+            entry[1] += count
+            entry[2] = min(entry[2], first_id)
+
+    def add_overtime(self, overtime_type, days: float, count: int) -> None:
+        if overtime_type == OvertimeType.ACTIVE:
+            self.active_overtime_days += days
+            self.active_overtime_count += count
+        elif overtime_type == OvertimeType.PASSIVE:
+            self.passive_overtime_days += days
+            self.passive_overtime_count += count
+
+    def ordered_leave_types(self) -> List[Tuple[int, float, int]]:
+        """按首次出现顺序返回 (请假类型ID, 天数, 次数)"""
+        return [
+            (leave_type_id, entry[0], entry[1])
+            for leave_type_id, entry in sorted(self.leave_types.items(), key=lambda item: item[1][2])
+        ]
+
+
+def _day_start(value: date) -> datetime:
+    return datetime.combine(value, datetime.min.time())
+
+
+def _day_end(value: date) -> datetime:
+    return datetime.combine(value, datetime.max.time())
+
+
+def _month_start(year: int, month: int) -> datetime:
+    return datetime(year, month, 1)
+
+
+def _next_month(year: int, month: int) -> Tuple[int, int]:
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _month_key(value) -> Tuple[int, int]:
+    return value.year, value.month
+
+
+def _accumulate_raw(
+    executor,
+    counters: Dict[int, UserCounters],
+    user_ids: List[int],
+    attendance_filter,
+    leave_filter,
+    overtime_filter,
+) -> None:
+    """按条件汇总明细（每张表一次 GROUP BY），累加到 counters"""
+    attendance_rows = executor.execute(
+        select(
+            Attendance.user_id,
+            func.count(Attendance.id),
+            func.sum(case((Attendance.is_late == True, 1), else_=0)),
+            func.sum(case((Attendance.is_early_leave == True, 1), else_=0)),
+            func.sum(Attendance.work_hours),
+        ).where(
+            Attendance.user_id.in_(user_ids),
+            attendance_filter
+        ).group_by(Attendance.user_id)
+    ).all()
+    for user_id, present, late, early, hours in attendance_rows:
+        counter = counters.setdefault(user_id, UserCounters())
+        counter.present_days += int(present or 0)
+        counter.late_days += int(late or 0)
+        counter.early_leave_days += int(early or 0)
+        counter.work_hours += float(hours or 0.0)
+
+    leave_rows = executor.execute(
+        select(
+            LeaveApplication.user_id,
+            LeaveApplication.leave_type_id,
+            func.sum(LeaveApplication.days),
+            func.count(LeaveApplication.id),
+            func.min(LeaveApplication.id),
+        ).where(
+            LeaveApplication.user_id.in_(user_ids),
+            LeaveApplication.status == LeaveStatus.APPROVED,
+            leave_filter
+        ).group_by(LeaveApplication.user_id, LeaveApplication.leave_type_id)
+    ).all()
+    for user_id, leave_type_id, days, count, first_id in leave_rows:
+        counter = counters.setdefault(user_id, UserCounters())
+        counter.leave_days += float(days or 0.0)
+        counter.leave_count += int(count or 0)
+        counter.add_leave_type(leave_type_id, float(days or 0.0), int(count or 0), first_id)
+
+    overtime_rows = executor.execute(
+        select(
+            OvertimeApplication.user_id,
+            OvertimeApplication.overtime_type,
+            func.sum(OvertimeApplication.days),
+            func.count(OvertimeApplication.id),
+        ).where(
+            OvertimeApplication.user_id.in_(user_ids),
+            OvertimeApplication.status == OvertimeStatus.APPROVED,
+            overtime_filter
+        ).group_by(OvertimeApplication.user_id, OvertimeApplication.overtime_type)
+    ).all()
+    for user_id, overtime_type, days, count in overtime_rows:
+        counters.setdefault(user_id, UserCounters()).add_overtime(
+            overtime_type, float(days or 0.0), int(count or 0)
+        )
+
+
+def _accumulate_rollups(
+    db: Session,
+    counters: Dict[int, UserCounters],
+    user_ids: List[int],
+    first_month: Tuple[int, int],
+    last_month: Tuple[int, int],
+) -> None:
+    """累加 [first_month, last_month] 内的月汇总行"""
+    month_index = AttendanceMonthlyRollup.year * 12 + AttendanceMonthlyRollup.month
+    rows = db.query(AttendanceMonthlyRollup).filter(
+        AttendanceMonthlyRollup.user_id.in_(user_ids),
+        month_index >= first_month[0] * 12 + first_month[1],
+        month_index <= last_month[0] * 12 + last_month[1]
+    ).all()
+    for row in rows:
+        counter = counters.setdefault(row.user_id, UserCounters())
+        counter.present_days += row.present_days
+        counter.late_days += row.late_days
+        counter.early_leave_days += row.early_leave_days
+        counter.work_hours += row.work_hours
+        counter.leave_days += row.leave_days
+        counter.leave_count += row.leave_count
+        for leave_type_id, (days, count, first_id) in json.loads(row.leave_type_breakdown or "{}").items():
+            counter.add_leave_type(int(leave_type_id), days, count, first_id)
+        counter.active_overtime_days += row.active_overtime_days
+        counter.active_overtime_count += row.active_overtime_count
+        counter.passive_overtime_days += row.passive_overtime_days
+        counter.passive_overtime_count += row.passive_overtime_count
+
+
+def full_month_span(start_date: date, end_date: date) -> Optional[Tuple[date, date]]:
+    """区间内完整覆盖的自然月范围 [首月1日, 末月次月1日)，不足一个整月返回 None"""
+    first = start_date if start_date.day == 1 else date(*_next_month(start_date.year, start_date.month), 1)
+    end_next = date.fromordinal(end_date.toordinal() + 1)
+    last_exclusive = end_next if end_next.day == 1 else date(end_date.year, end_date.month, 1)
+    if first >= last_exclusive:
+        return None
+    return first, last_exclusive
+
+
+def collect_user_counters(
+    db: Session,
+    user_ids: List[int],
+    start_date: date,
+    end_date: date,
+) -> Dict[int, UserCounters]:
+    """
+    汇总 user_ids 在 [start_date, end_date] 内的计数
+
+    口径：考勤按日期落在区间内；请假仅已批准、与区间有交集；加班仅已批准、开始日期落在区间内。
+    """
+    counters: Dict[int, UserCounters] = {user_id: UserCounters() for user_id in user_ids}
+    if not user_ids:
+        return counters
+
+    range_start, range_end = _day_start(start_date), _day_end(end_date)
+    span = full_month_span(start_date, end_date)
+    if span is None or not is_backfilled(db, AttendanceMonthlyRollup.__tablename__):
+        _accumulate_raw(
+            db, counters, user_ids,
+            and_(Attendance.date >= range_start, Attendance.date <= range_end),
+            and_(LeaveApplication.start_date <= range_end, LeaveApplication.end_date >= range_start),
+            and_(OvertimeApplication.start_time >= range_start, OvertimeApplication.start_time <= range_end),
+        )
+        return counters
+
+    months_start, months_end = _day_start(span[0]), _day_start(span[1])
+    # 首尾不完整月份查明细；请假另含区间开始前已开始、延续进区间的记录
+    _accumulate_raw(
+        db, counters, user_ids,
+        or_(
+            and_(Attendance.date >= range_start, Attendance.date < months_start),
+            and_(Attendance.date >= months_end, Attendance.date <= range_end),
+        ),
+        or_(
+            and_(LeaveApplication.start_date < months_start, LeaveApplication.end_date >= range_start),
+            and_(LeaveApplication.start_date >= months_end, LeaveApplication.start_date <= range_end),
+        ),
+        or_(
+            and_(OvertimeApplication.start_time >= range_start, OvertimeApplication.start_time < months_start),
+            and_(OvertimeApplication.start_time >= months_end, OvertimeApplication.start_time <= range_end),
+        ),
+    )
+    last_month_day = date.fromordinal(span[1].toordinal() - 1)
+    _accumulate_rollups(db, counters, user_ids, _month_key(span[0]), _month_key(last_month_day))
+    return counters
+
+
+def rebuild_monthly_rollups(connection, keys: Iterable[MonthKey]) -> None:
+    """按明细重算指定 (用户, 年, 月) 的汇总行"""
+    users_by_month: Dict[Tuple[int, int], Set[int]] = {}
+    for user_id, year, month in keys:
+        if user_id is None:
+            continue
+        users_by_month.setdefault((year, month), set()).add(user_id)
+
+    rollup_table = AttendanceMonthlyRollup.__table__
+    for (year, month), user_set in users_by_month.items():
+        user_ids = sorted(user_set)
+        month_start = _month_start(year, month)
+        month_end = _month_start(*_next_month(year, month))
+        counters: Dict[int, UserCounters] = {}
+        _accumulate_raw(
+            connection, counters, user_ids,
+            and_(Attendance.date >= month_start, Attendance.date < month_end),
+            and_(LeaveApplication.start_date >= month_start, LeaveApplication.start_date < month_end),
+            and_(OvertimeApplication.start_time >= month_start, OvertimeApplication.start_time < month_end),
+        )
+
+        connection.execute(
+            delete(rollup_table).where(
+                rollup_table.c.user_id.in_(user_ids),
+                rollup_table.c.year == year,
+                rollup_table.c.month == month,
+            )
+        )
+        now = datetime.now()
+        rows = [
+            {
+                "user_id": user_id,
+                "year": year,
+                "month": month,
+                "present_days": counter.present_days,
+                "late_days": counter.late_days,
+                "early_leave_days": counter.early_leave_days,
+                "work_hours": counter.work_hours,
+                "leave_days": counter.leave_days,
+                "leave_count": counter.leave_count,
+                "leave_type_breakdown": json.dumps(
+                    {str(leave_type_id): entry for leave_type_id, entry in counter.leave_types.items()}
+                ),
+                "active_overtime_days": counter.active_overtime_days,
+                "active_overtime_count": counter.active_overtime_count,
+                "passive_overtime_days": counter.passive_overtime_days,
+                "passive_overtime_count": counter.passive_overtime_count,
+                "updated_at": now,
+            }
+            for user_id, counter in counters.items()
+        ]
+        if rows:
+            connection.execute(insert(rollup_table), rows)
+
+
+def backfill_monthly_rollups(connection) -> int:
+    """清空并按全部明细重算月度汇总（已有数据库升级时使用），返回涉及的 (用户, 年, 月) 数"""
+    months = union(*(
+        select(model.user_id, extract("year", getattr(model, date_field)), extract("month", getattr(model, date_field)))
+        for model, (date_field, _fields) in _ROLLUP_SOURCES.items()
+    ))
+    keys = {tuple(row) for row in connection.execute(months) if None not in tuple(row)}
+    connection.execute(delete(AttendanceMonthlyRollup.__table__))
+    rebuild_monthly_rollups(connection, keys)
+    return len(keys)
+
+
+# 各明细表：影响汇总的字段，以及决定归属月份的日期字段
+_ROLLUP_SOURCES = {
+    Attendance: ("date", ("user_id", "date", "is_late", "is_early_leave", "work_hours")),
+    LeaveApplication: ("start_date", ("user_id", "start_date", "status", "days", "leave_type_id")),
+    OvertimeApplication: ("start_time", ("user_id", "start_time", "status", "days", "overtime_type")),
+}
+
+
+def _affected_keys(target, is_update: bool) -> Set[MonthKey]:
+    date_field, fields = _ROLLUP_SOURCES[type(target)]
+    state = inspect(target)
+    if is_update and not any(state.attrs[name].history.has_changes() for name in fields):
+        return set()
+
+    users = {target.user_id}
+    dates = {getattr(target, date_field)}
+    if is_update:
+        users.update(state.attrs.user_id.history.deleted)
+        dates.update(state.attrs[date_field].history.deleted)
+    return {
+        (user_id, value.year, value.month)
+        for user_id in users
+        for value in dates
+        if user_id is not None and value is not None
+    }
+
+
+def _mark_rollups_dirty(connection, target, is_update: bool) -> None:
+    keys = _affected_keys(target, is_update)
+    if not keys:
+        return
+    session = Session.object_session(target)
+    if session is None:
+        rebuild_monthly_rollups(connection, keys)
+    else:
+        session.info.setdefault(SESSION_DIRTY_KEY, set()).update(keys)
+
+
+def _after_insert_or_delete(mapper, connection, target):
+    _mark_rollups_dirty(connection, target, is_update=False)
+
+
+def _after_update(mapper, connection, target):
+    _mark_rollups_dirty(connection, target, is_update=True)
+
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    return value
+
+
+for _model, (_date_field, _fields) in _ROLLUP_SOURCES.items():
+    # 归属字段在过期后被直接赋值时，旧值默认不加载；active_history 保证能从历史中取到旧月份
+    for _name in ("user_id", _date_field):
+        event.listen(getattr(_model, _name), "set", _keep_previous_value, active_history=True, retval=True)
+    event.listen(_model, "after_insert", _after_insert_or_delete)
+    event.listen(_model, "after_delete", _after_insert_or_delete)
+    event.listen(_model, "after_update", _after_update)
+
+
+@event.listens_for(Session, "after_flush")
+def _rebuild_rollups_after_flush(session, flush_context):
+    keys = session.info.pop(SESSION_DIRTY_KEY, None)
+    if keys:
+        rebuild_monthly_rollups(session.connection(), keys)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rollup_keys(session, previous_transaction):
+    session.info.pop(SESSION_DIRTY_KEY, None)
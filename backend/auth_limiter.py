@@ -0,0 +1,222 @@
+"""
+认证失败限流
+按 (场景, 键) 统计登录/微信登录的失败次数：最近一个窗口（AUTH_FAILURE_WINDOW_SECONDS）内的失败达到上限即拒绝（429），
+登录成功时清零。
+
+滑动窗口用两个固定桶近似：时间按窗口长度分桶，每个键只保存 (当前桶编号, 上一桶次数, 当前桶次数)，
+估计值 = 当前桶次数 + 上一桶次数 × 上一桶仍落在滑动窗口内的比例。检查与记录均为 O(1)、内存固定，
+且不会像固定窗口那样在窗口边界前后各用满一次额度。
+
+存储后端：
+- 内存（默认）：有上限的 LRU，键数超过 AUTH_LIMITER_MAX_KEYS 时淘汰最久未访问的键，
+  撞库流量下内存不会无限增长；但每个 worker 进程各自计数。
+- SQLite（配置 AUTH_LIMITER_SQLITE_PATH 时）：同一主机上的所有 worker 共用一个数据库文件，
+  共同执行一份失败预算；过期记录定期清理，行数同样受 AUTH_LIMITER_MAX_KEYS 限制。
+"""
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from .config import settings
+from .utils.sqlite_files import connect_shared
+
+LOGIN_SCOPE = "login"
+WECHAT_SCOPE = "wechat"
+
+# SQLite 存储每记录多少次失败清理一次过期行
+SQLITE_PRUNE_EVERY = 256
+
+
+def _bucket(now: float, window: float) -> int:
+    return int(now // window)
+
+
+def _estimate(bucket: int, previous: int, current: int, now: float, window: float) -> float:
+    """滑动窗口内的失败次数估计值（bucket 为记录时的当前桶编号）"""
+    now_bucket = _bucket(now, window)
+    remaining = 1 - (now - now_bucket * window) / window
+    if bucket >= now_bucket:
+        return current + previous * remaining
+    if bucket == now_bucket - 1:
+        return current * remaining
+    return 0.0
+
+
+class MemoryFailureStore:
+    """进程内有上限的 LRU 失败计数"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # (scope, key) -> (桶编号, 上一桶次数, 当前桶次数)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[int, int, int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def count(self, scope: str, key: str, now: float, window: float) -> float:
+        with self._lock:
+            entry = self._entries.get((scope, key))
+            if entry is None:
+                return 0
+            if entry[0] < _bucket(now, window) - 1:
+                del self._entries[(scope, key)]
+                return 0
+            self._entries.move_to_end((scope, key))
+            return _estimate(*entry, now, window)
+
+    def record(self, scope: str, key: str, now: float, window: float) -> float:
+        """记录一次失败，返回记录后的估计次数"""
+        now_bucket = _bucket(now, window)
+        with self._lock:
+            bucket, previous, current = self._entries.get((scope, key), (now_bucket, 0, 0))
+            if bucket == now_bucket - 1:
+                previous, current = current, 0
+            elif bucket < now_bucket - 1:
+                previous, current = 0, 0
+            entry = (max(bucket, now_bucket), previous, current + 1)
+            self._entries[(scope, key)] = entry
+            self._entries.move_to_end((scope, key))
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+        return _estimate(*entry, now, window)
+
+    def clear(self, scope: str, key: str) -> None:
+        with self._lock:
+            self._entries.pop((scope, key), None)
+
+
+class SQLiteFailureStore:
+    """基于 SQLite 文件的失败计数，供同一主机上的多个 worker 进程共享"""
+
+    def __init__(self, path: str, max_keys: int):
+        self.path = path
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._records = 0
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # 首次使用时再打开，保证每个 worker 进程（fork 之后）各自持有连接
+        if self._conn is None:
+            conn = connect_shared(self.path)
+            # 旧版按固定窗口计数的表，其中只有短期失败记录，直接丢弃
+            conn.execute("DROP TABLE IF EXISTS auth_failures")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS auth_failure_buckets (
+                    scope TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    previous_failures INTEGER NOT NULL,
+                    current_failures INTEGER NOT NULL,
+                    last_failure_at REAL NOT NULL,
+                    PRIMARY KEY (scope, key)
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_auth_failure_buckets_last_failure_at "
+                "ON auth_failure_buckets (last_failure_at)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM auth_failure_buckets").fetchone()[0]
+
+    def count(self, scope: str, key: str, now: float, window: float) -> float:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT bucket, previous_failures, current_failures FROM auth_failure_buckets WHERE scope = ? AND key = ?",
+                (scope, key),
+            ).fetchone()
+        return _estimate(*row, now, window) if row else 0
+
+    def record(self, scope: str, key: str, now: float, window: float) -> float:
+        """记录一次失败，返回记录后的估计次数"""
+        # 单条 UPSERT 原子完成“换桶则滚动计数，否则当前桶加一”，多进程并发记录不会丢失计数；
+        # SET 中的表达式都基于更新前的行计算
+        with self._lock:
+            row = self._connection().execute(
+                """
+                INSERT INTO auth_failure_buckets (scope, key, bucket, previous_failures, current_failures, last_failure_at)
+                VALUES (?, ?, ?, 0, 1, ?)
+                ON CONFLICT (scope, key) DO UPDATE SET
+                    previous_failures = CASE
+                        WHEN auth_failure_buckets.bucket >= excluded.bucket THEN auth_failure_buckets.previous_failures
+                        WHEN auth_failure_buckets.bucket = excluded.bucket - 1 THEN auth_failure_buckets.current_failures
+                        ELSE 0 END,
+                    current_failures = CASE
+                        WHEN auth_failure_buckets.bucket >= excluded.bucket THEN auth_failure_buckets.current_failures + 1
+                        ELSE 1 END,
+                    bucket = MAX(auth_failure_buckets.bucket, excluded.bucket),
+                    last_failure_at = excluded.last_failure_at
+                RETURNING bucket, previous_failures, current_failures
+                """,
+                (scope, key, _bucket(now, window), now),
+            ).fetchone()
+            self._records += 1
+            if self._records % SQLITE_PRUNE_EVERY == 0:
+                self._prune(now, window)
+        return _estimate(*row, now, window)
+
+    def clear(self, scope: str, key: str) -> None:
+        with self._lock:
+            self._connection().execute("DELETE FROM auth_failure_buckets WHERE scope = ? AND key = ?", (scope, key))
+
+    def _prune(self, now: float, window: float) -> None:
+        """删除已滑出窗口的行；仍超过上限时删除最近一次失败最早的行"""
+        self._connection().execute(
+            "DELETE FROM auth_failure_buckets WHERE bucket < ?", (_bucket(now, window) - 1,)
+        )
+        self._connection().execute(
+            """
+            DELETE FROM auth_failure_buckets WHERE rowid IN (
+                SELECT rowid FROM auth_failure_buckets ORDER BY last_failure_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_keys,),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class AuthFailureLimiter:
+    """认证失败限流器：滑动窗口内失败次数（估计值）达到上限后拒绝继续尝试"""
+
+    def __init__(self, store, limit: int, window_seconds: float, clock: Callable[[], float] = time.time):
+        self.store = store
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self._clock = clock
+
+    def is_blocked(self, scope: str, key: str) -> bool:
+        return self.store.count(scope, key, self._clock(), self.window_seconds) >= self.limit
+
+    def record_failure(self, scope: str, key: str) -> float:
+        return self.store.record(scope, key, self._clock(), self.window_seconds)
+
+    def clear(self, scope: str, key: str) -> None:
+        self.store.clear(scope, key)
+
+
+def create_failure_store(sqlite_path: Optional[str] = None, max_keys: Optional[int] = None):
+    max_keys = max_keys or settings.AUTH_LIMITER_MAX_KEYS
+    if sqlite_path:
+        return SQLiteFailureStore(sqlite_path, max_keys)
+    return MemoryFailureStore(max_keys)
+
+
+auth_failure_limiter = AuthFailureLimiter(
+    create_failure_store(settings.AUTH_LIMITER_SQLITE_PATH),
+    limit=settings.AUTH_FAILURE_LIMIT,
+    window_seconds=settings.AUTH_FAILURE_WINDOW_SECONDS,
+)
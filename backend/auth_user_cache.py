@@ -0,0 +1,186 @@
+"""
+已认证用户缓存
+get_current_user 每次请求都按令牌 sub（用户名）查询 users 表，移动端轮询时这是最频繁的查询。
+本模块按 (数据库引擎, 用户名) 缓存用户的列值快照（有上限、带过期时间），命中时在当前会话中
+以 merge(load=False) 还原为持久化对象，不发出 SQL；关联属性（如 department）仍按需懒加载，
+对返回对象的修改照常随会话提交。
+
+失效：用户行被更新/删除（修改资料、改密码、解绑微信、禁用、删除等）经 cache_invalidation
+在提交后移除对应缓存，批量写入提交后清空缓存；其他 worker 进程的修改通过版本检查发现：
+距上次检查超过 AUTH_USER_CACHE_CHECK_INTERVAL_SECONDS 时查询一次 users 表的 (行数, 最近更新时间)，
+与上次不一致即清空该引擎的缓存。条目另有 AUTH_USER_CACHE_TTL_SECONDS 的最长保留时间。
+settings.AUTH_USER_CACHE_ENABLED=False 时关闭缓存。
+"""
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from .cache_invalidation import ALL_ROWS, watch_tables
+from .config import settings
+from .models import User
+
+# 批量写入时无法确定涉及哪些用户，清空整个引擎的缓存
+ALL_USERNAMES = ALL_ROWS
+
+_COLUMN_KEYS = tuple(attr.key for attr in inspect(User).column_attrs)
+
+
+class AuthUserCache:
+    """进程级已认证用户缓存，按数据库引擎分别缓存"""
+
+    def __init__(self, ttl_seconds: int, max_entries: int, check_interval_seconds: float, enabled: bool = True):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.check_interval_seconds = check_interval_seconds
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # engine -> OrderedDict{username: (stored_at, column values)}
+        self._entries: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        # engine -> (users 表版本, 检查时间)
+        self._versions: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        # 每次失效递增；查询期间发生失效时不写回，避免把已过期的值放回缓存
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.version_checks = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": sum(len(entries) for entries in self._entries.values()),
+            }
+
+    def get_user(self, db: Session, username: str) -> Optional[User]:
+        """按用户名取用户：命中时还原到当前会话，未命中时查询并缓存"""
+        if not self.enabled:
+            return db.query(User).filter(User.username == username).first()
+
+        bind = db.get_bind()
+        now = time.monotonic()
+        self._check_version(db, bind, now)
+        with self._lock:
+            values = self._lookup(bind, username, now)
+            if values is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            generation = self._generation
+        if values is not None:
+            return _restore(db, values)
+
+        user = db.query(User).filter(User.username == username).first()
+        if user is not None:
+            self._store(bind, username, {key: getattr(user, key) for key in _COLUMN_KEYS}, generation)
+        return user
+
+    def _check_version(self, db: Session, bind, now: float) -> None:
+        """定期比对 users 表版本，发现其他进程的写入时清空该引擎的缓存"""
+        with self._lock:
+            state = self._versions.get(bind)
+        if state is not None and now - state[1] < self.check_interval_seconds:
+            return
+        version = _read_version(db)
+        with self._lock:
+            self.version_checks += 1
+            state = self._versions.get(bind)
+            if state is not None and state[0] != version:
+                self._generation += 1
+                entries = self._entries.get(bind)
+                if entries is not None:
+                    entries.clear()
+            self._versions[bind] = (version, now)
+
+    def _lookup(self, bind, username: str, now: float) -> Optional[Dict[str, Any]]:
+        entries = self._entries.get(bind)
+        if entries is None:
+            return None
+        cached = entries.get(username)
+        if cached is None:
+            return None
+        stored_at, values = cached
+        if now - stored_at > self.ttl_seconds:
+            del entries[username]
+            return None
+        entries.move_to_end(username)
+        return values
+
+    def _store(self, bind, username: str, values: Dict[str, Any], generation: int) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+            entries = self._entries.get(bind)
+            if entries is None:
+                entries = OrderedDict()
+                self._entries[bind] = entries
+            entries[username] = (time.monotonic(), values)
+            entries.move_to_end(username)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def invalidate(self, bind=None, username: Optional[str] = ALL_USERNAMES) -> None:
+        """移除指定引擎（None 为全部）中某用户名（None 为全部）的缓存"""
+        with self._lock:
+            self._generation += 1
+            targets = list(self._entries.values()) if bind is None else [self._entries.get(bind)]
+            for entries in targets:
+                if entries is None:
+                    continue
+                if username is ALL_USERNAMES:
+                    entries.clear()
+                else:
+                    entries.pop(username, None)
+
+
+def _read_version(db: Session) -> tuple:
+    count, updated_at = db.query(func.count(User.id), func.max(User.updated_at)).one()
+    return count, updated_at
+
+
+def _restore(db: Session, values: Dict[str, Any]) -> User:
+    user = User()
+    for key, value in values.items():
+        setattr(user, key, value)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
+auth_user_cache = AuthUserCache(
+    ttl_seconds=settings.AUTH_USER_CACHE_TTL_SECONDS,
+    max_entries=settings.AUTH_USER_CACHE_MAX_ENTRIES,
+    check_interval_seconds=settings.AUTH_USER_CACHE_CHECK_INTERVAL_SECONDS,
+    enabled=settings.AUTH_USER_CACHE_ENABLED,
+)
+
+
+def _previous_and_current_usernames(target):
+    # 用户名本身被修改时，新旧用户名都需失效
+    return {target.username, *inspect(target).attrs.username.history.deleted}
+
+
+@event.listens_for(User.username, "set", active_history=True, retval=True)
+def _keep_previous_username(target, value, oldvalue, initiator):
+    return value
+
+
+def _invalidate_users(changes) -> None:
+    for change in changes:
+        auth_user_cache.invalidate(change.engine, change.key)
+
+
+# 新建用户不会使已缓存的条目失效，只监听更新与删除
+watch_tables(
+    (User,),
+    _invalidate_users,
+    row_keys=_previous_and_current_usernames,
+    events=("after_update", "after_delete"),
+)
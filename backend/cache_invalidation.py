@@ -0,0 +1,105 @@
+"""
+进程内缓存的失效通知
+节假日日历、统计结果、系统设置、打卡策略、已认证用户等缓存都要在相关数据表的写入提交后失效。
+各缓存通过 watch_tables(models, callback) 登记关心的模型，由本模块统一挂接 SQLAlchemy 事件：
+
+- 模型的行级写入（after_insert/after_update/after_delete）记入所在会话，提交后回调，回滚时丢弃；
+  不属于任何会话的写入立即回调；
+- query(...).update()/delete() 批量写入不触发模型事件，按语句的目标模型记录，涉及的行未知（key 为 ALL_ROWS）；
+- 会话中有尚未提交的写入时 TableWatch.is_dirty(session) 为真，缓存应绕过缓存，直接读取会话内的值。
+
+回调参数为本次提交涉及的 Change 集合，每项为 (数据库引擎, 表名, 行键)；行键由 row_keys(target)
+给出，未提供 row_keys 时为 ALL_ROWS。
+"""
+from typing import Callable, Hashable, Iterable, List, NamedTuple, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+ROW_EVENTS = ("after_insert", "after_update", "after_delete")
+
+# 批量写入或未区分行时的行键：该表的全部行
+ALL_ROWS = None
+
+
+class Change(NamedTuple):
+    engine: object
+    table: str
+    key: Optional[Hashable]
+
+
+class TableWatch:
+    """一个缓存对一组模型的监听；实例本身作为 session.info 中的键"""
+
+    def __init__(
+        self,
+        models: Iterable[type],
+        callback: Callable[[Set[Change]], None],
+        row_keys: Optional[Callable[[object], Iterable[Hashable]]] = None,
+        events: Iterable[str] = ROW_EVENTS,
+    ):
+        self.models = tuple(models)
+        self.tables = {model.__table__.name for model in self.models}
+        self.callback = callback
+        self.row_keys = row_keys
+        for model in self.models:
+            for event_name in events:
+                event.listen(model, event_name, self._on_row_write)
+
+    def is_dirty(self, session: Session) -> bool:
+        """会话中是否有尚未提交的相关写入"""
+        return bool(session.info.get(self))
+
+    def mark(self, session: Optional[Session], changes: Set[Change]) -> None:
+        if session is None:
+            self.callback(changes)
+        else:
+            session.info.setdefault(self, set()).update(changes)
+
+    def _on_row_write(self, mapper, connection, target) -> None:
+        keys = self.row_keys(target) if self.row_keys else (ALL_ROWS,)
+        table = mapper.local_table.name
+        self.mark(Session.object_session(target), {Change(connection.engine, table, key) for key in keys})
+
+
+_watches: List[TableWatch] = []
+
+
+def watch_tables(
+    models: Iterable[type],
+    callback: Callable[[Set[Change]], None],
+    row_keys: Optional[Callable[[object], Iterable[Hashable]]] = None,
+    events: Iterable[str] = ROW_EVENTS,
+) -> TableWatch:
+    """登记 models 的写入在提交后回调 callback，返回的 TableWatch 可用于判断会话是否有未提交写入"""
+    watch = TableWatch(models, callback, row_keys, events)
+    _watches.append(watch)
+    return watch
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_bulk_writes(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    table = mapper.local_table.name
+    session = orm_execute_state.session
+    for watch in _watches:
+        if table in watch.tables:
+            watch.mark(session, {Change(session.get_bind(mapper=mapper), table, ALL_ROWS)})
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_after_commit(session):
+    for watch in _watches:
+        changes = session.info.pop(watch, None)
+        if changes:
+            watch.callback(changes)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_after_rollback(session, previous_transaction):
+    for watch in _watches:
+        session.info.pop(watch, None)
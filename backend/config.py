@@ -1,6 +1,11 @@
+import os
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 from typing import Optional
 
+# 运行期数据文件（缓存、access_token 等）的默认目录，放在源码目录之外
+DEFAULT_DATA_DIR = os.path.join(os.path.expanduser("~"), ".local", "share", "attendance")
+
 
 class Settings(BaseSettings):
     # 应用配置
@@ -10,24 +15,91 @@ class Settings(BaseSettings):
     
     # 数据库配置
     DATABASE_URL: str = "sqlite:///./attendance.db"
+
+    # 运行期数据目录：未单独配置路径的 SQLite 缓存/凭证文件放在这里
+    DATA_DIR: str = DEFAULT_DATA_DIR
     
     # JWT配置
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7天
+
+    # 密码哈希（bcrypt）
+    BCRYPT_ROUNDS: int = 12  # 成本因子；修改后旧哈希在用户下次登录时自动按新成本重算
+    PASSWORD_HASH_WORKERS: int = 4  # 登录时执行 bcrypt 的专用线程数，避免阻塞事件循环
+
+    # 认证失败限流（登录/微信登录）
+    AUTH_FAILURE_LIMIT: int = 5  # 窗口内允许的失败次数
+    AUTH_FAILURE_WINDOW_SECONDS: int = 15 * 60
+    AUTH_LIMITER_MAX_KEYS: int = 10000  # 最多跟踪的用户名/授权码数量，超出后淘汰最久未访问的
+    AUTH_LIMITER_SQLITE_PATH: Optional[str] = None  # 设置后同一主机的所有 worker 共享失败计数
+
+    # 已认证用户缓存（get_current_user 按用户名缓存用户快照）
+    AUTH_USER_CACHE_ENABLED: bool = True
+    AUTH_USER_CACHE_TTL_SECONDS: int = 60  # 缓存条目的最长保留时间
+    AUTH_USER_CACHE_CHECK_INTERVAL_SECONDS: float = 2.0  # 其他 worker 的修改最迟在该时间后生效
+    AUTH_USER_CACHE_MAX_ENTRIES: int = 2048
     
     # CORS配置
     CORS_ORIGINS: list = ["*"]
     
     # 高德地图API配置
     AMAP_API_KEY: Optional[str] = None  # 高德地图API Key
+    AMAP_API_BASE_URL: str = "https://restapi.amap.com"
+    # 高德地图调用控制（每个 worker 进程分别计数）
+    # 单次批量请求中未缓存的坐标最多约 AMAP_BURST + AMAP_QPS × AMAP_MAX_WAIT_SECONDS 个能调用高德地图
+    # （默认约 12 个），其余返回坐标并带 error=rate_limited，由调用方稍后重试；
+    # 调大 QPS/等待时间可一次解析更多坐标，但请求耗时随之增加，且不能超过高德账号的 QPS 上限
+    AMAP_QPS: float = 3.0  # 每秒请求数上限，0 表示不限速
+    AMAP_BURST: int = 3
+    AMAP_MAX_WAIT_SECONDS: float = 3.0  # 排队等待令牌超过该时间则直接返回坐标
+    AMAP_DAILY_QUOTA: int = 5000  # 每日调用配额，0 表示不限制
+    AMAP_BREAKER_FAILURE_THRESHOLD: int = 5  # 连续失败多少次后熔断
+    AMAP_BREAKER_RESET_SECONDS: float = 30.0  # 熔断后多久放行试探请求
+    # 逆地理编码缓存：进程内 LRU + SQLite 文件持久层（多 worker 共享、重启后保留）
+    # 未设置时为 DATA_DIR/geocode_cache.db；设为空字符串则只用进程内缓存
+    GEOCODE_CACHE_PATH: Optional[str] = None
+    GEOCODE_CACHE_MAX_ENTRIES: int = 50000
+    GEOCODE_CACHE_MEMORY_ENTRIES: int = 1024
+    GEOCODE_CACHE_TTL_DAYS: int = 30
+    GEOCODE_CACHE_SWEEP_INTERVAL_SECONDS: int = 3600
+    GEOCODE_CACHE_RADIUS_METERS: float = 50.0  # 复用该半径内最近的已缓存地址；0 表示只做精确匹配
     
     # 微信小程序配置
     WECHAT_APPID: Optional[str] = None  # 微信小程序AppID
     WECHAT_SECRET: Optional[str] = None  # 微信小程序AppSecret
     WECHAT_APPROVAL_TEMPLATE_ID: Optional[str] = None  # 审批提醒订阅消息模板ID
     WECHAT_RESULT_TEMPLATE_ID: Optional[str] = None  # 审批结果通知订阅消息模板ID
+    WECHAT_API_BASE_URL: str = "https://api.weixin.qq.com"
+    # access_token 存储：SQLite 文件供同一主机的所有 worker 共用一个 token
+    # 未设置时为 DATA_DIR/wechat_token.db；设为空字符串则每个进程各自获取
+    WECHAT_TOKEN_STORE_PATH: Optional[str] = None
+    WECHAT_TOKEN_REFRESH_AHEAD_SECONDS: float = 600.0  # 剩余有效期不足该值时后台提前刷新
+    WECHAT_TOKEN_REFRESH_LEASE_SECONDS: float = 15.0  # 刷新租约，持有者崩溃后到期由其他 worker 接手
+    
+    # 微信消息发件箱（审批消息与状态变更同一事务写入，后台任务批量投递、失败指数退避重试）
+    NOTIFICATION_WORKER_ENABLED: bool = True
+    NOTIFICATION_BATCH_SIZE: int = 20
+    NOTIFICATION_POLL_INTERVAL_SECONDS: float = 5.0
+    NOTIFICATION_MAX_ATTEMPTS: int = 6  # 超过后转入死信（status=dead）
+    NOTIFICATION_RETRY_BASE_SECONDS: float = 10.0  # 第 n 次失败后约等待 base * 2^(n-1) 秒
+    NOTIFICATION_RETRY_MAX_SECONDS: float = 3600.0
+    NOTIFICATION_CLAIM_TIMEOUT_SECONDS: float = 120.0  # 认领租约，投递进程崩溃后到期可被重新认领
     
+    # 出站 HTTP 客户端（高德地图、微信共用连接池，keep-alive 复用连接）
+    HTTP_CLIENT_TIMEOUT_SECONDS: float = 10.0
+    HTTP_CLIENT_MAX_CONNECTIONS: int = 50
+    HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    
+    @model_validator(mode="after")
+    def _default_data_paths(self):
+        if self.GEOCODE_CACHE_PATH is None:
+            self.GEOCODE_CACHE_PATH = os.path.join(self.DATA_DIR, "geocode_cache.db")
+        if self.WECHAT_TOKEN_STORE_PATH is None:
+            self.WECHAT_TOKEN_STORE_PATH = os.path.join(self.DATA_DIR, "wechat_token.db")
+        return self
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -23,8 +23,11 @@ def get_db():
 
 
 def init_db():
-    """初始化数据库"""
+    """初始化数据库：建表，并回填尚未回填的派生表（如已有数据库新增的月度考勤汇总）"""
+    from .derived_tables import backfill_derived_tables
+
     Base.metadata.create_all(bind=engine)
+    backfill_derived_tables(engine)
 
 
 
@@ -0,0 +1,68 @@
+"""
+派生表回填状态
+月度考勤汇总（attendance_monthly_rollups）与请假半天占用（leave_day_slots）由模型事件随明细增量维护，
+但已有数据库升级后这些表为空，需要按历史明细回填一次。回填完成后在 derived_table_backfills 中记一行；
+读取方在记录出现前回退到直接查询明细，不会把空表当作"没有数据"。
+
+init_db 启动时回填尚未回填的派生表，对应的迁移脚本同样会回填并记录。
+"""
+import logging
+import threading
+import weakref
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+
+from .models import AttendanceMonthlyRollup, DerivedTableBackfill, LeaveDaySlot, backfill_leave_day_slots
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# engine -> 已确认回填完成的表名（回填记录只增不减，确认后不再查询）
+_backfilled: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def is_backfilled(db: Session, table_name: str) -> bool:
+    """派生表是否已按历史明细回填"""
+    bind = db.get_bind()
+    with _lock:
+        if table_name in _backfilled.get(bind, ()):
+            return True
+    found = db.query(DerivedTableBackfill.name).filter(DerivedTableBackfill.name == table_name).first() is not None
+    if found:
+        with _lock:
+            _backfilled.setdefault(bind, set()).add(table_name)
+    return found
+
+
+def mark_backfilled(connection, table_name: str) -> None:
+    """记录派生表已回填（与回填写入在同一事务内提交）"""
+    table = DerivedTableBackfill.__table__
+    table.create(connection, checkfirst=True)
+    connection.execute(delete(table).where(table.c.name == table_name))
+    connection.execute(insert(table).values(name=table_name))
+
+
+def _pending(connection, table_name: str) -> bool:
+    table = DerivedTableBackfill.__table__
+    return connection.execute(table.select().where(table.c.name == table_name)).first() is None
+
+
+def backfill_derived_tables(engine) -> None:
+    """回填尚未回填的派生表；失败时只记录日志，读取方继续回退到明细查询"""
+    from .attendance_rollups import backfill_monthly_rollups
+
+    backfills = (
+        (AttendanceMonthlyRollup.__tablename__, backfill_monthly_rollups),
+        (LeaveDaySlot.__tablename__, backfill_leave_day_slots),
+    )
+    for table_name, backfill in backfills:
+        try:
+            with engine.begin() as connection:
+                if not _pending(connection, table_name):
+                    continue
+                backfill(connection)
+                mark_backfilled(connection, table_name)
+            logger.info(f"派生表 {table_name} 已按历史明细回填")
+        except Exception as exc:
+            logger.warning(f"回填派生表 {table_name} 失败，读取时将回退到明细查询: {exc}")
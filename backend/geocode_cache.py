@@ -1,94 +1,388 @@
 """
 地理编码缓存模块
-使用内存缓存来减少高德地图API调用
+两级缓存逆地理编码结果，减少高德地图API调用：
+- 进程内 LRU（GEOCODE_CACHE_MEMORY_ENTRIES 条）作为前置层，命中时不访问磁盘；
+- SQLite 文件（GEOCODE_CACHE_PATH）作为持久层，重启/发布后仍然有效，同一主机上的所有 worker 共享，
+  条目数受 GEOCODE_CACHE_MAX_ENTRIES 限制。GEOCODE_CACHE_PATH 为空时只使用进程内缓存。
+
+近邻查找：每个条目按 geohash 分格索引（进程内按格子分桶，持久层按 geohash 前缀范围查询），
+精确键未命中时在所在格子及周围 8 个格子中查找 GEOCODE_CACHE_RADIUS_METERS 米内最近的已缓存地址，
+同一办公室相距十几米的员工共用一条缓存，不再各自调用高德地图API。半径为 0 时只做精确匹配。
+统计信息中 exact_hits 为旧的精确键即可命中的次数，nearby_hits 为近邻查找额外命中的次数。
+
+过期：读取时惰性判断过期时间；另外每隔 GEOCODE_CACHE_SWEEP_INTERVAL_SECONDS 在读写时顺带清理一次
+持久层中的过期条目，并删除超出上限的最早条目。统计信息只读计数器，为 O(1)。
+
+异步调用方使用 aget_cached_address / aset_cached_address：事件循环中只查写进程内缓存，
+持久层的 SQLite 读写（及顺带的清理）放到线程池执行，不阻塞其他请求。
 """
-from typing import Optional, Dict
-from datetime import datetime, timedelta
-import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from .config import settings
+from .utils import geohash
+from .utils.sqlite_files import connect_shared
+
+logger = logging.getLogger(__name__)
+
+# 持久层保存的 geohash 长度（约 5 米），查询时按搜索精度取前缀
+GEOHASH_STORE_PRECISION = 9
+
+
+def cache_key(latitude: float, longitude: float) -> str:
+    """生成缓存键（经纬度四舍五入到小数点后4位，约 10 米）"""
+    return f"{round(latitude, 4)},{round(longitude, 4)}"
+
+
+def _add_location_columns(conn: sqlite3.Connection) -> None:
+    """旧版缓存文件没有坐标列：补列并按 key 中的坐标回填"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(geocode_cache)")}
+    if "geohash" in columns:
+        return
+    for column in ("latitude REAL", "longitude REAL", "geohash TEXT"):
+        if column.split()[0] not in columns:
+            conn.execute(f"ALTER TABLE geocode_cache ADD COLUMN {column}")
+    updates = []
+    for (key,) in conn.execute("SELECT key FROM geocode_cache").fetchall():
+        latitude, longitude = (float(part) for part in key.split(","))
+        updates.append((latitude, longitude, geohash.encode(latitude, longitude, GEOHASH_STORE_PRECISION), key))
+    conn.executemany("UPDATE geocode_cache SET latitude = ?, longitude = ?, geohash = ? WHERE key = ?", updates)
+
+
+class GeocodeCache:
+    """逆地理编码两级缓存"""
+
+    def __init__(
+        self,
+        path: Optional[str],
+        max_entries: int,
+        memory_entries: int,
+        ttl_seconds: float,
+        sweep_interval_seconds: float,
+        radius_meters: float = 0.0,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self.radius_meters = radius_meters
+        self.precision = geohash.search_precision(radius_meters) if radius_meters > 0 else GEOHASH_STORE_PRECISION
+        # _lock 只保护进程内缓存（不在持有期间做磁盘 I/O），_db_lock 保护 SQLite 连接
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        # key -> (过期时间戳, 地址, 纬度, 经度)
+        self._memory: "OrderedDict[str, Tuple[float, str, float, float]]" = OrderedDict()
+        # 搜索精度的 geohash 格子 -> 该格子内的 key
+        self._cells: Dict[str, Set[str]] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._next_sweep_at = 0.0
+        # 持久层条目数：每次清理时重新统计，期间按本进程的写入递增（多 worker 时为近似值）
+        self._persistent_entries = 0
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.exact_hits = 0
+        self.nearby_hits = 0
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        # 首次使用时再打开，保证每个 worker 进程（fork 之后）各自持有连接
+        if self._conn is None and self.path:
+            conn = connect_shared(self.path)
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS geocode_cache (
+                    key TEXT PRIMARY KEY,
+                    address TEXT NOT NULL,
+                    cached_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    latitude REAL,
+                    longitude REAL,
+                    geohash TEXT
+                )
+                """
+            )
+            _add_location_columns(conn)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_geocode_cache_geohash ON geocode_cache (geohash)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_geocode_cache_expires_at ON geocode_cache (expires_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_geocode_cache_cached_at ON geocode_cache (cached_at)")
+            self._conn = conn
+        return self._conn
+
+    @property
+    def persistent(self) -> bool:
+        return bool(self.path)
+
+    def get(self, latitude: float, longitude: float) -> Optional[str]:
+        """精确键命中，或返回搜索半径内最近的已缓存地址（同步版本，会访问磁盘）"""
+        address = self.get_from_memory(latitude, longitude)
+        if address is None and self.persistent:
+            address = self.get_from_disk(latitude, longitude)
+        return address
+
+    def get_from_memory(self, latitude: float, longitude: float) -> Optional[str]:
+        """只查进程内缓存，不做磁盘 I/O，可在事件循环中直接调用"""
+        key = cache_key(latitude, longitude)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return self._hit(key, key, entry[1])
+                self._forget(key)
+            if self.radius_meters > 0:
+                nearby = self._nearest_in_memory(latitude, longitude, now)
+                if nearby is not None:
+                    self.memory_hits += 1
+                    return self._hit(nearby[4], key, nearby[1])
+            if not self.persistent:
+                self.misses += 1
+            return None
+
+    def get_from_disk(self, latitude: float, longitude: float) -> Optional[str]:
+        """查持久层并回填进程内缓存；阻塞的 SQLite I/O，异步代码中应放到线程池执行"""
+        key = cache_key(latitude, longitude)
+        now = time.time()
+        row = None
+        with self._db_lock:
+            conn = self._connection()
+            if conn is not None:
+                self._maybe_sweep(conn, now)
+                row = self._nearest_persisted(conn, key, latitude, longitude, now)
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            found_key, address, expires_at, found_lat, found_lon = row
+            self._remember(found_key, expires_at, address, found_lat, found_lon)
+            self.persistent_hits += 1
+            return self._hit(found_key, key, address)
+
+    def _hit(self, found_key: str, key: str, address: str) -> str:
+        if found_key == key:
+            self.exact_hits += 1
+        else:
+            self.nearby_hits += 1
+        return address
 
-# 内存缓存字典
-_cache: Dict[str, Dict] = {}
+    def _nearest_in_memory(self, latitude: float, longitude: float, now: float):
+        """返回 (过期时间, 地址, 纬度, 经度, key)；进程内缓存中半径内没有时返回 None"""
+        best, best_distance = None, self.radius_meters
+        for cell in geohash.neighbors(geohash.encode(latitude, longitude, self.precision)):
+            for candidate in self._cells.get(cell, ()):
+                expires_at, address, cached_lat, cached_lon = self._memory[candidate]
+                if expires_at <= now:
+                    continue
+                distance = geohash.distance_meters(latitude, longitude, cached_lat, cached_lon)
+                if distance <= best_distance:
+                    best, best_distance = (expires_at, address, cached_lat, cached_lon, candidate), distance
+        if best is not None:
+            self._memory.move_to_end(best[4])
+        return best
 
-# 缓存过期时间（天）
-CACHE_EXPIRE_DAYS = 30
+    def _nearest_persisted(self, conn: sqlite3.Connection, key: str, latitude: float, longitude: float, now: float):
+        """持久层中的精确键或半径内最近的条目：(key, 地址, 过期时间, 纬度, 经度)"""
+        if self.radius_meters <= 0:
+            rows = conn.execute(
+                "SELECT key, address, expires_at, latitude, longitude FROM geocode_cache WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchall()
+        else:
+            # 各格子对应 geohash 前缀范围，走 idx_geocode_cache_geohash 索引
+            cells = geohash.neighbors(geohash.encode(latitude, longitude, self.precision))
+            ranges = " OR ".join(["(geohash >= ? AND geohash < ?)"] * len(cells))
+            params: List = [now]
+            for cell in cells:
+                params.extend((cell, cell + "{"))
+            rows = conn.execute(
+                f"SELECT key, address, expires_at, latitude, longitude FROM geocode_cache "
+                f"WHERE expires_at > ? AND ({ranges})",
+                params,
+            ).fetchall()
+        best, best_distance = None, self.radius_meters
+        for row in rows:
+            if row[0] == key:
+                return row
+            distance = geohash.distance_meters(latitude, longitude, row[3], row[4])
+            if distance <= best_distance:
+                best, best_distance = row, distance
+        return best
 
+    def set(self, latitude: float, longitude: float, address: str) -> None:
+        """写入进程内缓存和持久层（同步版本，会访问磁盘）"""
+        expires_at = self.set_in_memory(latitude, longitude, address)
+        self.set_on_disk(latitude, longitude, address, expires_at)
 
-def _get_cache_key(latitude: float, longitude: float) -> str:
-    """生成缓存键（经纬度四舍五入到小数点后4位）"""
-    # 四舍五入到小数点后4位，减少缓存键数量
-    lat_rounded = round(latitude, 4)
-    lon_rounded = round(longitude, 4)
-    key_str = f"{lat_rounded},{lon_rounded}"
-    return hashlib.md5(key_str.encode()).hexdigest()
+    def set_in_memory(self, latitude: float, longitude: float, address: str) -> float:
+        """只写进程内缓存，返回过期时间"""
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(cache_key(latitude, longitude), expires_at, address, latitude, longitude)
+        return expires_at
+
+    def set_on_disk(self, latitude: float, longitude: float, address: str, expires_at: float) -> None:
+        """写入持久层；阻塞的 SQLite I/O，异步代码中应放到线程池执行"""
+        now = time.time()
+        with self._db_lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            conn.execute(
+                """
+                INSERT INTO geocode_cache (key, address, cached_at, expires_at, latitude, longitude, geohash)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    address = excluded.address,
+                    cached_at = excluded.cached_at,
+                    expires_at = excluded.expires_at,
+                    latitude = excluded.latitude,
+                    longitude = excluded.longitude,
+                    geohash = excluded.geohash
+                """,
+                (cache_key(latitude, longitude), address, now, expires_at, latitude, longitude,
+                 geohash.encode(latitude, longitude, GEOHASH_STORE_PRECISION)),
+            )
+            self._persistent_entries += 1
+            self._maybe_sweep(conn, now)
+
+    def _remember(self, key: str, expires_at: float, address: str, latitude: float, longitude: float) -> None:
+        if key in self._memory:
+            self._forget(key)
+        self._memory[key] = (expires_at, address, latitude, longitude)
+        self._cells.setdefault(geohash.encode(latitude, longitude, self.precision), set()).add(key)
+        while len(self._memory) > self.memory_entries:
+            self._forget(next(iter(self._memory)))
+
+    def _forget(self, key: str) -> None:
+        _, _, latitude, longitude = self._memory.pop(key)
+        cell = geohash.encode(latitude, longitude, self.precision)
+        keys = self._cells.get(cell)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._cells[cell]
+
+    def _maybe_sweep(self, conn: sqlite3.Connection, now: float) -> None:
+        # 超出上限时留 10% 余量再清理，避免达到上限后每次写入都触发清理
+        if now >= self._next_sweep_at or self._persistent_entries > self.max_entries * 1.1:
+            self._sweep(conn, now)
+
+    def _sweep(self, conn: sqlite3.Connection, now: float) -> None:
+        """删除过期条目，仍超过上限时删除最早缓存的条目"""
+        self._next_sweep_at = now + self.sweep_interval_seconds
+        try:
+            conn.execute("DELETE FROM geocode_cache WHERE expires_at <= ?", (now,))
+            conn.execute(
+                """
+                DELETE FROM geocode_cache WHERE key IN (
+                    SELECT key FROM geocode_cache ORDER BY cached_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self._persistent_entries = conn.execute("SELECT COUNT(*) FROM geocode_cache").fetchone()[0]
+        except sqlite3.OperationalError as exc:
+            # 其他 worker 正在写入导致锁等待超时：跳过本次清理，下个周期再试
+            logger.warning("地理编码缓存清理失败: %s", exc)
+
+    def clear_expired(self) -> None:
+        now = time.time()
+        with self._lock:
+            for key in [key for key, entry in self._memory.items() if entry[0] <= now]:
+                self._forget(key)
+        with self._db_lock:
+            conn = self._connection()
+            if conn is not None:
+                self._sweep(conn, now)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.memory_hits + self.persistent_hits + self.misses
+            hits = self.memory_hits + self.persistent_hits
+            return {
+                "memory_entries": len(self._memory),
+                "persistent_entries": self._persistent_entries,
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "exact_hits": self.exact_hits,
+                "nearby_hits": self.nearby_hits,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                # 只用精确键（四舍五入到小数点后4位）时的命中率，用于对比近邻查找的收益
+                "exact_hit_rate": round(self.exact_hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+geocode_cache = GeocodeCache(
+    path=settings.GEOCODE_CACHE_PATH,
+    max_entries=settings.GEOCODE_CACHE_MAX_ENTRIES,
+    memory_entries=settings.GEOCODE_CACHE_MEMORY_ENTRIES,
+    ttl_seconds=settings.GEOCODE_CACHE_TTL_DAYS * 24 * 3600,
+    sweep_interval_seconds=settings.GEOCODE_CACHE_SWEEP_INTERVAL_SECONDS,
+    radius_meters=settings.GEOCODE_CACHE_RADIUS_METERS,
+)
 
 
 def get_cached_address(latitude: float, longitude: float) -> Optional[str]:
     """
     从缓存中获取地址
-    
+
     Args:
         latitude: 纬度
         longitude: 经度
-        
+
     Returns:
         地址文本，如果缓存不存在或已过期则返回None
     """
-    cache_key = _get_cache_key(latitude, longitude)
-    
-    if cache_key not in _cache:
-        return None
-    
-    cache_entry = _cache[cache_key]
-    
-    # 检查是否过期
-    cached_time = cache_entry.get("cached_at")
-    if cached_time:
-        expire_time = cached_time + timedelta(days=CACHE_EXPIRE_DAYS)
-        if datetime.now() > expire_time:
-            # 缓存已过期，删除
-            del _cache[cache_key]
-            return None
-    
-    return cache_entry.get("address")
+    return geocode_cache.get(latitude, longitude)
 
 
 def set_cached_address(latitude: float, longitude: float, address: str):
     """
     将地址保存到缓存
-    
+
     Args:
         latitude: 纬度
         longitude: 经度
         address: 地址文本
     """
-    cache_key = _get_cache_key(latitude, longitude)
-    _cache[cache_key] = {
-        "address": address,
-        "cached_at": datetime.now()
-    }
+    geocode_cache.set(latitude, longitude, address)
+
+
+async def aget_cached_address(latitude: float, longitude: float) -> Optional[str]:
+    """get_cached_address 的异步版本：进程内未命中时在线程池中查持久层"""
+    address = geocode_cache.get_from_memory(latitude, longitude)
+    if address is None and geocode_cache.persistent:
+        address = await run_in_threadpool(geocode_cache.get_from_disk, latitude, longitude)
+    return address
+
+
+async def aset_cached_address(latitude: float, longitude: float, address: str) -> None:
+    """set_cached_address 的异步版本：持久层写入在线程池中执行"""
+    expires_at = geocode_cache.set_in_memory(latitude, longitude, address)
+    if geocode_cache.persistent:
+        await run_in_threadpool(geocode_cache.set_on_disk, latitude, longitude, address, expires_at)
 
 
 def clear_expired_cache():
     """清理过期的缓存"""
-    now = datetime.now()
-    expired_keys = []
-    
-    for key, entry in _cache.items():
-        cached_time = entry.get("cached_at")
-        if cached_time:
-            expire_time = cached_time + timedelta(days=CACHE_EXPIRE_DAYS)
-            if now > expire_time:
-                expired_keys.append(key)
-    
-    for key in expired_keys:
-        del _cache[key]
+    geocode_cache.clear_expired()
 
 
 def get_cache_stats() -> Dict:
     """获取缓存统计信息"""
-    return {
-        "total_entries": len(_cache),
-        "cache_size_mb": sum(len(str(v).encode()) for v in _cache.values()) / (1024 * 1024)
-    }
-
-
+    return geocode_cache.stats()
@@ -0,0 +1,231 @@
+"""
+节假日/工作日日历
+进程内缓存 holidays 表，按年份构建 日期→类型 映射与工作日前缀和，
+供打卡、统计、公开工作日查询复用，避免逐日查询 holidays 表。
+"""
+import threading
+import time
+import weakref
+from datetime import date, timedelta
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from sqlalchemy.orm import Session
+
+from .cache_invalidation import watch_tables
+from .models import Holiday
+
+# 兜底重载间隔（秒）：多 worker 部署时，其他进程的节假日修改最迟在该时间后生效
+CALENDAR_RELOAD_SECONDS = 300
+
+HOLIDAY_TYPE_HOLIDAY = "holiday"
+HOLIDAY_TYPE_WORKDAY = "workday"
+HOLIDAY_TYPE_COMPANY_HOLIDAY = "company_holiday"
+REST_HOLIDAY_TYPES = (HOLIDAY_TYPE_HOLIDAY, HOLIDAY_TYPE_COMPANY_HOLIDAY)
+
+DEFAULT_REASONS = {
+    HOLIDAY_TYPE_HOLIDAY: "法定节假日",
+    HOLIDAY_TYPE_COMPANY_HOLIDAY: "公司节假日",
+    HOLIDAY_TYPE_WORKDAY: "调休工作日",
+}
+
+
+# 周一至周五为常规工作日
+WORKDAY_WEEKMASK = "1111100"
+
+
+def build_busday_calendar(overrides: Mapping[date, str]) -> Tuple[np.busdaycalendar, np.ndarray]:
+    """根据节假日配置构建 numpy 工作日历与调休工作日数组，可在多次统计间复用"""
+    rest_days = [d for d, holiday_type in overrides.items() if holiday_type in REST_HOLIDAY_TYPES]
+    extra_workdays = sorted(d for d, holiday_type in overrides.items() if holiday_type == HOLIDAY_TYPE_WORKDAY)
+    busdaycal = np.busdaycalendar(
+        weekmask=WORKDAY_WEEKMASK,
+        holidays=np.array(rest_days, dtype="datetime64[D]"),
+    )
+    return busdaycal, np.array(extra_workdays, dtype="datetime64[D]")
+
+
+def workday_mask(
+    start_date: date,
+    end_date: date,
+    overrides: Mapping[date, str],
+    calendar: Optional[Tuple[np.busdaycalendar, np.ndarray]] = None,
+) -> np.ndarray:
+    """返回 [start_date, end_date] 每天是否为工作日的布尔数组"""
+    days = np.arange(
+        np.datetime64(start_date, "D"),
+        np.datetime64(end_date, "D") + 1,
+        dtype="datetime64[D]",
+    )
+    busdaycal, extra_workdays = calendar or build_busday_calendar(overrides)
+    mask = np.is_busday(days, busdaycal=busdaycal)
+    if extra_workdays.size:
+        mask |= np.isin(days, extra_workdays)
+    return mask
+
+
+def count_workdays_between(
+    start_date: date,
+    end_date: date,
+    overrides: Mapping[date, str],
+    calendar: Optional[Tuple[np.busdaycalendar, np.ndarray]] = None,
+) -> int:
+    """
+    统计 [start_date, end_date] 内的工作日天数（含两端）
+    overrides 为 {日期: 节假日类型}，holiday/company_holiday 休息，workday 上班；
+    calendar 为 build_busday_calendar 的结果，传入时跳过构建
+    """
+    if start_date > end_date:
+        return 0
+    busdaycal, extra_workdays = calendar or build_busday_calendar(overrides)
+    begin = np.datetime64(start_date, "D")
+    stop = np.datetime64(end_date, "D") + 1
+    count = int(np.busday_count(begin, stop, busdaycal=busdaycal))
+    if extra_workdays.size:
+        in_range = extra_workdays[(extra_workdays >= begin) & (extra_workdays < stop)]
+        # 落在周末的调休工作日不在 busdaycalendar 中，需要单独补计
+        count += int(np.count_nonzero(~np.is_busday(in_range, busdaycal=busdaycal)))
+    return count
+
+
+def list_workdays_between(
+    start_date: date,
+    end_date: date,
+    overrides: Mapping[date, str],
+    calendar: Optional[Tuple[np.busdaycalendar, np.ndarray]] = None,
+) -> List[date]:
+    """列出 [start_date, end_date] 内的全部工作日"""
+    if start_date > end_date:
+        return []
+    days = np.arange(
+        np.datetime64(start_date, "D"),
+        np.datetime64(end_date, "D") + 1,
+        dtype="datetime64[D]",
+    )
+    return days[workday_mask(start_date, end_date, overrides, calendar)].tolist()
+
+
+class _YearCalendar:
+    """单个自然年的日历：节假日配置 + 工作日标记 + 前缀和"""
+
+    __slots__ = ("year", "start", "overrides", "flags", "prefix")
+
+    def __init__(self, year: int, overrides: Dict[date, Tuple[str, Optional[str]]]):
+        self.year = year
+        self.start = date(year, 1, 1)
+        self.overrides = overrides
+        self.flags = workday_mask(
+            self.start,
+            date(year, 12, 31),
+            {d: holiday_type for d, (holiday_type, _name) in overrides.items()},
+        )
+        # prefix[i] = 当年前 i 天中的工作日天数
+        self.prefix = np.concatenate(([0], np.cumsum(self.flags, dtype=np.int64)))
+
+    def index(self, target_date: date) -> int:
+        return (target_date - self.start).days
+
+
+class HolidayCalendar:
+    """进程级节假日日历，按数据库引擎分别缓存，holidays 的写入提交后自动失效"""
+
+    def __init__(self, reload_seconds: int = CALENDAR_RELOAD_SECONDS):
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        # engine -> {"loaded_at": float, "years": {year: _YearCalendar}}
+        self._binds: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def invalidate(self) -> None:
+        """清空全部缓存，下次查询时重新加载"""
+        with self._lock:
+            self._binds.clear()
+
+    def _year(self, db: Session, year: int) -> _YearCalendar:
+        bind = db.get_bind()
+        now = time.monotonic()
+        with self._lock:
+            state = self._binds.get(bind)
+            if state is None or now - state["loaded_at"] > self.reload_seconds:
+                state = {"loaded_at": now, "years": {}}
+                self._binds[bind] = state
+            cached = state["years"].get(year)
+            if cached is not None:
+                return cached
+
+        rows = db.query(Holiday.date, Holiday.type, Holiday.name).filter(
+            Holiday.date >= f"{year:04d}-01-01",
+            Holiday.date <= f"{year:04d}-12-31"
+        ).all()
+        overrides = {}
+        for date_str, holiday_type, name in rows:
+            try:
+                overrides[date.fromisoformat(date_str)] = (holiday_type, name)
+            except (TypeError, ValueError):
+                continue
+        year_calendar = _YearCalendar(year, overrides)
+
+        with self._lock:
+            # 加载期间若已失效（节假日被修改），只返回本次结果，不写回缓存
+            if self._binds.get(bind) is state:
+                state["years"][year] = year_calendar
+        return year_calendar
+
+    def get_holiday(self, db: Session, target_date: date) -> Optional[Tuple[str, Optional[str]]]:
+        """返回 (类型, 名称)，未配置时返回 None"""
+        return self._year(db, target_date.year).overrides.get(target_date)
+
+    def is_workday(self, db: Session, target_date: date) -> bool:
+        year_calendar = self._year(db, target_date.year)
+        return bool(year_calendar.flags[year_calendar.index(target_date)])
+
+    def get_status(self, db: Session, target_date: date) -> Dict[str, object]:
+        """
+        返回工作日状态: {is_workday, reason, holiday_type, holiday_name}
+        reason 为默认文案（周末/正常工作日/法定节假日/公司节假日/调休工作日）
+        """
+        holiday = self.get_holiday(db, target_date)
+        if holiday and holiday[0] in DEFAULT_REASONS:
+            holiday_type, name = holiday
+            return {
+                "is_workday": holiday_type == HOLIDAY_TYPE_WORKDAY,
+                "reason": DEFAULT_REASONS[holiday_type],
+                "holiday_type": holiday_type,
+                "holiday_name": name,
+            }
+        if target_date.weekday() >= 5:
+            return {"is_workday": False, "reason": "周末", "holiday_type": None, "holiday_name": None}
+        return {"is_workday": True, "reason": "正常工作日", "holiday_type": None, "holiday_name": None}
+
+    def count_workdays(self, db: Session, start_date: date, end_date: date) -> int:
+        """统计 [start_date, end_date] 内的工作日天数（含两端）"""
+        if start_date > end_date:
+            return 0
+        total = 0
+        for year in range(start_date.year, end_date.year + 1):
+            year_calendar = self._year(db, year)
+            first = year_calendar.index(max(start_date, year_calendar.start))
+            last = year_calendar.index(min(end_date, date(year, 12, 31)))
+            total += int(year_calendar.prefix[last + 1] - year_calendar.prefix[first])
+        return total
+
+    def list_workdays(self, db: Session, start_date: date, end_date: date) -> List[date]:
+        """列出 [start_date, end_date] 内的全部工作日"""
+        result = []
+        for year in range(start_date.year, end_date.year + 1):
+            year_calendar = self._year(db, year)
+            first = year_calendar.index(max(start_date, year_calendar.start))
+            last = year_calendar.index(min(end_date, date(year, 12, 31)))
+            for i in np.flatnonzero(year_calendar.flags[first:last + 1]):
+                result.append(year_calendar.start + timedelta(days=first + int(i)))
+        return result
+
+
+holiday_calendar = HolidayCalendar()
+
+
+def _invalidate_calendar(changes) -> None:
+    holiday_calendar.invalidate()
+
+
+watch_tables((Holiday,), _invalidate_calendar)
@@ -0,0 +1,124 @@
+"""
+出站 HTTP 客户端
+高德地图、微信等外部接口共用应用级 httpx 客户端（连接池 + keep-alive），不再每次调用都新建客户端、
+重新建立 TCP/TLS 连接。应用启动时创建、关闭时释放（见 main.py）；脚本或未启动应用时按需创建。
+
+- get_async_client()：异步接口使用的 AsyncClient。连接与事件循环绑定，每个事件循环各用一个客户端，
+  aclose() 时全部关闭（其他线程的循环在其所属循环中关闭）；
+- get_sync_client()：同步代码（线程池中发送审批通知等）使用的 Client，可在多线程间共享；
+- SingleFlight：同一 key 的并发调用合并为一次上游请求，其余调用方等待同一结果。
+"""
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import httpx
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OutboundHttp:
+    """应用级出站 HTTP 客户端（异步 + 同步各一个连接池）"""
+
+    def __init__(self, timeout: float, max_connections: int, max_keepalive_connections: int, keepalive_expiry: float):
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._lock = threading.Lock()
+        # 每个事件循环一个异步客户端（连接与事件循环绑定），由 aclose() 统一关闭
+        self._async_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._sync_client: Optional[httpx.Client] = None
+
+    def get_async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None or client.is_closed:
+                self._discard_closed_loops()
+                client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+                self._async_clients[loop] = client
+            return client
+
+    def _discard_closed_loops(self) -> None:
+        # 调用方需持有 self._lock。事件循环关闭后其连接已无法在其他循环中关闭，只能丢弃
+        for loop in [loop for loop in self._async_clients if loop.is_closed()]:
+            client = self._async_clients.pop(loop)
+            if not client.is_closed:
+                logger.warning("事件循环关闭前未调用 outbound_http.aclose()，该循环的 HTTP 连接未能正常释放")
+
+    def get_sync_client(self) -> httpx.Client:
+        with self._lock:
+            if self._sync_client is None or self._sync_client.is_closed:
+                self._sync_client = httpx.Client(timeout=self.timeout, limits=self.limits)
+            return self._sync_client
+
+    async def start(self) -> None:
+        self.get_async_client()
+        self.get_sync_client()
+
+    async def aclose(self) -> None:
+        """关闭所有事件循环的异步客户端和同步客户端"""
+        current_loop = asyncio.get_running_loop()
+        with self._lock:
+            async_clients, self._async_clients = self._async_clients, {}
+            sync_client, self._sync_client = self._sync_client, None
+        for loop, client in async_clients.items():
+            if client.is_closed:
+                continue
+            if loop is current_loop:
+                await client.aclose()
+            elif loop.is_running():
+                # 其他线程中运行的事件循环：在其所属循环中关闭
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), loop))
+            else:
+                logger.warning("事件循环已停止，无法关闭其 HTTP 连接")
+        if sync_client is not None:
+            sync_client.close()
+
+
+class SingleFlight:
+    """按 key 合并同一事件循环内的并发协程调用"""
+
+    def __init__(self):
+        self._calls: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        call_key = (loop, key)
+        task = self._calls.get(call_key)
+        if task is None:
+            # 上游请求放在独立任务中执行：首个调用方被取消时，其余等待者仍能拿到结果
+            task = loop.create_task(func(*args))
+            self._calls[call_key] = task
+            task.add_done_callback(lambda _: self._calls.pop(call_key, None))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+outbound_http = OutboundHttp(
+    timeout=settings.HTTP_CLIENT_TIMEOUT_SECONDS,
+    max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS,
+)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    return outbound_http.get_async_client()
+
+
+def get_sync_client() -> httpx.Client:
+    return outbound_http.get_sync_client()
@@ -5,9 +5,10 @@
 """
 from datetime import datetime
 import calendar
-from typing import Optional
+from typing import Dict, List, Optional, Sequence, Tuple
 
-from sqlalchemy import func
+import numpy as np
+from sqlalchemy import and_, case, extract, func
 from sqlalchemy.orm import Session
 
 from .models import (
@@ -15,6 +16,7 @@ from .models import (
     AnnualLeaveBase,
     CompLeaveAdjustment,
     LeaveApplication,
+    LeaveBalanceSnapshot,
     LeaveStatus,
     LeaveType,
     OvertimeApplication,
@@ -28,6 +30,10 @@ COMP_LEAVE_TYPE_NAME = "加班调休"
 ANNUAL_LEAVE_TYPE_NAME = "年假调休"
 ANNUAL_LEAVE_DEFAULT_START_YEAR = 2025
 
+# leave_balance_snapshots.balance_type
+ANNUAL_BALANCE_TYPE = "annual"
+COMP_BALANCE_TYPE = "comp"
+
 # 占用额度的请假状态：待审批/审批中也计入占用，避免在途申请导致超支。
 # 与 users.py 现有年假统计口径保持一致。
 OCCUPYING_LEAVE_STATUSES = [
@@ -67,6 +73,46 @@ def _sum_adjustments(db: Session, model, user_id: int, year: Optional[int] = Non
     return float(query.scalar() or 0.0)
 
 
+def _latest_snapshots(
+    db: Session,
+    balance_type: str,
+    user_ids: Sequence[int],
+    through_year: int,
+    basis_year: Optional[int] = None,
+) -> Dict[int, LeaveBalanceSnapshot]:
+    """各用户 year <= through_year 的最新年末快照（annual 另按起始年匹配），一次查询"""
+    if not user_ids:
+        return {}
+    filters = [
+        LeaveBalanceSnapshot.balance_type == balance_type,
+        LeaveBalanceSnapshot.user_id.in_(list(user_ids)),
+        LeaveBalanceSnapshot.year <= through_year,
+    ]
+    if basis_year is not None:
+        filters.append(LeaveBalanceSnapshot.basis_year == basis_year)
+    latest = db.query(
+        LeaveBalanceSnapshot.user_id,
+        func.max(LeaveBalanceSnapshot.year).label("year"),
+    ).filter(*filters).group_by(LeaveBalanceSnapshot.user_id).subquery()
+    rows = db.query(LeaveBalanceSnapshot).join(
+        latest,
+        and_(LeaveBalanceSnapshot.user_id == latest.c.user_id, LeaveBalanceSnapshot.year == latest.c.year),
+    ).filter(*filters).all()
+    return {row.user_id: row for row in rows}
+
+
+def _add_comp_snapshot(snapshot: Optional[LeaveBalanceSnapshot], components):
+    """快照累计值 + 快照之后窗口内的 (挣得, 已用, 调整)"""
+    if snapshot is None:
+        return tuple(components)
+    earned, used, adjustment = components
+    return (
+        snapshot.earned_days + earned,
+        snapshot.used_days + used,
+        snapshot.adjustment_days + adjustment,
+    )
+
+
 def _comp_components(db: Session, user: User, comp_type, start=None, end=None):
     """在 [start, end] 日期窗口内汇总主动加班挣得、加班调休已用、期初/调整。
 
@@ -137,8 +183,12 @@ def compute_comp_leave(
         }
 
     if year is None:
-        # 累计(全部)：所有时间合计，不分年。
-        earned, used, adjustment = _comp_components(db, user, comp_type, None, None)
+        # 累计(全部)：所有时间合计，不分年；有年末快照时只汇总快照之后的明细。
+        snapshot = _latest_snapshots(db, COMP_BALANCE_TYPE, [user.id], datetime.now().year).get(user.id)
+        start = _year_range(snapshot.year + 1)[0] if snapshot else None
+        earned, used, adjustment = _add_comp_snapshot(
+            snapshot, _comp_components(db, user, comp_type, start, None)
+        )
         remaining = max(0.0, earned - used + adjustment)
         return {
             "earned_days": earned,
@@ -148,9 +198,16 @@ def compute_comp_leave(
             "remaining_days": remaining,
         }
 
-    # 指定年份 + 结转：上年结转(截至上一年末的累计) + 当年。
+    # 指定年份 + 结转：上年结转(截至上一年末的累计) + 当年；累计从最新年末快照起算。
     prior_end = _year_range(year - 1)[1]
-    p_earned, p_used, p_adjustment = _comp_components(db, user, comp_type, None, prior_end)
+    snapshot = _latest_snapshots(db, COMP_BALANCE_TYPE, [user.id], year - 1).get(user.id)
+    if snapshot is not None and snapshot.year == year - 1:
+        p_earned, p_used, p_adjustment = _add_comp_snapshot(snapshot, (0.0, 0.0, 0.0))
+    else:
+        start = _year_range(snapshot.year + 1)[0] if snapshot else None
+        p_earned, p_used, p_adjustment = _add_comp_snapshot(
+            snapshot, _comp_components(db, user, comp_type, start, prior_end)
+        )
     carryover = max(0.0, p_earned - p_used + p_adjustment)
     year_start, year_end = _year_range(year)
     earned, used, adjustment = _comp_components(db, user, comp_type, year_start, year_end)
@@ -164,6 +221,157 @@ def compute_comp_leave(
     }
 
 
+def _window_sum(column, date_column, start=None, end=None):
+    """SUM(CASE WHEN date_column 在 [start, end] 内 THEN column END)，用于一次查询汇总多个日期窗口"""
+    conditions = []
+    if start is not None:
+        conditions.append(date_column >= start)
+    if end is not None:
+        conditions.append(date_column <= end)
+    if not conditions:
+        return func.sum(column)
+    return func.sum(case((and_(*conditions), column)))
+
+
+def _comp_sources(comp_type):
+    """加班调休三项来源：(下标, 用户列, 天数列, 归属日期列, 过滤条件)，下标依次为挣得/已用/调整"""
+    sources = [(
+        0,
+        OvertimeApplication.user_id,
+        OvertimeApplication.days,
+        OvertimeApplication.start_time,
+        (
+            OvertimeApplication.overtime_type == OvertimeType.ACTIVE,
+            OvertimeApplication.status == OvertimeStatus.APPROVED,
+        ),
+    )]
+    if comp_type:
+        sources.append((
+            1,
+            LeaveApplication.user_id,
+            LeaveApplication.days,
+            LeaveApplication.start_date,
+            (
+                LeaveApplication.leave_type_id == comp_type.id,
+                LeaveApplication.status.in_(OCCUPYING_LEAVE_STATUSES),
+            ),
+        ))
+    sources.append((
+        2,
+        CompLeaveAdjustment.user_id,
+        CompLeaveAdjustment.days,
+        CompLeaveAdjustment.effective_date,
+        (),
+    ))
+    return sources
+
+
+def _comp_components_bulk(
+    db: Session,
+    user_ids: Sequence[int],
+    comp_type,
+    windows: Sequence[Tuple[Optional[datetime], Optional[datetime]]],
+) -> Dict[int, List[List[float]]]:
+    """批量版 _comp_components：按 user_id GROUP BY，一次查询汇总全部日期窗口。
+
+    返回 {user_id: [[earned, used, adjustment], ...]}，与 windows 一一对应。
+    """
+    result = {user_id: [[0.0, 0.0, 0.0] for _ in windows] for user_id in user_ids}
+    if not user_ids:
+        return result
+    user_ids = list(user_ids)
+
+    sources = _comp_sources(comp_type)
+
+    for index, user_column, days_column, date_column, filters in sources:
+        rows = db.query(
+            user_column,
+            *[_window_sum(days_column, date_column, start, end) for start, end in windows],
+        ).filter(
+            user_column.in_(user_ids),
+            *filters,
+        ).group_by(user_column).all()
+        for user_id, *sums in rows:
+            for window_index, value in enumerate(sums):
+                result[user_id][window_index][index] = float(value or 0.0)
+    return result
+
+
+def compute_comp_leave_bulk(
+    db: Session,
+    users: Sequence[User],
+    yearly_reset: bool = False,
+    year: Optional[int] = None,
+) -> Dict[int, dict]:
+    """批量计算加班调休额度，返回 {user_id: 与 compute_comp_leave 相同结构的 dict}。
+
+    口径与 compute_comp_leave 完全一致；查询次数与人数无关（请假类型、年末快照各 1 次，
+    按快照年份分组后每组加班/请假/调整各 1 次）。
+    """
+    comp_type = get_leave_type_by_name(db, COMP_LEAVE_TYPE_NAME)
+    user_ids = [user.id for user in users]
+
+    if yearly_reset:
+        y = year if year is not None else datetime.now().year
+        components = _comp_components_bulk(db, user_ids, comp_type, [_year_range(y)])
+        result = {}
+        for user_id in user_ids:
+            earned, used, adjustment = components[user_id][0]
+            result[user_id] = {
+                "earned_days": earned,
+                "used_days": used,
+                "adjustment_days": adjustment,
+                "carryover_days": 0.0,
+                "remaining_days": max(0.0, earned - used + adjustment),
+            }
+        return result
+
+    # 结转模式：累计部分从各用户最新年末快照起算，按快照年份分组查询（通常只有一两组）
+    if year is None:
+        snapshots = _latest_snapshots(db, COMP_BALANCE_TYPE, user_ids, datetime.now().year)
+    else:
+        snapshots = _latest_snapshots(db, COMP_BALANCE_TYPE, user_ids, year - 1)
+    groups: Dict[Optional[int], List[int]] = {}
+    for user_id in user_ids:
+        snapshot = snapshots.get(user_id)
+        groups.setdefault(snapshot.year if snapshot else None, []).append(user_id)
+
+    components: Dict[int, List[List[float]]] = {}
+    for snapshot_year, group in groups.items():
+        start = _year_range(snapshot_year + 1)[0] if snapshot_year is not None else None
+        if year is None:
+            windows = [(start, None)]
+        else:
+            # 窗口 0 为快照之后至上一年末的累计，窗口 1 为当年
+            windows = [(start, _year_range(year - 1)[1]), _year_range(year)]
+        components.update(_comp_components_bulk(db, group, comp_type, windows))
+
+    result = {}
+    for user_id in user_ids:
+        cumulative = _add_comp_snapshot(snapshots.get(user_id), components[user_id][0])
+        if year is None:
+            earned, used, adjustment = cumulative
+            result[user_id] = {
+                "earned_days": earned,
+                "used_days": used,
+                "adjustment_days": adjustment,
+                "carryover_days": 0.0,
+                "remaining_days": max(0.0, earned - used + adjustment),
+            }
+            continue
+        p_earned, p_used, p_adjustment = cumulative
+        earned, used, adjustment = components[user_id][1]
+        carryover = max(0.0, p_earned - p_used + p_adjustment)
+        result[user_id] = {
+            "earned_days": earned,
+            "used_days": used,
+            "adjustment_days": adjustment,
+            "carryover_days": carryover,
+            "remaining_days": max(0.0, carryover + earned + adjustment - used),
+        }
+    return result
+
+
 def _load_annual_base_tiers(db: Session, user_id: int):
     """取某员工全部基础年假分档，按生效年份升序返回 [(effective_year, days), ...]。"""
     rows = db.query(AnnualLeaveBase.effective_year, AnnualLeaveBase.days).filter(
@@ -230,28 +438,41 @@ def compute_annual_leave(
             "remaining_days": remaining,
         }
 
-    # 结转模式：逐年累计。预取按年聚合的期初/调整与已用年假。
-    adj_by_year: dict = {}
-    for eff_date, days in db.query(
+    # 结转模式：逐年累计；有年末快照时从最新快照的下一年起算，只预取其后的明细。
+    floor_year = min(start_year, year)
+    snapshot = None
+    if year > floor_year:
+        snapshot = _latest_snapshots(
+            db, ANNUAL_BALANCE_TYPE, [user.id], year - 1, basis_year=start_year
+        ).get(user.id)
+    first_year = snapshot.year + 1 if snapshot else floor_year
+
+    adj_query = db.query(
         AnnualLeaveAdjustment.effective_date, AnnualLeaveAdjustment.days
-    ).filter(AnnualLeaveAdjustment.user_id == user.id).all():
+    ).filter(AnnualLeaveAdjustment.user_id == user.id)
+    if snapshot:
+        adj_query = adj_query.filter(AnnualLeaveAdjustment.effective_date >= _year_range(first_year)[0])
+    adj_by_year: dict = {}
+    for eff_date, days in adj_query.all():
         adj_by_year[eff_date.year] = adj_by_year.get(eff_date.year, 0.0) + float(days or 0.0)
 
     used_by_year: dict = {}
     if annual_type:
-        for start_date, days in db.query(
+        used_query = db.query(
             LeaveApplication.start_date, LeaveApplication.days
         ).filter(
             LeaveApplication.user_id == user.id,
             LeaveApplication.leave_type_id == annual_type.id,
             LeaveApplication.status.in_(OCCUPYING_LEAVE_STATUSES),
-        ).all():
+        )
+        if snapshot:
+            used_query = used_query.filter(LeaveApplication.start_date >= _year_range(first_year)[0])
+        for start_date, days in used_query.all():
             used_by_year[start_date.year] = used_by_year.get(start_date.year, 0.0) + float(days or 0.0)
 
-    floor_year = min(start_year, year)
-    carryover_in = 0.0
+    carryover_in = snapshot.closing_days if snapshot else 0.0
     result = None
-    for y in range(floor_year, year + 1):
+    for y in range(first_year, year + 1):
         base_y = _base_for_year(base_tiers, default_base, y)
         if y == floor_year:
             # 起始年汇总该年及更早的期初/调整（含上线前补录的期初余额）；
@@ -287,6 +508,183 @@ def compute_annual_leave(
     return result
 
 
+def compute_annual_leave_bulk(
+    db: Session,
+    users: Sequence[User],
+    year: Optional[int] = None,
+    yearly_reset: bool = False,
+    start_year: Optional[int] = None,
+) -> Dict[int, dict]:
+    """批量计算年假额度，返回 {user_id: 与 compute_annual_leave 相同结构的 dict}。
+
+    分档、期初/调整、已用年假各一次 GROUP BY 查询取全部用户，按 [用户, 年份] 数组
+    逐年执行结转递推（每年一次向量运算），查询次数与人数、结转年数无关；
+    结转模式下各用户从最新年末快照的下一年起算。
+    """
+    return _annual_ledger(db, users, year, yearly_reset, start_year)[0]
+
+
+def _annual_ledger(
+    db: Session,
+    users: Sequence[User],
+    year: Optional[int] = None,
+    yearly_reset: bool = False,
+    start_year: Optional[int] = None,
+) -> Tuple[Dict[int, dict], Dict[int, Dict[int, float]]]:
+    """年假批量递推，返回 (所选 year 的明细, {user_id: {本次递推的年份: 年末剩余}})"""
+    if year is None:
+        year = datetime.now().year
+    if start_year is None:
+        start_year = ANNUAL_LEAVE_DEFAULT_START_YEAR
+    users = list(users)
+    if not users:
+        return {}, {}
+    user_ids = [user.id for user in users]
+    position = {user_id: index for index, user_id in enumerate(user_ids)}
+
+    # 清零模式只看当年；结转模式自起始年逐年递推，起始年汇总该年及更早的期初/调整
+    floor_year = year if yearly_reset else min(start_year, year)
+    year_count = year - floor_year + 1
+    year_end = _year_range(year)[1]
+
+    # 各用户开始递推的年份下标与期初结转：有年末快照时从快照下一年起算
+    first_index = np.zeros(len(users), dtype=np.int64)
+    opening = np.zeros(len(users))
+    if not yearly_reset and year > floor_year:
+        snapshots = _latest_snapshots(db, ANNUAL_BALANCE_TYPE, user_ids, year - 1, basis_year=start_year)
+        for user_id, snapshot in snapshots.items():
+            first_index[position[user_id]] = snapshot.year + 1 - floor_year
+            opening[position[user_id]] = snapshot.closing_days
+    load_index = int(first_index.min())
+    load_start = _year_range(floor_year + load_index)[0]
+
+    defaults = np.array(
+        [float(user.annual_leave_days if user.annual_leave_days is not None else 10.0) for user in users]
+    )
+    base = np.repeat(defaults[:, None], year_count, axis=1)
+    tiers = db.query(
+        AnnualLeaveBase.user_id, AnnualLeaveBase.effective_year, AnnualLeaveBase.days
+    ).filter(
+        AnnualLeaveBase.user_id.in_(user_ids),
+        AnnualLeaveBase.effective_year <= year,
+    ).order_by(AnnualLeaveBase.user_id, AnnualLeaveBase.effective_year).all()
+    for user_id, effective_year, days in tiers:
+        # 按生效年份升序覆盖：每年取生效年份 <= 该年的最后一档
+        base[position[user_id], max(int(effective_year) - floor_year, 0):] = float(days)
+
+    adjustment = np.zeros((len(users), year_count))
+    adjustment_year = extract("year", AnnualLeaveAdjustment.effective_date)
+    adjustment_query = db.query(
+        AnnualLeaveAdjustment.user_id, adjustment_year, func.sum(AnnualLeaveAdjustment.days)
+    ).filter(
+        AnnualLeaveAdjustment.user_id.in_(user_ids),
+        AnnualLeaveAdjustment.effective_date <= year_end,
+    )
+    if yearly_reset or load_index > 0:
+        adjustment_query = adjustment_query.filter(AnnualLeaveAdjustment.effective_date >= load_start)
+    for user_id, adjustment_y, days in adjustment_query.group_by(AnnualLeaveAdjustment.user_id, adjustment_year):
+        adjustment[position[user_id], max(int(adjustment_y) - floor_year, 0)] += float(days or 0.0)
+
+    used = np.zeros((len(users), year_count))
+    annual_type = get_leave_type_by_name(db, ANNUAL_LEAVE_TYPE_NAME)
+    if annual_type:
+        # 起始年之前的历史请假视为上线前、由期初统一抵充，不计入已用
+        used_year = extract("year", LeaveApplication.start_date)
+        for user_id, used_y, days in db.query(
+            LeaveApplication.user_id, used_year, func.sum(LeaveApplication.days)
+        ).filter(
+            LeaveApplication.user_id.in_(user_ids),
+            LeaveApplication.leave_type_id == annual_type.id,
+            LeaveApplication.status.in_(OCCUPYING_LEAVE_STATUSES),
+            LeaveApplication.start_date >= load_start,
+            LeaveApplication.start_date <= year_end,
+        ).group_by(LeaveApplication.user_id, used_year):
+            used[position[user_id], int(used_y) - floor_year] += float(days or 0.0)
+
+    carryover = np.zeros(len(users))
+    closing = np.zeros((len(users), year_count))
+    for index in range(load_index, year_count):
+        carryover = np.where(first_index == index, opening, carryover)
+        carryover_in = carryover
+        total = np.maximum(0.0, base[:, index] + carryover_in + adjustment[:, index])
+        carryover = np.maximum(0.0, total - used[:, index])
+        closing[:, index] = carryover
+
+    results = {
+        user_id: {
+            "base_days": float(base[row, -1]),
+            "carryover_days": float(carryover_in[row]),
+            "adjustment_days": float(adjustment[row, -1]),
+            "total_days": float(total[row]),
+            "used_days": float(used[row, -1]),
+            "remaining_days": float(carryover[row]),
+        }
+        for user_id, row in position.items()
+    }
+    closings = {
+        user_id: {
+            floor_year + index: float(closing[row, index])
+            for index in range(int(first_index[row]), year_count)
+        }
+        for user_id, row in position.items()
+    }
+    return results, closings
+
+
+def comp_cumulative_by_year(
+    db: Session,
+    user_ids: Sequence[int],
+    through_year: int,
+) -> Dict[int, Dict[int, Tuple[float, float, float]]]:
+    """加班调休逐年年末累计 (挣得, 已用, 调整)，从各用户最新年末快照（或最早明细年份）起至 through_year。
+
+    返回 {user_id: {year: (累计挣得, 累计已用, 累计调整)}}，仅含本次新算出的年份。
+    """
+    comp_type = get_leave_type_by_name(db, COMP_LEAVE_TYPE_NAME)
+    snapshots = _latest_snapshots(db, COMP_BALANCE_TYPE, user_ids, through_year)
+    through_end = _year_range(through_year)[1]
+
+    sources = _comp_sources(comp_type)
+
+    # {user_id: {year: [earned, used, adjustment]}}，只取快照之后的年份
+    yearly: Dict[int, Dict[int, List[float]]] = {user_id: {} for user_id in user_ids}
+    first_after_snapshot = None
+    if user_ids and all(user_id in snapshots for user_id in user_ids):
+        first_after_snapshot = min(snapshots[user_id].year for user_id in user_ids) + 1
+    for index, user_column, days_column, date_column, filters in sources:
+        date_year = extract("year", date_column)
+        query = db.query(user_column, date_year, func.sum(days_column)).filter(
+            user_column.in_(list(user_ids)),
+            date_column <= through_end,
+            *filters,
+        )
+        if first_after_snapshot is not None:
+            query = query.filter(date_column >= _year_range(first_after_snapshot)[0])
+        for user_id, row_year, days in query.group_by(user_column, date_year):
+            snapshot = snapshots.get(user_id)
+            if snapshot is not None and row_year <= snapshot.year:
+                continue
+            yearly[user_id].setdefault(int(row_year), [0.0, 0.0, 0.0])[index] += float(days or 0.0)
+
+    result: Dict[int, Dict[int, Tuple[float, float, float]]] = {}
+    for user_id in user_ids:
+        snapshot = snapshots.get(user_id)
+        if snapshot is not None:
+            first_year = snapshot.year + 1
+            cumulative = [snapshot.earned_days, snapshot.used_days, snapshot.adjustment_days]
+        elif yearly[user_id]:
+            first_year = min(yearly[user_id])
+            cumulative = [0.0, 0.0, 0.0]
+        else:
+            continue
+        result[user_id] = {}
+        for y in range(first_year, through_year + 1):
+            for index, days in enumerate(yearly[user_id].get(y, (0.0, 0.0, 0.0))):
+                cumulative[index] += days
+            result[user_id][y] = tuple(cumulative)
+    return result
+
+
 def compute_passive_overtime_adjustment(
     db: Session,
     user: User,
@@ -295,3 +693,4 @@ def compute_passive_overtime_adjustment(
 ) -> float:
     """被动加班期初/调整天数，按生效日期计入指定自然年/月。"""
     return _sum_adjustments(db, PassiveOvertimeAdjustment, user.id, year, month)
+
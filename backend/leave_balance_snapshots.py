@@ -0,0 +1,302 @@
+"""假期余额年末快照（leave_balance_snapshots）维护。
+
+结转模式下年假按年递推、加班调休按全部历史累计，读取时从最新有效快照起算
+（见 leave_balance）。本模块负责快照与明细保持一致：
+
+- 请假/加班/期初调整/基础年假增删改时，模型事件记下 (员工, 余额类型, 最早受影响年份)；
+- 同一次 flush 结束后删除这些员工自该年起的快照，并从仍有效的快照起补齐到上一年年末；
+- 员工默认年假天数、年假起始年设置变化，以及"年假调休"/"加班调休"请假类型新增、删除、
+  改名或启停时，整体重建对应余额类型的快照；其他请假类型及其他字段的修改不触发重建。
+
+事件在映射配置完成时由 models 注册（见 models._register_derived_table_listeners）。
+
+快照写入与业务数据在同一事务内提交或回滚。
+"""
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, event, insert, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from .leave_balance import (
+    ANNUAL_BALANCE_TYPE,
+    ANNUAL_LEAVE_TYPE_NAME,
+    COMP_BALANCE_TYPE,
+    COMP_LEAVE_TYPE_NAME,
+    _annual_ledger,
+    comp_cumulative_by_year,
+)
+from .models import (
+    AnnualLeaveAdjustment,
+    AnnualLeaveBase,
+    CompLeaveAdjustment,
+    LeaveApplication,
+    LeaveBalanceSnapshot,
+    LeaveType,
+    OvertimeApplication,
+    SystemSetting,
+    User,
+)
+from .system_settings_cache import ANNUAL_LEAVE_START_YEAR_KEY, get_system_settings
+
+BALANCE_TYPES = (ANNUAL_BALANCE_TYPE, COMP_BALANCE_TYPE)
+
+# 受影响的全部员工
+ALL_USERS = None
+# 受影响的全部年份
+ALL_YEARS = 0
+
+SESSION_DIRTY_KEY = "leave_balance_snapshot_marks"
+
+# 计入余额的请假类型名称 -> 余额类型
+_BALANCE_LEAVE_TYPES = {
+    ANNUAL_LEAVE_TYPE_NAME: ANNUAL_BALANCE_TYPE,
+    COMP_LEAVE_TYPE_NAME: COMP_BALANCE_TYPE,
+}
+
+# 各明细表：影响的余额类型、归属年份字段、影响余额的字段
+_SNAPSHOT_SOURCES = {
+    LeaveApplication: (BALANCE_TYPES, "start_date", ("user_id", "start_date", "days", "status", "leave_type_id")),
+    OvertimeApplication: ((COMP_BALANCE_TYPE,), "start_time", ("user_id", "start_time", "days", "status", "overtime_type")),
+    CompLeaveAdjustment: ((COMP_BALANCE_TYPE,), "effective_date", ("user_id", "effective_date", "days")),
+    AnnualLeaveAdjustment: ((ANNUAL_BALANCE_TYPE,), "effective_date", ("user_id", "effective_date", "days")),
+    AnnualLeaveBase: ((ANNUAL_BALANCE_TYPE,), "effective_year", ("user_id", "effective_year", "days")),
+}
+
+
+def _year_of(value) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.year
+    return int(value)
+
+
+def snapshot_through_year() -> int:
+    """快照只保存已结束的年份：截至上一年年末"""
+    return datetime.now().year - 1
+
+
+def invalidate_leave_balance_snapshots(
+    db: Session,
+    user_ids: Optional[Iterable[int]],
+    balance_type: str,
+    from_year: int = ALL_YEARS,
+) -> None:
+    """删除指定员工（None 为全部）某余额类型自 from_year 起的快照"""
+    table = LeaveBalanceSnapshot.__table__
+    statement = delete(table).where(table.c.balance_type == balance_type, table.c.year >= from_year)
+    if user_ids is not None:
+        statement = statement.where(table.c.user_id.in_(list(user_ids)))
+    db.execute(statement)
+
+
+def _users_missing_year(db: Session, users: Sequence[User], balance_type: str, through_year: int) -> list:
+    """快照尚未补齐到 through_year 的员工"""
+    table = LeaveBalanceSnapshot.__table__
+    complete = {
+        user_id for (user_id,) in db.execute(
+            select(table.c.user_id).where(
+                table.c.balance_type == balance_type,
+                table.c.year == through_year,
+                table.c.user_id.in_([user.id for user in users]),
+            )
+        )
+    }
+    return [user for user in users if user.id not in complete]
+
+
+def rebuild_leave_balance_snapshots(
+    db: Session,
+    user_ids: Optional[Sequence[int]] = None,
+    balance_types: Sequence[str] = BALANCE_TYPES,
+    through_year: Optional[int] = None,
+) -> int:
+    """从各员工最新有效快照起补齐快照至 through_year（默认上一年），返回写入行数"""
+    if through_year is None:
+        through_year = snapshot_through_year()
+    query = db.query(User)
+    if user_ids is not None:
+        if not user_ids:
+            return 0
+        query = query.filter(User.id.in_(list(user_ids)))
+    users = query.order_by(User.id).all()
+    if not users:
+        return 0
+
+    table = LeaveBalanceSnapshot.__table__
+    now = datetime.now()
+    rows = []
+    if ANNUAL_BALANCE_TYPE in balance_types:
+        start_year = get_system_settings(db).annual_leave_start_year
+        # 起始年变更后，按旧起始年算出的快照不再适用
+        db.execute(delete(table).where(
+            table.c.balance_type == ANNUAL_BALANCE_TYPE,
+            table.c.user_id.in_([user.id for user in users]),
+            or_(table.c.basis_year.is_(None), table.c.basis_year != start_year),
+        ))
+        pending = _users_missing_year(db, users, ANNUAL_BALANCE_TYPE, through_year)
+        if pending and through_year >= start_year:
+            _, closings = _annual_ledger(db, pending, through_year, False, start_year)
+            for user_id, by_year in closings.items():
+                rows.extend(
+                    {
+                        "user_id": user_id,
+                        "balance_type": ANNUAL_BALANCE_TYPE,
+                        "year": year,
+                        "basis_year": start_year,
+                        "earned_days": 0.0,
+                        "used_days": 0.0,
+                        "adjustment_days": 0.0,
+                        "closing_days": closing,
+                        "updated_at": now,
+                    }
+                    for year, closing in by_year.items()
+                )
+    if COMP_BALANCE_TYPE in balance_types:
+        pending = _users_missing_year(db, users, COMP_BALANCE_TYPE, through_year)
+        cumulative = comp_cumulative_by_year(db, [user.id for user in pending], through_year) if pending else {}
+        for user_id, by_year in cumulative.items():
+            rows.extend(
+                {
+                    "user_id": user_id,
+                    "balance_type": COMP_BALANCE_TYPE,
+                    "year": year,
+                    "basis_year": None,
+                    "earned_days": earned,
+                    "used_days": used,
+                    "adjustment_days": adjustment,
+                    "closing_days": earned - used + adjustment,
+                    "updated_at": now,
+                }
+                for year, (earned, used, adjustment) in by_year.items()
+            )
+    if rows:
+        db.execute(insert(table), rows)
+    return len(rows)
+
+
+def _mark(session: Optional[Session], user_id, balance_types: Iterable[str], from_year: int) -> None:
+    if session is None:
+        return
+    marks: Dict[Tuple[Optional[int], str], int] = session.info.setdefault(SESSION_DIRTY_KEY, {})
+    for balance_type in balance_types:
+        key = (user_id, balance_type)
+        marks[key] = min(marks.get(key, from_year), from_year)
+
+
+def _affected_years(target, is_update: bool):
+    balance_types, year_field, fields = _SNAPSHOT_SOURCES[type(target)]
+    state = inspect(target)
+    if is_update and not any(state.attrs[name].history.has_changes() for name in fields):
+        return balance_types, []
+
+    pairs = {(target.user_id, _year_of(getattr(target, year_field)))}
+    if is_update:
+        old_users = state.attrs.user_id.history.deleted or [target.user_id]
+        old_years = state.attrs[year_field].history.deleted or [getattr(target, year_field)]
+        pairs.update((user_id, _year_of(value)) for user_id in old_users for value in old_years)
+    return balance_types, [
+        (user_id, year) for user_id, year in pairs if user_id is not None and year is not None
+    ]
+
+
+def _mark_source_row(target, is_update: bool) -> None:
+    balance_types, pairs = _affected_years(target, is_update)
+    session = Session.object_session(target)
+    for user_id, year in pairs:
+        _mark(session, user_id, balance_types, year)
+
+
+def _after_insert_or_delete(mapper, connection, target):
+    _mark_source_row(target, is_update=False)
+
+
+def _after_update(mapper, connection, target):
+    _mark_source_row(target, is_update=True)
+
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    return value
+
+
+for _model, (_types, _year_field, _fields) in _SNAPSHOT_SOURCES.items():
+    # 归属字段在过期后被直接赋值时，旧值默认不加载；active_history 保证能从历史中取到旧年份
+    for _name in ("user_id", _year_field):
+        event.listen(getattr(_model, _name), "set", _keep_previous_value, active_history=True, retval=True)
+    event.listen(_model, "after_insert", _after_insert_or_delete)
+    event.listen(_model, "after_delete", _after_insert_or_delete)
+    event.listen(_model, "after_update", _after_update)
+
+
+@event.listens_for(User, "after_update")
+def _mark_default_annual_days(mapper, connection, target):
+    """未配置分档的年份按员工默认年假天数计算"""
+    if inspect(target).attrs.annual_leave_days.history.has_changes():
+        _mark(Session.object_session(target), target.id, (ANNUAL_BALANCE_TYPE,), ALL_YEARS)
+
+
+def _mark_leave_type(target, names) -> None:
+    """请假类型名称/启用状态决定哪些请假计入年假调休、加班调休"""
+    balance_types = sorted({_BALANCE_LEAVE_TYPES[name] for name in names if name in _BALANCE_LEAVE_TYPES})
+    if balance_types:
+        _mark(Session.object_session(target), ALL_USERS, balance_types, ALL_YEARS)
+
+
+# 改名时需要旧名称判断是否曾是计入余额的类型
+event.listen(LeaveType.name, "set", _keep_previous_value, active_history=True, retval=True)
+
+
+@event.listens_for(LeaveType, "after_insert")
+@event.listens_for(LeaveType, "after_delete")
+def _mark_leave_type_added_or_removed(mapper, connection, target):
+    _mark_leave_type(target, {target.name})
+
+
+@event.listens_for(LeaveType, "after_update")
+def _mark_leave_type_updated(mapper, connection, target):
+    state = inspect(target)
+    name_history = state.attrs.name.history
+    if not (name_history.has_changes() or state.attrs.is_active.history.has_changes()):
+        return
+    _mark_leave_type(target, {target.name, *name_history.deleted})
+
+
+@event.listens_for(SystemSetting, "after_insert")
+@event.listens_for(SystemSetting, "after_update")
+def _mark_annual_start_year(mapper, connection, target):
+    if target.key == ANNUAL_LEAVE_START_YEAR_KEY:
+        _mark(Session.object_session(target), ALL_USERS, (ANNUAL_BALANCE_TYPE,), ALL_YEARS)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _refresh_snapshots_after_flush(session, flush_context):
+    marks = session.info.pop(SESSION_DIRTY_KEY, None)
+    if not marks:
+        return
+    # 当年及以后的变更不影响已结束年份的快照，多数写入到此为止
+    through_year = snapshot_through_year()
+    marks = {key: from_year for key, from_year in marks.items() if from_year <= through_year}
+    if not marks:
+        return
+    with session.no_autoflush:
+        for balance_type in BALANCE_TYPES:
+            if (ALL_USERS, balance_type) in marks:
+                invalidate_leave_balance_snapshots(session, ALL_USERS, balance_type)
+                rebuild_leave_balance_snapshots(session, None, (balance_type,))
+                continue
+            by_year: Dict[int, set] = {}
+            for (user_id, marked_type), from_year in marks.items():
+                if marked_type == balance_type:
+                    by_year.setdefault(from_year, set()).add(user_id)
+            if not by_year:
+                continue
+            for from_year, user_ids in by_year.items():
+                invalidate_leave_balance_snapshots(session, user_ids, balance_type, from_year)
+            affected = sorted(set().union(*by_year.values()))
+            rebuild_leave_balance_snapshots(session, affected, (balance_type,))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_snapshot_marks(session, previous_transaction):
+    session.info.pop(SESSION_DIRTY_KEY, None)
@@ -0,0 +1,198 @@
+"""请假时段查询（上午/下午/全天）。
+
+判定规则见 utils.leave_period_rules；请假申请写入时由模型事件展开到
+leave_day_slots 表（每条请假每天每个半天一行），读路径只做索引查询：
+单人单日按 (user_id, date) 查询，多人多日由 LeavePeriodIndex 一次区间查询加载。
+
+LeaveIntervalIndex 直接读取 leave_applications，按人建立有序区间索引，按 (用户, 日期) 以
+O(log n) 定位有交集的请假后套用同一判定规则，结果与 LeavePeriodIndex 一致。
+已有数据库升级后 leave_day_slots 在回填完成前为空（见 derived_tables），此时查询回退到 LeaveIntervalIndex。
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Sequence, Set, Tuple, Union
+
+from sqlalchemy.orm import Session
+
+from .derived_tables import is_backfilled
+from .models import LEAVE_SLOT_EXCLUDED_STATUS_VALUES, LeaveApplication, LeaveDaySlot
+from .utils.leave_period_rules import (  # noqa: F401
+    AFTERNOON,
+    MORNING,
+    LeaveSpan,
+    empty_leave_period,
+    leave_day_halves,
+    period_from_halves,
+    resolve_leave_period,
+)
+
+
+def leave_day_slots_ready(db: Session) -> bool:
+    """leave_day_slots 是否已按历史请假申请回填（之前的请假在表中没有占用行）"""
+    return is_backfilled(db, LeaveDaySlot.__tablename__)
+
+
+class LeavePeriodIndex:
+    """多人多日请假时段批量查询：一次加载区间内的半天占用，按 (用户, 日期) 查询"""
+
+    def __init__(self, halves_by_day: Dict[Tuple[int, date], Set[str]]):
+        self._halves_by_day = halves_by_day
+
+    @classmethod
+    def load(
+        cls,
+        db: Session,
+        user_ids: Sequence[int],
+        start_date: date,
+        end_date: date,
+    ) -> Union["LeavePeriodIndex", "LeaveIntervalIndex"]:
+        """加载 user_ids 在 [start_date, end_date] 内的请假半天占用（已排除已拒绝/已取消）
+
+        leave_day_slots 尚未回填时返回直接读取请假申请的 LeaveIntervalIndex（接口相同）。
+        """
+        halves_by_day: Dict[Tuple[int, date], Set[str]] = defaultdict(set)
+        if not user_ids:
+            return cls(halves_by_day)
+        if not leave_day_slots_ready(db):
+            return LeaveIntervalIndex.load(db, user_ids, start_date, end_date)
+
+        rows = db.query(
+            LeaveDaySlot.user_id,
+            LeaveDaySlot.date,
+            LeaveDaySlot.half,
+        ).filter(
+            LeaveDaySlot.user_id.in_(list(user_ids)),
+            LeaveDaySlot.date >= start_date,
+            LeaveDaySlot.date <= end_date
+        ).all()
+        for user_id, slot_date, half in rows:
+            halves_by_day[(user_id, slot_date)].add(half)
+        return cls(halves_by_day)
+
+    def iter_halves(self) -> Iterator[Tuple[int, date, Set[str]]]:
+        """遍历有请假占用的 (用户ID, 日期, 半天集合)"""
+        for (user_id, slot_date), halves in self._halves_by_day.items():
+            yield user_id, slot_date, halves
+
+    def get(self, user_id: int, target_date: date) -> Dict[str, bool]:
+        """返回与 get_leave_period_for_date 相同结构的请假时段"""
+        return period_from_halves(self._halves_by_day.get((user_id, target_date), ()))
+
+
+def _day_bounds(target_date: date) -> Tuple[datetime, datetime]:
+    return (
+        datetime.combine(target_date, datetime.min.time()),
+        datetime.combine(target_date, datetime.max.time()),
+    )
+
+
+class _UserLeaveIntervals:
+    """单个用户的请假区间：按开始时间排序，附带结束时间前缀最大值用于剪枝"""
+
+    __slots__ = ("spans", "starts", "max_ends")
+
+    def __init__(self, spans: List[LeaveSpan]):
+        spans.sort(key=lambda span: span[0])
+        self.spans = spans
+        self.starts = [span[0] for span in spans]
+        self.max_ends = []
+        running_max = None
+        for span in spans:
+            running_max = span[1] if running_max is None or span[1] > running_max else running_max
+            self.max_ends.append(running_max)
+
+    def overlapping(self, day_start: datetime, day_end: datetime) -> List[LeaveSpan]:
+        # 开始时间 <= 当天结束 的记录位于 [0, idx)；自后向前扫描，前缀最大结束时间早于当天开始即可停止
+        idx = bisect_right(self.starts, day_end)
+        matched = []
+        j = idx - 1
+        while j >= 0 and self.max_ends[j] >= day_start:
+            if self.spans[j][1] >= day_start:
+                matched.append(self.spans[j])
+            j -= 1
+        return matched
+
+
+class LeaveIntervalIndex:
+    """多人多日请假时段批量查询（直接读取请假申请）：一次查询加载，按 (用户, 日期) 查询"""
+
+    def __init__(self, spans_by_user: Dict[int, List[LeaveSpan]], start_date: date, end_date: date):
+        self._users = {
+            user_id: _UserLeaveIntervals(spans)
+            for user_id, spans in spans_by_user.items()
+            if spans
+        }
+        self._start_date = start_date
+        self._end_date = end_date
+
+    @classmethod
+    def load(
+        cls,
+        db: Session,
+        user_ids: Sequence[int],
+        start_date: date,
+        end_date: date,
+    ) -> "LeaveIntervalIndex":
+        """加载 user_ids 在 [start_date, end_date] 内有交集的有效请假（排除已拒绝/已取消）"""
+        spans_by_user: Dict[int, List[LeaveSpan]] = {}
+        if not user_ids:
+            return cls(spans_by_user, start_date, end_date)
+
+        range_start, range_end = _day_bounds(start_date)[0], _day_bounds(end_date)[1]
+        rows = db.query(
+            LeaveApplication.user_id,
+            LeaveApplication.start_date,
+            LeaveApplication.end_date,
+            LeaveApplication.days,
+        ).filter(
+            LeaveApplication.user_id.in_(list(user_ids)),
+            LeaveApplication.status.notin_(sorted(LEAVE_SLOT_EXCLUDED_STATUS_VALUES)),
+            LeaveApplication.start_date <= range_end,
+            LeaveApplication.end_date >= range_start
+        ).all()
+        for user_id, leave_start, leave_end, days in rows:
+            spans_by_user.setdefault(user_id, []).append((leave_start, leave_end, days or 0))
+        return cls(spans_by_user, start_date, end_date)
+
+    def leaves_on(self, user_id: int, target_date: date) -> List[LeaveSpan]:
+        intervals = self._users.get(user_id)
+        if intervals is None:
+            return []
+        return intervals.overlapping(*_day_bounds(target_date))
+
+    def iter_halves(self) -> Iterator[Tuple[int, date, Set[str]]]:
+        """遍历加载区间内有请假占用的 (用户ID, 日期, 半天集合)"""
+        for user_id, intervals in self._users.items():
+            halves_by_day: Dict[date, Set[str]] = defaultdict(set)
+            for leave_start, leave_end, days in intervals.spans:
+                for slot_date, half in leave_day_halves(leave_start, leave_end, days):
+                    if self._start_date <= slot_date <= self._end_date:
+                        halves_by_day[slot_date].add(half)
+            for slot_date, halves in halves_by_day.items():
+                yield user_id, slot_date, halves
+
+    def get(self, user_id: int, target_date: date) -> Dict[str, bool]:
+        """返回与 get_leave_period_for_date 相同结构的请假时段"""
+        return resolve_leave_period(self.leaves_on(user_id, target_date), target_date)
+
+
+def get_leave_period_for_date(user_id: int, target_date: date, db: Session) -> Dict[str, bool]:
+    """
+    获取指定用户在指定日期的请假时段（单用户单日查询）
+
+    Returns:
+        包含请假信息的字典: {
+            'has_leave': bool,  # 是否有请假
+            'morning_leave': bool,  # 是否上午请假
+            'afternoon_leave': bool,  # 是否下午请假
+            'full_day_leave': bool  # 是否全天请假
+        }
+    """
+    if not leave_day_slots_ready(db):
+        return LeaveIntervalIndex.load(db, [user_id], target_date, target_date).get(user_id, target_date)
+    halves = db.query(LeaveDaySlot.half).filter(
+        LeaveDaySlot.user_id == user_id,
+        LeaveDaySlot.date == target_date
+    ).all()
+    return period_from_halves(half for (half,) in halves)
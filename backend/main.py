@@ -5,6 +5,11 @@ import logging
 import sys
 from .config import settings
 from .database import init_db
+from .security import shutdown_password_executor
+from .geocode_cache import geocode_cache
+from .http_clients import outbound_http
+from .notification_outbox import notification_worker
+from .wechat_token import access_token_manager
 from .routers import auth, users, departments, attendance, leave, overtime, statistics, holidays, vp_departments, attendance_viewers, leave_types, system_settings, vacation
 
 # 配置日志，确保输出到标准输出（systemd journal）
@@ -79,8 +84,24 @@ if MOBILE_DIR.exists():
 
 @app.on_event("startup")
 async def startup_event():
-    """应用启动时初始化数据库"""
+    """应用启动时初始化数据库、创建出站 HTTP 客户端，并启动微信 access_token 提前刷新和消息投递任务"""
     init_db()
+    await outbound_http.start()
+    if settings.WECHAT_APPID and settings.WECHAT_SECRET:
+        await access_token_manager.start(settings.WECHAT_APPID)
+        if settings.NOTIFICATION_WORKER_ENABLED:
+            await notification_worker.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时停止后台任务，释放密码哈希线程池、地理编码缓存和 access_token 存储连接、出站 HTTP 客户端"""
+    await notification_worker.stop()
+    await access_token_manager.stop()
+    shutdown_password_executor()
+    geocode_cache.close()
+    access_token_manager.close()
+    await outbound_http.aclose()
 
 
 @app.get("/")
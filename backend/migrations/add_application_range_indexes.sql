@@ -0,0 +1,9 @@
+-- 为请假/加班申请增加 员工 + 状态 + 日期 复合索引
+-- 说明：统计、假期余额等按员工和审批状态筛选后再按日期区间过滤，
+-- 日期条件已改为对原始列的半开区间比较（不再包裹 date()），可直接走索引范围扫描。
+
+CREATE INDEX IF NOT EXISTS idx_leave_applications_user_status_dates
+ON leave_applications (user_id, status, start_date, end_date);
+
+CREATE INDEX IF NOT EXISTS idx_overtime_applications_user_status_start
+ON overtime_applications (user_id, status, start_time);
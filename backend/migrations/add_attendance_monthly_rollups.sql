@@ -0,0 +1,24 @@
+-- 按用户、自然月的考勤/请假/加班汇总表
+-- 说明：由考勤、请假、加班模型事件在增删改后按明细重算受影响月份，
+-- 历史数据由 scripts/migrations/run_migration_attendance_monthly_rollups.py 回填。
+CREATE TABLE IF NOT EXISTS attendance_monthly_rollups (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    present_days INTEGER NOT NULL DEFAULT 0,
+    late_days INTEGER NOT NULL DEFAULT 0,
+    early_leave_days INTEGER NOT NULL DEFAULT 0,
+    work_hours FLOAT NOT NULL DEFAULT 0,
+    leave_days FLOAT NOT NULL DEFAULT 0,
+    leave_count INTEGER NOT NULL DEFAULT 0,
+    leave_type_breakdown TEXT NOT NULL DEFAULT '{}',
+    active_overtime_days FLOAT NOT NULL DEFAULT 0,
+    active_overtime_count INTEGER NOT NULL DEFAULT 0,
+    passive_overtime_days FLOAT NOT NULL DEFAULT 0,
+    passive_overtime_count INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME,
+    CONSTRAINT uq_attendance_monthly_rollups_user_month UNIQUE (user_id, year, month)
+);
+
+CREATE INDEX IF NOT EXISTS ix_attendance_monthly_rollups_id ON attendance_monthly_rollups(id);
@@ -0,0 +1,18 @@
+-- 假期余额年末快照表（年假结转余额、加班调休累计）
+-- 说明：由请假/加班/期初调整/基础年假等模型事件在增删改后删除受影响年份及以后的快照并补齐，
+-- 历史数据由 scripts/migrations/run_migration_leave_balance_snapshots.py 回填。
+CREATE TABLE IF NOT EXISTS leave_balance_snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    balance_type VARCHAR(20) NOT NULL,
+    year INTEGER NOT NULL,
+    basis_year INTEGER,
+    earned_days FLOAT NOT NULL DEFAULT 0,
+    used_days FLOAT NOT NULL DEFAULT 0,
+    adjustment_days FLOAT NOT NULL DEFAULT 0,
+    closing_days FLOAT NOT NULL,
+    updated_at DATETIME,
+    CONSTRAINT uq_leave_balance_snapshots_user_type_year UNIQUE (user_id, balance_type, year)
+);
+
+CREATE INDEX IF NOT EXISTS ix_leave_balance_snapshots_id ON leave_balance_snapshots(id);
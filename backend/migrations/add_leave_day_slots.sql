@@ -0,0 +1,14 @@
+-- 请假半天占用表：每条有效请假（排除已拒绝/已取消）每天每个半天一行
+-- 说明：由 LeaveApplication 模型事件在新建/审批/修改/撤销/删除时同步维护，
+-- 历史数据由 scripts/migrations/run_migration_leave_day_slots.py 回填。
+CREATE TABLE IF NOT EXISTS leave_day_slots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    leave_id INTEGER NOT NULL REFERENCES leave_applications(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    date DATE NOT NULL,
+    half VARCHAR(10) NOT NULL,
+    CONSTRAINT uq_leave_day_slots_leave_date_half UNIQUE (leave_id, date, half)
+);
+
+CREATE INDEX IF NOT EXISTS idx_leave_day_slots_user_date ON leave_day_slots(user_id, date);
+CREATE INDEX IF NOT EXISTS ix_leave_day_slots_leave_id ON leave_day_slots(leave_id);
@@ -0,0 +1,21 @@
+-- 微信消息发件箱：审批消息与状态变更同一事务写入，由后台任务投递
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind VARCHAR(30) NOT NULL,
+    leave_id INTEGER REFERENCES leave_applications(id) ON DELETE SET NULL,
+    overtime_id INTEGER REFERENCES overtime_applications(id) ON DELETE SET NULL,
+    payload TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    claim_token VARCHAR(36),
+    last_error TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    sent_at DATETIME
+);
+
+CREATE INDEX IF NOT EXISTS ix_notification_outbox_id ON notification_outbox(id);
+
+-- 投递任务按 (status, next_attempt_at) 认领到期的待投递消息
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_status_next_attempt
+ON notification_outbox(status, next_attempt_at);
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Text, Enum as SQLEnum, UniqueConstraint, event
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, ForeignKey, Float, Text, Enum as SQLEnum, UniqueConstraint, Index, event, inspect, select
+from sqlalchemy.orm import Mapper, relationship
 from datetime import datetime
 import enum
 from .database import Base
@@ -7,6 +7,7 @@ from .request_dedup import (
     build_leave_active_request_key,
     build_overtime_active_request_key,
 )
+from .utils.leave_period_rules import leave_day_halves
 
 
 class UserRole(str, enum.Enum):
@@ -183,6 +184,10 @@ class LeaveType(Base):
 class LeaveApplication(Base):
     """请假申请表"""
     __tablename__ = "leave_applications"
+    __table_args__ = (
+        # 按员工 + 状态 + 日期区间的统计/冲突检查
+        Index("idx_leave_applications_user_status_dates", "user_id", "status", "start_date", "end_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -220,6 +225,10 @@ class LeaveApplication(Base):
 class OvertimeApplication(Base):
     """加班申请表"""
     __tablename__ = "overtime_applications"
+    __table_args__ = (
+        # 按员工 + 状态 + 开始时间区间的统计查询
+        Index("idx_overtime_applications_user_status_start", "user_id", "status", "start_time"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -331,6 +340,31 @@ class AnnualLeaveBase(Base):
     created_by = relationship("User", foreign_keys=[created_by_id], post_update=True)
 
 
+class LeaveBalanceSnapshot(Base):
+    """假期余额年末快照（按员工、余额类型、年份），结转模式下从最新有效快照起向后计算。
+
+    balance_type=annual：closing_days 为该年年末剩余年假（即下一年结转），basis_year 为计算所用的年假起始年；
+    balance_type=comp：earned/used/adjustment_days 为截至该年年末的累计值，
+    closing_days = 累计挣得 − 累计已用 + 累计调整（未截断）。
+    请假/加班/调整/基础年假变更时由模型事件删除受影响年份及以后的快照并补齐。
+    """
+    __tablename__ = "leave_balance_snapshots"
+    __table_args__ = (
+        UniqueConstraint("user_id", "balance_type", "year", name="uq_leave_balance_snapshots_user_type_year"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="员工ID")
+    balance_type = Column(String(20), nullable=False, comment="余额类型: annual=年假, comp=加班调休")
+    year = Column(Integer, nullable=False, comment="快照年份（该年年末）")
+    basis_year = Column(Integer, nullable=True, comment="年假起始年（仅 annual）")
+    earned_days = Column(Float, nullable=False, default=0.0, comment="累计挣得（仅 comp）")
+    used_days = Column(Float, nullable=False, default=0.0, comment="累计已用（仅 comp）")
+    adjustment_days = Column(Float, nullable=False, default=0.0, comment="累计期初/调整（仅 comp）")
+    closing_days = Column(Float, nullable=False, comment="年末余额")
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
 class HolidayType(str, enum.Enum):
     """节假日类型"""
     HOLIDAY = "holiday"  # 法定节假日（休息）
@@ -375,6 +409,123 @@ def _sync_overtime_active_request_key(mapper, connection, target):
     sync_overtime_active_request_key(target)
 
 
+class LeaveDaySlot(Base):
+    """请假半天占用表（由请假申请变更时同步维护，每条请假每天每个半天一行）"""
+    __tablename__ = "leave_day_slots"
+    __table_args__ = (
+        UniqueConstraint("leave_id", "date", "half", name="uq_leave_day_slots_leave_date_half"),
+        Index("idx_leave_day_slots_user_date", "user_id", "date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    leave_id = Column(Integer, ForeignKey("leave_applications.id", ondelete="CASCADE"), nullable=False, index=True, comment="请假申请ID")
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="员工ID")
+    date = Column(Date, nullable=False, comment="占用日期")
+    half = Column(String(10), nullable=False, comment="半天: morning=上午, afternoon=下午")
+
+
+# 不占用请假时段的申请状态（与 get_leave_period_for_date 历史口径一致）
+LEAVE_SLOT_EXCLUDED_STATUS_VALUES = {"rejected", "cancelled"}
+LEAVE_SLOT_SOURCE_FIELDS = ("user_id", "start_date", "end_date", "days", "status")
+
+
+def build_leave_day_slot_rows(leave_id, user_id, start_date, end_date, days, status):
+    status_value = status.value if hasattr(status, "value") else status
+    if status_value in LEAVE_SLOT_EXCLUDED_STATUS_VALUES or start_date is None or end_date is None:
+        return []
+    return [
+        {"leave_id": leave_id, "user_id": user_id, "date": slot_date, "half": half}
+        for slot_date, half in leave_day_halves(start_date, end_date, days or 0)
+    ]
+
+
+def sync_leave_day_slots(connection, leave: LeaveApplication) -> None:
+    slot_table = LeaveDaySlot.__table__
+    connection.execute(slot_table.delete().where(slot_table.c.leave_id == leave.id))
+    rows = build_leave_day_slot_rows(
+        leave.id, leave.user_id, leave.start_date, leave.end_date, leave.days, leave.status
+    )
+    if rows:
+        connection.execute(slot_table.insert(), rows)
+
+
+def backfill_leave_day_slots(connection) -> int:
+    """清空并按全部请假申请重建半天占用（已有数据库升级时使用），返回写入的行数"""
+    slot_table = LeaveDaySlot.__table__
+    leave_table = LeaveApplication.__table__
+    connection.execute(slot_table.delete())
+    rows = []
+    for leave in connection.execute(
+        select(
+            leave_table.c.id,
+            leave_table.c.user_id,
+            leave_table.c.start_date,
+            leave_table.c.end_date,
+            leave_table.c.days,
+            leave_table.c.status,
+        ).order_by(leave_table.c.id)
+    ):
+        rows.extend(build_leave_day_slot_rows(*leave))
+    if rows:
+        connection.execute(slot_table.insert(), rows)
+    return len(rows)
+
+
+@event.listens_for(LeaveApplication, "after_insert")
+def _insert_leave_day_slots(mapper, connection, target):
+    sync_leave_day_slots(connection, target)
+
+
+@event.listens_for(LeaveApplication, "after_update")
+def _update_leave_day_slots(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in LEAVE_SLOT_SOURCE_FIELDS):
+        sync_leave_day_slots(connection, target)
+
+
+@event.listens_for(LeaveApplication, "after_delete")
+def _delete_leave_day_slots(mapper, connection, target):
+    slot_table = LeaveDaySlot.__table__
+    connection.execute(slot_table.delete().where(slot_table.c.leave_id == target.id))
+
+
+class AttendanceMonthlyRollup(Base):
+    """按用户、自然月汇总的考勤/请假/加班计数（随明细变更增量重算）
+
+    归属口径：考勤按考勤日期、请假按开始日期、加班按开始时间所在月份。
+    leave_type_breakdown 为 JSON：{请假类型ID: [天数, 次数, 最小申请ID]}。
+    """
+    __tablename__ = "attendance_monthly_rollups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "year", "month", name="uq_attendance_monthly_rollups_user_month"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="员工ID")
+    year = Column(Integer, nullable=False, comment="年份")
+    month = Column(Integer, nullable=False, comment="月份")
+    present_days = Column(Integer, nullable=False, default=0, comment="出勤次数")
+    late_days = Column(Integer, nullable=False, default=0, comment="迟到次数")
+    early_leave_days = Column(Integer, nullable=False, default=0, comment="早退次数")
+    work_hours = Column(Float, nullable=False, default=0.0, comment="工时合计")
+    leave_days = Column(Float, nullable=False, default=0.0, comment="已批准请假天数（按开始日期归月）")
+    leave_count = Column(Integer, nullable=False, default=0, comment="已批准请假次数")
+    leave_type_breakdown = Column(Text, nullable=False, default="{}", comment="按请假类型细分(JSON)")
+    active_overtime_days = Column(Float, nullable=False, default=0.0, comment="已批准主动加班天数")
+    active_overtime_count = Column(Integer, nullable=False, default=0, comment="已批准主动加班次数")
+    passive_overtime_days = Column(Float, nullable=False, default=0.0, comment="已批准被动加班天数")
+    passive_overtime_count = Column(Integer, nullable=False, default=0, comment="已批准被动加班次数")
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class DerivedTableBackfill(Base):
+    """派生表（月度考勤汇总等）的历史数据回填记录：有记录表示该表已按全部明细回填，可以直接读取"""
+    __tablename__ = "derived_table_backfills"
+
+    name = Column(String(64), primary_key=True, comment="派生表名")
+    completed_at = Column(DateTime, nullable=False, default=datetime.now, comment="回填完成时间")
+
+
 class Holiday(Base):
     """节假日配置表"""
     __tablename__ = "holidays"
@@ -444,3 +595,39 @@ class SystemSetting(Base):
     description = Column(Text, comment="设置描述")
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class NotificationOutbox(Base):
+    """微信消息发件箱（与审批状态变更同一事务写入，由后台任务异步投递）
+
+    status: pending=待投递（含等待重试）, sent=已发送, skipped=无需发送（用户拒收、openid 或模板未配置）,
+    dead=重试耗尽或不可重试的失败。
+    投递任务认领时写入 claim_token 并把 next_attempt_at 推后作为租约，进程崩溃后租约到期可被重新认领。
+    """
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        Index("idx_notification_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(30), nullable=False, comment="消息类型: approval=审批提醒, approval_result=审批结果")
+    leave_id = Column(Integer, ForeignKey("leave_applications.id", ondelete="SET NULL"), nullable=True, comment="请假申请ID")
+    overtime_id = Column(Integer, ForeignKey("overtime_applications.id", ondelete="SET NULL"), nullable=True, comment="加班申请ID")
+    payload = Column(Text, nullable=False, comment="消息参数(JSON)")
+    status = Column(String(20), nullable=False, default="pending", comment="投递状态")
+    attempts = Column(Integer, nullable=False, default=0, comment="已尝试次数")
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.now, comment="下次可投递时间")
+    claim_token = Column(String(36), nullable=True, comment="认领批次标识")
+    last_error = Column(Text, nullable=True, comment="最近一次失败原因")
+    created_at = Column(DateTime, default=datetime.now)
+    sent_at = Column(DateTime, nullable=True)
+
+    leave = relationship("LeaveApplication")
+    overtime = relationship("OvertimeApplication")
+
+
+@event.listens_for(Mapper, "after_configured", once=True)
+def _register_derived_table_listeners():
+    """派生表（假期余额年末快照、月度考勤汇总）的维护事件依赖业务计算模块，映射配置完成后在此统一注册，
+    保证任何使用模型的进程（接口、脚本、测试）都会维护这些表，而不取决于是否导入了某个路由。"""
+    from . import attendance_rollups, leave_balance_snapshots  # noqa: F401
@@ -0,0 +1,272 @@
+"""
+微信消息发件箱
+审批相关的微信订阅消息不再在请求处理中同步调用微信接口：处理函数只在同一事务中插入一行
+notification_outbox（状态变更回滚时消息也不会发出，提交成功则消息不会丢失），
+由后台 NotificationWorker 批量认领并投递。
+
+- 认领：一条 UPDATE 把到期的 pending 行写上本批 claim_token，并把 next_attempt_at 推后作为租约，
+  多个 worker 进程并发认领时每行只会被一个进程拿到；进程崩溃后租约到期可被重新认领；
+- 逐条投递：发送前按 (id, claim_token) 续租并计入一次尝试，行已被其他进程重新认领（租约在排队期间到期）
+  时跳过；发送结果同样只在 claim_token 未变时写回，同一条消息不会被两个进程重复发送或重复计数；
+- 失败：可重试的错误（网络异常、系统繁忙、access_token 失效等）按指数退避（带随机抖动）重新排队，
+  不可重试的错误或超过 NOTIFICATION_MAX_ATTEMPTS 次后转入死信（status=dead），保留 last_error 便于排查；
+- 事务提交后通过 after_commit 事件唤醒本进程的投递任务，无需等到下一次轮询。
+"""
+import asyncio
+import json
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Union
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import SessionLocal
+from .models import LeaveApplication, NotificationOutbox, OvertimeApplication
+from .services.wechat_message import (
+    WechatSendError,
+    send_approval_notification,
+    send_approval_result_notification,
+)
+
+logger = logging.getLogger(__name__)
+
+APPROVAL = "approval"
+APPROVAL_RESULT = "approval_result"
+
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_SKIPPED = "skipped"
+STATUS_DEAD = "dead"
+
+# session.info 中的标记：本事务写入了发件箱，提交后唤醒投递任务
+_SESSION_FLAG = "notification_outbox_pending"
+
+Application = Union[LeaveApplication, OvertimeApplication]
+
+
+def _enqueue(db: Session, kind: str, template_id: Optional[str], application: Application, params: Dict[str, Any]) -> Optional[NotificationOutbox]:
+    # 未配置微信或模板时消息必然无法发送，不写入发件箱
+    if not (settings.WECHAT_APPID and settings.WECHAT_SECRET and template_id):
+        return None
+    params.pop("application_id", None)
+    message = NotificationOutbox(kind=kind, payload=json.dumps(params, ensure_ascii=False))
+    # 通过关系关联申请：新建的申请在 flush 后才有 ID，由 ORM 负责回填外键
+    if isinstance(application, LeaveApplication):
+        message.leave = application
+    else:
+        message.overtime = application
+    db.add(message)
+    db.info[_SESSION_FLAG] = True
+    return message
+
+
+def enqueue_approval_notification(db: Session, application: Application, **params: Any) -> Optional[NotificationOutbox]:
+    """写入一条审批提醒消息（参数同 send_approval_notification，application_id 取自 application）"""
+    return _enqueue(db, APPROVAL, settings.WECHAT_APPROVAL_TEMPLATE_ID, application, params)
+
+
+def enqueue_approval_result_notification(db: Session, application: Application, **params: Any) -> Optional[NotificationOutbox]:
+    """写入一条审批结果通知（参数同 send_approval_result_notification，application_id 取自 application）"""
+    return _enqueue(db, APPROVAL_RESULT, settings.WECHAT_RESULT_TEMPLATE_ID, application, params)
+
+
+def send_outbox_message(kind: str, params: Dict[str, Any]) -> bool:
+    """实际调用微信接口；返回 False 表示无需发送，失败时抛出 WechatSendError"""
+    if kind == APPROVAL:
+        return send_approval_notification(**params, raise_on_error=True)
+    if kind == APPROVAL_RESULT:
+        return send_approval_result_notification(**params, raise_on_error=True)
+    raise WechatSendError(f"未知的消息类型: {kind}", retryable=False)
+
+
+def retry_delay(attempts: int) -> float:
+    """第 attempts 次失败后的重试等待秒数：指数退避，封顶后再乘以 [0.5, 1) 的随机抖动"""
+    delay = min(settings.NOTIFICATION_RETRY_MAX_SECONDS, settings.NOTIFICATION_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def claim_due_notifications(db: Session, limit: int, now: Optional[datetime] = None):
+    """认领最多 limit 条到期的待投递消息"""
+    now = now or datetime.now()
+    token = str(uuid.uuid4())
+    due_ids = (
+        select(NotificationOutbox.id)
+        .where(NotificationOutbox.status == STATUS_PENDING, NotificationOutbox.next_attempt_at <= now)
+        .order_by(NotificationOutbox.next_attempt_at, NotificationOutbox.id)
+        .limit(limit)
+    )
+    db.execute(
+        update(NotificationOutbox)
+        .where(
+            NotificationOutbox.id.in_(due_ids),
+            NotificationOutbox.status == STATUS_PENDING,
+            NotificationOutbox.next_attempt_at <= now,
+        )
+        .values(
+            claim_token=token,
+            next_attempt_at=now + timedelta(seconds=settings.NOTIFICATION_CLAIM_TIMEOUT_SECONDS),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return db.query(NotificationOutbox).filter(NotificationOutbox.claim_token == token).order_by(NotificationOutbox.id).all()
+
+
+def _take_claimed(db: Session, message_id: int, token: str, now: datetime) -> Optional[int]:
+    """发送前续租并计入一次尝试，返回尝试次数；认领已被其他进程接手时返回 None"""
+    attempts = db.execute(
+        update(NotificationOutbox)
+        .where(NotificationOutbox.id == message_id, NotificationOutbox.claim_token == token)
+        .values(
+            next_attempt_at=now + timedelta(seconds=settings.NOTIFICATION_CLAIM_TIMEOUT_SECONDS),
+            attempts=NotificationOutbox.attempts + 1,
+        )
+        .returning(NotificationOutbox.attempts)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    db.commit()
+    return attempts
+
+
+def _deliver(
+    message: NotificationOutbox,
+    attempts: int,
+    sender: Callable[[str, Dict[str, Any]], bool],
+    now: datetime,
+) -> Dict[str, Any]:
+    """发送一条消息，返回需要写回的字段"""
+    application_id = message.leave_id or message.overtime_id
+    if application_id is None:
+        return {"status": STATUS_DEAD, "last_error": "关联的申请已删除"}
+    params = json.loads(message.payload)
+    params["application_id"] = application_id
+    try:
+        sent = sender(message.kind, params)
+    except Exception as exc:
+        retryable = exc.retryable if isinstance(exc, WechatSendError) else True
+        values: Dict[str, Any] = {"last_error": str(exc)[:500]}
+        if retryable and attempts < settings.NOTIFICATION_MAX_ATTEMPTS:
+            values["next_attempt_at"] = now + timedelta(seconds=retry_delay(attempts))
+            logger.warning(f"微信消息 {message.id} 第 {attempts} 次投递失败，稍后重试: {exc}")
+        else:
+            values["status"] = STATUS_DEAD
+            logger.error(f"微信消息 {message.id} 投递失败，已转入死信: {exc}")
+        return values
+    return {"status": STATUS_SENT if sent else STATUS_SKIPPED, "sent_at": now}
+
+
+def drain_outbox(
+    db: Session,
+    limit: Optional[int] = None,
+    sender: Optional[Callable[[str, Dict[str, Any]], bool]] = None,
+    now: Optional[datetime] = None,
+) -> int:
+    """认领并投递一批到期消息，返回本批实际投递的条数"""
+    sender = sender or send_outbox_message
+    messages = claim_due_notifications(db, limit or settings.NOTIFICATION_BATCH_SIZE, now)
+    # 每次提交后 ORM 对象会重新加载，认领标识须在投递前记下，不能读取可能已被其他进程改写的值
+    claims = [(message, message.claim_token) for message in messages]
+    delivered = 0
+    for message, token in claims:
+        attempts = _take_claimed(db, message.id, token, now or datetime.now())
+        if attempts is None:
+            continue
+        values = _deliver(message, attempts, sender, now or datetime.now())
+        # 逐条提交：进程中途退出时已发送的消息不会被重新认领重复发送
+        db.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id == message.id, NotificationOutbox.claim_token == token)
+            .values(claim_token=None, **values)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        delivered += 1
+    return delivered
+
+
+class NotificationWorker:
+    """后台投递任务：在事件循环中定期（或被唤醒时）把数据库操作放到线程池中执行"""
+
+    def __init__(self, session_factory: Callable[[], Session], batch_size: int, poll_interval: float):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _drain_once(self) -> int:
+        db = self.session_factory()
+        try:
+            return drain_outbox(db, self.batch_size)
+        finally:
+            db.close()
+
+    async def _run(self) -> None:
+        wakeup = self._wakeup
+        while True:
+            wakeup.clear()
+            try:
+                processed = await run_in_threadpool(self._drain_once)
+            except Exception as exc:
+                logger.error(f"投递微信消息发件箱失败: {exc}")
+                processed = 0
+            # 整批都满说明可能还有积压，立即处理下一批
+            if processed >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+
+    def notify(self) -> None:
+        """唤醒投递任务（可在任意线程调用）"""
+        loop, wakeup = self._loop, self._wakeup
+        if loop is None or wakeup is None:
+            return
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        self._loop = self._wakeup = None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+notification_worker = NotificationWorker(
+    session_factory=SessionLocal,
+    batch_size=settings.NOTIFICATION_BATCH_SIZE,
+    poll_interval=settings.NOTIFICATION_POLL_INTERVAL_SECONDS,
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_worker_after_commit(session: Session) -> None:
+    if session.info.pop(_SESSION_FLAG, False):
+        notification_worker.notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_flag_after_rollback(session: Session) -> None:
+    session.info.pop(_SESSION_FLAG, None)
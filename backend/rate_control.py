@@ -0,0 +1,177 @@
+"""
+外部接口调用控制
+- TokenBucket：按配置的 QPS 发放令牌，允许 burst 个突发；令牌不足时预约并等待，
+  需等待超过 max_wait 秒时直接拒绝，由调用方走降级逻辑；
+- DailyQuota：按自然日计数的调用配额，用完后当天不再调用；
+- CircuitBreaker：连续失败达到阈值后熔断（open），冷却期内直接拒绝，
+  冷却结束后放行一次试探调用（half-open），成功则恢复，失败则重新熔断。
+均为进程内状态，多 worker 部署时每个进程各自计数（QPS/配额按 worker 数分摊配置）。
+"""
+import asyncio
+import threading
+import time
+from datetime import date
+from typing import Callable, Dict, Optional
+
+
+class TokenBucket:
+    """令牌桶限速"""
+
+    def __init__(self, rate: float, burst: int, max_wait: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated_at = clock()
+        self.granted = 0
+        self.delayed = 0
+        self.rejected = 0
+
+    def reserve(self) -> Optional[float]:
+        """预约一个令牌，返回需要等待的秒数；等待超过 max_wait 时返回 None（不预约）"""
+        if self.rate <= 0:
+            self.granted += 1
+            return 0.0
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > self.max_wait:
+                self.rejected += 1
+                return None
+            # 令牌数可为负：表示已被排队的调用预约
+            self._tokens -= 1
+            self.granted += 1
+            if wait > 0:
+                self.delayed += 1
+            return wait
+
+    async def acquire(self) -> bool:
+        wait = self.reserve()
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            "qps": self.rate,
+            "burst": self.burst,
+            "granted": self.granted,
+            "delayed": self.delayed,
+            "rejected": self.rejected,
+        }
+
+
+class DailyQuota:
+    """按自然日计数的调用配额，limit 为 0 时不限制"""
+
+    def __init__(self, limit: int, today: Callable[[], date] = date.today):
+        self.limit = limit
+        self._today = today
+        self._lock = threading.Lock()
+        self._day = today()
+        self.used = 0
+        self.rejected = 0
+
+    def try_consume(self) -> bool:
+        with self._lock:
+            today = self._today()
+            if today != self._day:
+                self._day, self.used = today, 0
+            if self.limit and self.used >= self.limit:
+                self.rejected += 1
+                return False
+            self.used += 1
+            return True
+
+    def refund(self) -> None:
+        """退回一次已计入但未实际发出的调用"""
+        with self._lock:
+            self.used = max(0, self.used - 1)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"day": self._day.isoformat(), "limit": self.limit, "used": self.used, "rejected": self.rejected}
+
+
+class CircuitBreaker:
+    """连续失败熔断器"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def is_open(self) -> bool:
+        """处于熔断冷却期内（不改变状态，仅用于提前降级）"""
+        with self._lock:
+            if self.state == self.OPEN and self._clock() - self._opened_at < self.reset_timeout:
+                self.rejected += 1
+                return True
+            return False
+
+    def allow(self) -> bool:
+        """是否放行本次调用；放行后调用方须调用 record_success 或 record_failure"""
+        with self._lock:
+            if self.state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self) -> None:
+        """放行后未产生可判定的结果（未实际调用或请求本身有误）：归还试探名额，不计成功或失败"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.successes += 1
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+            self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._consecutive_failures,
+                "successes": self.successes,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "opened": self.opened,
+            }
@@ -1,13 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy import and_
 from sqlalchemy.exc import IntegrityError
-from typing import List, Optional, Dict, Any
-from datetime import datetime, date, timedelta
-import json
+from typing import List, Optional, Dict, Any, Union
+from datetime import datetime, date, time, timedelta
 import httpx
 from ..database import get_db
-from ..models import Attendance, User, AttendancePolicy, UserRole, AttendanceViewer, LeaveApplication, OvertimeApplication, Department, Holiday, LeaveStatus, CheckinStatusConfig, AttendanceStatus
+from ..models import Attendance, User, AttendancePolicy, UserRole, AttendanceViewer, LeaveApplication, LeaveDaySlot, OvertimeApplication, Department, CheckinStatusConfig, AttendanceStatus
 from ..permissions import can_view_user_records
 from ..schemas import (
     AttendanceCheckin, AttendanceCheckout, AttendanceResponse, AttendanceUpdate, 
@@ -18,13 +17,23 @@ from ..schemas import (
 )
 from ..security import get_current_user, get_current_active_admin
 from ..config import settings
-from ..geocode_cache import get_cached_address, set_cached_address
+from ..geocode_cache import aget_cached_address, aset_cached_address, cache_key, get_cache_stats
+from ..http_clients import SingleFlight, get_async_client
+from ..rate_control import CircuitBreaker, DailyQuota, TokenBucket
 from ..services.excel_export import build_excel_stream, fmt_date, fmt_dt
 from ..leave_balance import OCCUPYING_LEAVE_STATUSES
 from ..utils.attendance_utils import is_on_or_after_hire_date
+from ..utils.date_ranges import day_start, next_day_start
+from ..holiday_calendar import holiday_calendar
+from ..leave_periods import LeavePeriodIndex, get_leave_period_for_date, leave_day_slots_ready
+from ..attendance_policy_cache import CompiledPolicy, compile_policy, get_active_policy, merge_policy_rules
 
 router = APIRouter(prefix="/attendance", tags=["考勤管理"])
 
+# 上午请假时下午签到的截止时间
+AFTERNOON_CHECKIN_DEADLINE = time(14, 10)
+
+
 def _is_duplicate_attendance_integrity_error(exc: IntegrityError) -> bool:
     """仅识别 user_id + date 唯一约束冲突，避免误报其他完整性错误。"""
     # sqlite 常见报错：UNIQUE constraint failed: attendances.user_id, attendances.date
@@ -103,43 +112,21 @@ def ensure_system_reserved_checkin_statuses(db: Session) -> None:
             db.flush()
 
 
-def get_policy_for_date(policy: AttendancePolicy, check_date: datetime) -> Dict[str, Any]:
+def get_policy_for_date(policy: Union[AttendancePolicy, CompiledPolicy], check_date: datetime) -> Dict[str, Any]:
     """
     获取指定日期的策略规则
     
     Args:
-        policy: 打卡策略对象
+        policy: 打卡策略对象（或已编译的策略）
         check_date: 检查日期
         
     Returns:
         包含策略规则的字典
     """
-    # 获取星期几（0=周一, 6=周日）
-    weekday = check_date.weekday()
-    
-    # 默认规则
-    rules = {
-        'work_start_time': policy.work_start_time,
-        'work_end_time': policy.work_end_time,
-        'checkin_start_time': policy.checkin_start_time,
-        'checkin_end_time': policy.checkin_end_time,
-        'checkout_start_time': policy.checkout_start_time,
-        'checkout_end_time': policy.checkout_end_time,
-        'late_threshold_minutes': policy.late_threshold_minutes,
-        'early_threshold_minutes': policy.early_threshold_minutes,
-    }
-    
-    # 如果有每周规则，则应用特定规则
-    if policy.weekly_rules:
-        try:
-            weekly_rules = json.loads(policy.weekly_rules)
-            if str(weekday) in weekly_rules:
-                day_rules = weekly_rules[str(weekday)]
-                rules.update(day_rules)
-        except (json.JSONDecodeError, TypeError):
-            pass  # 使用默认规则
-    
-    return rules
+    if isinstance(policy, CompiledPolicy):
+        return dict(policy.for_date(check_date).raw)
+    # 获取星期几（0=周一, 6=周日），默认规则叠加每周特殊规则
+    return merge_policy_rules(policy, check_date.weekday())
 
 
 def calculate_work_hours(checkin_time: datetime, checkout_time: datetime) -> float:
@@ -148,150 +135,18 @@ def calculate_work_hours(checkin_time: datetime, checkout_time: datetime) -> flo
     return round(delta.total_seconds() / 3600, 2)
 
 
-def is_late(checkin_time: datetime, policy: AttendancePolicy) -> bool:
-    """判断是否迟到"""
-    rules = get_policy_for_date(policy, checkin_time)
-    work_start = datetime.strptime(rules['work_start_time'], "%H:%M").time()
-    checkin = checkin_time.time()
-    
-    # 加上迟到阈值
-    work_start_with_threshold = (
-        datetime.combine(date.today(), work_start) + 
-        timedelta(minutes=rules['late_threshold_minutes'])
-    ).time()
-    
-    return checkin > work_start_with_threshold
+def _as_compiled(policy: Union[AttendancePolicy, CompiledPolicy]) -> CompiledPolicy:
+    return policy if isinstance(policy, CompiledPolicy) else compile_policy(policy)
 
 
-def is_early_leave(checkout_time: datetime, policy: AttendancePolicy) -> bool:
-    """判断是否早退"""
-    rules = get_policy_for_date(policy, checkout_time)
-    work_end = datetime.strptime(rules['work_end_time'], "%H:%M").time()
-    checkout = checkout_time.time()
-    
-    # 减去早退阈值
-    work_end_with_threshold = (
-        datetime.combine(date.today(), work_end) - 
-        timedelta(minutes=rules['early_threshold_minutes'])
-    ).time()
-    
-    return checkout < work_end_with_threshold
+def is_late(checkin_time: datetime, policy: Union[AttendancePolicy, CompiledPolicy]) -> bool:
+    """判断是否迟到（晚于上班时间 + 迟到阈值）"""
+    return _as_compiled(policy).is_late(checkin_time)
 
 
-def get_leave_period_for_date(user_id: int, target_date: date, db: Session) -> Dict[str, bool]:
-    """
-    获取指定用户在指定日期的请假时段
-    
-    Args:
-        user_id: 用户ID
-        target_date: 目标日期
-        db: 数据库会话
-        
-    Returns:
-        包含请假信息的字典: {
-            'has_leave': bool,  # 是否有请假
-            'morning_leave': bool,  # 是否上午请假
-            'afternoon_leave': bool,  # 是否下午请假
-            'full_day_leave': bool  # 是否全天请假
-        }
-    """
-    result = {
-        'has_leave': False,
-        'morning_leave': False,
-        'afternoon_leave': False,
-        'full_day_leave': False
-    }
-    
-    # 查询该日期范围内的有效请假（排除已拒绝和已取消的请假）
-    # 只要有请假申请（无论是否被核准），都应该按请假计算
-    target_datetime_start = datetime.combine(target_date, datetime.min.time())
-    target_datetime_end = datetime.combine(target_date, datetime.max.time())
-    
-    leaves = db.query(LeaveApplication).filter(
-        and_(
-            LeaveApplication.user_id == user_id,
-            LeaveApplication.status.notin_([LeaveStatus.REJECTED.value, LeaveStatus.CANCELLED.value]),
-            LeaveApplication.start_date <= target_datetime_end,
-            LeaveApplication.end_date >= target_datetime_start
-        )
-    ).all()
-    
-    if not leaves:
-        return result
-    
-    result['has_leave'] = True
-    
-    for leave in leaves:
-        start_date_only = leave.start_date.date() if isinstance(leave.start_date, datetime) else leave.start_date
-        end_date_only = leave.end_date.date() if isinstance(leave.end_date, datetime) else leave.end_date
-        start_time = leave.start_date.time() if isinstance(leave.start_date, datetime) else datetime.min.time()
-        end_time = leave.end_date.time() if isinstance(leave.end_date, datetime) else datetime.max.time()
-        
-        # 判断规则1: 起始时间为9点且时长为0.5天的 → 上午请假
-        if (start_time.hour == 9 and start_time.minute == 0 and 
-            leave.days == 0.5 and start_date_only == target_date):
-            result['morning_leave'] = True
-            continue
-        
-        # 判断规则2: 起始时间为14点的，请假起始的当天记录为 下午请假
-        if (start_time.hour == 14 and start_time.minute == 0 and 
-            start_date_only == target_date):
-            result['afternoon_leave'] = True
-            continue
-        
-        # 判断规则3: 假期时长大于等于一天的且请假结束时间为12点的，假期结束当天上午记录为请假
-        if (leave.days >= 1.0 and end_time.hour == 12 and end_time.minute == 0 and 
-            end_date_only == target_date):
-            result['morning_leave'] = True
-            continue
-        
-        # 如果请假跨天，且目标日期在中间，则全天请假
-        if start_date_only < target_date < end_date_only:
-            result['full_day_leave'] = True
-            result['morning_leave'] = True
-            result['afternoon_leave'] = True
-            continue
-        
-        # 如果请假开始日期和结束日期都是目标日期
-        if start_date_only == target_date == end_date_only:
-            # 根据开始和结束时间判断
-            if start_time.hour < 12:  # 上午开始
-                if end_time.hour < 14:  # 上午结束
-                    result['morning_leave'] = True
-                else:  # 下午或全天结束
-                    result['full_day_leave'] = True
-                    result['morning_leave'] = True
-                    result['afternoon_leave'] = True
-            elif start_time.hour >= 14:  # 下午开始
-                result['afternoon_leave'] = True
-            else:  # 中午开始
-                result['afternoon_leave'] = True
-        elif start_date_only == target_date:
-            # 请假开始日期是目标日期（跨天请假的第一天）
-            if start_time.hour < 12:
-                # 从上午开始请假，且跨天，则当天全天请假
-                result['morning_leave'] = True
-                result['afternoon_leave'] = True
-                result['full_day_leave'] = True
-            else:
-                # 从下午开始请假
-                result['afternoon_leave'] = True
-        elif end_date_only == target_date:
-            # 请假结束日期是目标日期（跨天请假的最后一天）
-            if end_time.hour >= 14:
-                # 请假到下午结束，则当天全天请假
-                result['morning_leave'] = True
-                result['afternoon_leave'] = True
-                result['full_day_leave'] = True
-            else:
-                # 请假到上午结束（12点前）
-                result['morning_leave'] = True
-    
-    # 如果上午和下午都请假，则全天请假
-    if result['morning_leave'] and result['afternoon_leave']:
-        result['full_day_leave'] = True
-    
-    return result
+def is_early_leave(checkout_time: datetime, policy: Union[AttendancePolicy, CompiledPolicy]) -> bool:
+    """判断是否早退（早于下班时间 − 早退阈值）"""
+    return _as_compiled(policy).is_early_leave(checkout_time)
 
 
 @router.post("/checkin", response_model=AttendanceResponse)
@@ -312,7 +167,8 @@ def checkin(
     existing_attendance = db.query(Attendance).filter(
         and_(
             Attendance.user_id == current_user.id,
-            func.date(Attendance.date) == today
+            Attendance.date >= day_start(today),
+            Attendance.date < next_day_start(today)
         )
     ).first()
     
@@ -323,7 +179,7 @@ def checkin(
         )
     
     # 获取活跃的打卡策略
-    policy = db.query(AttendancePolicy).filter(AttendancePolicy.is_active == True).first()
+    policy = get_active_policy(db)
 
     # 非工作日仅允许加班打卡
     workday_status = get_workday_status(db, today)
@@ -346,8 +202,7 @@ def checkin(
     # 如果上午请假，检查是否在14:10前
     if leave_info['morning_leave']:
         # 上午请假时，14:10前可以正常签到
-        afternoon_checkin_deadline = datetime.strptime("14:10", "%H:%M").time()
-        if checkin_time_only > afternoon_checkin_deadline:
+        if checkin_time_only > AFTERNOON_CHECKIN_DEADLINE:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="上午请假，签到时间已过（14:10后不可签到）"
@@ -355,22 +210,20 @@ def checkin(
     
     # 验证打卡时间是否在策略允许的范围内
     if policy:
-        rules = get_policy_for_date(policy, checkin_time)
-        checkin_start = datetime.strptime(rules['checkin_start_time'], "%H:%M").time()
-        checkin_end = datetime.strptime(rules['checkin_end_time'], "%H:%M").time()
+        rules = policy.for_date(checkin_time)
         
         # 如果上午请假，允许在14:10前签到，否则按正常时间范围检查
         if workday_status["is_workday"] and not leave_info['morning_leave']:
-            if checkin_time_only < checkin_start or checkin_time_only > checkin_end:
+            if checkin_time_only < rules.checkin_start_time or checkin_time_only > rules.checkin_end_time:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"当前时间不在上班打卡时间范围内（{rules['checkin_start_time']} - {rules['checkin_end_time']}）"
+                    detail=f"当前时间不在上班打卡时间范围内（{rules.raw['checkin_start_time']} - {rules.raw['checkin_end_time']}）"
                 )
     
     # 判断是否迟到（只有在非上午请假的情况下才判断）
     late = False
     if not leave_info['morning_leave'] and policy:
-        late = is_late(checkin_time, policy)
+        late = policy.is_late(checkin_time)
     
     # 仅非工作日加班打卡标记为系统保留状态
     if not workday_status["is_workday"] and checkin_data.is_overtime_punch:
@@ -469,7 +322,8 @@ def checkout(
     attendance = db.query(Attendance).filter(
         and_(
             Attendance.user_id == current_user.id,
-            func.date(Attendance.date) == today
+            Attendance.date >= day_start(today),
+            Attendance.date < next_day_start(today)
         )
     ).first()
     
@@ -496,7 +350,7 @@ def checkout(
         )
     
     # 获取活跃的打卡策略
-    policy = db.query(AttendancePolicy).filter(AttendancePolicy.is_active == True).first()
+    policy = get_active_policy(db)
     workday_status = get_workday_status(db, today)
 
     # 非工作日仅允许加班打卡
@@ -511,17 +365,17 @@ def checkout(
     
     # 验证打卡时间是否在策略允许的范围内
     if policy:
-        rules = get_policy_for_date(policy, checkout_time)
-        checkout_start = datetime.strptime(rules['checkout_start_time'], "%H:%M").time()
-        checkout_end = datetime.strptime(rules['checkout_end_time'], "%H:%M").time()
+        rules = policy.for_date(checkout_time)
         
-        if workday_status["is_workday"] and (checkout_time_only < checkout_start or checkout_time_only > checkout_end):
+        if workday_status["is_workday"] and (
+            checkout_time_only < rules.checkout_start_time or checkout_time_only > rules.checkout_end_time
+        ):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"当前时间不在下班打卡时间范围内（{rules['checkout_start_time']} - {rules['checkout_end_time']}）"
+                detail=f"当前时间不在下班打卡时间范围内（{rules.raw['checkout_start_time']} - {rules.raw['checkout_end_time']}）"
             )
     
-    early = is_early_leave(checkout_time, policy) if policy else False
+    early = policy.is_early_leave(checkout_time) if policy else False
     
     # 更新记录
     attendance.checkout_time = checkout_time
@@ -560,17 +414,16 @@ def check_late(
 ):
     """检查当前时间打卡是否会迟到（打卡前调用）"""
     # 获取活跃的打卡策略
-    policy = db.query(AttendancePolicy).filter(AttendancePolicy.is_active == True).first()
+    policy = get_active_policy(db)
     
     if not policy:
         return {"will_be_late": False, "work_start_time": None, "current_time": None}
     
     checkin_time = datetime.now()
-    will_be_late = is_late(checkin_time, policy)
+    will_be_late = policy.is_late(checkin_time)
     
     # 获取工作开始时间
-    rules = get_policy_for_date(policy, checkin_time)
-    work_start = rules.get('work_start_time', '09:00')
+    work_start = policy.for_date(checkin_time).raw.get('work_start_time', '09:00')
     
     return {
         "will_be_late": will_be_late,
@@ -586,17 +439,16 @@ def check_early_leave(
 ):
     """检查当前时间打卡是否会早退（打卡前调用）"""
     # 获取活跃的打卡策略
-    policy = db.query(AttendancePolicy).filter(AttendancePolicy.is_active == True).first()
+    policy = get_active_policy(db)
     
     if not policy:
         return {"will_be_early_leave": False, "work_end_time": None, "current_time": None}
     
     checkout_time = datetime.now()
-    will_be_early_leave = is_early_leave(checkout_time, policy)
+    will_be_early_leave = policy.is_early_leave(checkout_time)
     
     # 获取工作结束时间
-    rules = get_policy_for_date(policy, checkout_time)
-    work_end = rules.get('work_end_time', '18:00')
+    work_end = policy.for_date(checkout_time).raw.get('work_end_time', '18:00')
     
     return {
         "will_be_early_leave": will_be_early_leave,
@@ -919,9 +771,9 @@ def get_my_attendance(
     query = db.query(Attendance).filter(Attendance.user_id == current_user.id)
     
     if start_date:
-        query = query.filter(func.date(Attendance.date) >= start_date)
+        query = query.filter(Attendance.date >= day_start(start_date))
     if end_date:
-        query = query.filter(func.date(Attendance.date) <= end_date)
+        query = query.filter(Attendance.date < next_day_start(end_date))
     
     attendances = query.order_by(Attendance.date.desc()).all()
     
@@ -937,6 +789,8 @@ def get_my_attendance(
         today = date.today()
         current_date = start_date
         absent_records = []
+        # 一次加载区间内的请假记录，逐日按索引判定请假时段
+        leave_index = LeavePeriodIndex.load(db, [current_user.id], start_date, end_date)
         
         while current_date <= end_date:
             if not is_on_or_after_hire_date(current_user.hire_date, current_date):
@@ -953,7 +807,7 @@ def get_my_attendance(
             
             if workday_status["is_workday"] and current_date not in existing_dates:
                 # 检查是否请假
-                leave_info = get_leave_period_for_date(current_user.id, current_date, db)
+                leave_info = leave_index.get(current_user.id, current_date)
                 
                 # 如果全天请假，不算缺勤
                 if leave_info['full_day_leave']:
@@ -1028,9 +882,9 @@ def get_user_attendance(
     query = db.query(Attendance).filter(Attendance.user_id == user_id)
     
     if start_date:
-        query = query.filter(func.date(Attendance.date) >= start_date)
+        query = query.filter(Attendance.date >= day_start(start_date))
     if end_date:
-        query = query.filter(func.date(Attendance.date) <= end_date)
+        query = query.filter(Attendance.date < next_day_start(end_date))
     
     attendances = query.order_by(Attendance.date.desc()).offset(skip).limit(limit).all()
     return attendances
@@ -1047,9 +901,9 @@ def export_attendance(
     query = db.query(Attendance)
 
     if start_date:
-        query = query.filter(func.date(Attendance.date) >= start_date)
+        query = query.filter(Attendance.date >= day_start(start_date))
     if end_date:
-        query = query.filter(func.date(Attendance.date) <= end_date)
+        query = query.filter(Attendance.date < next_day_start(end_date))
     if user_id:
         query = query.filter(Attendance.user_id == user_id)
 
@@ -1102,9 +956,9 @@ def list_attendance(
     query = db.query(Attendance)
     
     if start_date:
-        query = query.filter(func.date(Attendance.date) >= start_date)
+        query = query.filter(Attendance.date >= day_start(start_date))
     if end_date:
-        query = query.filter(func.date(Attendance.date) <= end_date)
+        query = query.filter(Attendance.date < next_day_start(end_date))
     if user_id:
         query = query.filter(Attendance.user_id == user_id)
     
@@ -1194,12 +1048,42 @@ def delete_policy(
     return None
 
 
+# 同一坐标（缓存键相同）的并发逆地理编码只请求一次高德地图API
+_geocode_flight = SingleFlight()
+# 高德地图调用控制：QPS 令牌桶、每日配额、连续失败熔断（被拒绝时返回坐标并标注原因）
+amap_rate_limiter = TokenBucket(
+    rate=settings.AMAP_QPS, burst=settings.AMAP_BURST, max_wait=settings.AMAP_MAX_WAIT_SECONDS
+)
+amap_daily_quota = DailyQuota(limit=settings.AMAP_DAILY_QUOTA)
+amap_circuit_breaker = CircuitBreaker(
+    failure_threshold=settings.AMAP_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=settings.AMAP_BREAKER_RESET_SECONDS,
+)
+# 高德地图限流/配额类错误码（infocode）：视为上游不可用，计入熔断
+AMAP_THROTTLED_INFOCODES = {"10003", "10004", "10014", "10019", "10020", "10021", "10044"}
+
+# 本地调用控制拒绝请求时返回给调用方的错误标识（地址为坐标，可稍后重试）
+GEOCODE_CIRCUIT_OPEN = "circuit_open"
+GEOCODE_QUOTA_EXHAUSTED = "quota_exhausted"
+GEOCODE_RATE_LIMITED = "rate_limited"
+
+
+class GeocodeThrottled(Exception):
+    """熔断、每日配额或 QPS 限速拒绝了本次高德地图调用"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
 async def _reverse_geocode_internal(latitude: float, longitude: float) -> str:
     """
     内部逆地理编码函数，带缓存
+
+    调用被熔断/配额/限速拒绝时抛出 GeocodeThrottled，由调用方降级为坐标并标注原因
     """
     # 先检查缓存
-    cached_address = get_cached_address(latitude, longitude)
+    cached_address = await aget_cached_address(latitude, longitude)
     if cached_address:
         return cached_address
     
@@ -1210,82 +1094,110 @@ async def _reverse_geocode_internal(latitude: float, longitude: float) -> str:
         address = f"{latitude:.6f}, {longitude:.6f}"
         return address
     
+    return await _geocode_flight.do(
+        cache_key(latitude, longitude), _fetch_reverse_geocode, latitude, longitude, api_key
+    )
+
+
+async def _fetch_reverse_geocode(latitude: float, longitude: float, api_key: str) -> str:
+    """调用高德地图逆地理编码API（使用应用级连接池，受限速、配额和熔断控制）"""
+    # 熔断期间直接降级，不占用配额、不等待令牌
+    if amap_circuit_breaker.is_open():
+        raise GeocodeThrottled(GEOCODE_CIRCUIT_OPEN)
+    if not amap_daily_quota.try_consume():
+        raise GeocodeThrottled(GEOCODE_QUOTA_EXHAUSTED)
+    # 先确认熔断器放行再取令牌，被拒绝时不浪费令牌
+    if not amap_circuit_breaker.allow():
+        amap_daily_quota.refund()
+        raise GeocodeThrottled(GEOCODE_CIRCUIT_OPEN)
+    if not await amap_rate_limiter.acquire():
+        amap_circuit_breaker.release()
+        amap_daily_quota.refund()
+        raise GeocodeThrottled(GEOCODE_RATE_LIMITED)
+    
+    # 调用结果：True=成功，False=上游不可用（计入熔断），None=请求本身的错误（不影响熔断）
+    upstream_ok = False
     try:
         # 调用高德地图逆地理编码API
         # 注意：高德地图API要求经纬度格式为：经度,纬度
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(
-                "https://restapi.amap.com/v3/geocode/regeo",
-                params={
-                    "key": api_key,
-                    "location": f"{longitude},{latitude}",  # 高德地图要求：经度,纬度
-                    "radius": 1000,
-                    "extensions": "all",
-                    "output": "json"
-                }
+        client = get_async_client()
+        response = await client.get(
+            f"{settings.AMAP_API_BASE_URL}/v3/geocode/regeo",
+            timeout=5.0,
+            params={
+                "key": api_key,
+                "location": f"{longitude},{latitude}",  # 高德地图要求：经度,纬度
+                "radius": 1000,
+                "extensions": "all",
+                "output": "json"
+            }
+        )
+        
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="高德地图API请求失败"
             )
+        
+        data = response.json()
+        if data.get("status") == "1":
+            upstream_ok = True
+        elif str(data.get("infocode", "")) not in AMAP_THROTTLED_INFOCODES:
+            upstream_ok = None
+        
+        # 检查API返回状态
+        if data.get("status") != "1":
+            error_msg = data.get("info", "未知错误")
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"高德地图API错误: {error_msg}"
+            )
+        
+        # 提取地址信息
+        regeocode = data.get("regeocode", {})
+        if not regeocode:
+            return {"address": f"{latitude:.6f}, {longitude:.6f}"}
+        
+        formatted_address = regeocode.get("formatted_address", "")
+        addressComponent = regeocode.get("addressComponent", {})
+        
+        # 构建详细地址
+        if formatted_address:
+            # 如果有格式化地址，直接使用
+            address = formatted_address
+        else:
+            # 否则手动构建地址
+            province = addressComponent.get("province", "")
+            city = addressComponent.get("city", "") or addressComponent.get("district", "")
+            district = addressComponent.get("district", "")
+            township = addressComponent.get("township", "")
+            street = addressComponent.get("street", "")
+            streetNumber = addressComponent.get("streetNumber", {})
+            building = addressComponent.get("building", {})
             
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=status.HTTP_502_BAD_GATEWAY,
-                    detail="高德地图API请求失败"
-                )
-            
-            data = response.json()
-            
-            # 检查API返回状态
-            if data.get("status") != "1":
-                error_msg = data.get("info", "未知错误")
-                raise HTTPException(
-                    status_code=status.HTTP_502_BAD_GATEWAY,
-                    detail=f"高德地图API错误: {error_msg}"
-                )
-            
-            # 提取地址信息
-            regeocode = data.get("regeocode", {})
-            if not regeocode:
-                return {"address": f"{latitude:.6f}, {longitude:.6f}"}
-            
-            formatted_address = regeocode.get("formatted_address", "")
-            addressComponent = regeocode.get("addressComponent", {})
-            
-            # 构建详细地址
-            if formatted_address:
-                # 如果有格式化地址，直接使用
-                address = formatted_address
-            else:
-                # 否则手动构建地址
-                province = addressComponent.get("province", "")
-                city = addressComponent.get("city", "") or addressComponent.get("district", "")
-                district = addressComponent.get("district", "")
-                township = addressComponent.get("township", "")
-                street = addressComponent.get("street", "")
-                streetNumber = addressComponent.get("streetNumber", {})
-                building = addressComponent.get("building", {})
-                
-                # 构建地址字符串
-                address_parts = []
-                if province:
-                    address_parts.append(province)
-                if city and city != province:
-                    address_parts.append(city)
-                if district and district != city:
-                    address_parts.append(district)
-                if township:
-                    address_parts.append(township)
-                if street:
-                    address_parts.append(street)
-                if streetNumber and streetNumber.get("number"):
-                    address_parts.append(streetNumber["number"] + "号")
-                if building and building.get("name"):
-                    address_parts.append(building["name"])
-                
-                address = "".join(address_parts) if address_parts else f"{latitude:.6f}, {longitude:.6f}"
-            
-            # 保存到缓存
-            set_cached_address(latitude, longitude, address)
-            return address
+            # 构建地址字符串
+            address_parts = []
+            if province:
+                address_parts.append(province)
+            if city and city != province:
+                address_parts.append(city)
+            if district and district != city:
+                address_parts.append(district)
+            if township:
+                address_parts.append(township)
+            if street:
+                address_parts.append(street)
+            if streetNumber and streetNumber.get("number"):
+                address_parts.append(streetNumber["number"] + "号")
+            if building and building.get("name"):
+                address_parts.append(building["name"])
             
+            address = "".join(address_parts) if address_parts else f"{latitude:.6f}, {longitude:.6f}"
+        
+        # 保存到缓存
+        await aset_cached_address(latitude, longitude, address)
+        return address
+        
     except httpx.TimeoutException:
         # API请求超时，返回坐标作为备选
         address = f"{latitude:.6f}, {longitude:.6f}"
@@ -1299,6 +1211,13 @@ async def _reverse_geocode_internal(latitude: float, longitude: float) -> str:
         logging.error(f"高德地图API调用失败: {str(e)}")
         address = f"{latitude:.6f}, {longitude:.6f}"
         return address
+    finally:
+        if upstream_ok is True:
+            amap_circuit_breaker.record_success()
+        elif upstream_ok is False:
+            amap_circuit_breaker.record_failure()
+        else:
+            amap_circuit_breaker.release()
 
 
 @router.get("/geocode/reverse")
@@ -1309,9 +1228,12 @@ async def reverse_geocode(
 ):
     """
     逆地理编码：将经纬度转换为地址文本
-    使用高德地图API，带缓存
+    使用高德地图API，带缓存；调用被限速/配额/熔断拒绝时返回坐标，并在 error 中标注原因
     """
-    address = await _reverse_geocode_internal(latitude, longitude)
+    try:
+        address = await _reverse_geocode_internal(latitude, longitude)
+    except GeocodeThrottled as exc:
+        return {"address": f"{latitude:.6f}, {longitude:.6f}", "error": exc.reason}
     return {"address": address}
 
 
@@ -1323,6 +1245,9 @@ async def batch_reverse_geocode(
     """
     批量逆地理编码：将多个经纬度转换为地址文本
     使用高德地图API，带缓存，异步处理
+
+    未缓存的坐标受 AMAP_QPS/AMAP_BURST/AMAP_MAX_WAIT_SECONDS 限制，超出部分返回坐标，
+    error 为 rate_limited/quota_exhausted/circuit_open，调用方可稍后对这些坐标重试
     """
     import asyncio
     
@@ -1340,6 +1265,13 @@ async def batch_reverse_geocode(
                 longitude=lon,
                 address=address
             )
+        except GeocodeThrottled as exc:
+            return GeocodeResult(
+                latitude=lat,
+                longitude=lon,
+                address=f"{lat:.6f}, {lon:.6f}",
+                error=exc.reason
+            )
         except Exception as e:
             return GeocodeResult(
                 latitude=lat,
@@ -1348,19 +1280,39 @@ async def batch_reverse_geocode(
                 error=str(e)
             )
     
-    # 并发处理所有地址转换（限制并发数为10，避免过多API调用）
-    semaphore = asyncio.Semaphore(10)
-    
-    async def get_address_with_semaphore(loc: LocationPoint) -> GeocodeResult:
-        async with semaphore:
-            return await get_address(loc)
+    # 先按缓存键去重，相同坐标只查询一次；调用速率由 amap_rate_limiter 控制
+    unique_locations: Dict[str, LocationPoint] = {}
+    for loc in locations:
+        unique_locations.setdefault(cache_key(loc.latitude, loc.longitude), loc)
     
     # 并发执行所有地址转换
-    results = await asyncio.gather(*[get_address_with_semaphore(loc) for loc in locations])
+    unique_results = await asyncio.gather(*[get_address(loc) for loc in unique_locations.values()])
+    by_key = dict(zip(unique_locations, unique_results))
+    results = []
+    for loc in locations:
+        result = by_key[cache_key(loc.latitude, loc.longitude)]
+        results.append(GeocodeResult(
+            latitude=loc.latitude,
+            longitude=loc.longitude,
+            address=result.address,
+            error=result.error
+        ))
     
     return BatchGeocodeResponse(results=results)
 
 
+@router.get("/geocode/stats")
+def get_geocode_stats(current_user: User = Depends(get_current_active_admin)):
+    """逆地理编码缓存、限速、配额与熔断计数（管理员）"""
+    return {
+        "cache": get_cache_stats(),
+        "coalescing": _geocode_flight.stats(),
+        "rate_limiter": amap_rate_limiter.stats(),
+        "daily_quota": amap_daily_quota.stats(),
+        "circuit_breaker": amap_circuit_breaker.stats(),
+    }
+
+
 # ==================== 出勤情况概览 ====================
 def check_attendance_view_permission(db: Session, user: User) -> bool:
     """检查用户是否有查看全部人员出勤情况的权限"""
@@ -1375,21 +1327,11 @@ def check_attendance_view_permission(db: Session, user: User) -> bool:
 
 def get_workday_status(db: Session, target_date: date) -> Dict[str, Any]:
     """获取指定日期的工作日状态"""
-    date_str = target_date.isoformat()
-    holiday = db.query(Holiday).filter(Holiday.date == date_str).first()
-    
-    if holiday:
-        if holiday.type == "holiday":
-            return {"is_workday": False, "reason": holiday.name or "法定节假日"}
-        if holiday.type == "company_holiday":
-            return {"is_workday": False, "reason": holiday.name or "公司节假日"}
-        if holiday.type == "workday":
-            return {"is_workday": True, "reason": holiday.name or "调休工作日"}
-    
-    weekday = target_date.weekday()
-    if weekday >= 5:
-        return {"is_workday": False, "reason": "周末"}
-    return {"is_workday": True, "reason": "正常工作日"}
+    workday_status = holiday_calendar.get_status(db, target_date)
+    return {
+        "is_workday": workday_status["is_workday"],
+        "reason": workday_status["holiday_name"] or workday_status["reason"],
+    }
 
 
 @router.get("/overview", response_model=AttendanceOverviewResponse)
@@ -1432,7 +1374,8 @@ def get_attendance_overview(
     # 获取目标日期的考勤记录（只查询已过滤用户的记录）
     if user_ids:
         attendances = db.query(Attendance).filter(
-            func.date(Attendance.date) == target_date,
+            Attendance.date >= day_start(target_date),
+            Attendance.date < next_day_start(target_date),
             Attendance.user_id.in_(user_ids)
         ).all()
     else:
@@ -1445,13 +1388,23 @@ def get_attendance_overview(
     ]
 
     # 获取目标日期的请假记录（已批准/审批中的，只查询已过滤用户的记录）
-    if user_ids:
+    if user_ids and not leave_day_slots_ready(db):
+        # 半天占用表尚未回填：按请假起止时间与当天有交集查询
         leaves = db.query(LeaveApplication).filter(
-            func.date(LeaveApplication.start_date) <= target_date,
-            func.date(LeaveApplication.end_date) >= target_date,
-            LeaveApplication.status.in_(occupying_leave_status_values),
-            LeaveApplication.user_id.in_(user_ids)
+            LeaveApplication.start_date < next_day_start(target_date),
+            LeaveApplication.end_date >= day_start(target_date),
+            LeaveApplication.user_id.in_(user_ids),
+            LeaveApplication.status.in_(occupying_leave_status_values)
         ).all()
+    elif user_ids:
+        # 通过请假半天占用表按日期索引定位当天有请假的申请
+        leaves = db.query(LeaveApplication).join(
+            LeaveDaySlot, LeaveDaySlot.leave_id == LeaveApplication.id
+        ).filter(
+            LeaveDaySlot.date == target_date,
+            LeaveDaySlot.user_id.in_(user_ids),
+            LeaveApplication.status.in_(occupying_leave_status_values)
+        ).distinct().all()
     else:
         leaves = []
     # 格式化日期时间为前端使用的格式（不带时区信息）
@@ -1496,8 +1449,8 @@ def get_attendance_overview(
     # 获取目标日期的加班记录（已批准的，只查询已过滤用户的记录）
     if user_ids:
         overtimes = db.query(OvertimeApplication).filter(
-            func.date(OvertimeApplication.start_time) <= target_date,
-            func.date(OvertimeApplication.end_time) >= target_date,
+            OvertimeApplication.start_time < next_day_start(target_date),
+            OvertimeApplication.end_time >= day_start(target_date),
             OvertimeApplication.status == "approved",
             OvertimeApplication.user_id.in_(user_ids)
         ).all()
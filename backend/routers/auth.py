@@ -1,48 +1,41 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from datetime import timedelta
-import time
 import httpx
 from ..database import get_db
 from ..models import User
 from ..schemas import UserLogin, Token, UserCreate, UserResponse, WechatLogin
-from ..security import verify_password, get_password_hash, create_access_token, get_current_active_admin
+from ..security import get_password_hash, create_access_token, get_current_active_admin, verify_password_async
 from ..config import settings
+from ..auth_user_cache import auth_user_cache
+from ..auth_limiter import auth_failure_limiter, LOGIN_SCOPE, WECHAT_SCOPE
+from ..http_clients import get_async_client
 
 router = APIRouter(prefix="/auth", tags=["认证"])
 
-_login_failures = {}
-_wechat_failures = {}
-AUTH_FAILURE_LIMIT = 5
-AUTH_FAILURE_WINDOW_SECONDS = 15 * 60
 
-
-def _prune_failures(store: dict, key: str) -> list:
-    now = time.time()
-    failures = [
-        ts for ts in store.get(key, [])
-        if now - ts < AUTH_FAILURE_WINDOW_SECONDS
-    ]
-    store[key] = failures
-    return failures
-
-
-def _check_failure_limit(store: dict, key: str) -> None:
-    if len(_prune_failures(store, key)) >= AUTH_FAILURE_LIMIT:
+async def _check_failure_limit(scope: str, key: str) -> None:
+    # 失败计数可能存放在 SQLite 文件中，与数据库访问一样放到线程池执行
+    if await run_in_threadpool(auth_failure_limiter.is_blocked, scope, key):
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="失败次数过多，请稍后再试"
         )
 
 
-def _record_failure(store: dict, key: str) -> None:
-    failures = _prune_failures(store, key)
-    failures.append(time.time())
-    store[key] = failures
+def _get_user_by_username(db: Session, username: str):
+    return db.query(User).filter(User.username == username).first()
 
 
-def _clear_failures(store: dict, key: str) -> None:
-    store.pop(key, None)
+def _get_user_by_openid(db: Session, openid: str):
+    return db.query(User).filter(User.wechat_openid == openid).first()
+
+
+def _save_user_fields(db: Session, user: User, **values) -> None:
+    for field, value in values.items():
+        setattr(user, field, value)
+    db.commit()
 
 
 async def get_wechat_openid(code: str) -> str:
@@ -53,7 +46,7 @@ async def get_wechat_openid(code: str) -> str:
             detail="微信配置未设置"
         )
     
-    url = "https://api.weixin.qq.com/sns/jscode2session"
+    url = f"{settings.WECHAT_API_BASE_URL}/sns/jscode2session"
     params = {
         "appid": settings.WECHAT_APPID,
         "secret": settings.WECHAT_SECRET,
@@ -62,24 +55,24 @@ async def get_wechat_openid(code: str) -> str:
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params, timeout=10.0)
-            data = response.json()
-            
-            if "errcode" in data:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"获取微信OpenID失败: {data.get('errmsg', '未知错误')}"
-                )
-            
-            openid = data.get("openid")
-            if not openid:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="未能获取微信OpenID"
-                )
-            
-            return openid
+        client = get_async_client()
+        response = await client.get(url, params=params, timeout=10.0)
+        data = response.json()
+        
+        if "errcode" in data:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"获取微信OpenID失败: {data.get('errmsg', '未知错误')}"
+            )
+        
+        openid = data.get("openid")
+        if not openid:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="未能获取微信OpenID"
+            )
+        
+        return openid
     except httpx.RequestError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -90,11 +83,15 @@ async def get_wechat_openid(code: str) -> str:
 @router.post("/login", response_model=Token)
 async def login(user_login: UserLogin, db: Session = Depends(get_db)):
     """用户登录（支持绑定微信OpenID）"""
-    _check_failure_limit(_login_failures, user_login.username)
-    user = db.query(User).filter(User.username == user_login.username).first()
+    await _check_failure_limit(LOGIN_SCOPE, user_login.username)
+    # 异步接口中数据库访问放到线程池，bcrypt 校验放到专用的密码哈希线程池，均不阻塞事件循环
+    user = await run_in_threadpool(_get_user_by_username, db, user_login.username)
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await verify_password_async(user_login.password, user.password_hash)
     
-    if not user or not verify_password(user_login.password, user.password_hash):
-        _record_failure(_login_failures, user_login.username)
+    if not valid:
+        await run_in_threadpool(auth_failure_limiter.record_failure, LOGIN_SCOPE, user_login.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
@@ -107,22 +104,26 @@ async def login(user_login: UserLogin, db: Session = Depends(get_db)):
             detail="用户已被禁用"
         )
     
+    username = user.username
+    # bcrypt 成本因子已调整：用本次明文按新成本重算哈希
+    if new_hash:
+        await run_in_threadpool(_save_user_fields, db, user, password_hash=new_hash)
+    
     # 如果提供了微信code，进行绑定
     if user_login.wechat_code:
         try:
             openid = await get_wechat_openid(user_login.wechat_code)
             
             # 检查该openid是否已被其他用户绑定
-            existing_user = db.query(User).filter(User.wechat_openid == openid).first()
-            if existing_user and existing_user.id != user.id:
+            existing_user = await run_in_threadpool(_get_user_by_openid, db, openid)
+            if existing_user and existing_user.username != username:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"该微信账号已被用户「{existing_user.real_name}({existing_user.username})」绑定，请联系管理员清理绑定关系"
                 )
             
             # 绑定openid到当前用户
-            user.wechat_openid = openid
-            db.commit()
+            await run_in_threadpool(_save_user_fields, db, user, wechat_openid=openid)
         except HTTPException as e:
             # 如果是code失效的错误，提供更友好的错误信息
             if "invalid code" in str(e.detail) or "code been used" in str(e.detail):
@@ -136,10 +137,10 @@ async def login(user_login: UserLogin, db: Session = Depends(get_db)):
             # 如果绑定失败，不影响登录
             pass
     
-    _clear_failures(_login_failures, user_login.username)
+    await run_in_threadpool(auth_failure_limiter.clear, LOGIN_SCOPE, user_login.username)
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username},
+        data={"sub": username},
         expires_delta=access_token_expires
     )
     
@@ -149,13 +150,13 @@ async def login(user_login: UserLogin, db: Session = Depends(get_db)):
 @router.post("/wechat-login", response_model=Token)
 async def wechat_login(wechat_login: WechatLogin, db: Session = Depends(get_db)):
     """微信登录（通过OpenID）"""
-    _check_failure_limit(_wechat_failures, wechat_login.code)
+    await _check_failure_limit(WECHAT_SCOPE, wechat_login.code)
     try:
         # 获取微信OpenID
         openid = await get_wechat_openid(wechat_login.code)
         
         # 查找已绑定该OpenID的用户
-        user = db.query(User).filter(User.wechat_openid == openid).first()
+        user = await run_in_threadpool(_get_user_by_openid, db, openid)
         
         if not user:
             # 未绑定，返回404提示需要绑定
@@ -177,11 +178,11 @@ async def wechat_login(wechat_login: WechatLogin, db: Session = Depends(get_db))
             expires_delta=access_token_expires
         )
         
-        _clear_failures(_wechat_failures, wechat_login.code)
+        await run_in_threadpool(auth_failure_limiter.clear, WECHAT_SCOPE, wechat_login.code)
         return {"access_token": access_token, "token_type": "bearer"}
         
     except HTTPException:
-        _record_failure(_wechat_failures, wechat_login.code)
+        await run_in_threadpool(auth_failure_limiter.record_failure, WECHAT_SCOPE, wechat_login.code)
         raise
     except Exception as e:
         raise HTTPException(
@@ -229,4 +230,7 @@ def register(
     return user
 
 
-
+@router.get("/user-cache")
+def get_auth_user_cache_stats(current_admin: User = Depends(get_current_active_admin)):
+    """已认证用户缓存命中情况（管理员）"""
+    return auth_user_cache.stats()
@@ -5,6 +5,7 @@ from datetime import datetime, date, timedelta
 from .. import models, schemas
 from ..database import get_db
 from ..security import get_current_user
+from ..holiday_calendar import holiday_calendar
 
 router = APIRouter(
     prefix="/holidays",
@@ -185,55 +186,13 @@ def check_workday(
             detail="日期格式错误，应为 YYYY-MM-DD"
         )
     
-    # 查询节假日配置
-    holiday = db.query(models.Holiday).filter(
-        models.Holiday.date == check_date
-    ).first()
-    
-    # 如果有节假日配置，按配置判断
-    if holiday:
-        if holiday.type == "holiday":
-            # 法定节假日，休息
-            return schemas.WorkdayCheck(
-                date=check_date,
-                is_workday=False,
-                reason="法定节假日",
-                holiday_name=holiday.name
-            )
-        elif holiday.type == "company_holiday":
-            # 公司节假日，休息
-            return schemas.WorkdayCheck(
-                date=check_date,
-                is_workday=False,
-                reason="公司节假日",
-                holiday_name=holiday.name
-            )
-        elif holiday.type == "workday":
-            # 调休工作日，上班
-            return schemas.WorkdayCheck(
-                date=check_date,
-                is_workday=True,
-                reason="调休工作日",
-                holiday_name=holiday.name
-            )
-    
-    # 没有配置，按周几判断
-    weekday = date_obj.weekday()  # 0=周一, 6=周日
-    
-    if weekday >= 5:  # 周六、周日
-        return schemas.WorkdayCheck(
-            date=check_date,
-            is_workday=False,
-            reason="周末",
-            holiday_name=None
-        )
-    else:  # 周一到周五
-        return schemas.WorkdayCheck(
-            date=check_date,
-            is_workday=True,
-            reason="正常工作日",
-            holiday_name=None
-        )
+    workday_status = holiday_calendar.get_status(db, date_obj.date())
+    return schemas.WorkdayCheck(
+        date=check_date,
+        is_workday=workday_status["is_workday"],
+        reason=workday_status["reason"],
+        holiday_name=workday_status["holiday_name"]
+    )
 
 
 @router.get("/{holiday_id}", response_model=schemas.Holiday)
@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 from datetime import datetime, date
 from ..database import get_db
 from ..models import LeaveApplication, User, UserRole, LeaveStatus, Department, LeaveType
+from ..utils.date_ranges import day_start, next_day_start
 from ..permissions import can_view_leave_application
 from ..request_dedup import build_leave_active_request_key, is_active_request_key_conflict, normalize_reason_text
 from ..schemas import LeaveApplicationCreate, LeaveApplicationUpdate, LeaveApplicationResponse, LeaveApproval
@@ -15,7 +15,7 @@ from ..approval_assigner import (
     assign_general_manager_for_leave,
     can_approve_leave
 )
-from ..services.wechat_message import send_approval_notification, send_approval_result_notification
+from ..notification_outbox import enqueue_approval_notification, enqueue_approval_result_notification
 from .system_settings import is_gm_auto_approve_enabled, is_comp_leave_yearly_reset_enabled
 from ..leave_balance import compute_comp_leave, COMP_LEAVE_TYPE_NAME, OCCUPYING_LEAVE_STATUSES
 
@@ -166,6 +166,21 @@ def find_existing_active_leave(
 
 
 
+def _insert_new_leave(leave: LeaveApplication, db: Session) -> None:
+    """插入新申请并 flush：去重键冲突在写入发件箱等后续操作之前转换为 409，不会被其后的异常处理吞掉"""
+    db.add(leave)
+    try:
+        db.flush()
+    except IntegrityError as exc:
+        db.rollback()
+        if is_active_request_key_conflict(exc, "leave_applications"):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="相同的请假申请已存在，请勿重复提交"
+            ) from exc
+        raise
+
+
 def _auto_approve_leave_at_gm_stage(leave: LeaveApplication, db: Session) -> bool:
     """当开启系统开关时，流转到总经理审批节点的请假自动通过。"""
     if not is_gm_auto_approve_enabled(db):
@@ -199,10 +214,11 @@ def _auto_approve_leave_at_gm_stage(leave: LeaveApplication, db: Session) -> boo
     try:
         applicant = db.query(User).filter(User.id == leave.user_id).first()
         if applicant and applicant.wechat_openid:
-            send_approval_result_notification(
+            enqueue_approval_result_notification(
+                db,
+                leave,
                 applicant_openid=applicant.wechat_openid,
                 application_type="leave",
-                application_id=leave.id,
                 applicant_name=applicant.real_name,
                 application_item=get_leave_type_name(leave, db),
                 approved=True,
@@ -312,6 +328,8 @@ def create_leave_application(
             leave.assigned_gm_id = current_user.id
     
 
+    _insert_new_leave(leave, db)
+
     # Auto-approve when applicant and current approver are the same person.
     first_approver = None
     if current_user.role in [UserRole.EMPLOYEE, UserRole.DEPARTMENT_HEAD]:
@@ -355,20 +373,7 @@ def create_leave_application(
             leave.gm_approved_at = now
             leave.gm_comment = auto_approve_comment
             leave.status = LeaveStatus.APPROVED
-    db.add(leave)
-    try:
-        db.commit()
-    except IntegrityError as exc:
-        db.rollback()
-        if is_active_request_key_conflict(exc, "leave_applications"):
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="相同的请假申请已存在，请勿重复提交"
-            ) from exc
-        raise
-    db.refresh(leave)
-    
-    # 发送审批提醒消息给第一个审批人
+    # 审批提醒消息写入发件箱，与申请同一事务提交，由后台任务投递
     try:
         # 确保正确获取请假类型名称
         application_item = get_leave_type_name(leave, db, leave_type_name)
@@ -409,10 +414,11 @@ def create_leave_application(
             next_approver = db.query(User).filter(User.id == leave.assigned_gm_id).first()
 
         if next_approver and next_approver.id != current_user.id and next_approver.wechat_openid:
-            send_approval_notification(
+            enqueue_approval_notification(
+                db,
+                leave,
                 approver_openid=next_approver.wechat_openid,
                 application_type="leave",
-                application_id=leave.id,
                 applicant_name=current_user.real_name,
                 application_item=application_item,
                 application_time=application_time,
@@ -421,7 +427,10 @@ def create_leave_application(
     except Exception as e:
         # 消息推送失败不影响主流程，只记录日志
         import logging
-        logging.getLogger(__name__).error(f"发送审批提醒消息失败: {str(e)}")
+        logging.getLogger(__name__).error(f"写入审批提醒消息失败: {str(e)}")
+    
+    db.commit()
+    db.refresh(leave)
     
     return to_leave_response(leave)
 
@@ -1001,10 +1010,7 @@ def approve_leave_application(
             detail="权限不足"
         )
     
-    db.commit()
-    db.refresh(leave)
-    
-    # 发送消息通知
+    # 审批消息写入发件箱，与审批结果同一事务提交，由后台任务投递
     try:
         # 获取申请人信息（如果之前没有获取）
         if not applicant:
@@ -1019,10 +1025,11 @@ def approve_leave_application(
             if leave.status == LeaveStatus.APPROVED:
                 # 审批完成，给申请人发送结果通知
                 if applicant and applicant.wechat_openid:
-                    send_approval_result_notification(
+                    enqueue_approval_result_notification(
+                        db,
+                        leave,
                         applicant_openid=applicant.wechat_openid,
                         application_type="leave",
-                        application_id=leave.id,
                         applicant_name=applicant.real_name,
                         application_item=application_item,
                         approved=True,
@@ -1034,10 +1041,11 @@ def approve_leave_application(
                 if leave.assigned_vp_id:
                     next_approver = db.query(User).filter(User.id == leave.assigned_vp_id).first()
                     if next_approver and next_approver.wechat_openid:
-                        send_approval_notification(
+                        enqueue_approval_notification(
+                            db,
+                            leave,
                             approver_openid=next_approver.wechat_openid,
                             application_type="leave",
-                            application_id=leave.id,
                             applicant_name=applicant.real_name if applicant else "未知",
                             application_item=application_item,
                             application_time=application_time,
@@ -1049,10 +1057,11 @@ def approve_leave_application(
                 if leave.assigned_gm_id:
                     next_approver = db.query(User).filter(User.id == leave.assigned_gm_id).first()
                     if next_approver and next_approver.wechat_openid:
-                        send_approval_notification(
+                        enqueue_approval_notification(
+                            db,
+                            leave,
                             approver_openid=next_approver.wechat_openid,
                             application_type="leave",
-                            application_id=leave.id,
                             applicant_name=applicant.real_name if applicant else "未知",
                             application_item=application_item,
                             application_time=application_time,
@@ -1062,10 +1071,11 @@ def approve_leave_application(
         else:
             # 审批拒绝，给申请人发送结果通知
             if applicant and applicant.wechat_openid:
-                send_approval_result_notification(
+                enqueue_approval_result_notification(
+                    db,
+                    leave,
                     applicant_openid=applicant.wechat_openid,
                     application_type="leave",
-                    application_id=leave.id,
                     applicant_name=applicant.real_name,
                     application_item=application_item,
                     approved=False,
@@ -1075,7 +1085,10 @@ def approve_leave_application(
     except Exception as e:
         # 消息推送失败不影响主流程，只记录日志
         import logging
-        logging.getLogger(__name__).error(f"发送审批消息失败: {str(e)}")
+        logging.getLogger(__name__).error(f"写入审批消息失败: {str(e)}")
+    
+    db.commit()
+    db.refresh(leave)
     
     return to_leave_response(leave)
 
@@ -1165,9 +1178,9 @@ def list_leave_applications(
     
     # 按日期范围筛选（检查请假日期是否与查询范围有重叠）
     if start_date:
-        query = query.filter(func.date(LeaveApplication.end_date) >= start_date)
+        query = query.filter(LeaveApplication.end_date >= day_start(start_date))
     if end_date:
-        query = query.filter(func.date(LeaveApplication.start_date) <= end_date)
+        query = query.filter(LeaveApplication.start_date < next_day_start(end_date))
     
     # 按员工筛选
     if user_id:
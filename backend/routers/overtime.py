@@ -1,17 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 from datetime import datetime, date
 from ..database import get_db
 from ..models import OvertimeApplication, User, UserRole, OvertimeStatus, OvertimeType
+from ..utils.date_ranges import day_start, next_day_start
 from ..permissions import can_view_overtime_application
 from ..request_dedup import build_overtime_active_request_key, is_active_request_key_conflict, normalize_reason_text
 from ..schemas import OvertimeApplicationCreate, OvertimeApplicationUpdate, OvertimeApplicationResponse, OvertimeApproval
 from ..security import get_current_user, get_current_active_admin
 from ..approval_assigner import assign_approver_for_overtime, can_approve_overtime
-from ..services.wechat_message import send_approval_notification, send_approval_result_notification
+from ..notification_outbox import enqueue_approval_notification, enqueue_approval_result_notification
 from .system_settings import is_gm_auto_approve_enabled
 
 router = APIRouter(prefix="/overtime", tags=["加班管理"])
@@ -77,6 +77,21 @@ def find_existing_active_overtime(
 
 
 
+def _insert_new_overtime(overtime: OvertimeApplication, db: Session) -> None:
+    """插入新申请并 flush：去重键冲突在写入发件箱等后续操作之前转换为 409，不会被其后的异常处理吞掉"""
+    db.add(overtime)
+    try:
+        db.flush()
+    except IntegrityError as exc:
+        db.rollback()
+        if is_active_request_key_conflict(exc, "overtime_applications"):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="相同的加班申请已存在，请勿重复提交"
+            ) from exc
+        raise
+
+
 def _auto_approve_overtime_at_gm_stage(overtime: OvertimeApplication, db: Session) -> bool:
     """当开启系统开关时，分配到总经理审批节点的加班自动通过。"""
     if not is_gm_auto_approve_enabled(db):
@@ -111,10 +126,11 @@ def _auto_approve_overtime_at_gm_stage(overtime: OvertimeApplication, db: Sessio
     try:
         applicant = db.query(User).filter(User.id == overtime.user_id).first()
         if applicant and applicant.wechat_openid:
-            send_approval_result_notification(
+            enqueue_approval_result_notification(
+                db,
+                overtime,
                 applicant_openid=applicant.wechat_openid,
                 application_type="overtime",
-                application_id=overtime.id,
                 applicant_name=applicant.real_name,
                 application_item=get_overtime_application_item(overtime),
                 approved=True,
@@ -199,6 +215,8 @@ def create_overtime_application(
         pass
     
 
+    _insert_new_overtime(overtime, db)
+
     # Auto-approve when applicant and current approver are the same person.
     first_approver = None
     if current_user.role in [UserRole.EMPLOYEE, UserRole.DEPARTMENT_HEAD, UserRole.VICE_PRESIDENT]:
@@ -214,28 +232,16 @@ def create_overtime_application(
         overtime.status = OvertimeStatus.APPROVED
     _auto_approve_overtime_at_gm_stage(overtime, db)
 
-    db.add(overtime)
-    try:
-        db.commit()
-    except IntegrityError as exc:
-        db.rollback()
-        if is_active_request_key_conflict(exc, "overtime_applications"):
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="相同的加班申请已存在，请勿重复提交"
-            ) from exc
-        raise
-    db.refresh(overtime)
-    
-    # 发送审批提醒消息给审批人
+    # 审批提醒消息写入发件箱，与申请同一事务提交，由后台任务投递
     try:
         if overtime.status == OvertimeStatus.PENDING and overtime.assigned_approver_id:
             approver = db.query(User).filter(User.id == overtime.assigned_approver_id).first()
             if approver and approver.id != current_user.id and approver.wechat_openid:
-                send_approval_notification(
+                enqueue_approval_notification(
+                    db,
+                    overtime,
                     approver_openid=approver.wechat_openid,
                     application_type="overtime",
-                    application_id=overtime.id,
                     applicant_name=current_user.real_name,
                     application_item=get_overtime_application_item(overtime),
                     application_time=get_overtime_application_time(overtime),
@@ -244,7 +250,10 @@ def create_overtime_application(
     except Exception as e:
         # 消息推送失败不影响主流程，只记录日志
         import logging
-        logging.getLogger(__name__).error(f"发送审批提醒消息失败: {str(e)}")
+        logging.getLogger(__name__).error(f"写入审批提醒消息失败: {str(e)}")
+    
+    db.commit()
+    db.refresh(overtime)
     
     return overtime
 
@@ -518,16 +527,14 @@ def approve_overtime_application(
     overtime.status = OvertimeStatus.APPROVED if approval.approved else OvertimeStatus.REJECTED
 
     
-    db.commit()
-    db.refresh(overtime)
-    
-    # 发送审批结果通知给申请人
+    # 审批结果通知写入发件箱，与审批结果同一事务提交，由后台任务投递
     try:
         if applicant and applicant.wechat_openid:
-            send_approval_result_notification(
+            enqueue_approval_result_notification(
+                db,
+                overtime,
                 applicant_openid=applicant.wechat_openid,
                 application_type="overtime",
-                application_id=overtime.id,
                 applicant_name=applicant.real_name,
                 application_item=get_overtime_application_item(overtime),
                 approved=approval.approved,
@@ -537,7 +544,10 @@ def approve_overtime_application(
     except Exception as e:
         # 消息推送失败不影响主流程，只记录日志
         import logging
-        logging.getLogger(__name__).error(f"发送审批结果通知失败: {str(e)}")
+        logging.getLogger(__name__).error(f"写入审批结果通知失败: {str(e)}")
+    
+    db.commit()
+    db.refresh(overtime)
     
     return overtime
 
@@ -626,9 +636,9 @@ def list_overtime_applications(
     
     # 按日期范围筛选（按加班开始时间）
     if start_date:
-        query = query.filter(func.date(OvertimeApplication.start_time) >= start_date)
+        query = query.filter(OvertimeApplication.start_time >= day_start(start_date))
     if end_date:
-        query = query.filter(func.date(OvertimeApplication.start_time) <= end_date)
+        query = query.filter(OvertimeApplication.start_time < next_day_start(end_date))
     
     # 按员工筛选
     if user_id:
@@ -1,14 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, and_
-from typing import List, Optional
-from datetime import datetime, timedelta, date
+from typing import Any, Dict, List, Optional, Union
+from datetime import datetime, date
 from ..database import get_db
-from ..models import User, Attendance, LeaveApplication, OvertimeApplication, UserRole, LeaveStatus, OvertimeStatus, Holiday, LeaveType, AttendanceStatus, OvertimeType
+from ..models import User, LeaveApplication, OvertimeApplication, UserRole, LeaveStatus, OvertimeStatus, LeaveType, AttendanceStatus, OvertimeType
 from ..permissions import can_view_user_records
 from ..schemas import (
     AttendanceStatistics, PeriodStatistics, LeaveApplicationResponse, OvertimeApplicationResponse,
-    DailyAttendanceStatisticsResponse, DailyAttendanceStatistics, DailyAttendanceItem
+    DailyAttendanceStatisticsResponse, DailyAttendanceColumnarResponse
 )
 from ..leave_balance import compute_annual_leave, compute_comp_leave, compute_passive_overtime_adjustment
 from .system_settings import (
@@ -16,8 +16,11 @@ from .system_settings import (
     is_annual_leave_yearly_reset_enabled,
     is_comp_leave_yearly_reset_enabled,
 )
-from .attendance import get_leave_period_for_date
-from ..utils.attendance_utils import is_on_or_after_hire_date
+from ..attendance_matrix import DAY_TYPE_NAMES, WEEKDAY_NAMES, iter_daily_matrices, load_daily_matrix
+from ..holiday_calendar import holiday_calendar
+from ..utils.date_ranges import day_start, next_day_start
+from ..attendance_rollups import collect_user_counters
+from ..statistics_cache import statistics_cache
 
 
 def serialize_leave_response(leave: LeaveApplication) -> LeaveApplicationResponse:
@@ -37,36 +40,79 @@ def calculate_workdays(start_date: date, end_date: date, db: Session) -> int:
     - 排除法定节假日
     - 包含调休工作日
     """
-    # 获取日期范围内的所有节假日配置
-    holidays_config = db.query(Holiday).filter(
-        Holiday.date >= start_date.isoformat(),
-        Holiday.date <= end_date.isoformat()
-    ).all()
-    
-    # 创建节假日字典 {日期字符串: 类型}
-    holidays_dict = {h.date: h.type for h in holidays_config}
-    
-    workdays = 0
-    current_date = start_date
-    
-    while current_date <= end_date:
-        date_str = current_date.isoformat()
-        
-        # 检查是否有节假日配置
-        if date_str in holidays_dict:
-            if holidays_dict[date_str] == 'workday':
-                # 调休工作日，算作工作日
-                workdays += 1
-            # 如果是 'holiday' 或 'company_holiday' 类型，不算工作日
-        else:
-            # 没有配置，按周几判断
-            weekday = current_date.weekday()  # 0=周一, 6=周日
-            if weekday < 5:  # 周一到周五
-                workdays += 1
-        
-        current_date += timedelta(days=1)
-    
-    return workdays
+    return holiday_calendar.count_workdays(db, start_date, end_date)
+
+
+def _statistics_scope(current_user: User, department_id: Optional[int]) -> tuple:
+    """统计结果缓存键中的查看范围：部门主任固定为本部门，其余角色按筛选部门"""
+    if current_user.role == UserRole.DEPARTMENT_HEAD:
+        return ("department", current_user.department_id)
+    return ("all", department_id or None)
+
+
+def _empty_user_aggregate() -> Dict[str, Any]:
+    return {
+        "present_days": 0,
+        "late_days": 0,
+        "early_leave_days": 0,
+        "work_hours": 0.0,
+        "leave_days": 0.0,
+        "leave_count": 0,
+        "leave_type_breakdown": [],
+        "active_overtime_days": 0.0,
+        "active_overtime_count": 0,
+        "passive_overtime_days": 0.0,
+        "passive_overtime_count": 0,
+    }
+
+
+def aggregate_user_statistics(
+    db: Session,
+    user_ids: List[int],
+    start_date: date,
+    end_date: date,
+) -> Dict[int, Dict[str, Any]]:
+    """
+    按用户批量汇总考勤/请假/加班计数
+
+    完整自然月取自 attendance_monthly_rollups，首尾不完整月份按明细 GROUP BY，
+    查询次数与用户数无关，口径与逐用户汇总一致：
+    - 考勤：出勤次数、迟到、早退、工时
+    - 请假：仅已批准，与统计区间有交集即计入，按请假类型细分
+    - 加班：仅已批准，开始日期落在统计区间内，按主动/被动细分
+    """
+    result = {user_id: _empty_user_aggregate() for user_id in user_ids}
+    if not user_ids:
+        return result
+
+    # 请假类型名称只取启用中的类型，停用类型归为"未分类"
+    leave_type_map = {
+        lt_id: name
+        for lt_id, name in db.query(LeaveType.id, LeaveType.name).filter(LeaveType.is_active == True).all()
+    }
+    for user_id, counter in collect_user_counters(db, user_ids, start_date, end_date).items():
+        agg = result[user_id]
+        agg["present_days"] = counter.present_days
+        agg["late_days"] = counter.late_days
+        agg["early_leave_days"] = counter.early_leave_days
+        agg["work_hours"] = counter.work_hours
+        agg["leave_days"] = counter.leave_days
+        agg["leave_count"] = counter.leave_count
+        agg["leave_type_breakdown"] = [
+            {
+                "leave_type_id": lt_id,
+                "leave_type_name": leave_type_map.get(lt_id, "未分类"),
+                "total_days": days,
+                "total_count": count,
+            }
+            for lt_id, days, count in counter.ordered_leave_types()
+        ]
+        agg["active_overtime_days"] = counter.active_overtime_days
+        agg["active_overtime_count"] = counter.active_overtime_count
+        agg["passive_overtime_days"] = counter.passive_overtime_days
+        agg["passive_overtime_count"] = counter.passive_overtime_count
+
+    return result
 
 
 @router.get("/attendance", response_model=List[AttendanceStatistics])
@@ -85,6 +131,21 @@ def get_attendance_statistics(
             detail="权限不足"
         )
     
+    cache_key = ("attendance", start_date, end_date, _statistics_scope(current_user, department_id))
+    return statistics_cache.get_or_compute(
+        db, cache_key,
+        lambda: _compute_attendance_statistics(db, current_user, start_date, end_date, department_id),
+        weight=len
+    )
+
+
+def _compute_attendance_statistics(
+    db: Session,
+    current_user: User,
+    start_date: date,
+    end_date: date,
+    department_id: Optional[int],
+) -> List[AttendanceStatistics]:
     # 构建查询（排除admin账户、禁用考勤的员工）
     query = db.query(User).filter(
         User.username != "admin",
@@ -97,94 +158,36 @@ def get_attendance_statistics(
     elif department_id:
         query = query.filter(User.department_id == department_id)
     
-    users = query.all()
+    users = query.options(joinedload(User.department)).all()
     
     # 计算日期范围内的实际工作日天数（排除周末和法定节假日）
     total_days = calculate_workdays(start_date, end_date, db)
     
-    leave_types = db.query(LeaveType).filter(LeaveType.is_active == True).all()
-    leave_type_map = {lt.id: lt.name for lt in leave_types}
+    aggregates = aggregate_user_statistics(db, [user.id for user in users], start_date, end_date)
     statistics = []
     for user in users:
-        # 获取考勤记录
-        attendances = db.query(Attendance).filter(
-            and_(
-                Attendance.user_id == user.id,
-                func.date(Attendance.date) >= start_date,
-                func.date(Attendance.date) <= end_date
-            )
-        ).all()
-        
-        # 获取请假记录
-        leaves = db.query(LeaveApplication).options(joinedload(LeaveApplication.leave_type)).filter(
-            and_(
-                LeaveApplication.user_id == user.id,
-                LeaveApplication.status == LeaveStatus.APPROVED,
-                LeaveApplication.start_date <= datetime.combine(end_date, datetime.max.time()),
-                LeaveApplication.end_date >= datetime.combine(start_date, datetime.min.time())
-            )
-        ).all()
-        
-        # 获取加班记录（只要加班日期在统计范围内即可）
-        overtimes = db.query(OvertimeApplication).filter(
-            and_(
-                OvertimeApplication.user_id == user.id,
-                OvertimeApplication.status == OvertimeStatus.APPROVED,
-                func.date(OvertimeApplication.start_time) <= end_date,
-                func.date(OvertimeApplication.start_time) >= start_date
-            )
-        ).all()
-        
-        # 计算统计数据
-        present_days = len(attendances)
-        late_days = sum(1 for a in attendances if a.is_late)
-        early_leave_days = sum(1 for a in attendances if a.is_early_leave)
-        leave_days = sum(l.days for l in leaves if l.days is not None)
-        leave_count = len(leaves)  # 请假次数（只统计已批准的）
-        leave_type_totals = {}
-        for leave in leaves:
-            lt_id = leave.leave_type_id if hasattr(leave, "leave_type_id") else None
-            if lt_id:
-                if lt_id not in leave_type_totals:
-                    leave_type_totals[lt_id] = {"leave_type_id": lt_id, "leave_type_name": leave_type_map.get(lt_id, "未分类"), "total_days": 0.0, "total_count": 0}
-                leave_type_totals[lt_id]["total_days"] += leave.days or 0
-                leave_type_totals[lt_id]["total_count"] += 1
-        leave_type_breakdown = list(leave_type_totals.values())
-        
-        # 按类型分类统计加班数据
-        active_overtimes = [o for o in overtimes if o.overtime_type == OvertimeType.ACTIVE]
-        passive_overtimes = [o for o in overtimes if o.overtime_type == OvertimeType.PASSIVE]
-        
-        active_overtime_days = sum(o.days for o in active_overtimes if o.days is not None)
-        active_overtime_count = len(active_overtimes)
-        passive_overtime_days = sum(o.days for o in passive_overtimes if o.days is not None)
-        passive_overtime_count = len(passive_overtimes)
-        
-        overtime_days = active_overtime_days + passive_overtime_days
-        overtime_count = active_overtime_count + passive_overtime_count
-        
-        work_hours = sum(a.work_hours for a in attendances if a.work_hours is not None)
-        absence_days = total_days - present_days - int(leave_days)
-        
+        agg = aggregates[user.id]
+        absence_days = total_days - agg["present_days"] - int(agg["leave_days"])
+
         stat = AttendanceStatistics(
             user_id=user.id,
             user_name=user.real_name,
             department=user.department.name if user.department else None,
             total_days=total_days,
-            present_days=present_days,
-            late_days=late_days,
-            early_leave_days=early_leave_days,
+            present_days=agg["present_days"],
+            late_days=agg["late_days"],
+            early_leave_days=agg["early_leave_days"],
             absence_days=max(0, absence_days),
-            leave_days=leave_days,
-            leave_count=leave_count,
-            overtime_days=overtime_days,
-            overtime_count=overtime_count,
-            active_overtime_days=active_overtime_days,
-            active_overtime_count=active_overtime_count,
-            passive_overtime_days=passive_overtime_days,
-            passive_overtime_count=passive_overtime_count,
-            work_hours=work_hours,
-            leave_type_breakdown=leave_type_breakdown
+            leave_days=agg["leave_days"],
+            leave_count=agg["leave_count"],
+            overtime_days=agg["active_overtime_days"] + agg["passive_overtime_days"],
+            overtime_count=agg["active_overtime_count"] + agg["passive_overtime_count"],
+            active_overtime_days=agg["active_overtime_days"],
+            active_overtime_count=agg["active_overtime_count"],
+            passive_overtime_days=agg["passive_overtime_days"],
+            passive_overtime_count=agg["passive_overtime_count"],
+            work_hours=agg["work_hours"],
+            leave_type_breakdown=agg["leave_type_breakdown"]
         )
         statistics.append(stat)
     
@@ -199,6 +202,13 @@ def get_period_statistics(
     current_user: User = Depends(get_current_active_admin)
 ):
     """获取周期统计（管理员）"""
+    return statistics_cache.get_or_compute(
+        db, ("period", start_date, end_date),
+        lambda: _compute_period_statistics(db, start_date, end_date)
+    )
+
+
+def _compute_period_statistics(db: Session, start_date: date, end_date: date) -> PeriodStatistics:
     # 总用户数 = 激活的系统用户数 - 1（admin账户）
     # 方法：查询所有用户，在Python中过滤
     all_users = db.query(User).all()
@@ -218,65 +228,45 @@ def get_period_statistics(
     # 应出勤次数
     expected_attendance = total_users * total_days
     
+    counters = collect_user_counters(db, enabled_user_ids, start_date, end_date).values()
+
     # 实际出勤次数（排除admin账户的考勤记录）
-    if enabled_user_ids:
-        actual_attendance = db.query(Attendance).filter(
-            and_(
-                func.date(Attendance.date) >= start_date,
-                func.date(Attendance.date) <= end_date,
-                Attendance.user_id.in_(enabled_user_ids)
-            )
-        ).count()
-    else:
-        actual_attendance = 0
+    actual_attendance = sum(counter.present_days for counter in counters)
     
     # 出勤率
     attendance_rate = (actual_attendance / expected_attendance * 100) if expected_attendance > 0 else 0
     
     # 总请假天数（排除admin账户）
-    if enabled_user_ids:
-        leaves = db.query(LeaveApplication).options(joinedload(LeaveApplication.leave_type)).filter(
-            and_(
-                LeaveApplication.status == LeaveStatus.APPROVED,
-                LeaveApplication.start_date <= datetime.combine(end_date, datetime.max.time()),
-                LeaveApplication.end_date >= datetime.combine(start_date, datetime.min.time()),
-                LeaveApplication.user_id.in_(enabled_user_ids)
-            )
-        ).all()
-    else:
-        leaves = []
-    total_leave_days = sum(l.days for l in leaves)
+    total_leave_days = sum(counter.leave_days for counter in counters)
     
     # 总加班天数（排除admin账户，只要加班日期在统计范围内即可）
-    if enabled_user_ids:
-        overtimes = db.query(OvertimeApplication).filter(
-            and_(
-                OvertimeApplication.status == OvertimeStatus.APPROVED,
-                func.date(OvertimeApplication.start_time) <= end_date,
-                func.date(OvertimeApplication.start_time) >= start_date,
-                OvertimeApplication.user_id.in_(enabled_user_ids)
-            )
-        ).all()
-    else:
-        overtimes = []
-    total_overtime_days = sum(o.days for o in overtimes if o.days is not None)
+    total_overtime_days = sum(
+        counter.active_overtime_days + counter.passive_overtime_days for counter in counters
+    )
     
+    # 按请假类型汇总（停用类型保留原名称），按类型首次出现的申请顺序排列
+    leave_type_names = dict(db.query(LeaveType.id, LeaveType.name).all())
     leave_type_totals = {}
-    for leave in leaves:
-        lt = leave.leave_type
-        lt_id = lt.id if lt else 0
-        lt_name = lt.name if lt else "未分类"
-        if lt_id not in leave_type_totals:
-            leave_type_totals[lt_id] = {
-                "leave_type_id": lt_id,
-                "leave_type_name": lt_name,
-                "total_days": 0.0,
-                "total_count": 0
-            }
-        leave_type_totals[lt_id]["total_days"] += leave.days or 0
-        leave_type_totals[lt_id]["total_count"] += 1
-    
-    leave_type_summary = list(leave_type_totals.values())
+    for counter in counters:
+        for lt_id, (days, count, first_id) in counter.leave_types.items():
+            lt_id = lt_id if lt_id in leave_type_names else 0
+            if lt_id not in leave_type_totals:
+                leave_type_totals[lt_id] = {
+                    "leave_type_id": lt_id,
+                    "leave_type_name": leave_type_names.get(lt_id, "未分类"),
+                    "total_days": 0.0,
+                    "total_count": 0,
+                    "first_id": first_id
+                }
+            totals = leave_type_totals[lt_id]
+            totals["total_days"] += days
+            totals["total_count"] += count
+            totals["first_id"] = min(totals["first_id"], first_id)
+    
+    leave_type_summary = [
+        {key: value for key, value in item.items() if key != "first_id"}
+        for item in sorted(leave_type_totals.values(), key=lambda item: item["first_id"])
+    ]
     
     return PeriodStatistics(
         start_date=datetime.combine(start_date, datetime.min.time()),
@@ -289,6 +279,12 @@ def get_period_statistics(
     )
 
 
+@router.get("/cache")
+def get_statistics_cache_stats(current_user: User = Depends(get_current_active_admin)):
+    """统计结果缓存命中情况（管理员）"""
+    return statistics_cache.stats()
+
+
 @router.get("/my", response_model=AttendanceStatistics)
 def get_my_statistics(
     start_date: date,
@@ -353,55 +349,22 @@ def get_my_statistics(
     # 计算日期范围内的实际工作日天数（排除周末和法定节假日）
     total_days = calculate_workdays(start_date, end_date, db)
     
-    # 获取考勤记录
-    attendances = db.query(Attendance).filter(
-        and_(
-            Attendance.user_id == current_user.id,
-            func.date(Attendance.date) >= start_date,
-            func.date(Attendance.date) <= end_date
-        )
-    ).all()
-    
-    # 获取请假记录
-    leaves = db.query(LeaveApplication).options(joinedload(LeaveApplication.leave_type)).filter(
-        and_(
-            LeaveApplication.user_id == current_user.id,
-            LeaveApplication.status == LeaveStatus.APPROVED,
-            LeaveApplication.start_date <= datetime.combine(end_date, datetime.max.time()),
-            LeaveApplication.end_date >= datetime.combine(start_date, datetime.min.time())
-        )
-    ).all()
-    
-    # 获取加班记录（只要加班日期在统计范围内即可）
-    overtimes = db.query(OvertimeApplication).filter(
-        and_(
-            OvertimeApplication.user_id == current_user.id,
-            OvertimeApplication.status == OvertimeStatus.APPROVED,
-            func.date(OvertimeApplication.start_time) <= end_date,
-            func.date(OvertimeApplication.start_time) >= start_date
-        )
-    ).all()
-    
-    # 计算统计数据
-    present_days = len(attendances)
-    late_days = sum(1 for a in attendances if a.is_late)
-    early_leave_days = sum(1 for a in attendances if a.is_early_leave)
-    leave_days = sum(l.days for l in leaves if l.days is not None)
-    leave_count = len(leaves)  # 请假次数（只统计已批准的）
-    
-    # 按类型分类统计加班数据
-    active_overtimes = [o for o in overtimes if o.overtime_type == OvertimeType.ACTIVE]
-    passive_overtimes = [o for o in overtimes if o.overtime_type == OvertimeType.PASSIVE]
+    agg = aggregate_user_statistics(db, [current_user.id], start_date, end_date)[current_user.id]
+    present_days = agg["present_days"]
+    late_days = agg["late_days"]
+    early_leave_days = agg["early_leave_days"]
+    leave_days = agg["leave_days"]
+    leave_count = agg["leave_count"]  # 请假次数（只统计已批准的）
     
-    active_overtime_days = sum(o.days for o in active_overtimes if o.days is not None)
-    active_overtime_count = len(active_overtimes)
-    passive_overtime_days = sum(o.days for o in passive_overtimes if o.days is not None)
-    passive_overtime_count = len(passive_overtimes)
+    active_overtime_days = agg["active_overtime_days"]
+    active_overtime_count = agg["active_overtime_count"]
+    passive_overtime_days = agg["passive_overtime_days"]
+    passive_overtime_count = agg["passive_overtime_count"]
     
     overtime_days = active_overtime_days + passive_overtime_days
     overtime_count = active_overtime_count + passive_overtime_count
     
-    work_hours = sum(a.work_hours for a in attendances if a.work_hours is not None) or 0.0
+    work_hours = agg["work_hours"]
     absence_days = total_days - present_days - int(leave_days)
     
     return AttendanceStatistics(
@@ -502,8 +465,8 @@ def get_user_overtime_details(
         and_(
             OvertimeApplication.user_id == user_id,
             OvertimeApplication.status == OvertimeStatus.APPROVED,
-            func.date(OvertimeApplication.start_time) <= end_date,
-            func.date(OvertimeApplication.start_time) >= start_date
+            OvertimeApplication.start_time >= day_start(start_date),
+            OvertimeApplication.start_time < next_day_start(end_date)
         )
     ).order_by(OvertimeApplication.start_time.desc()).all()
     
@@ -548,17 +511,7 @@ def _daily_status_display(status: Optional[str], target_date_str: str, period: s
 
 def is_workday(target_date: date, db: Session) -> bool:
     """判断指定日期是否为工作日"""
-    date_str = target_date.isoformat()
-    holiday = db.query(Holiday).filter(Holiday.date == date_str).first()
-    
-    if holiday:
-        if holiday.type == "workday":
-            return True
-        elif holiday.type in ["holiday", "company_holiday"]:
-            return False
-    
-    weekday = target_date.weekday()
-    return weekday < 5  # 周一到周五
+    return holiday_calendar.is_workday(db, target_date)
 
 
 def get_weekday_name(target_date: date) -> str:
@@ -567,21 +520,64 @@ def get_weekday_name(target_date: date) -> str:
     return weekday_names[target_date.weekday()]
 
 
-@router.get("/attendance/daily", response_model=DailyAttendanceStatisticsResponse)
-def get_daily_attendance_statistics(
-    start_date: date,
-    end_date: date,
-    department_id: Optional[int] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    """获取每日上下午考勤详细统计（默认工作日；非工作日仅在有加班打卡时显示）"""
-    if current_user.role not in [UserRole.ADMIN, UserRole.DEPARTMENT_HEAD, UserRole.VICE_PRESIDENT, UserRole.GENERAL_MANAGER]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="权限不足"
-        )
-
+DAILY_STATISTICS_FORMATS = ("nested", "columnar")
+
+
+def _iter_daily_export_rows(matrices):
+    """逐批展开每日矩阵为导出行（文案与前端 getStatusDisplay 一致）"""
+    yes_no = ('否', '是')
+    for matrix in matrices:
+        date_texts = [d.isoformat() for d in matrix.dates]
+        weekday_texts = [WEEKDAY_NAMES[d.weekday()] for d in matrix.dates]
+        names = matrix.status_names
+        day_types = matrix.day_type.tolist()
+        mornings = matrix.morning_status.tolist()
+        afternoons = matrix.afternoon_status.tolist()
+        overtime_flags = matrix.has_overtime_punch.tolist()
+        late_flags = matrix.is_late.tolist()
+        early_flags = matrix.is_early_leave.tolist()
+        for row, user in enumerate(matrix.users):
+            name = user.real_name or user.username
+            department = user.department.name if user.department else '-'
+            for col, date_text in enumerate(date_texts):
+                day_type = DAY_TYPE_NAMES[day_types[row][col]]
+                is_late = late_flags[row][col]
+                is_early_leave = early_flags[row][col]
+                has_overtime_punch = overtime_flags[row][col]
+                if day_type == 'not_hired':
+                    morning_text = '-'
+                    afternoon_text = '-'
+                    day_type_text = '未入职'
+                elif day_type == 'overtime_non_workday':
+                    morning_text = '加班' if has_overtime_punch else ''
+                    afternoon_text = '-'
+                    day_type_text = '非工作日'
+                else:
+                    morning_text = _daily_status_display(
+                        names[mornings[row][col]], date_text, 'morning', is_late, is_early_leave
+                    )
+                    afternoon_text = _daily_status_display(
+                        names[afternoons[row][col]], date_text, 'afternoon', is_late, is_early_leave
+                    )
+                    day_type_text = '工作日'
+
+                yield [
+                    name,
+                    user.username,
+                    department,
+                    date_text,
+                    weekday_texts[col],
+                    day_type_text,
+                    morning_text,
+                    afternoon_text,
+                    yes_no[is_late],
+                    yes_no[is_early_leave],
+                    yes_no[has_overtime_punch],
+                ]
+
+
+def _daily_statistics_users(db: Session, current_user: User, department_id: Optional[int]) -> List[User]:
+    """每日统计的用户范围：部门主任仅限本部门，其余角色可按部门筛选"""
     query = db.query(User).filter(
         User.username != "admin",
         User.is_active == True,
@@ -593,121 +589,76 @@ def get_daily_attendance_statistics(
     elif department_id:
         query = query.filter(User.department_id == department_id)
 
-    users = query.all()
-    user_ids = [u.id for u in users]
+    return query.options(joinedload(User.department)).order_by(User.id).all()
 
-    workdays = []
-    current_date = start_date
-    while current_date <= end_date:
-        if is_workday(current_date, db):
-            workdays.append(current_date)
-        current_date += timedelta(days=1)
 
-    attendances_query = db.query(Attendance).filter(
-        and_(
-            func.date(Attendance.date) >= start_date,
-            func.date(Attendance.date) <= end_date
+@router.get(
+    "/attendance/daily",
+    response_model=Union[DailyAttendanceStatisticsResponse, DailyAttendanceColumnarResponse]
+)
+def get_daily_attendance_statistics(
+    start_date: date,
+    end_date: date,
+    department_id: Optional[int] = None,
+    format: str = "nested",
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取每日上下午考勤详细统计（默认工作日；非工作日仅在有加班打卡时显示）
+
+    format=nested（默认）按用户逐日返回对象；format=columnar 只返回一次日期/星期轴，
+    每个用户的状态以整数编码数组返回，配合码表解码，适合大部门减小响应体积。
+    """
+    if format not in DAILY_STATISTICS_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="format 仅支持 nested 或 columnar"
+        )
+    if current_user.role not in [UserRole.ADMIN, UserRole.DEPARTMENT_HEAD, UserRole.VICE_PRESIDENT, UserRole.GENERAL_MANAGER]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="权限不足"
         )
-    )
-    if user_ids:
-        attendances_query = attendances_query.filter(Attendance.user_id.in_(user_ids))
 
-    attendances = attendances_query.all()
+    cache_key = ("attendance_daily", start_date, end_date, _statistics_scope(current_user, department_id), format)
+    return statistics_cache.get_or_compute(
+        db, cache_key,
+        lambda: _compute_daily_statistics(db, current_user, start_date, end_date, department_id, format),
+        weight=_daily_statistics_weight
+    )
 
-    attendance_dict = {}
-    non_workday_overtime_dates = set()
-    for att in attendances:
-        att_date = att.date.date() if isinstance(att.date, datetime) else att.date
-        key = (att.user_id, att_date)
-        attendance_dict[key] = att
 
-        if (
-            att.checkin_status == AttendanceStatus.OVERTIME_PUNCH.value
-            and not is_workday(att_date, db)
-        ):
-            non_workday_overtime_dates.add(att_date)
+def _daily_statistics_weight(result: Union[DailyAttendanceStatisticsResponse, DailyAttendanceColumnarResponse]) -> int:
+    """每日统计结果的缓存体积：用户数 × 显示日期数"""
+    if isinstance(result, DailyAttendanceColumnarResponse):
+        return len(result.users) * len(result.dates)
+    return sum(len(item.items) for item in result.statistics)
 
-    display_dates = sorted(set(workdays) | non_workday_overtime_dates)
 
-    statistics_list = []
+def _compute_daily_statistics(
+    db: Session,
+    current_user: User,
+    start_date: date,
+    end_date: date,
+    department_id: Optional[int],
+    format: str,
+) -> Union[DailyAttendanceStatisticsResponse, DailyAttendanceColumnarResponse]:
+    users = _daily_statistics_users(db, current_user, department_id)
+    workdays = holiday_calendar.list_workdays(db, start_date, end_date)
+    matrix = load_daily_matrix(db, users, start_date, end_date, workdays)
+
+    if format == "columnar":
+        return DailyAttendanceColumnarResponse(
+            start_date=start_date.isoformat(),
+            end_date=end_date.isoformat(),
+            dates=[d.isoformat() for d in matrix.dates],
+            weekdays=[WEEKDAY_NAMES[d.weekday()] for d in matrix.dates],
+            day_type_codes=list(DAY_TYPE_NAMES),
+            status_codes=matrix.status_names,
+            users=matrix.to_columnar_users()
+        )
 
-    for user in users:
-        items = []
-
-        for target_day in display_dates:
-            if not is_on_or_after_hire_date(user.hire_date, target_day):
-                items.append(DailyAttendanceItem(
-                    date=target_day.isoformat(),
-                    weekday=get_weekday_name(target_day),
-                    day_type="not_hired",
-                    morning_status=None,
-                    afternoon_status=None,
-                    has_overtime_punch=False,
-                    is_late=False,
-                    is_early_leave=False
-                ))
-                continue
-
-            att = attendance_dict.get((user.id, target_day))
-            has_overtime_punch = bool(att and att.checkin_status == AttendanceStatus.OVERTIME_PUNCH.value)
-
-            if target_day in non_workday_overtime_dates:
-                items.append(DailyAttendanceItem(
-                    date=target_day.isoformat(),
-                    weekday=get_weekday_name(target_day),
-                    day_type="overtime_non_workday",
-                    morning_status=None,
-                    afternoon_status=None,
-                    has_overtime_punch=has_overtime_punch,
-                    is_late=False,
-                    is_early_leave=False
-                ))
-                continue
-
-            leave_info = get_leave_period_for_date(user.id, target_day, db)
-
-            morning_status = None
-            if leave_info['morning_leave'] or leave_info['full_day_leave']:
-                morning_status = AttendanceStatus.LEAVE.value
-            elif att and att.morning_status:
-                morning_status = att.morning_status
-            elif att and att.checkin_time:
-                checkin_time_only = att.checkin_time.time() if att.checkin_time else None
-                if checkin_time_only and (checkin_time_only.hour < 14 or (checkin_time_only.hour == 14 and checkin_time_only.minute < 10)):
-                    morning_status = att.checkin_status or AttendanceStatus.NORMAL.value
-                else:
-                    morning_status = AttendanceStatus.ABSENT.value
-            else:
-                morning_status = AttendanceStatus.ABSENT.value
-
-            afternoon_status = None
-            if leave_info['afternoon_leave'] or leave_info['full_day_leave']:
-                afternoon_status = AttendanceStatus.LEAVE.value
-            elif att and att.afternoon_status:
-                afternoon_status = att.afternoon_status
-            elif att and att.checkout_time:
-                afternoon_status = att.checkin_status or AttendanceStatus.NORMAL.value
-            else:
-                afternoon_status = AttendanceStatus.ABSENT.value
-
-            items.append(DailyAttendanceItem(
-                date=target_day.isoformat(),
-                weekday=get_weekday_name(target_day),
-                day_type="workday",
-                morning_status=morning_status,
-                afternoon_status=afternoon_status,
-                has_overtime_punch=has_overtime_punch,
-                is_late=att.is_late if att else False,
-                is_early_leave=att.is_early_leave if att else False
-            ))
-
-        statistics_list.append(DailyAttendanceStatistics(
-            user_id=user.id,
-            user_name=user.username,
-            real_name=user.real_name,
-            department=user.department.name if user.department else None,
-            items=items
-        ))
+    statistics_list = matrix.to_statistics()
 
     return DailyAttendanceStatisticsResponse(
         start_date=start_date.isoformat(),
@@ -723,61 +674,20 @@ def export_daily_attendance_statistics(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_admin)
 ):
-    """导出每日详细统计（Excel，扁平格式，仅管理员）。"""
-    daily_data = get_daily_attendance_statistics(
-        start_date=start_date,
-        end_date=end_date,
-        department_id=department_id,
-        db=db,
-        current_user=current_user,
-    )
+    """导出每日详细统计（Excel，扁平格式，仅管理员）。
+
+    按用户分批计算每日矩阵并逐行生成，由 build_excel_stream 以 write-only 模式写入临时文件后分块下发。
+    """
+    users = _daily_statistics_users(db, current_user, department_id)
+    workdays = holiday_calendar.list_workdays(db, start_date, end_date)
 
     headers = [
         '姓名', '用户名', '部门', '日期', '星期', '日期类型',
         '上午状态', '下午状态', '是否迟到', '是否早退', '是否加班打卡'
     ]
-
-    rows = []
-    for stat in daily_data.statistics:
-        for item in stat.items:
-            if item.day_type == 'not_hired':
-                morning_text = '-'
-                afternoon_text = '-'
-                day_type_text = '未入职'
-            elif item.day_type == 'overtime_non_workday':
-                morning_text = '加班' if item.has_overtime_punch else ''
-                afternoon_text = '-'
-                day_type_text = '非工作日'
-            else:
-                morning_text = _daily_status_display(
-                    item.morning_status,
-                    item.date,
-                    'morning',
-                    bool(item.is_late),
-                    bool(item.is_early_leave),
-                )
-                afternoon_text = _daily_status_display(
-                    item.afternoon_status,
-                    item.date,
-                    'afternoon',
-                    bool(item.is_late),
-                    bool(item.is_early_leave),
-                )
-                day_type_text = '工作日'
-
-            rows.append([
-                stat.real_name or stat.user_name,
-                stat.user_name,
-                stat.department or '-',
-                item.date,
-                item.weekday,
-                day_type_text,
-                morning_text,
-                afternoon_text,
-                '是' if item.is_late else '否',
-                '是' if item.is_early_leave else '否',
-                '是' if item.has_overtime_punch else '否',
-            ])
+    rows = _iter_daily_export_rows(
+        iter_daily_matrices(db, users, start_date, end_date, workdays)
+    )
 
     filename = f"每日详细_{start_date.isoformat()}_{end_date.isoformat()}.xlsx"
     return build_excel_stream('每日详细', headers, rows, filename)
@@ -1,3 +1,5 @@
+from dataclasses import asdict
+
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
@@ -5,32 +7,17 @@ from ..database import get_db
 from ..models import SystemSetting, User
 from ..schemas import SystemSettingUpdate
 from ..security import get_current_active_admin
+from ..system_settings_cache import (  # noqa: F401  键名与默认值供其他模块从此处导入
+    ANNUAL_LEAVE_DEFAULT_START_YEAR,
+    ANNUAL_LEAVE_START_YEAR_KEY,
+    ANNUAL_LEAVE_YEARLY_RESET_KEY,
+    COMP_LEAVE_YEARLY_RESET_KEY,
+    GM_AUTO_APPROVE_KEY,
+    get_system_settings as get_cached_system_settings,
+)
 
 router = APIRouter(prefix="/system-settings", tags=["系统设置"])
 
-GM_AUTO_APPROVE_KEY = "auto_approve_gm_level"
-COMP_LEAVE_YEARLY_RESET_KEY = "comp_leave_yearly_reset"
-ANNUAL_LEAVE_YEARLY_RESET_KEY = "annual_leave_yearly_reset"
-ANNUAL_LEAVE_START_YEAR_KEY = "annual_leave_start_year"
-ANNUAL_LEAVE_DEFAULT_START_YEAR = 2025
-
-
-def _get_bool_setting(db: Session, key: str, default: bool = False) -> bool:
-    row = db.query(SystemSetting).filter(SystemSetting.key == key).first()
-    if not row:
-        return default
-    return str(row.value).strip().lower() in ["1", "true", "yes", "on"]
-
-
-def _get_int_setting(db: Session, key: str, default: int) -> int:
-    row = db.query(SystemSetting).filter(SystemSetting.key == key).first()
-    if not row:
-        return default
-    try:
-        return int(str(row.value).strip())
-    except (TypeError, ValueError):
-        return default
-
 
 def _set_int_setting(db: Session, key: str, value: int, description: str) -> None:
     row = db.query(SystemSetting).filter(SystemSetting.key == key).first()
@@ -63,12 +50,7 @@ def get_system_settings(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_admin)
 ):
-    return {
-        "auto_approve_gm_level": _get_bool_setting(db, GM_AUTO_APPROVE_KEY, False),
-        "comp_leave_yearly_reset": _get_bool_setting(db, COMP_LEAVE_YEARLY_RESET_KEY, False),
-        "annual_leave_yearly_reset": _get_bool_setting(db, ANNUAL_LEAVE_YEARLY_RESET_KEY, False),
-        "annual_leave_start_year": _get_int_setting(db, ANNUAL_LEAVE_START_YEAR_KEY, ANNUAL_LEAVE_DEFAULT_START_YEAR),
-    }
+    return asdict(get_cached_system_settings(db))
 
 
 @router.put("/")
@@ -106,25 +88,20 @@ def update_system_settings(
             "年假逐年结转的起算年份（每年自该年起发放一份基础年假）"
         )
     db.commit()
-    return {
-        "auto_approve_gm_level": _get_bool_setting(db, GM_AUTO_APPROVE_KEY, False),
-        "comp_leave_yearly_reset": _get_bool_setting(db, COMP_LEAVE_YEARLY_RESET_KEY, False),
-        "annual_leave_yearly_reset": _get_bool_setting(db, ANNUAL_LEAVE_YEARLY_RESET_KEY, False),
-        "annual_leave_start_year": _get_int_setting(db, ANNUAL_LEAVE_START_YEAR_KEY, ANNUAL_LEAVE_DEFAULT_START_YEAR),
-    }
+    return asdict(get_cached_system_settings(db))
 
 
 def is_gm_auto_approve_enabled(db: Session) -> bool:
-    return _get_bool_setting(db, GM_AUTO_APPROVE_KEY, False)
+    return get_cached_system_settings(db).auto_approve_gm_level
 
 
 def is_comp_leave_yearly_reset_enabled(db: Session) -> bool:
-    return _get_bool_setting(db, COMP_LEAVE_YEARLY_RESET_KEY, False)
+    return get_cached_system_settings(db).comp_leave_yearly_reset
 
 
 def is_annual_leave_yearly_reset_enabled(db: Session) -> bool:
-    return _get_bool_setting(db, ANNUAL_LEAVE_YEARLY_RESET_KEY, False)
+    return get_cached_system_settings(db).annual_leave_yearly_reset
 
 
 def get_annual_leave_start_year(db: Session) -> int:
-    return _get_int_setting(db, ANNUAL_LEAVE_START_YEAR_KEY, ANNUAL_LEAVE_DEFAULT_START_YEAR)
+    return get_cached_system_settings(db).annual_leave_start_year
@@ -6,10 +6,13 @@ from ..database import get_db
 from ..models import (
     AnnualLeaveAdjustment,
     Attendance,
+    AttendanceMonthlyRollup,
     AttendanceViewer,
     CompLeaveAdjustment,
     Department,
     LeaveApplication,
+    LeaveBalanceSnapshot,
+    LeaveDaySlot,
     OvertimeApplication,
     PassiveOvertimeAdjustment,
     User,
@@ -301,11 +304,14 @@ def delete_user(
     ).update({AnnualLeaveAdjustment.created_by_id: None}, synchronize_session=False)
 
     db.query(Attendance).filter(Attendance.user_id == user_id).delete(synchronize_session=False)
+    db.query(AttendanceMonthlyRollup).filter(AttendanceMonthlyRollup.user_id == user_id).delete(synchronize_session=False)
+    db.query(LeaveDaySlot).filter(LeaveDaySlot.user_id == user_id).delete(synchronize_session=False)
     db.query(LeaveApplication).filter(LeaveApplication.user_id == user_id).delete(synchronize_session=False)
     db.query(OvertimeApplication).filter(OvertimeApplication.user_id == user_id).delete(synchronize_session=False)
     db.query(CompLeaveAdjustment).filter(CompLeaveAdjustment.user_id == user_id).delete(synchronize_session=False)
     db.query(PassiveOvertimeAdjustment).filter(PassiveOvertimeAdjustment.user_id == user_id).delete(synchronize_session=False)
     db.query(AnnualLeaveAdjustment).filter(AnnualLeaveAdjustment.user_id == user_id).delete(synchronize_session=False)
+    db.query(LeaveBalanceSnapshot).filter(LeaveBalanceSnapshot.user_id == user_id).delete(synchronize_session=False)
 
     db.delete(user)
     db.commit()
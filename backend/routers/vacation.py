@@ -8,7 +8,6 @@ from datetime import date, datetime
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from ..database import get_db
@@ -17,7 +16,9 @@ from ..leave_balance import (
     COMP_LEAVE_TYPE_NAME,
     OCCUPYING_LEAVE_STATUSES,
     compute_annual_leave,
+    compute_annual_leave_bulk,
     compute_comp_leave,
+    compute_comp_leave_bulk,
     get_leave_type_by_name,
 )
 from ..models import (
@@ -31,6 +32,7 @@ from ..models import (
     PassiveOvertimeAdjustment,
     User,
 )
+from ..utils.date_ranges import day_start, next_day_start
 from ..schemas import (
     AnnualLeaveAdjustmentCreate,
     AnnualLeaveAdjustmentResponse,
@@ -157,9 +159,11 @@ def list_comp_leave(
       - 开启：按自然年隔离清零，不结转。
     """
     use_yearly_reset = is_comp_leave_yearly_reset_enabled(db)
+    users = _eligible_users(db, department_id)
+    balances = compute_comp_leave_bulk(db, users, yearly_reset=use_yearly_reset, year=year)
     result = []
-    for user in _eligible_users(db, department_id):
-        bal = compute_comp_leave(db, user, yearly_reset=use_yearly_reset, year=year)
+    for user in users:
+        bal = balances[user.id]
         result.append(VacationCompLeaveItem(
             user_id=user.id,
             user_name=user.real_name,
@@ -322,9 +326,13 @@ def list_annual_leave(
     """
     use_yearly_reset = is_annual_leave_yearly_reset_enabled(db)
     start_year = get_annual_leave_start_year(db)
+    users = _eligible_users(db, department_id)
+    balances = compute_annual_leave_bulk(
+        db, users, year=year, yearly_reset=use_yearly_reset, start_year=start_year
+    )
     result = []
-    for user in _eligible_users(db, department_id):
-        bal = compute_annual_leave(db, user, year=year, yearly_reset=use_yearly_reset, start_year=start_year)
+    for user in users:
+        bal = balances[user.id]
         result.append(VacationAnnualLeaveItem(
             user_id=user.id,
             user_name=user.real_name,
@@ -549,8 +557,8 @@ def _passive_overtime_stats(
         OvertimeApplication.user_id.in_(list(user_map.keys())),
         OvertimeApplication.overtime_type == OvertimeType.PASSIVE,
         OvertimeApplication.status == OvertimeStatus.APPROVED,
-        func.date(OvertimeApplication.start_time) >= start,
-        func.date(OvertimeApplication.start_time) <= end,
+        OvertimeApplication.start_time >= day_start(start),
+        OvertimeApplication.start_time < next_day_start(end),
     ).all()
 
     adjustment_start, adjustment_end = _datetime_range(year, month)
@@ -699,8 +707,8 @@ def list_passive_overtime_detail(
         OvertimeApplication.user_id == user_id,
         OvertimeApplication.overtime_type == OvertimeType.PASSIVE,
         OvertimeApplication.status == OvertimeStatus.APPROVED,
-        func.date(OvertimeApplication.start_time) >= start,
-        func.date(OvertimeApplication.start_time) <= end,
+        OvertimeApplication.start_time >= day_start(start),
+        OvertimeApplication.start_time < next_day_start(end),
     ).order_by(OvertimeApplication.start_time.asc()).all()
     return [
         PassiveOvertimeDetailItem(
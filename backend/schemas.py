@@ -656,6 +656,32 @@ class DailyAttendanceStatisticsResponse(BaseModel):
     start_date: str  # YYYY-MM-DD
     end_date: str  # YYYY-MM-DD
     statistics: List[DailyAttendanceStatistics]
+
+
+class DailyAttendanceColumnarUser(BaseModel):
+    """列式每日考勤：单个用户的按日编码数组（下标与 dates 对齐）"""
+    user_id: int
+    user_name: str
+    real_name: str
+    department: Optional[str] = None
+    day_type: List[int]  # 取值为 day_type_codes 的下标
+    morning_status: List[int]  # 取值为 status_codes 的下标
+    afternoon_status: List[int]  # 取值为 status_codes 的下标
+    has_overtime_punch: List[int]  # 0/1
+    is_late: List[int]  # 0/1
+    is_early_leave: List[int]  # 0/1
+
+
+class DailyAttendanceColumnarResponse(BaseModel):
+    """每日上下午考勤统计响应（列式，format=columnar）"""
+    format: str = "columnar"
+    start_date: str  # YYYY-MM-DD
+    end_date: str  # YYYY-MM-DD
+    dates: List[str]  # 日期轴 YYYY-MM-DD
+    weekdays: List[str]  # 与 dates 对齐的星期
+    day_type_codes: List[str]  # 日期类型码表
+    status_codes: List[Optional[str]]  # 上下午状态码表，0 为无状态(null)
+    users: List[DailyAttendanceColumnarUser]
 # ==================== 系统设置相关 ====================
 class SystemSettingItem(BaseModel):
     key: str
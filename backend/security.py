@@ -1,5 +1,8 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -8,10 +11,22 @@ from sqlalchemy.orm import Session
 from .config import settings
 from .database import get_db
 from .models import User
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .auth_user_cache import auth_user_cache
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    # 成本因子与配置不一致的哈希视为需要更新，登录成功时透明重算
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 security = HTTPBearer()
 
+# bcrypt 单次耗时数百毫秒，异步接口中放到专用线程池执行（bcrypt 计算期间释放 GIL）
+_password_executor: Optional[ThreadPoolExecutor] = None
+_password_executor_lock = threading.Lock()
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
@@ -29,6 +44,43 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def verify_password_and_rehash(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """验证密码；验证通过且哈希成本与当前配置不一致时，一并返回按当前配置重算的哈希"""
+    if not verify_password(plain_password, hashed_password):
+        return False, None
+    if pwd_context.needs_update(hashed_password):
+        return True, get_password_hash(plain_password)
+    return True, None
+
+
+def _get_password_executor() -> ThreadPoolExecutor:
+    global _password_executor
+    with _password_executor_lock:
+        if _password_executor is None:
+            _password_executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                thread_name_prefix="password-hash",
+            )
+        return _password_executor
+
+
+def shutdown_password_executor() -> None:
+    """关闭密码哈希线程池（应用关闭时调用，下次使用时重新创建）"""
+    global _password_executor
+    with _password_executor_lock:
+        executor, _password_executor = _password_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """在密码哈希线程池中执行 verify_password_and_rehash，不阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_password_executor(), verify_password_and_rehash, plain_password, hashed_password
+    )
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """创建访问令牌"""
     to_encode = data.copy()
@@ -70,7 +122,7 @@ async def get_current_user(
     if username is None:
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == username).first()
+    user = auth_user_cache.get_user(db, username)
     if user is None:
         raise credentials_exception
     
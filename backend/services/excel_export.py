@@ -1,30 +1,42 @@
 from datetime import datetime
-from io import BytesIO
-from typing import Any, Iterable, Sequence
+from itertools import islice
+from tempfile import SpooledTemporaryFile
+from typing import Any, Iterable, Iterator, Sequence
 from urllib.parse import quote
 
 from fastapi.responses import StreamingResponse
 from openpyxl import Workbook
-from openpyxl.worksheet.worksheet import Worksheet
 from openpyxl.utils import get_column_letter
 
 
-def _autosize_columns(ws: Worksheet, sample_rows: int = 500) -> None:
-    """Auto-size columns with a capped scan for performance."""
+# 列宽按前若干行采样估算（write-only 模式需在写入数据前设置列宽）
+AUTOSIZE_SAMPLE_ROWS = 500
+# 导出文件在内存中缓冲的上限，超过后落盘到临时文件
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def _column_widths(rows: Iterable[Sequence[Any]]) -> dict:
+    """Estimate column widths from sampled rows (capped at 40 chars)."""
     max_lengths = {}
-    row_count = 0
-    for row in ws.iter_rows(values_only=True):
-        row_count += 1
-        if row_count > sample_rows:
-            break
+    for row in rows:
         for idx, value in enumerate(row, start=1):
             text = '' if value is None else str(value)
             length = len(text)
             if length > max_lengths.get(idx, 0):
                 max_lengths[idx] = min(length, 40)
+    return {idx: max(10, length + 2) for idx, length in max_lengths.items()}
+
 
-    for idx, length in max_lengths.items():
-        ws.column_dimensions[get_column_letter(idx)].width = max(10, length + 2)
+def _iter_file_chunks(file_obj, chunk_size: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    try:
+        while True:
+            chunk = file_obj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file_obj.close()
 
 
 def build_excel_stream(
@@ -33,17 +45,26 @@ def build_excel_stream(
     rows: Iterable[Sequence[Any]],
     filename: str,
 ) -> StreamingResponse:
-    wb = Workbook()
-    ws = wb.active
-    ws.title = sheet_name
+    """Write rows with a write-only workbook into a spooled temp file and stream it.
 
-    ws.append(list(headers))
-    for row in rows:
-        ws.append(list(row))
+    rows is consumed lazily (generators are fine); only the first
+    AUTOSIZE_SAMPLE_ROWS rows are buffered to size the columns.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_name)
 
-    _autosize_columns(ws)
+    row_iter = iter(rows)
+    sampled = [list(headers)]
+    sampled.extend(list(row) for row in islice(row_iter, AUTOSIZE_SAMPLE_ROWS - 1))
+    for idx, width in _column_widths(sampled).items():
+        ws.column_dimensions[get_column_letter(idx)].width = width
+
+    for row in sampled:
+        ws.append(row)
+    for row in row_iter:
+        ws.append(list(row))
 
-    output = BytesIO()
+    output = SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
     wb.save(output)
     output.seek(0)
 
@@ -55,7 +76,7 @@ def build_excel_stream(
     )
 
     return StreamingResponse(
-        output,
+        _iter_file_chunks(output),
         media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
         headers={'Content-Disposition': content_disposition},
     )
@@ -1,17 +1,33 @@
 """
 微信订阅消息推送服务
 """
-import httpx
-import time
 import logging
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict
 from ..config import settings
+from ..http_clients import get_sync_client
+from ..wechat_token import access_token_manager
 
 logger = logging.getLogger(__name__)
 
-# 全局缓存access_token
-_access_token_cache: Optional[Dict[str, Any]] = None
+# 可重试的微信错误码：系统繁忙、access_token 失效/过期、调用频率超限
+RETRYABLE_ERRCODES = {-1, 40001, 42001, 45009}
+# access_token 失效：清除共享的 token 后重试会重新获取
+TOKEN_INVALID_ERRCODES = {40001, 42001}
+
+
+class WechatSendError(Exception):
+    """订阅消息发送失败；retryable 表示稍后重试可能成功"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def _send_failed(message: str, retryable: bool, raise_on_error: bool) -> bool:
+    if raise_on_error:
+        raise WechatSendError(message, retryable)
+    return False
 
 
 def _clip(value: Optional[str], max_len: int = 20) -> str:
@@ -24,61 +40,24 @@ def _clip(value: Optional[str], max_len: int = 20) -> str:
 
 def get_access_token() -> Optional[str]:
     """
-    获取微信access_token（带缓存机制）
+    获取微信access_token（同一主机的所有 worker 共用，过期前由后台任务提前刷新，见 wechat_token.py）
     
     Returns:
         access_token字符串，如果获取失败返回None
     """
-    global _access_token_cache
-    
-    # 检查缓存是否有效（提前5分钟刷新）
-    if _access_token_cache and _access_token_cache.get("expires_at", 0) > time.time() + 300:
-        return _access_token_cache.get("access_token")
-    
     if not settings.WECHAT_APPID or not settings.WECHAT_SECRET:
         logger.warning("微信配置未设置，无法获取access_token")
         return None
     
-    try:
-        url = "https://api.weixin.qq.com/cgi-bin/token"
-        params = {
-            "grant_type": "client_credential",
-            "appid": settings.WECHAT_APPID,
-            "secret": settings.WECHAT_SECRET
-        }
-        
-        with httpx.Client(timeout=10.0) as client:
-            response = client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            if "access_token" in data:
-                access_token = data["access_token"]
-                expires_in = data.get("expires_in", 7200)
-                
-                # 缓存token
-                _access_token_cache = {
-                    "access_token": access_token,
-                    "expires_at": time.time() + expires_in
-                }
-                
-                logger.info("成功获取微信access_token")
-                return access_token
-            else:
-                error_msg = data.get("errmsg", "未知错误")
-                logger.error(f"获取微信access_token失败: {error_msg}")
-                return None
-                
-    except Exception as e:
-        logger.error(f"获取微信access_token异常: {str(e)}")
-        return None
+    return access_token_manager.get_token(settings.WECHAT_APPID)
 
 
 def send_subscribe_message(
     openid: str,
     template_id: str,
     page: str,
-    data: Dict[str, Dict[str, str]]
+    data: Dict[str, Dict[str, str]],
+    raise_on_error: bool = False
 ) -> bool:
     """
     发送微信订阅消息
@@ -88,21 +67,22 @@ def send_subscribe_message(
         template_id: 订阅消息模板ID
         page: 点击消息跳转的页面路径
         data: 模板数据，格式: {"thing1": {"value": "xxx"}, ...}
+        raise_on_error: 为 True 时发送失败抛出 WechatSendError（供发件箱判断是否重试）
     
     Returns:
-        是否发送成功
+        是否发送成功（openid 为空、用户拒收等无需发送的情况返回 False，不抛异常）
     """
     access_token = get_access_token()
     if not access_token:
         logger.warning("无法获取access_token，跳过消息推送")
-        return False
+        return _send_failed("无法获取access_token", True, raise_on_error)
     
     if not openid:
         logger.warning("用户openid为空，跳过消息推送")
         return False
     
     try:
-        url = f"https://api.weixin.qq.com/cgi-bin/message/subscribe/send?access_token={access_token}"
+        url = f"{settings.WECHAT_API_BASE_URL}/cgi-bin/message/subscribe/send?access_token={access_token}"
         payload = {
             "touser": openid,
             "template_id": template_id,
@@ -110,27 +90,31 @@ def send_subscribe_message(
             "data": data
         }
         
-        with httpx.Client(timeout=10.0) as client:
-            response = client.post(url, json=payload)
-            response.raise_for_status()
-            result = response.json()
-            
-            errcode = result.get("errcode", 0)
-            if errcode == 0:
-                logger.info(f"成功发送订阅消息给用户 {openid[:10]}... (模板ID: {template_id[:20]}...)")
-                return True
-            else:
-                errmsg = result.get("errmsg", "未知错误")
-                # 43101表示用户拒绝接收消息，这是正常情况，不记录为错误
-                if errcode == 43101:
-                    logger.info(f"用户 {openid[:10]}... 拒绝接收订阅消息 (模板ID: {template_id[:20]}...)")
-                else:
-                    logger.warning(f"发送订阅消息失败: {errmsg} (errcode: {errcode}, 模板ID: {template_id[:20]}..., 用户: {openid[:10]}...)")
+        client = get_sync_client()
+        response = client.post(url, json=payload, timeout=10.0)
+        response.raise_for_status()
+        result = response.json()
+        
+        errcode = result.get("errcode", 0)
+        if errcode == 0:
+            logger.info(f"成功发送订阅消息给用户 {openid[:10]}... (模板ID: {template_id[:20]}...)")
+            return True
+        else:
+            errmsg = result.get("errmsg", "未知错误")
+            # 43101表示用户拒绝接收消息，这是正常情况，不记录为错误
+            if errcode == 43101:
+                logger.info(f"用户 {openid[:10]}... 拒绝接收订阅消息 (模板ID: {template_id[:20]}...)")
                 return False
-                
+            logger.warning(f"发送订阅消息失败: {errmsg} (errcode: {errcode}, 模板ID: {template_id[:20]}..., 用户: {openid[:10]}...)")
+            if errcode in TOKEN_INVALID_ERRCODES:
+                access_token_manager.invalidate(settings.WECHAT_APPID, access_token)
+            return _send_failed(f"{errmsg} (errcode: {errcode})", errcode in RETRYABLE_ERRCODES, raise_on_error)
+            
+    except WechatSendError:
+        raise
     except Exception as e:
         logger.error(f"发送订阅消息异常: {str(e)} (模板ID: {template_id[:20]}..., 用户: {openid[:10]}...)")
-        return False
+        return _send_failed(str(e), True, raise_on_error)
 
 
 def send_approval_notification(
@@ -141,7 +125,8 @@ def send_approval_notification(
     application_item: str,
     application_time: str,
     reason: str,
-    status_text: str = "待审批"
+    status_text: str = "待审批",
+    raise_on_error: bool = False
 ) -> bool:
     """
     发送审批提醒消息给审批人
@@ -155,6 +140,7 @@ def send_approval_notification(
         application_time: 申请时间
         reason: 申请原因
         status_text: 审核状态
+        raise_on_error: 为 True 时发送失败抛出 WechatSendError
     
     Returns:
         是否发送成功
@@ -189,7 +175,8 @@ def send_approval_notification(
         approver_openid,
         settings.WECHAT_APPROVAL_TEMPLATE_ID,
         page,
-        data
+        data,
+        raise_on_error=raise_on_error
     )
 
 
@@ -201,7 +188,8 @@ def send_approval_result_notification(
     application_item: str,
     approved: bool,
     approver_name: str,
-    approval_date: str
+    approval_date: str,
+    raise_on_error: bool = False
 ) -> bool:
     """
     发送审批结果通知给申请人
@@ -213,6 +201,7 @@ def send_approval_result_notification(
         approved: 是否通过
         approver_name: 审批人姓名
         approval_date: 审批日期（格式：YYYY-MM-DD 或 YYYYMMDD）
+        raise_on_error: 为 True 时发送失败抛出 WechatSendError
     
     Returns:
         是否发送成功
@@ -281,6 +270,7 @@ def send_approval_result_notification(
         applicant_openid,
         settings.WECHAT_RESULT_TEMPLATE_ID,
         page,
-        data
+        data,
+        raise_on_error=raise_on_error
     )
 
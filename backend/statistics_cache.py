@@ -0,0 +1,207 @@
+"""
+统计结果缓存
+按 (接口, 日期区间, 部门, 查看范围, 其他参数) 缓存统计接口的计算结果，供月底大量管理人员
+用相同区间重复查询时复用。
+
+失效：考勤/请假/加班/节假日等数据表各有一个变更计数，写入（含批量 update/delete）
+经 cache_invalidation 在提交后递增；缓存项记录计算前的计数快照，快照与当前计数不一致即视为过期。
+计数为进程内状态，多 worker 部署时其他进程的写入最迟在 STATISTICS_CACHE_TTL_SECONDS 后生效。
+
+并发：相同键的并发请求只有一个执行计算，其余等待并复用其结果（single-flight）。
+
+容量：除缓存项数外按估算体积限制。调用方可为结果给出体积（如每日统计为 用户数 × 显示日期数），
+未给出时按 1 计；每个引擎的总体积超过 STATISTICS_CACHE_MAX_WEIGHT 时按最近使用淘汰，
+单个结果超过上限则不缓存。
+"""
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from .cache_invalidation import watch_tables
+from .models import (
+    Attendance,
+    Department,
+    Holiday,
+    LeaveApplication,
+    LeaveType,
+    OvertimeApplication,
+    User,
+)
+
+# 兜底过期时间（秒）：多 worker 部署时，其他进程的写入最迟在该时间后生效
+STATISTICS_CACHE_TTL_SECONDS = 60
+# 每个数据库引擎最多保留的缓存项数（按最近使用淘汰）
+STATISTICS_CACHE_MAX_ENTRIES = 256
+# 每个数据库引擎缓存结果的总估算体积上限（每日统计按 用户数 × 显示日期数 计）
+STATISTICS_CACHE_MAX_WEIGHT = 200_000
+
+# 统计结果依赖的数据表：除明细外，用户/部门/请假类型影响统计范围与名称
+TRACKED_TABLES = {
+    model.__tablename__: model
+    for model in (Attendance, LeaveApplication, OvertimeApplication, Holiday, User, Department, LeaveType)
+}
+
+
+class _Flight:
+    """一次进行中的计算，供同键的并发请求等待"""
+
+    __slots__ = ("done", "result", "failed")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+class _Entries(OrderedDict):
+    """单个引擎的缓存项 {key: (versions, stored_at, result, weight)}，附带总体积"""
+
+    def __init__(self):
+        super().__init__()
+        self.weight = 0
+
+    def discard(self, key: Hashable) -> None:
+        cached = self.pop(key, None)
+        if cached is not None:
+            self.weight -= cached[3]
+
+
+class StatisticsCache:
+    """进程级统计结果缓存，按数据库引擎分别缓存"""
+
+    def __init__(
+        self,
+        ttl_seconds: int = STATISTICS_CACHE_TTL_SECONDS,
+        max_entries: int = STATISTICS_CACHE_MAX_ENTRIES,
+        max_weight: int = STATISTICS_CACHE_MAX_WEIGHT,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {name: 0 for name in TRACKED_TABLES}
+        # engine -> _Entries
+        self._entries: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        # (engine id, key) -> _Flight
+        self._flights: Dict[Tuple[int, Hashable], _Flight] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def versions(self) -> Tuple[int, ...]:
+        """当前各数据表变更计数的快照"""
+        with self._lock:
+            return tuple(self._versions[name] for name in TRACKED_TABLES)
+
+    def bump(self, table_names) -> None:
+        """数据表写入已提交：递增对应变更计数，相关缓存项随之过期"""
+        with self._lock:
+            for name in table_names:
+                if name in self._versions:
+                    self._versions[name] += 1
+
+    def invalidate(self) -> None:
+        """清空全部缓存项"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": sum(len(entries) for entries in self._entries.values()),
+                "weight": sum(entries.weight for entries in self._entries.values()),
+            }
+
+    def _lookup(self, bind, key: Hashable, versions: Tuple[int, ...], now: float) -> Tuple[bool, Any]:
+        entries = self._entries.get(bind)
+        if entries is None:
+            return False, None
+        cached = entries.get(key)
+        if cached is None:
+            return False, None
+        cached_versions, stored_at, result, _weight = cached
+        if cached_versions != versions or now - stored_at > self.ttl_seconds:
+            entries.discard(key)
+            return False, None
+        entries.move_to_end(key)
+        return True, result
+
+    def get_or_compute(
+        self,
+        db: Session,
+        key: Hashable,
+        compute: Callable[[], Any],
+        weight: Optional[Callable[[Any], int]] = None,
+    ) -> Any:
+        """命中时直接返回缓存结果，否则计算并缓存；相同键的并发计算只执行一次
+
+        weight(result) 给出结果的估算体积，未提供时按 1 计。
+        """
+        bind = db.get_bind()
+        flight_key = (id(bind), key)
+        versions = self.versions()
+        with self._lock:
+            found, result = self._lookup(bind, key, versions, time.monotonic())
+            if found:
+                self.hits += 1
+                return result
+            flight = self._flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[flight_key] = flight
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if not flight.failed:
+                return flight.result
+            # 领头请求计算失败时各自重新计算，异常由各请求自行抛出
+            return compute()
+
+        try:
+            result = compute()
+            flight.result = result
+        except BaseException:
+            flight.failed = True
+            raise
+        else:
+            result_weight = max(1, weight(result)) if weight else 1
+            with self._lock:
+                # 计算期间若有写入提交，结果可能已过期，只返回本次结果，不写回缓存
+                # 单个结果超过体积上限时不缓存，避免挤掉其余全部缓存项
+                current = tuple(self._versions[name] for name in TRACKED_TABLES)
+                if versions == current and result_weight <= self.max_weight:
+                    entries = self._entries.get(bind)
+                    if entries is None:
+                        entries = _Entries()
+                        self._entries[bind] = entries
+                    entries.discard(key)
+                    entries[key] = (versions, time.monotonic(), result, result_weight)
+                    entries.weight += result_weight
+                    while len(entries) > self.max_entries or entries.weight > self.max_weight:
+                        entries.discard(next(iter(entries)))
+            return result
+        finally:
+            with self._lock:
+                self._flights.pop(flight_key, None)
+            flight.done.set()
+
+
+statistics_cache = StatisticsCache()
+
+
+def _bump_versions(changes) -> None:
+    statistics_cache.bump({change.table for change in changes})
+
+
+watch_tables(TRACKED_TABLES.values(), _bump_versions)
@@ -0,0 +1,144 @@
+"""
+系统设置缓存
+审批、统计、假期接口每次请求会多次读取系统设置，本模块把 system_settings 整表载入为
+类型化的 SystemSettings，按数据库引擎缓存在进程内。
+
+本进程的写入经 cache_invalidation 在提交后清除缓存（会话中有未提交的写入时直接读取会话内的值）；
+其他 worker 进程的写入通过版本检查发现：距上次检查超过 SYSTEM_SETTINGS_CHECK_INTERVAL_SECONDS
+时查询一次 (行数, 最近更新时间)，与缓存时不一致才整表重载。
+"""
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .cache_invalidation import watch_tables
+from .models import SystemSetting
+
+GM_AUTO_APPROVE_KEY = "auto_approve_gm_level"
+COMP_LEAVE_YEARLY_RESET_KEY = "comp_leave_yearly_reset"
+ANNUAL_LEAVE_YEARLY_RESET_KEY = "annual_leave_yearly_reset"
+ANNUAL_LEAVE_START_YEAR_KEY = "annual_leave_start_year"
+ANNUAL_LEAVE_DEFAULT_START_YEAR = 2025
+
+# 两次版本检查的最小间隔（秒）：其他进程的写入最迟在该时间后生效
+SYSTEM_SETTINGS_CHECK_INTERVAL_SECONDS = 2.0
+
+
+@dataclass(frozen=True)
+class SystemSettings:
+    """类型化的系统设置，未配置的键取默认值"""
+
+    auto_approve_gm_level: bool = False
+    comp_leave_yearly_reset: bool = False
+    annual_leave_yearly_reset: bool = False
+    annual_leave_start_year: int = ANNUAL_LEAVE_DEFAULT_START_YEAR
+
+
+def _parse_bool(value: Optional[str], default: bool) -> bool:
+    if value is None:
+        return default
+    return str(value).strip().lower() in ["1", "true", "yes", "on"]
+
+
+def _parse_int(value: Optional[str], default: int) -> int:
+    if value is None:
+        return default
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_system_settings(values: Dict[str, str]) -> SystemSettings:
+    """把 {key: value} 原始字符串解析为 SystemSettings"""
+    return SystemSettings(
+        auto_approve_gm_level=_parse_bool(values.get(GM_AUTO_APPROVE_KEY), False),
+        comp_leave_yearly_reset=_parse_bool(values.get(COMP_LEAVE_YEARLY_RESET_KEY), False),
+        annual_leave_yearly_reset=_parse_bool(values.get(ANNUAL_LEAVE_YEARLY_RESET_KEY), False),
+        annual_leave_start_year=_parse_int(
+            values.get(ANNUAL_LEAVE_START_YEAR_KEY), ANNUAL_LEAVE_DEFAULT_START_YEAR
+        ),
+    )
+
+
+def load_system_settings(db: Session) -> SystemSettings:
+    """不经缓存，整表读取系统设置"""
+    return parse_system_settings(dict(db.query(SystemSetting.key, SystemSetting.value).all()))
+
+
+def _read_version(db: Session) -> tuple:
+    count, updated_at = db.query(func.count(SystemSetting.id), func.max(SystemSetting.updated_at)).one()
+    return count, updated_at
+
+
+class _Entry:
+    __slots__ = ("version", "settings", "checked_at")
+
+    def __init__(self, version: tuple, settings: SystemSettings, checked_at: float):
+        self.version = version
+        self.settings = settings
+        self.checked_at = checked_at
+
+
+class SystemSettingsCache:
+    """进程级系统设置缓存，按数据库引擎分别缓存"""
+
+    def __init__(self, check_interval_seconds: float = SYSTEM_SETTINGS_CHECK_INTERVAL_SECONDS):
+        self.check_interval_seconds = check_interval_seconds
+        self._lock = threading.Lock()
+        # engine -> _Entry
+        self._entries: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self.loads = 0
+        self.version_checks = 0
+
+    def get(self, db: Session) -> SystemSettings:
+        if _settings_watch.is_dirty(db):
+            return load_system_settings(db)
+
+        bind = db.get_bind()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(bind)
+        if entry is not None and now - entry.checked_at < self.check_interval_seconds:
+            return entry.settings
+
+        version = _read_version(db)
+        with self._lock:
+            self.version_checks += 1
+            if entry is not None and entry.version == version:
+                entry.checked_at = now
+                return entry.settings
+
+        settings = load_system_settings(db)
+        with self._lock:
+            self.loads += 1
+            self._entries[bind] = _Entry(version, settings, now)
+        return settings
+
+    def invalidate(self, bind=None) -> None:
+        """清除指定引擎（None 为全部）的缓存"""
+        with self._lock:
+            if bind is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(bind, None)
+
+
+system_settings_cache = SystemSettingsCache()
+
+
+def get_system_settings(db: Session) -> SystemSettings:
+    return system_settings_cache.get(db)
+
+
+def _invalidate_engines(changes) -> None:
+    for engine in {change.engine for change in changes}:
+        system_settings_cache.invalidate(engine)
+
+
+_settings_watch = watch_tables((SystemSetting,), _invalidate_engines)
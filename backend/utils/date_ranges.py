@@ -0,0 +1,11 @@
+from datetime import date, datetime, timedelta
+
+
+def day_start(value: date) -> datetime:
+    """Return 00:00 of the given day."""
+    return datetime.combine(value, datetime.min.time())
+
+
+def next_day_start(value: date) -> datetime:
+    """Return 00:00 of the following day (exclusive upper bound of a day range)."""
+    return day_start(value) + timedelta(days=1)
@@ -0,0 +1,94 @@
+"""Geohash 编码与近邻格子计算（用于按距离查找缓存的地址）。"""
+import math
+from typing import List, Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {char: index for index, char in enumerate(_BASE32)}
+
+EARTH_RADIUS_METERS = 6371000.0
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_METERS / 180
+
+# 选择搜索精度时按该纬度下最窄的格子宽度计算，保证 70° 以内 3x3 格子覆盖整个搜索半径
+MAX_SUPPORTED_LATITUDE = 70.0
+
+
+def encode(latitude: float, longitude: float, precision: int) -> str:
+    """经纬度编码为指定长度的 geohash"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, bit_count, even = 0, 0, True
+    while len(chars) < precision:
+        target, value = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (target[0] + target[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            target[0] = middle
+        else:
+            bits = bits * 2
+            target[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """指定精度的格子大小 (纬度跨度, 经度跨度)，单位为度"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def decode_center(geohash: str) -> Tuple[float, float]:
+    """geohash 格子中心点的经纬度"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = _DECODE[char]
+        for shift in range(4, -1, -1):
+            target = lon_range if even else lat_range
+            middle = (target[0] + target[1]) / 2
+            if bits >> shift & 1:
+                target[0] = middle
+            else:
+                target[1] = middle
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def neighbors(geohash: str) -> List[str]:
+    """格子本身及其周围 8 个格子（去重，极点附近可能少于 9 个）"""
+    lat_step, lon_step = cell_size(len(geohash))
+    center_lat, center_lon = decode_center(geohash)
+    cells = []
+    for lat_offset in (-1, 0, 1):
+        latitude = center_lat + lat_offset * lat_step
+        if not -90 <= latitude <= 90:
+            continue
+        for lon_offset in (-1, 0, 1):
+            longitude = (center_lon + lon_offset * lon_step + 180) % 360 - 180
+            cell = encode(latitude, longitude, len(geohash))
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def search_precision(radius_meters: float, max_precision: int = 9) -> int:
+    """能用 3x3 格子覆盖 radius_meters 半径的最大精度"""
+    min_cos = math.cos(math.radians(MAX_SUPPORTED_LATITUDE))
+    for precision in range(max_precision, 0, -1):
+        lat_step, lon_step = cell_size(precision)
+        if min(lat_step, lon_step * min_cos) * METERS_PER_DEGREE >= radius_meters:
+            return precision
+    return 1
+
+
+def distance_meters(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """两点间的球面距离（haversine），单位米"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
@@ -0,0 +1,138 @@
+"""请假时段判定规则（上午/下午/全天），不依赖数据库模型，供模型事件与查询共用。"""
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+MORNING = "morning"
+AFTERNOON = "afternoon"
+
+# (start_date, end_date, days)
+LeaveSpan = Tuple[datetime, datetime, float]
+
+
+def empty_leave_period() -> Dict[str, bool]:
+    return {
+        'has_leave': False,
+        'morning_leave': False,
+        'afternoon_leave': False,
+        'full_day_leave': False
+    }
+
+
+def resolve_leave_period(leaves: Iterable[LeaveSpan], target_date: date) -> Dict[str, bool]:
+    """
+    根据与目标日期有交集的请假记录判定当天请假时段
+
+    Args:
+        leaves: 与目标日期有交集的请假 (start_date, end_date, days)
+        target_date: 目标日期
+
+    Returns:
+        {'has_leave', 'morning_leave', 'afternoon_leave', 'full_day_leave'}
+    """
+    result = empty_leave_period()
+
+    for start_date, end_date, days in leaves:
+        result['has_leave'] = True
+        start_date_only = start_date.date() if isinstance(start_date, datetime) else start_date
+        end_date_only = end_date.date() if isinstance(end_date, datetime) else end_date
+        start_time = start_date.time() if isinstance(start_date, datetime) else datetime.min.time()
+        end_time = end_date.time() if isinstance(end_date, datetime) else datetime.max.time()
+
+        # 判断规则1: 起始时间为9点且时长为0.5天的 → 上午请假
+        if (start_time.hour == 9 and start_time.minute == 0 and
+                days == 0.5 and start_date_only == target_date):
+            result['morning_leave'] = True
+            continue
+
+        # 判断规则2: 起始时间为14点的，请假起始的当天记录为 下午请假
+        if (start_time.hour == 14 and start_time.minute == 0 and
+                start_date_only == target_date):
+            result['afternoon_leave'] = True
+            continue
+
+        # 判断规则3: 假期时长大于等于一天的且请假结束时间为12点的，假期结束当天上午记录为请假
+        if (days >= 1.0 and end_time.hour == 12 and end_time.minute == 0 and
+                end_date_only == target_date):
+            result['morning_leave'] = True
+            continue
+
+        # 如果请假跨天，且目标日期在中间，则全天请假
+        if start_date_only < target_date < end_date_only:
+            result['full_day_leave'] = True
+            result['morning_leave'] = True
+            result['afternoon_leave'] = True
+            continue
+
+        # 如果请假开始日期和结束日期都是目标日期
+        if start_date_only == target_date == end_date_only:
+            # 根据开始和结束时间判断
+            if start_time.hour < 12:  # 上午开始
+                if end_time.hour < 14:  # 上午结束
+                    result['morning_leave'] = True
+                else:  # 下午或全天结束
+                    result['full_day_leave'] = True
+                    result['morning_leave'] = True
+                    result['afternoon_leave'] = True
+            elif start_time.hour >= 14:  # 下午开始
+                result['afternoon_leave'] = True
+            else:  # 中午开始
+                result['afternoon_leave'] = True
+        elif start_date_only == target_date:
+            # 请假开始日期是目标日期（跨天请假的第一天）
+            if start_time.hour < 12:
+                # 从上午开始请假，且跨天，则当天全天请假
+                result['morning_leave'] = True
+                result['afternoon_leave'] = True
+                result['full_day_leave'] = True
+            else:
+                # 从下午开始请假
+                result['afternoon_leave'] = True
+        elif end_date_only == target_date:
+            # 请假结束日期是目标日期（跨天请假的最后一天）
+            if end_time.hour >= 14:
+                # 请假到下午结束，则当天全天请假
+                result['morning_leave'] = True
+                result['afternoon_leave'] = True
+                result['full_day_leave'] = True
+            else:
+                # 请假到上午结束（12点前）
+                result['morning_leave'] = True
+
+    # 如果上午和下午都请假，则全天请假
+    if result['morning_leave'] and result['afternoon_leave']:
+        result['full_day_leave'] = True
+
+    return result
+
+
+def leave_day_halves(start_date: datetime, end_date: datetime, days: float) -> List[Tuple[date, str]]:
+    """
+    展开单条请假占用的 (日期, 半天) 列表，逐日套用 resolve_leave_period 的规则
+
+    多条请假的占用取并集即与 resolve_leave_period 对全部请假的判定一致。
+    """
+    start_day = start_date.date() if isinstance(start_date, datetime) else start_date
+    end_day = end_date.date() if isinstance(end_date, datetime) else end_date
+    halves = []
+    current = start_day
+    while current <= end_day:
+        period = resolve_leave_period([(start_date, end_date, days)], current)
+        if period['morning_leave']:
+            halves.append((current, MORNING))
+        if period['afternoon_leave']:
+            halves.append((current, AFTERNOON))
+        current += timedelta(days=1)
+    return halves
+
+
+def period_from_halves(halves: Iterable[str]) -> Dict[str, bool]:
+    """由当天已占用的半天集合还原 get_leave_period_for_date 结构"""
+    result = empty_leave_period()
+    for half in halves:
+        result['has_leave'] = True
+        if half == MORNING:
+            result['morning_leave'] = True
+        elif half == AFTERNOON:
+            result['afternoon_leave'] = True
+    result['full_day_leave'] = result['morning_leave'] and result['afternoon_leave']
+    return result
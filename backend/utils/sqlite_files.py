@@ -0,0 +1,14 @@
+"""进程间共享的 SQLite 数据文件（地理编码缓存、access_token 等）的打开方式。"""
+import os
+import sqlite3
+
+
+def connect_shared(path: str) -> sqlite3.Connection:
+    """打开（必要时创建目录和文件）供多个 worker 进程共享的 SQLite 文件：WAL + synchronous=NORMAL，自动提交"""
+    directory = os.path.dirname(os.path.abspath(path))
+    # 数据目录只允许运行服务的用户访问（其中可能保存接口凭证）
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
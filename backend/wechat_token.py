@@ -0,0 +1,298 @@
+"""
+微信 access_token 管理
+access_token 每天的获取次数有限，且重新获取后旧 token 只再保留 5 分钟有效期。
+因此同一主机上的所有 worker 进程共用一个 token，不再各自获取：
+
+- 存储：SQLite 文件（WECHAT_TOKEN_STORE_PATH）中的一行保存当前 token 及过期时间，所有 worker 读取同一份；
+  为空时只保存在进程内存中（单进程部署）；
+- 单次刷新：进程内用锁保证只有一个线程刷新，其余线程等待后复用结果；跨进程通过刷新租约
+  （lease_until）保证同一时刻只有一个 worker 调用微信接口，其他 worker 等待其写入新 token；
+  释放租约时只清除本 worker 写入的租约，刷新超时后被其他 worker 接手的租约不受影响；
+- 提前刷新：后台任务在 token 剩余有效期不足 WECHAT_TOKEN_REFRESH_AHEAD_SECONDS 时主动刷新，
+  请求线程通常只需读取，不会在发送消息时同步等待微信接口；
+- 失效：微信返回 token 失效时按值清除（只清除仍是该值的 token），不会误删其他 worker 刚刷新的新 token。
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from .config import settings
+from .http_clients import get_sync_client
+from .utils.sqlite_files import connect_shared
+
+logger = logging.getLogger(__name__)
+
+# 请求线程读取时，剩余有效期不足该值即同步刷新（后台提前刷新失败时的兜底）
+FOREGROUND_REFRESH_MARGIN_SECONDS = 300
+# 等待其他进程刷新时的轮询间隔
+LEASE_POLL_SECONDS = 0.1
+# 后台刷新失败后的重试间隔
+REFRESH_RETRY_SECONDS = 30.0
+
+
+class MemoryTokenSlot:
+    """进程内 token 存储"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # appid -> (access_token, 过期时间戳)
+        self._tokens: Dict[str, Tuple[str, float]] = {}
+
+    def load(self, appid: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            return self._tokens.get(appid)
+
+    def store(self, appid: str, access_token: str, expires_at: float) -> None:
+        with self._lock:
+            self._tokens[appid] = (access_token, expires_at)
+
+    def clear(self, appid: str, access_token: str) -> None:
+        with self._lock:
+            if self._tokens.get(appid, (None,))[0] == access_token:
+                del self._tokens[appid]
+
+    def try_lease(self, appid: str, now: float, lease_seconds: float) -> bool:
+        # 单进程内已由 AccessTokenManager 的锁保证只有一个线程刷新
+        return True
+
+    def release_lease(self, appid: str) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteTokenSlot:
+    """基于 SQLite 文件的 token 存储，供同一主机上的多个 worker 进程共享"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # appid -> 本 worker 持有的租约到期时间（即写入的 lease_until）
+        self._leases: Dict[str, float] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        # 首次使用时再打开，保证每个 worker 进程（fork 之后）各自持有连接
+        if self._conn is None:
+            conn = connect_shared(self.path)
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS wechat_access_token (
+                    appid TEXT PRIMARY KEY,
+                    access_token TEXT,
+                    expires_at REAL NOT NULL DEFAULT 0,
+                    lease_until REAL NOT NULL DEFAULT 0
+                )
+                """
+            )
+            try:
+                # 文件中保存的是接口凭证，仅允许运行服务的用户读写
+                os.chmod(self.path, 0o600)
+            except OSError:
+                pass
+            self._conn = conn
+        return self._conn
+
+    def load(self, appid: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT access_token, expires_at FROM wechat_access_token WHERE appid = ? AND access_token IS NOT NULL",
+                (appid,),
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def store(self, appid: str, access_token: str, expires_at: float) -> None:
+        with self._lock:
+            self._connection().execute(
+                """
+                INSERT INTO wechat_access_token (appid, access_token, expires_at, lease_until) VALUES (?, ?, ?, 0)
+                ON CONFLICT (appid) DO UPDATE SET
+                    access_token = excluded.access_token,
+                    expires_at = excluded.expires_at
+                """,
+                (appid, access_token, expires_at),
+            )
+
+    def clear(self, appid: str, access_token: str) -> None:
+        with self._lock:
+            self._connection().execute(
+                "UPDATE wechat_access_token SET access_token = NULL, expires_at = 0 WHERE appid = ? AND access_token = ?",
+                (appid, access_token),
+            )
+
+    def try_lease(self, appid: str, now: float, lease_seconds: float) -> bool:
+        """获取刷新租约：没有其他进程持有未过期的租约时成功"""
+        lease_until = now + lease_seconds
+        with self._lock:
+            row = self._connection().execute(
+                """
+                INSERT INTO wechat_access_token (appid, lease_until) VALUES (?, ?)
+                ON CONFLICT (appid) DO UPDATE SET lease_until = excluded.lease_until
+                WHERE wechat_access_token.lease_until <= ?
+                RETURNING appid
+                """,
+                (appid, lease_until, now),
+            ).fetchone()
+            if row is not None:
+                self._leases[appid] = lease_until
+        return row is not None
+
+    def release_lease(self, appid: str) -> None:
+        """释放本 worker 的租约；租约已过期并被其他 worker 接手时不做修改"""
+        with self._lock:
+            lease_until = self._leases.pop(appid, None)
+            if lease_until is None:
+                return
+            self._connection().execute(
+                "UPDATE wechat_access_token SET lease_until = 0 WHERE appid = ? AND lease_until = ?",
+                (appid, lease_until),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def fetch_access_token() -> Optional[Tuple[str, float]]:
+    """向微信请求新的 access_token，返回 (access_token, 有效秒数)"""
+    try:
+        url = f"{settings.WECHAT_API_BASE_URL}/cgi-bin/token"
+        params = {
+            "grant_type": "client_credential",
+            "appid": settings.WECHAT_APPID,
+            "secret": settings.WECHAT_SECRET
+        }
+
+        client = get_sync_client()
+        response = client.get(url, params=params, timeout=10.0)
+        response.raise_for_status()
+        data = response.json()
+
+        if "access_token" in data:
+            logger.info("成功获取微信access_token")
+            return data["access_token"], data.get("expires_in", 7200)
+        logger.error(f"获取微信access_token失败: {data.get('errmsg', '未知错误')}")
+        return None
+
+    except Exception as e:
+        logger.error(f"获取微信access_token异常: {str(e)}")
+        return None
+
+
+class AccessTokenManager:
+    """access_token 的读取、单次刷新与后台提前刷新"""
+
+    def __init__(
+        self,
+        slot,
+        refresh_ahead_seconds: float,
+        lease_seconds: float,
+        fetcher: Callable[[], Optional[Tuple[str, float]]] = fetch_access_token,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.slot = slot
+        self.refresh_ahead_seconds = refresh_ahead_seconds
+        self.lease_seconds = lease_seconds
+        self.fetcher = fetcher
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.fetches = 0
+
+    def get_token(self, appid: str) -> Optional[str]:
+        """返回可用的 token；即将过期或不存在时刷新（同一时刻只有一个线程/进程调用微信接口）"""
+        cached = self.slot.load(appid)
+        if cached and cached[1] - self._clock() > FOREGROUND_REFRESH_MARGIN_SECONDS:
+            return cached[0]
+        with self._lock:
+            return self._refresh(appid, FOREGROUND_REFRESH_MARGIN_SECONDS)
+
+    def invalidate(self, appid: str, access_token: str) -> None:
+        """微信返回 token 失效时调用；只清除仍是该值的 token"""
+        self.slot.clear(appid, access_token)
+
+    def _refresh(self, appid: str, min_remaining: float) -> Optional[str]:
+        # 调用方需持有 self._lock
+        deadline = self._clock() + self.lease_seconds
+        while True:
+            cached = self.slot.load(appid)
+            now = self._clock()
+            # 等锁或等租约期间其他线程/进程可能已经刷新
+            if cached and cached[1] - now > min_remaining:
+                return cached[0]
+            if self.slot.try_lease(appid, now, self.lease_seconds):
+                try:
+                    # 取得租约前其他进程可能刚写入新 token
+                    cached = self.slot.load(appid)
+                    if cached and cached[1] - now > min_remaining:
+                        return cached[0]
+                    self.fetches += 1
+                    result = self.fetcher()
+                    if result is None:
+                        # 刷新失败时旧 token 只要尚未过期仍可继续使用
+                        return cached[0] if cached and cached[1] > now else None
+                    access_token, expires_in = result
+                    self.slot.store(appid, access_token, now + expires_in)
+                    return access_token
+                finally:
+                    self.slot.release_lease(appid)
+            if now >= deadline:
+                return cached[0] if cached and cached[1] > now else None
+            self._sleep(LEASE_POLL_SECONDS)
+
+    def refresh_ahead(self, appid: str) -> float:
+        """剩余有效期不足 refresh_ahead_seconds 时刷新，返回距下次需要检查的秒数"""
+        try:
+            with self._lock:
+                self._refresh(appid, self.refresh_ahead_seconds)
+        except Exception as e:
+            logger.error(f"后台刷新微信access_token异常: {str(e)}")
+        cached = self.slot.load(appid)
+        if not cached:
+            return REFRESH_RETRY_SECONDS
+        return max(REFRESH_RETRY_SECONDS, cached[1] - self.refresh_ahead_seconds - self._clock())
+
+    async def _run(self, appid: str) -> None:
+        while True:
+            delay = await run_in_threadpool(self.refresh_ahead, appid)
+            await asyncio.sleep(delay)
+
+    async def start(self, appid: str) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(appid))
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def close(self) -> None:
+        self.slot.close()
+
+
+def create_token_slot(path: Optional[str]):
+    if path:
+        return SQLiteTokenSlot(path)
+    return MemoryTokenSlot()
+
+
+access_token_manager = AccessTokenManager(
+    create_token_slot(settings.WECHAT_TOKEN_STORE_PATH),
+    refresh_ahead_seconds=settings.WECHAT_TOKEN_REFRESH_AHEAD_SECONDS,
+    lease_seconds=settings.WECHAT_TOKEN_REFRESH_LEASE_SECONDS,
+)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：全员年假额度（结转模式）
+对比逐人 compute_annual_leave 与批量 compute_annual_leave_bulk
+（1000 / 5000 用户 × 10 年结转，内存 SQLite，含分档/期初调整/年假请假数据）
+
+用法: python scripts/benchmarks/bench_annual_leave.py [--repeat 1] [--years 10]
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from sqlalchemy import create_engine, event, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from backend.database import Base  # noqa: E402
+from backend.leave_balance import (  # noqa: E402
+    ANNUAL_LEAVE_TYPE_NAME,
+    compute_annual_leave,
+    compute_annual_leave_bulk,
+)
+from backend.models import (  # noqa: E402
+    AnnualLeaveAdjustment,
+    AnnualLeaveBase,
+    LeaveApplication,
+    LeaveType,
+    User,
+)
+
+
+def build_session(user_count: int, year: int, horizon: int, seed: int = 7):
+    """建内存库并用 Core 批量写入样本数据（绕过模型事件，只为造数）"""
+    rng = random.Random(seed)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    first_year = year - horizon + 1
+
+    with engine.begin() as conn:
+        conn.execute(insert(LeaveType.__table__), [{"id": 1, "name": ANNUAL_LEAVE_TYPE_NAME, "is_active": True}])
+        conn.execute(insert(User.__table__), [
+            {
+                "id": user_id,
+                "username": f"user{user_id}",
+                "password_hash": "x",
+                "real_name": f"员工{user_id}",
+                "role": "EMPLOYEE",
+                "is_active": True,
+                "annual_leave_days": rng.choice([5.0, 10.0, 15.0]),
+            }
+            for user_id in range(1, user_count + 1)
+        ])
+        tiers, adjustments, leaves = [], [], []
+        for user_id in range(1, user_count + 1):
+            for effective_year in rng.sample(range(first_year, year + 1), rng.randint(0, 2)):
+                tiers.append({"user_id": user_id, "effective_year": effective_year, "days": rng.choice([12.0, 15.0])})
+            adjustments.append({
+                "user_id": user_id,
+                "days": rng.choice([1.0, 3.0, 5.0]),
+                "effective_date": datetime(first_year - 1, 12, 31),
+                "reason": "期初",
+            })
+            for leave_year in range(first_year, year + 1):
+                for index in range(rng.randint(1, 4)):
+                    start = datetime(leave_year, rng.randint(1, 12), rng.randint(1, 28), 9, 0)
+                    leaves.append({
+                        "user_id": user_id,
+                        "start_date": start,
+                        "end_date": start.replace(hour=17),
+                        "days": rng.choice([0.5, 1.0, 2.0]),
+                        "reason": f"年假{leave_year}-{index}",
+                        "status": "approved",
+                        "leave_type_id": 1,
+                    })
+        conn.execute(insert(AnnualLeaveBase.__table__), tiers)
+        conn.execute(insert(AnnualLeaveAdjustment.__table__), adjustments)
+        conn.execute(insert(LeaveApplication.__table__), leaves)
+
+    session = sessionmaker(bind=engine)()
+    return engine, session, len(leaves)
+
+
+def timed(repeat: int, engine, func):
+    """返回 (最优耗时 ms, SQL 语句数, 结果)"""
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    best = None
+    result = None
+    for _ in range(repeat):
+        statements.clear()
+        event.listen(engine, "before_cursor_execute", count_statement)
+        started = time.perf_counter()
+        try:
+            result = func()
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, len(statements), result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="年假额度批量计算基准测试")
+    parser.add_argument("--repeat", type=int, default=1, help="每个规模重复次数（取最优）")
+    parser.add_argument("--years", type=int, default=10, help="结转年数")
+    args = parser.parse_args()
+
+    year = 2026
+    start_year = year - args.years + 1
+    print('=' * 92)
+    print(f"{'用户数':<8}{'请假记录':>10}{'逐人(ms)':>12}{'逐人SQL':>10}{'批量(ms)':>12}{'批量SQL':>10}{'加速比':>10}")
+    print('-' * 92)
+    for user_count in (1000, 5000):
+        engine, session, leave_count = build_session(user_count, year, args.years)
+        users = session.query(User).order_by(User.id).all()
+
+        legacy_ms, legacy_sql, legacy = timed(args.repeat, engine, lambda: {
+            user.id: compute_annual_leave(session, user, year=year, start_year=start_year)
+            for user in users
+        })
+        bulk_ms, bulk_sql, bulk = timed(
+            args.repeat, engine, lambda: compute_annual_leave_bulk(session, users, year=year, start_year=start_year)
+        )
+        session.close()
+        engine.dispose()
+        if bulk != legacy:
+            print(f"❌ {user_count} 用户结果不一致")
+            return 1
+        print(
+            f"{user_count:<8}{leave_count:>10}{legacy_ms:>12.1f}{legacy_sql:>10}"
+            f"{bulk_ms:>12.1f}{bulk_sql:>10}{legacy_ms / bulk_ms:>9.1f}x"
+        )
+    print('=' * 92)
+    print(f"注：{start_year}-{year} 逐年结转，结果逐人比对一致")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
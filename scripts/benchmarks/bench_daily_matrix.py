@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：每日上下午考勤统计
+对比原逐格循环（每格构造 DailyAttendanceItem）与矩阵计算 + 序列化展开
+（500 / 2000 / 5000 用户 × 90 天）
+
+用法: python scripts/benchmarks/bench_daily_matrix.py [--repeat 3]
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.attendance_matrix import build_daily_matrix  # noqa: E402
+from backend.leave_periods import LeavePeriodIndex  # noqa: E402
+from backend.models import AttendanceStatus  # noqa: E402
+from backend.schemas import DailyAttendanceItem, DailyAttendanceStatistics  # noqa: E402
+from backend.utils.attendance_utils import is_on_or_after_hire_date  # noqa: E402
+
+WEEKDAY_NAMES = ["一", "二", "三", "四", "五", "六", "日"]
+
+
+class SampleUser:
+    def __init__(self, user_id, hire_date):
+        self.id = user_id
+        self.username = f"user{user_id}"
+        self.real_name = f"员工{user_id}"
+        self.department = None
+        self.hire_date = hire_date
+
+
+def build_sample(user_count: int, day_count: int, seed: int = 7):
+    rng = random.Random(seed)
+    start = date(2026, 1, 1)
+    dates = [start + timedelta(days=offset) for offset in range(day_count)]
+    overtime_dates = {d for d in dates if d.weekday() == 5 and d.day <= 7}
+    users = [
+        SampleUser(i, datetime.combine(start + timedelta(days=rng.randint(0, 60)), datetime.min.time())
+                   if rng.random() < 0.05 else None)
+        for i in range(1, user_count + 1)
+    ]
+    rows = []
+    halves = {}
+    for user in users:
+        for d in dates:
+            roll = rng.random()
+            if roll < 0.85:
+                checkin = datetime.combine(d, datetime.min.time()) + timedelta(minutes=rng.randint(480, 600))
+                checkout = checkin + timedelta(hours=9) if rng.random() < 0.95 else None
+                status = AttendanceStatus.OVERTIME_PUNCH.value if d in overtime_dates else AttendanceStatus.NORMAL.value
+                rows.append((user.id, datetime.combine(d, datetime.min.time()), checkin, checkout,
+                             None, None, status, checkin.minute > 30, False))
+            elif roll < 0.92:
+                halves[(user.id, d)] = rng.choice([{"morning"}, {"afternoon"}, {"morning", "afternoon"}])
+    return users, dates, overtime_dates, rows, LeavePeriodIndex(halves)
+
+
+def legacy_daily_statistics(users, display_dates, non_workday_dates, rows, leave_index):
+    """原 get_daily_attendance_statistics 的逐格循环（数据已预取）"""
+    attendance_dict = {(row[0], row[1].date()): row for row in rows}
+    statistics_list = []
+    for user in users:
+        items = []
+        for target_day in display_dates:
+            if not is_on_or_after_hire_date(user.hire_date, target_day):
+                items.append(DailyAttendanceItem(
+                    date=target_day.isoformat(), weekday=WEEKDAY_NAMES[target_day.weekday()],
+                    day_type="not_hired", morning_status=None, afternoon_status=None,
+                    has_overtime_punch=False, is_late=False, is_early_leave=False,
+                ))
+                continue
+            att = attendance_dict.get((user.id, target_day))
+            has_overtime_punch = bool(att and att[6] == AttendanceStatus.OVERTIME_PUNCH.value)
+            if target_day in non_workday_dates:
+                items.append(DailyAttendanceItem(
+                    date=target_day.isoformat(), weekday=WEEKDAY_NAMES[target_day.weekday()],
+                    day_type="overtime_non_workday", morning_status=None, afternoon_status=None,
+                    has_overtime_punch=has_overtime_punch, is_late=False, is_early_leave=False,
+                ))
+                continue
+            leave_info = leave_index.get(user.id, target_day)
+            if leave_info['morning_leave']:
+                morning_status = AttendanceStatus.LEAVE.value
+            elif att and att[4]:
+                morning_status = att[4]
+            elif att and att[2] and (att[2].hour < 14 or (att[2].hour == 14 and att[2].minute < 10)):
+                morning_status = att[6] or AttendanceStatus.NORMAL.value
+            else:
+                morning_status = AttendanceStatus.ABSENT.value
+            if leave_info['afternoon_leave']:
+                afternoon_status = AttendanceStatus.LEAVE.value
+            elif att and att[5]:
+                afternoon_status = att[5]
+            elif att and att[3]:
+                afternoon_status = att[6] or AttendanceStatus.NORMAL.value
+            else:
+                afternoon_status = AttendanceStatus.ABSENT.value
+            items.append(DailyAttendanceItem(
+                date=target_day.isoformat(), weekday=WEEKDAY_NAMES[target_day.weekday()],
+                day_type="workday", morning_status=morning_status, afternoon_status=afternoon_status,
+                has_overtime_punch=has_overtime_punch,
+                is_late=bool(att[7]) if att else False, is_early_leave=bool(att[8]) if att else False,
+            ))
+        statistics_list.append(DailyAttendanceStatistics(
+            user_id=user.id, user_name=user.username, real_name=user.real_name, department=None, items=items,
+        ))
+    return statistics_list
+
+
+def best_of(repeat: int, func):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="每日考勤矩阵基准测试")
+    parser.add_argument("--repeat", type=int, default=3, help="每个规模重复次数（取最优）")
+    parser.add_argument("--days", type=int, default=90, help="展示日期数")
+    args = parser.parse_args()
+
+    print('=' * 84)
+    print(f"{'用户数':<8}{'单元格':>10}{'逐格循环(ms)':>16}{'矩阵计算(ms)':>16}{'矩阵+展开(ms)':>18}{'加速比':>10}")
+    print('-' * 84)
+    for user_count in (500, 2000, 5000):
+        users, dates, overtime_dates, rows, leave_index = build_sample(user_count, args.days)
+
+        legacy_ms, legacy = best_of(
+            args.repeat, lambda: legacy_daily_statistics(users, dates, overtime_dates, rows, leave_index)
+        )
+        build_ms, matrix = best_of(
+            args.repeat, lambda: build_daily_matrix(users, dates, overtime_dates, rows, leave_index)
+        )
+        total_ms, expanded = best_of(
+            args.repeat,
+            lambda: build_daily_matrix(users, dates, overtime_dates, rows, leave_index).to_statistics(),
+        )
+        if [s.model_dump() for s in expanded[:50]] != [s.model_dump() for s in legacy[:50]]:
+            print(f"❌ {user_count} 用户结果不一致")
+            return 1
+        print(
+            f"{user_count:<8}{user_count * len(dates):>10}{legacy_ms:>16.1f}{build_ms:>16.1f}"
+            f"{total_ms:>18.1f}{legacy_ms / total_ms:>9.1f}x"
+        )
+    print('=' * 84)
+    print('注：数据均已预取，仅比较计算与对象构造耗时；加速比按 矩阵+展开 计算')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：逆地理编码缓存命中率
+模拟若干办公室，员工在各自办公室周围 0~30 米内随机位置打卡，按打卡顺序查询缓存，未命中时视为调用一次高德地图API并写入缓存。
+对比旧的精确键（四舍五入到小数点后4位）与按半径近邻查找的命中率、API 调用次数和单次查询耗时。
+
+用法: python scripts/benchmarks/bench_geocode_proximity.py [--offices 20] [--checkins 5000] [--radius 50]
+"""
+import argparse
+import math
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.geocode_cache import GeocodeCache  # noqa: E402
+from backend.utils.geohash import METERS_PER_DEGREE  # noqa: E402
+
+SPREAD_METERS = 30.0
+
+
+def build_checkins(office_count: int, checkin_count: int, seed: int = 7):
+    rng = random.Random(seed)
+    offices = [(rng.uniform(22.0, 40.0), rng.uniform(104.0, 122.0)) for _ in range(office_count)]
+    points = []
+    for _ in range(checkin_count):
+        latitude, longitude = rng.choice(offices)
+        distance = rng.uniform(0, SPREAD_METERS)
+        bearing = rng.uniform(0, 2 * math.pi)
+        points.append((
+            latitude + distance * math.cos(bearing) / METERS_PER_DEGREE,
+            longitude + distance * math.sin(bearing) / (METERS_PER_DEGREE * math.cos(math.radians(latitude))),
+        ))
+    return points
+
+
+def run(points, radius: float, directory: str) -> dict:
+    cache = GeocodeCache(
+        str(Path(directory) / f"geocode_{radius:g}.db"),
+        max_entries=100000,
+        memory_entries=1024,
+        ttl_seconds=30 * 24 * 3600,
+        sweep_interval_seconds=3600,
+        radius_meters=radius,
+    )
+    api_calls = 0
+    started = time.perf_counter()
+    for latitude, longitude in points:
+        if cache.get(latitude, longitude) is None:
+            api_calls += 1
+            cache.set(latitude, longitude, f"{latitude:.6f}, {longitude:.6f}")
+    elapsed = time.perf_counter() - started
+    stats = cache.stats()
+    cache.close()
+    return {"api_calls": api_calls, "hit_rate": stats["hit_rate"], "per_lookup_us": elapsed / len(points) * 1e6}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="逆地理编码缓存命中率基准测试")
+    parser.add_argument("--offices", type=int, default=20, help="办公室数量")
+    parser.add_argument("--checkins", type=int, default=5000, help="打卡次数")
+    parser.add_argument("--radius", type=float, default=50.0, help="近邻查找半径（米）")
+    args = parser.parse_args()
+
+    points = build_checkins(args.offices, args.checkins)
+    with tempfile.TemporaryDirectory() as directory:
+        rows = [("精确键", run(points, 0.0, directory)), (f"近邻 {args.radius:g} 米", run(points, args.radius, directory))]
+
+    print('=' * 70)
+    print(f"办公室 {args.offices} 个，打卡 {args.checkins} 次（办公室周围 {SPREAD_METERS:g} 米内）")
+    print('-' * 70)
+    print(f"{'模式':<14}{'命中率':>12}{'API调用次数':>16}{'单次查询(us)':>18}")
+    for label, row in rows:
+        print(f"{label:<14}{row['hit_rate']:>12.2%}{row['api_calls']:>16}{row['per_lookup_us']:>18.1f}")
+    print('=' * 70)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：登录高峰期间的签到延迟
+同一事件循环内并发发起一批登录（bcrypt），同时按固定间隔发起签到请求，统计签到延迟 p50/p99。
+对比两种模式：
+- 阻塞（旧实现）：登录接口在事件循环上直接查询数据库并执行 bcrypt 校验；
+- 线程池（现实现）：数据库访问进线程池，bcrypt 进专用的密码哈希线程池。
+
+用法: python scripts/benchmarks/bench_login_burst.py [--logins 20] [--checkins 40] [--interval-ms 10]
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from backend import security  # noqa: E402
+from backend.database import Base, get_db  # noqa: E402
+from backend.main import app  # noqa: E402
+from backend.models import User  # noqa: E402
+from backend.routers import auth  # noqa: E402
+
+PASSWORD = "Password123"
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def build_database(path: str, login_count: int, checkin_count: int):
+    # 连接池按并发请求数放大：get_current_user 在事件循环上查询，池耗尽时会卡住整个循环，
+    # 本基准只比较 bcrypt/数据库访问是否阻塞事件循环，不测连接池排队
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+        pool_size=login_count + checkin_count + 5,
+        max_overflow=0,
+    )
+    Base.metadata.create_all(bind=engine)
+    password_hash = security.get_password_hash(PASSWORD)
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {
+                "username": f"{prefix}{index}",
+                "password_hash": password_hash,
+                "real_name": f"{prefix}{index}",
+                "role": "EMPLOYEE",
+                "is_active": True,
+            }
+            for prefix, count in (("login", login_count), ("checkin", checkin_count))
+            for index in range(count)
+        ])
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+async def _blocking_verify(plain_password, hashed_password):
+    return security.verify_password_and_rehash(plain_password, hashed_password)
+
+
+async def _inline(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+async def run_burst(login_count: int, checkin_count: int, interval: float):
+    """返回 (签到延迟列表 ms, 登录总耗时 s)"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def login(index: int):
+            response = await client.post("/api/auth/login", json={"username": f"login{index}", "password": PASSWORD})
+            assert response.status_code == 200, response.text
+
+        async def checkin(index: int, delay: float):
+            await asyncio.sleep(delay)
+            token = security.create_access_token(data={"sub": f"checkin{index}"})
+            started = time.perf_counter()
+            response = await client.post(
+                "/api/attendance/checkin",
+                json={"location": "0,0", "is_overtime_punch": True, "checkin_status": "normal"},
+                headers={"Authorization": f"Bearer {token}"},
+            )
+            elapsed = (time.perf_counter() - started) * 1000
+            assert response.status_code == 200, response.text
+            return elapsed
+
+        started = time.perf_counter()
+        logins = asyncio.gather(*(login(index) for index in range(login_count)))
+        checkins = asyncio.gather(*(checkin(index, index * interval) for index in range(checkin_count)))
+        await logins
+        login_seconds = time.perf_counter() - started
+        latencies = await checkins
+    return latencies, login_seconds
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure(label: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        engine, session_factory = build_database(
+            str(Path(directory) / "bench.db"), args.logins, args.checkins
+        )
+
+        def override_get_db():
+            db = session_factory()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        try:
+            latencies, login_seconds = asyncio.run(
+                run_burst(args.logins, args.checkins, args.interval_ms / 1000)
+            )
+        finally:
+            app.dependency_overrides.clear()
+            engine.dispose()
+    return {
+        "label": label,
+        "p50": statistics.median(latencies),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies),
+        "logins": login_seconds,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="登录高峰期间签到延迟基准测试")
+    parser.add_argument("--logins", type=int, default=20, help="并发登录数")
+    parser.add_argument("--checkins", type=int, default=40, help="签到请求数（每人一次）")
+    parser.add_argument("--interval-ms", type=float, default=10.0, help="签到请求间隔（毫秒）")
+    args = parser.parse_args()
+
+    results = []
+    # 旧实现：在事件循环上直接执行数据库访问与 bcrypt
+    original_verify, original_threadpool = auth.verify_password_async, auth.run_in_threadpool
+    auth.verify_password_async, auth.run_in_threadpool = _blocking_verify, _inline
+    try:
+        results.append(measure("阻塞（旧）", args))
+    finally:
+        auth.verify_password_async, auth.run_in_threadpool = original_verify, original_threadpool
+    results.append(measure("线程池（新）", args))
+    security.shutdown_password_executor()
+
+    print('=' * 78)
+    print(f"bcrypt 成本 {security.settings.BCRYPT_ROUNDS}，并发登录 {args.logins}，"
+          f"签到 {args.checkins} 次（间隔 {args.interval_ms:g} ms）")
+    print('-' * 78)
+    print(f"{'模式':<14}{'签到p50(ms)':>14}{'签到p99(ms)':>14}{'签到max(ms)':>14}{'登录总耗时(s)':>16}")
+    for row in results:
+        print(f"{row['label']:<14}{row['p50']:>14.1f}{row['p99']:>14.1f}{row['max']:>14.1f}{row['logins']:>16.2f}")
+    print('=' * 78)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
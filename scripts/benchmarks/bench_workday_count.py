@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：工作日天数统计
+对比原逐日 while 循环与 numpy busdaycalendar 实现（1 / 12 / 60 个月区间）
+
+用法: python scripts/benchmarks/bench_workday_count.py [--repeat 200]
+"""
+import argparse
+import sys
+import timeit
+from datetime import date, timedelta
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.holiday_calendar import (  # noqa: E402
+    build_busday_calendar,
+    count_workdays_between,
+    list_workdays_between,
+)
+
+
+def legacy_count_workdays(start_date: date, end_date: date, holidays_dict: dict) -> int:
+    """原 calculate_workdays 的逐日循环实现（节假日字典已预取）"""
+    workdays = 0
+    current_date = start_date
+    while current_date <= end_date:
+        date_str = current_date.isoformat()
+        if date_str in holidays_dict:
+            if holidays_dict[date_str] == 'workday':
+                workdays += 1
+        else:
+            if current_date.weekday() < 5:
+                workdays += 1
+        current_date += timedelta(days=1)
+    return workdays
+
+
+def build_sample_overrides(start_year: int, years: int) -> dict:
+    """每年生成一组典型的节假日/调休配置：春节、国庆各 7 天 + 2 个周末调休上班"""
+    overrides = {}
+    for year in range(start_year, start_year + years):
+        for offset in range(7):
+            overrides[date(year, 2, 10) + timedelta(days=offset)] = "holiday"
+            overrides[date(year, 10, 1) + timedelta(days=offset)] = "holiday"
+        overrides[date(year, 2, 8)] = "workday"
+        overrides[date(year, 10, 11)] = "workday"
+        overrides[date(year, 12, 31)] = "company_holiday"
+    return overrides
+
+
+def add_months(start: date, months: int) -> date:
+    month_index = start.month - 1 + months
+    return date(start.year + month_index // 12, month_index % 12 + 1, 1) - timedelta(days=1)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="工作日统计基准测试")
+    parser.add_argument("--repeat", type=int, default=200, help="每个区间重复次数")
+    args = parser.parse_args()
+
+    start = date(2024, 1, 1)
+    overrides = build_sample_overrides(start.year, 6)
+    holidays_dict = {d.isoformat(): t for d, t in overrides.items()}
+
+    calendar = build_busday_calendar(overrides)
+
+    print('=' * 80)
+    print(f"{'区间':<10}{'天数':>8}{'while 循环(ms)':>18}{'busday(ms)':>14}{'预构建(ms)':>14}{'加速比':>10}")
+    print('-' * 80)
+    for months in (1, 12, 60):
+        end = add_months(start, months)
+        expected = legacy_count_workdays(start, end, holidays_dict)
+        actual = count_workdays_between(start, end, overrides)
+        if expected != actual or len(list_workdays_between(start, end, overrides)) != expected:
+            print(f"❌ {months} 个月区间结果不一致: loop={expected}, busday={actual}")
+            return 1
+
+        loop_ms = timeit.timeit(
+            lambda: legacy_count_workdays(start, end, holidays_dict), number=args.repeat
+        ) / args.repeat * 1000
+        busday_ms = timeit.timeit(
+            lambda: count_workdays_between(start, end, overrides), number=args.repeat
+        ) / args.repeat * 1000
+        prebuilt_ms = timeit.timeit(
+            lambda: count_workdays_between(start, end, overrides, calendar), number=args.repeat
+        ) / args.repeat * 1000
+        days = (end - start).days + 1
+        print(
+            f"{str(months) + '个月':<10}{days:>8}{loop_ms:>18.4f}{busday_ms:>14.4f}"
+            f"{prebuilt_ms:>14.4f}{loop_ms / prebuilt_ms:>9.1f}x"
+        )
+    print('=' * 80)
+    print('注：busday 列含构建日历耗时；预构建列复用 build_busday_calendar 结果，加速比按预构建计算')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
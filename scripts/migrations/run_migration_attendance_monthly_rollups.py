@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：月度考勤汇总表
+- 创建 attendance_monthly_rollups 表（幂等）
+- 按现有考勤/请假/加班明细重算月度汇总并记录回填完成（可重复执行；服务启动时 init_db 也会自动回填）
+跨平台脚本，支持 Windows 和 Linux 系统
+"""
+import os
+import sys
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from sqlalchemy import create_engine  # noqa: E402
+
+from backend.attendance_rollups import backfill_monthly_rollups  # noqa: E402
+from backend.derived_tables import mark_backfilled  # noqa: E402
+from backend.models import AttendanceMonthlyRollup  # noqa: E402
+
+# Windows 控制台默认 GBK 编码，确保 emoji/中文正常输出，避免 UnicodeEncodeError
+try:
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+except Exception:
+    pass
+
+
+def backup_database(db_path: str):
+    """备份数据库"""
+    if not os.path.exists(db_path):
+        print(f"❌ 数据库文件不存在: {db_path}")
+        return None
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    backup_path = f"{db_path}.backup.{timestamp}"
+
+    try:
+        import shutil
+        shutil.copy2(db_path, backup_path)
+        print(f"✅ 数据库已备份到: {backup_path}")
+        return backup_path
+    except Exception as exc:
+        print(f"⚠️  备份失败: {exc}")
+        return None
+
+
+def collect_month_keys(cursor: sqlite3.Cursor):
+    """收集明细中出现过的 (用户, 年, 月)"""
+    cursor.execute(
+        """
+        SELECT user_id, CAST(strftime('%Y', date) AS INTEGER), CAST(strftime('%m', date) AS INTEGER)
+        FROM attendances
+        UNION
+        SELECT user_id, CAST(strftime('%Y', start_date) AS INTEGER), CAST(strftime('%m', start_date) AS INTEGER)
+        FROM leave_applications
+        UNION
+        SELECT user_id, CAST(strftime('%Y', start_time) AS INTEGER), CAST(strftime('%m', start_time) AS INTEGER)
+        FROM overtime_applications
+        """
+    )
+    return {row for row in cursor.fetchall() if None not in row}
+
+
+def backfill_rollups(db_path: str) -> None:
+    """清空并按明细重算全部月度汇总（与模型事件使用同一重算逻辑），并记录回填完成"""
+    engine = create_engine(f"sqlite:///{db_path}")
+    try:
+        with engine.begin() as connection:
+            backfill_monthly_rollups(connection)
+            mark_backfilled(connection, AttendanceMonthlyRollup.__tablename__)
+    finally:
+        engine.dispose()
+
+
+def run_migration() -> bool:
+    """执行数据库迁移"""
+    db_path = str(PROJECT_ROOT / 'attendance.db')
+    migration_path = str(PROJECT_ROOT / 'backend' / 'migrations' / 'add_attendance_monthly_rollups.sql')
+
+    if not os.path.exists(db_path):
+        print(f"❌ 数据库文件不存在: {db_path}")
+        print(f"   当前工作目录: {os.getcwd()}")
+        return False
+
+    if not os.path.exists(migration_path):
+        print(f"❌ 迁移脚本不存在: {migration_path}")
+        print(f"   当前工作目录: {os.getcwd()}")
+        return False
+
+    print('📦 正在备份数据库...')
+    backup_path = backup_database(db_path)
+
+    conn = None
+    try:
+        print('🔌 正在连接数据库...')
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+
+        print('📖 正在读取迁移脚本...')
+        with open(migration_path, 'r', encoding='utf-8') as file:
+            migration_sql = file.read()
+        print('⚙️  正在执行迁移...')
+        cursor.executescript(migration_sql)
+        conn.commit()
+
+        print('⚙️  正在回填月度汇总...')
+        keys = collect_month_keys(cursor)
+        conn.close()
+        conn = None
+        backfill_rollups(db_path)
+
+        # 验证
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM attendance_monthly_rollups")
+        rollup_count = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(DISTINCT user_id) FROM attendance_monthly_rollups")
+        user_count = cursor.fetchone()[0]
+
+        print('\n📊 验证结果:')
+        print(f"   月度汇总记录数: {rollup_count}")
+        print(f"   涉及员工数: {user_count}")
+
+        if rollup_count != len(keys):
+            print('❌ 回填记录数不一致')
+            return False
+
+        print('\n✅ 迁移完成！')
+        if backup_path:
+            print(f"💾 备份文件: {backup_path}")
+        return True
+
+    except sqlite3.OperationalError as exc:
+        if conn:
+            conn.rollback()
+        print(f"❌ 数据库操作失败: {exc}")
+        if backup_path:
+            print(f"💾 可以从备份恢复: {backup_path}")
+        return False
+    except Exception as exc:
+        if conn:
+            conn.rollback()
+        print(f"❌ 迁移执行失败: {exc}")
+        import traceback
+        traceback.print_exc()
+        if backup_path:
+            print(f"💾 可以从备份恢复: {backup_path}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == '__main__':
+    print('=' * 72)
+    print('数据库迁移：月度考勤汇总表（attendance_monthly_rollups）')
+    print('跨平台脚本 - 支持 Windows 和 Linux')
+    print('=' * 72)
+    print()
+
+    success = run_migration()
+
+    print()
+    if success:
+        print('✅ 迁移成功完成！')
+        print('   现在可启动后端服务: python run.py')
+        sys.exit(0)
+
+    print('❌ 迁移失败，请检查错误信息')
+    sys.exit(1)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：假期余额年末快照表
+- 创建 leave_balance_snapshots 表（幂等）
+- 按现有请假/加班/调整明细重算截至上一年年末的快照（可重复执行）
+跨平台脚本，支持 Windows 和 Linux 系统
+"""
+import os
+import sys
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from sqlalchemy import create_engine, delete  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from backend.leave_balance_snapshots import rebuild_leave_balance_snapshots  # noqa: E402
+from backend.models import LeaveBalanceSnapshot  # noqa: E402
+
+# Windows 控制台默认 GBK 编码，确保 emoji/中文正常输出，避免 UnicodeEncodeError
+try:
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+except Exception:
+    pass
+
+
+def backup_database(db_path: str):
+    """备份数据库"""
+    if not os.path.exists(db_path):
+        print(f"❌ 数据库文件不存在: {db_path}")
+        return None
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    backup_path = f"{db_path}.backup.{timestamp}"
+
+    try:
+        import shutil
+        shutil.copy2(db_path, backup_path)
+        print(f"✅ 数据库已备份到: {backup_path}")
+        return backup_path
+    except Exception as exc:
+        print(f"⚠️  备份失败: {exc}")
+        return None
+
+
+def backfill_snapshots(db_path: str) -> int:
+    """清空并按明细重算全部快照（与模型事件使用同一重算逻辑），返回写入行数"""
+    engine = create_engine(f"sqlite:///{db_path}")
+    try:
+        with Session(engine) as session:
+            session.execute(delete(LeaveBalanceSnapshot.__table__))
+            written = rebuild_leave_balance_snapshots(session)
+            session.commit()
+            return written
+    finally:
+        engine.dispose()
+
+
+def run_migration() -> bool:
+    """执行数据库迁移"""
+    db_path = str(PROJECT_ROOT / 'attendance.db')
+    migration_path = str(PROJECT_ROOT / 'backend' / 'migrations' / 'add_leave_balance_snapshots.sql')
+
+    if not os.path.exists(db_path):
+        print(f"❌ 数据库文件不存在: {db_path}")
+        print(f"   当前工作目录: {os.getcwd()}")
+        return False
+
+    if not os.path.exists(migration_path):
+        print(f"❌ 迁移脚本不存在: {migration_path}")
+        print(f"   当前工作目录: {os.getcwd()}")
+        return False
+
+    print('📦 正在备份数据库...')
+    backup_path = backup_database(db_path)
+
+    conn = None
+    try:
+        print('🔌 正在连接数据库...')
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+
+        print('📖 正在读取迁移脚本...')
+        with open(migration_path, 'r', encoding='utf-8') as file:
+            migration_sql = file.read()
+        print('⚙️  正在执行迁移...')
+        cursor.executescript(migration_sql)
+        conn.commit()
+        conn.close()
+        conn = None
+
+        print('⚙️  正在回填年末快照...')
+        written = backfill_snapshots(db_path)
+
+        # 验证
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT balance_type, COUNT(*), COUNT(DISTINCT user_id) FROM leave_balance_snapshots GROUP BY balance_type")
+        rows = cursor.fetchall()
+
+        print('\n📊 验证结果:')
+        for balance_type, snapshot_count, user_count in rows:
+            print(f"   {balance_type}: 快照 {snapshot_count} 条，涉及员工 {user_count} 人")
+
+        if sum(row[1] for row in rows) != written:
+            print('❌ 回填记录数不一致')
+            return False
+
+        print('\n✅ 迁移完成！')
+        if backup_path:
+            print(f"💾 备份文件: {backup_path}")
+        return True
+
+    except sqlite3.OperationalError as exc:
+        if conn:
+            conn.rollback()
+        print(f"❌ 数据库操作失败: {exc}")
+        if backup_path:
+            print(f"💾 可以从备份恢复: {backup_path}")
+        return False
+    except Exception as exc:
+        if conn:
+            conn.rollback()
+        print(f"❌ 迁移执行失败: {exc}")
+        import traceback
+        traceback.print_exc()
+        if backup_path:
+            print(f"💾 可以从备份恢复: {backup_path}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == '__main__':
+    print('=' * 72)
+    print('数据库迁移：假期余额年末快照表（leave_balance_snapshots）')
+    print('跨平台脚本 - 支持 Windows 和 Linux')
+    print('=' * 72)
+    print()
+
+    success = run_migration()
+
+    print()
+    if success:
+        print('✅ 迁移成功完成！')
+        print('   现在可启动后端服务: python run.py')
+        sys.exit(0)
+
+    print('❌ 迁移失败，请检查错误信息')
+    sys.exit(1)
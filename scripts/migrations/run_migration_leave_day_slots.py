@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：请假半天占用表
+- 创建 leave_day_slots 表及 (user_id, date) 索引（幂等）
+- 按现有请假申请重建半天占用数据并记录回填完成（可重复执行；服务启动时 init_db 也会自动回填）
+跨平台脚本，支持 Windows 和 Linux 系统
+"""
+import os
+import sys
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from sqlalchemy import create_engine  # noqa: E402
+
+from backend.derived_tables import mark_backfilled  # noqa: E402
+from backend.models import LeaveDaySlot, backfill_leave_day_slots  # noqa: E402
+
+# Windows 控制台默认 GBK 编码，确保 emoji/中文正常输出，避免 UnicodeEncodeError
+try:
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+except Exception:
+    pass
+
+
+def backup_database(db_path: str):
+    """备份数据库"""
+    if not os.path.exists(db_path):
+        print(f"❌ 数据库文件不存在: {db_path}")
+        return None
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    backup_path = f"{db_path}.backup.{timestamp}"
+
+    try:
+        import shutil
+        shutil.copy2(db_path, backup_path)
+        print(f"✅ 数据库已备份到: {backup_path}")
+        return backup_path
+    except Exception as exc:
+        print(f"⚠️  备份失败: {exc}")
+        return None
+
+
+def backfill_slots(db_path: str) -> int:
+    """清空并按请假申请重建半天占用（与模型事件使用同一展开逻辑），并记录回填完成"""
+    engine = create_engine(f"sqlite:///{db_path}")
+    try:
+        with engine.begin() as connection:
+            inserted = backfill_leave_day_slots(connection)
+            mark_backfilled(connection, LeaveDaySlot.__tablename__)
+        return inserted
+    finally:
+        engine.dispose()
+
+
+def run_migration() -> bool:
+    """执行数据库迁移"""
+    db_path = str(PROJECT_ROOT / 'attendance.db')
+    migration_path = str(PROJECT_ROOT / 'backend' / 'migrations' / 'add_leave_day_slots.sql')
+
+    if not os.path.exists(db_path):
+        print(f"❌ 数据库文件不存在: {db_path}")
+        print(f"   当前工作目录: {os.getcwd()}")
+        return False
+
+    if not os.path.exists(migration_path):
+        print(f"❌ 迁移脚本不存在: {migration_path}")
+        print(f"   当前工作目录: {os.getcwd()}")
+        return False
+
+    print('📦 正在备份数据库...')
+    backup_path = backup_database(db_path)
+
+    conn = None
+    try:
+        print('🔌 正在连接数据库...')
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+
+        print('📖 正在读取迁移脚本...')
+        with open(migration_path, 'r', encoding='utf-8') as file:
+            migration_sql = file.read()
+        print('⚙️  正在执行迁移...')
+        cursor.executescript(migration_sql)
+        conn.commit()
+
+        print('⚙️  正在回填请假半天占用...')
+        conn.close()
+        conn = None
+        inserted = backfill_slots(db_path)
+
+        # 验证
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM leave_day_slots")
+        slot_count = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(DISTINCT leave_id) FROM leave_day_slots")
+        leave_count = cursor.fetchone()[0]
+
+        print('\n📊 验证结果:')
+        print(f"   半天占用记录数: {slot_count}")
+        print(f"   涉及请假申请数: {leave_count}")
+
+        if slot_count != inserted:
+            print('❌ 回填记录数不一致')
+            return False
+
+        print('\n✅ 迁移完成！')
+        if backup_path:
+            print(f"💾 备份文件: {backup_path}")
+        return True
+
+    except sqlite3.OperationalError as exc:
+        if conn:
+            conn.rollback()
+        print(f"❌ 数据库操作失败: {exc}")
+        if backup_path:
+            print(f"💾 可以从备份恢复: {backup_path}")
+        return False
+    except Exception as exc:
+        if conn:
+            conn.rollback()
+        print(f"❌ 迁移执行失败: {exc}")
+        import traceback
+        traceback.print_exc()
+        if backup_path:
+            print(f"💾 可以从备份恢复: {backup_path}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == '__main__':
+    print('=' * 72)
+    print('数据库迁移：请假半天占用表（leave_day_slots）')
+    print('跨平台脚本 - 支持 Windows 和 Linux')
+    print('=' * 72)
+    print()
+
+    success = run_migration()
+
+    print()
+    if success:
+        print('✅ 迁移成功完成！')
+        print('   现在可启动后端服务: python run.py')
+        sys.exit(0)
+
+    print('❌ 迁移失败，请检查错误信息')
+    sys.exit(1)
@@ -9,6 +9,7 @@ from sqlalchemy.pool import StaticPool
 from fastapi.testclient import TestClient
 
 from backend.database import Base, get_db
+from backend.derived_tables import backfill_derived_tables
 from backend.main import app
 from backend.config import settings
 
@@ -30,8 +31,9 @@ def test_db():
         poolclass=StaticPool,
     )
     
-    # 创建表
+    # 创建表（与 init_db 一致，新库的派生表回填后即可直接读取）
     Base.metadata.create_all(bind=engine)
+    backfill_derived_tables(engine)
     
     # 创建会话
     TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
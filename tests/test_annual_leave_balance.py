@@ -0,0 +1,92 @@
+"""年假额度批量计算回归测试。"""
+
+import random
+from datetime import datetime
+
+from sqlalchemy import event
+
+from backend.leave_balance import compute_annual_leave, compute_annual_leave_bulk
+from backend.models import (
+    AnnualLeaveAdjustment,
+    AnnualLeaveBase,
+    LeaveApplication,
+    LeaveStatus,
+    LeaveType,
+    User,
+    UserRole,
+)
+
+
+def test_bulk_annual_leave_matches_per_user_computation(test_db):
+    """批量计算与逐人计算结果一致（结转/清零、分档、起始年前的期初），且查询次数与人数无关。"""
+    rng = random.Random(11)
+    annual_type = LeaveType(name="年假调休", is_active=True)
+    other_type = LeaveType(name="病假", is_active=True)
+    users = [
+        User(
+            username=f"bulk_annual_user_{index}",
+            password_hash="x",
+            real_name=f"批量年假{index}",
+            role=UserRole.EMPLOYEE,
+            is_active=True,
+            annual_leave_days=rng.choice([None, 5.0, 10.0, 15.0]),
+        )
+        for index in range(15)
+    ]
+    test_db.add_all([annual_type, other_type, *users])
+    test_db.flush()
+
+    statuses = [LeaveStatus.APPROVED, LeaveStatus.PENDING, LeaveStatus.REJECTED, LeaveStatus.CANCELLED]
+    # 最后两人没有任何记录，验证默认基础年假
+    for user in users[:-2]:
+        for effective_year in rng.sample(range(2018, 2028), rng.randint(0, 3)):
+            test_db.add(AnnualLeaveBase(user_id=user.id, effective_year=effective_year, days=rng.choice([5.0, 12.0, 20.0])))
+        for index in range(rng.randint(0, 4)):
+            test_db.add(AnnualLeaveAdjustment(
+                user_id=user.id,
+                days=rng.choice([-2.0, 1.5, 4.0]),
+                effective_date=datetime(rng.randint(2016, 2027), rng.randint(1, 12), 1),
+                reason="调整",
+            ))
+        for index in range(rng.randint(0, 8)):
+            start = datetime(rng.randint(2016, 2027), rng.randint(1, 12), rng.randint(1, 28), 9, 0)
+            test_db.add(LeaveApplication(
+                user_id=user.id,
+                start_date=start,
+                end_date=start.replace(hour=17),
+                days=rng.choice([0.5, 1.0, 3.0, 8.0]),
+                reason=f"{user.username}请假{index}",
+                status=rng.choice(statuses),
+                leave_type_id=rng.choice([annual_type.id, annual_type.id, other_type.id]),
+            ))
+    test_db.commit()
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = test_db.get_bind()
+    for yearly_reset, year, start_year in [
+        (False, 2026, 2018),
+        (False, 2026, 2025),
+        (False, 2020, 2025),
+        (False, 2027, 2016),
+        (True, 2026, 2018),
+        (True, 2019, 2025),
+    ]:
+        expected = {
+            user.id: compute_annual_leave(test_db, user, year=year, yearly_reset=yearly_reset, start_year=start_year)
+            for user in users
+        }
+        statements.clear()
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            actual = compute_annual_leave_bulk(
+                test_db, users, year=year, yearly_reset=yearly_reset, start_year=start_year
+            )
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+        assert actual == expected, (yearly_reset, year, start_year)
+        # 快照 + 请假类型 + 分档/调整/已用各一次
+        assert len(statements) <= 5
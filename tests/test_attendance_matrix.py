@@ -0,0 +1,142 @@
+"""每日考勤矩阵计算测试。"""
+
+from datetime import date, datetime
+
+from backend.attendance_matrix import build_daily_matrix
+from backend.leave_periods import LeavePeriodIndex
+from backend.models import Attendance, AttendanceStatus, LeaveApplication, LeaveStatus, LeaveType, User, UserRole
+from backend.security import create_access_token, get_password_hash
+
+
+class StubUser:
+    def __init__(self, user_id, hire_date=None):
+        self.id = user_id
+        self.username = f"user{user_id}"
+        self.real_name = f"员工{user_id}"
+        self.department = None
+        self.hire_date = hire_date
+
+
+def test_build_daily_matrix_applies_cell_rules():
+    users = [StubUser(1), StubUser(2, hire_date=datetime(2026, 7, 2))]
+    dates = [date(2026, 7, 1), date(2026, 7, 2), date(2026, 7, 4)]
+    rows = [
+        (1, datetime(2026, 7, 1), datetime(2026, 7, 1, 8, 50), None, None, None, "city_business", True, False),
+        (1, datetime(2026, 7, 2), datetime(2026, 7, 2, 14, 30), datetime(2026, 7, 2, 18, 0), None, None, None, False, True),
+        (1, datetime(2026, 7, 4), datetime(2026, 7, 4, 9, 0), None, None, None,
+         AttendanceStatus.OVERTIME_PUNCH.value, False, False),
+        (2, datetime(2026, 7, 1), datetime(2026, 7, 1, 9, 0), None, None, None, None, True, False),
+    ]
+    leave_index = LeavePeriodIndex({(2, date(2026, 7, 2)): {"afternoon"}})
+
+    matrix = build_daily_matrix(users, dates, {date(2026, 7, 4)}, rows, leave_index)
+    assert matrix.shape == (2, 3)
+
+    first, second = [stat.items for stat in matrix.to_statistics()]
+    assert [item.day_type for item in first] == ["workday", "workday", "overtime_non_workday"]
+    assert (first[0].morning_status, first[0].afternoon_status) == ("city_business", "absent")
+    assert first[0].is_late is True
+    # 14:10 之后签到：上午缺勤，下午按签到状态（默认正常）
+    assert (first[1].morning_status, first[1].afternoon_status) == ("absent", "normal")
+    assert first[1].is_early_leave is True
+    assert first[2].has_overtime_punch is True
+    assert first[2].morning_status is None
+
+    assert second[0].day_type == "not_hired"
+    assert second[0].is_late is False
+    assert (second[1].morning_status, second[1].afternoon_status) == ("absent", "leave")
+    assert second[1].weekday == "四"
+
+
+def test_daily_statistics_endpoint_uses_matrix(client, test_db):
+    admin = User(
+        username="matrix_admin",
+        password_hash=get_password_hash("Password123"),
+        real_name="管理员",
+        role=UserRole.ADMIN,
+        is_active=True,
+        enable_attendance=False,
+    )
+    employee = User(
+        username="matrix_user",
+        password_hash=get_password_hash("Password123"),
+        real_name="员工",
+        role=UserRole.EMPLOYEE,
+        is_active=True,
+        enable_attendance=True,
+    )
+    leave_type = LeaveType(name="事假", is_active=True)
+    test_db.add_all([admin, employee, leave_type])
+    test_db.commit()
+    test_db.add_all([
+        Attendance(
+            user_id=employee.id,
+            date=datetime(2026, 7, 1),
+            checkin_time=datetime(2026, 7, 1, 8, 55),
+            checkout_time=datetime(2026, 7, 1, 18, 0),
+        ),
+        Attendance(
+            user_id=employee.id,
+            date=datetime(2026, 7, 4),
+            checkin_time=datetime(2026, 7, 4, 9, 0),
+            checkin_status=AttendanceStatus.OVERTIME_PUNCH.value,
+        ),
+        LeaveApplication(
+            user_id=employee.id,
+            start_date=datetime(2026, 7, 2, 9, 0),
+            end_date=datetime(2026, 7, 2, 12, 0),
+            days=0.5,
+            reason="事假",
+            status=LeaveStatus.APPROVED.value,
+            leave_type_id=leave_type.id,
+        ),
+    ])
+    test_db.commit()
+
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': admin.username})}"}
+    response = client.get(
+        "/api/statistics/attendance/daily?start_date=2026-07-01&end_date=2026-07-05",
+        headers=headers,
+    )
+    assert response.status_code == 200
+    statistics = response.json()["statistics"]
+    assert [stat["user_name"] for stat in statistics] == ["matrix_user"]
+    items = {item["date"]: item for item in statistics[0]["items"]}
+    assert sorted(items) == ["2026-07-01", "2026-07-02", "2026-07-03", "2026-07-04"]
+    assert (items["2026-07-01"]["morning_status"], items["2026-07-01"]["afternoon_status"]) == ("normal", "normal")
+    assert (items["2026-07-02"]["morning_status"], items["2026-07-02"]["afternoon_status"]) == ("leave", "absent")
+    assert items["2026-07-04"]["day_type"] == "overtime_non_workday"
+    assert items["2026-07-04"]["has_overtime_punch"] is True
+
+    columnar = client.get(
+        "/api/statistics/attendance/daily?start_date=2026-07-01&end_date=2026-07-05&format=columnar",
+        headers=headers,
+    )
+    assert columnar.status_code == 200
+    payload = columnar.json()
+    assert payload["format"] == "columnar"
+    assert payload["dates"] == sorted(items)
+    assert payload["weekdays"] == [items[d]["weekday"] for d in payload["dates"]]
+
+    # 按码表解码后应与默认嵌套格式逐格一致
+    user = payload["users"][0]
+    decoded = [
+        {
+            "date": day,
+            "weekday": payload["weekdays"][index],
+            "day_type": payload["day_type_codes"][user["day_type"][index]],
+            "morning_status": payload["status_codes"][user["morning_status"][index]],
+            "afternoon_status": payload["status_codes"][user["afternoon_status"][index]],
+            "has_overtime_punch": bool(user["has_overtime_punch"][index]),
+            "is_late": bool(user["is_late"][index]),
+            "is_early_leave": bool(user["is_early_leave"][index]),
+        }
+        for index, day in enumerate(payload["dates"])
+    ]
+    assert decoded == statistics[0]["items"]
+
+    invalid = client.get(
+        "/api/statistics/attendance/daily?start_date=2026-07-01&end_date=2026-07-05&format=csv",
+        headers=headers,
+    )
+    assert invalid.status_code == 400
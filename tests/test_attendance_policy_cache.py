@@ -0,0 +1,146 @@
+"""打卡策略编译与缓存测试。"""
+
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from backend import attendance_policy_cache as policy_cache_module
+from backend.attendance_policy_cache import attendance_policy_cache, compile_policy, get_active_policy
+from backend.models import AttendancePolicy, User, UserRole
+from backend.security import create_access_token, get_password_hash
+
+WEEKLY_RULES = json.dumps({
+    "4": {"work_end_time": "17:00", "checkout_start_time": "16:30", "early_threshold_minutes": 15},
+    "5": {"work_start_time": "10:00", "late_threshold_minutes": 30},
+})
+
+
+def _policy(**overrides) -> AttendancePolicy:
+    values = dict(
+        name="默认策略",
+        work_start_time="09:00",
+        work_end_time="17:30",
+        checkin_start_time="07:00",
+        checkin_end_time="11:30",
+        checkout_start_time="17:00",
+        checkout_end_time="23:00",
+        late_threshold_minutes=5,
+        early_threshold_minutes=0,
+        weekly_rules=WEEKLY_RULES,
+        is_active=True,
+    )
+    values.update(overrides)
+    return AttendancePolicy(**values)
+
+
+def _reference_rules(policy, check_date):
+    rules = {
+        name: getattr(policy, name)
+        for name in (
+            "work_start_time", "work_end_time", "checkin_start_time", "checkin_end_time",
+            "checkout_start_time", "checkout_end_time", "late_threshold_minutes", "early_threshold_minutes",
+        )
+    }
+    rules.update(json.loads(policy.weekly_rules).get(str(check_date.weekday()), {}))
+    return rules
+
+
+def test_compiled_policy_matches_per_call_parsing():
+    policy = _policy(id=1)
+    compiled = compile_policy(policy)
+    monday = datetime(2026, 3, 2)
+    for day_offset in range(7):
+        day = monday + timedelta(days=day_offset)
+        rules = _reference_rules(policy, day)
+        assert compiled.for_date(day).raw == rules
+        work_start = datetime.strptime(rules["work_start_time"], "%H:%M")
+        work_end = datetime.strptime(rules["work_end_time"], "%H:%M")
+        late_after = (work_start + timedelta(minutes=rules["late_threshold_minutes"])).time()
+        early_before = (work_end - timedelta(minutes=rules["early_threshold_minutes"])).time()
+        for minute in range(0, 24 * 60, 7):
+            moment = day + timedelta(minutes=minute, seconds=30)
+            assert compiled.is_late(moment) == (moment.time() > late_after)
+            assert compiled.is_early_leave(moment) == (moment.time() < early_before)
+
+    broken = compile_policy(_policy(id=2, weekly_rules=json.dumps({"2": {"work_start_time": "9点"}})))
+    assert broken.is_late(monday.replace(hour=10))
+    try:
+        broken.is_late(monday + timedelta(days=2))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("无效规则应在用到当天时报错")
+
+
+def test_active_policy_compiled_once_and_rebuilt_on_policy_changes(client, test_db, monkeypatch):
+    admin = User(
+        username="policy_admin",
+        password_hash=get_password_hash("Password123"),
+        real_name="策略管理员",
+        role=UserRole.ADMIN,
+        is_active=True,
+    )
+    test_db.add_all([admin, _policy()])
+    test_db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': admin.username})}"}
+
+    first = get_active_policy(test_db)
+    assert first.for_date(datetime(2026, 3, 6)).raw["work_end_time"] == "17:00"
+
+    # 命中缓存时不查询、不解析
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def fail_compile(rules):
+        raise AssertionError("不应重新编译")
+
+    event.listen(test_db.get_bind(), "before_cursor_execute", count_statement)
+    try:
+        with monkeypatch.context() as patch:
+            patch.setattr(policy_cache_module.DayRule, "from_rules", staticmethod(fail_compile))
+            for _ in range(5):
+                assert get_active_policy(test_db) is first
+            response = client.get("/api/attendance/check-late", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["work_start_time"] in ("09:00", "10:00")
+    finally:
+        event.remove(test_db.get_bind(), "before_cursor_execute", count_statement)
+    assert not any("attendance_policies" in statement for statement in statements)
+
+    compiles = attendance_policy_cache.compiles
+    created = client.post(
+        "/api/attendance/policies",
+        json={
+            "name": "夏令时",
+            "work_start_time": "08:30",
+            "work_end_time": "17:00",
+            "checkin_start_time": "07:00",
+            "checkin_end_time": "11:00",
+            "checkout_start_time": "16:30",
+            "checkout_end_time": "23:00",
+            "late_threshold_minutes": 0,
+            "early_threshold_minutes": 0,
+            "is_active": True,
+        },
+        headers=headers,
+    )
+    assert created.status_code == 201
+    summer = get_active_policy(test_db)
+    assert summer.name == "夏令时"
+    assert summer.for_date(datetime(2026, 3, 2)).raw["work_start_time"] == "08:30"
+    assert attendance_policy_cache.compiles == compiles + 1
+
+    updated = client.put(
+        f"/api/attendance/policies/{created.json()['id']}",
+        json={"work_start_time": "08:45"},
+        headers=headers,
+    )
+    assert updated.status_code == 200
+    assert get_active_policy(test_db).for_date(datetime(2026, 3, 2)).raw["work_start_time"] == "08:45"
+
+    deleted = client.delete(f"/api/attendance/policies/{created.json()['id']}", headers=headers)
+    assert deleted.status_code == 204
+    assert get_active_policy(test_db) is None
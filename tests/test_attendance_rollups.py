@@ -0,0 +1,214 @@
+"""按月考勤汇总维护与区间拼接测试。"""
+
+import random
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import and_
+
+from backend.attendance_rollups import UserCounters, _accumulate_raw, collect_user_counters, full_month_span
+from backend.derived_tables import backfill_derived_tables
+from backend.models import (
+    Attendance,
+    AttendanceMonthlyRollup,
+    DerivedTableBackfill,
+    LeaveApplication,
+    LeaveStatus,
+    LeaveType,
+    OvertimeApplication,
+    OvertimeStatus,
+    OvertimeType,
+    User,
+    UserRole,
+)
+from backend.security import get_password_hash
+
+
+def create_user(test_db, username: str) -> User:
+    user = User(
+        username=username,
+        password_hash=get_password_hash("Password123"),
+        real_name=username,
+        role=UserRole.EMPLOYEE,
+        is_active=True,
+    )
+    test_db.add(user)
+    test_db.commit()
+    test_db.refresh(user)
+    return user
+
+
+def raw_counters(test_db, user_ids, start_date: date, end_date: date):
+    """逐区间明细口径（不经汇总表）"""
+    start = datetime.combine(start_date, datetime.min.time())
+    end = datetime.combine(end_date, datetime.max.time())
+    counters = {user_id: UserCounters() for user_id in user_ids}
+    _accumulate_raw(
+        test_db, counters, user_ids,
+        and_(Attendance.date >= start, Attendance.date <= end),
+        and_(LeaveApplication.start_date <= end, LeaveApplication.end_date >= start),
+        and_(OvertimeApplication.start_time >= start, OvertimeApplication.start_time <= end),
+    )
+    return counters
+
+
+def snapshot(counter: UserCounters) -> tuple:
+    return (
+        counter.present_days, counter.late_days, counter.early_leave_days, round(counter.work_hours, 6),
+        round(counter.leave_days, 6), counter.leave_count, counter.ordered_leave_types(),
+        counter.active_overtime_days, counter.active_overtime_count,
+        counter.passive_overtime_days, counter.passive_overtime_count,
+    )
+
+
+def test_full_month_span():
+    assert full_month_span(date(2026, 1, 15), date(2026, 3, 10)) == (date(2026, 2, 1), date(2026, 3, 1))
+    assert full_month_span(date(2026, 1, 1), date(2026, 1, 31)) == (date(2026, 1, 1), date(2026, 2, 1))
+    assert full_month_span(date(2025, 12, 1), date(2026, 2, 28)) == (date(2025, 12, 1), date(2026, 3, 1))
+    assert full_month_span(date(2026, 1, 2), date(2026, 1, 31)) is None
+    assert full_month_span(date(2026, 1, 20), date(2026, 2, 5)) is None
+
+
+def test_rollups_follow_row_changes(test_db):
+    user = create_user(test_db, "rollup_user")
+    leave_type = LeaveType(name="事假", is_active=True)
+    test_db.add(leave_type)
+    test_db.commit()
+
+    attendance = Attendance(user_id=user.id, date=datetime(2026, 1, 30), is_late=True, work_hours=8.0)
+    leave = LeaveApplication(
+        user_id=user.id,
+        start_date=datetime(2026, 1, 29, 9, 0),
+        end_date=datetime(2026, 2, 2, 17, 30),
+        days=3.0,
+        reason="跨月请假",
+        status=LeaveStatus.PENDING.value,
+        leave_type_id=leave_type.id,
+    )
+    overtime = OvertimeApplication(
+        user_id=user.id,
+        start_time=datetime(2026, 2, 7, 9, 0),
+        end_time=datetime(2026, 2, 7, 18, 0),
+        hours=8.0,
+        days=1.0,
+        reason="加班",
+        status=OvertimeStatus.APPROVED.value,
+        overtime_type=OvertimeType.PASSIVE,
+    )
+    test_db.add_all([attendance, leave, overtime])
+    test_db.commit()
+
+    def rollup(month: int):
+        return test_db.query(AttendanceMonthlyRollup).filter_by(user_id=user.id, year=2026, month=month).first()
+
+    assert (rollup(1).present_days, rollup(1).late_days, rollup(1).leave_days) == (1, 1, 0.0)
+    assert rollup(2).passive_overtime_count == 1
+
+    leave.status = LeaveStatus.APPROVED.value
+    test_db.commit()
+    assert (rollup(1).leave_days, rollup(1).leave_count) == (3.0, 1)
+
+    attendance.date = datetime(2026, 2, 3)
+    test_db.commit()
+    assert rollup(1).present_days == 0
+    assert rollup(2).present_days == 1
+
+    test_db.delete(overtime)
+    test_db.commit()
+    assert rollup(2).passive_overtime_count == 0
+
+    test_db.rollback()
+    leave.days = 5.0
+    test_db.flush()
+    test_db.rollback()
+    assert rollup(1).leave_days == 3.0
+
+
+def test_composed_counters_match_raw_rows(test_db):
+    rng = random.Random(20260101)
+    users = [create_user(test_db, f"rollup_mix_{i}") for i in range(4)]
+    leave_types = [LeaveType(name=f"类型{i}", is_active=True) for i in range(3)]
+    test_db.add_all(leave_types)
+    test_db.commit()
+
+    base = date(2025, 12, 1)
+    for user in users:
+        for offset in rng.sample(range(120), 60):
+            test_db.add(Attendance(
+                user_id=user.id,
+                date=datetime.combine(base + timedelta(days=offset), datetime.min.time()),
+                is_late=rng.random() < 0.2,
+                is_early_leave=rng.random() < 0.1,
+                work_hours=rng.choice([None, 7.5, 8.0]),
+            ))
+        for index in range(10):
+            start = datetime.combine(base + timedelta(days=rng.randint(0, 115)), datetime.min.time()).replace(hour=9)
+            test_db.add(LeaveApplication(
+                user_id=user.id,
+                start_date=start,
+                end_date=start + timedelta(days=rng.choice([0, 1, 3, 6]), hours=8),
+                days=rng.choice([0.5, 1.0, 2.0, 4.0]),
+                reason=f"请假{index}",
+                status=rng.choice([LeaveStatus.APPROVED.value, LeaveStatus.APPROVED.value, LeaveStatus.REJECTED.value]),
+                leave_type_id=rng.choice(leave_types).id,
+            ))
+        for index in range(8):
+            start = datetime.combine(base + timedelta(days=rng.randint(0, 119)), datetime.min.time()).replace(hour=9)
+            test_db.add(OvertimeApplication(
+                user_id=user.id,
+                start_time=start,
+                end_time=start + timedelta(hours=8),
+                hours=8.0,
+                days=1.0,
+                reason=f"加班{index}",
+                status=OvertimeStatus.APPROVED.value,
+                overtime_type=rng.choice([OvertimeType.ACTIVE, OvertimeType.PASSIVE]),
+            ))
+    test_db.commit()
+
+    user_ids = [user.id for user in users]
+    for start_date, end_date in [
+        (date(2026, 1, 15), date(2026, 3, 10)),
+        (date(2026, 1, 1), date(2026, 1, 31)),
+        (date(2025, 12, 1), date(2026, 3, 31)),
+        (date(2026, 1, 20), date(2026, 2, 5)),
+        (date(2025, 12, 31), date(2026, 2, 1)),
+    ]:
+        composed = collect_user_counters(test_db, user_ids, start_date, end_date)
+        expected = raw_counters(test_db, user_ids, start_date, end_date)
+        for user_id in user_ids:
+            assert snapshot(composed[user_id]) == snapshot(expected[user_id]), (start_date, end_date)
+
+
+def test_whole_months_are_read_from_rollups(test_db):
+    user = create_user(test_db, "rollup_reader")
+    test_db.add(Attendance(user_id=user.id, date=datetime(2026, 3, 10), work_hours=8.0))
+    test_db.commit()
+
+    # 绕过模型事件删除明细：整月读取汇总行，不完整月份读取明细
+    test_db.query(Attendance).filter(Attendance.user_id == user.id).delete(synchronize_session=False)
+    test_db.commit()
+    assert collect_user_counters(test_db, [user.id], date(2026, 3, 1), date(2026, 3, 31))[user.id].present_days == 1
+    assert collect_user_counters(test_db, [user.id], date(2026, 3, 2), date(2026, 3, 31))[user.id].present_days == 0
+
+
+def test_unbackfilled_rollups_fall_back_to_raw_rows_until_init_db_backfills(test_db):
+    user = create_user(test_db, "rollup_upgrade")
+    test_db.add(Attendance(user_id=user.id, date=datetime(2026, 4, 10), work_hours=8.0))
+    test_db.commit()
+    # 模拟升级前的数据库：明细已存在，汇总表为空且没有回填记录
+    test_db.query(AttendanceMonthlyRollup).delete(synchronize_session=False)
+    test_db.query(DerivedTableBackfill).delete(synchronize_session=False)
+    test_db.commit()
+
+    assert collect_user_counters(test_db, [user.id], date(2026, 4, 1), date(2026, 4, 30))[user.id].present_days == 1
+
+    backfill_derived_tables(test_db.get_bind())
+    rollup = test_db.query(AttendanceMonthlyRollup).filter(AttendanceMonthlyRollup.user_id == user.id).one()
+    assert (rollup.year, rollup.month, rollup.present_days) == (2026, 4, 1)
+    assert test_db.query(DerivedTableBackfill).filter(
+        DerivedTableBackfill.name == AttendanceMonthlyRollup.__tablename__
+    ).count() == 1
+    # 回填后整月读取汇总行
+    test_db.query(Attendance).filter(Attendance.user_id == user.id).delete(synchronize_session=False)
+    test_db.commit()
+    assert collect_user_counters(test_db, [user.id], date(2026, 4, 1), date(2026, 4, 30))[user.id].present_days == 1
@@ -0,0 +1,101 @@
+"""认证失败限流测试。"""
+
+import pytest
+
+from backend.auth_limiter import (
+    AuthFailureLimiter,
+    LOGIN_SCOPE,
+    MemoryFailureStore,
+    SQLiteFailureStore,
+    WECHAT_SCOPE,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_memory_limiter_blocks_within_window_and_stays_bounded():
+    clock = FakeClock()
+    limiter = AuthFailureLimiter(MemoryFailureStore(max_keys=100), limit=3, window_seconds=60, clock=clock)
+
+    for _ in range(3):
+        assert not limiter.is_blocked(LOGIN_SCOPE, "alice")
+        limiter.record_failure(LOGIN_SCOPE, "alice")
+    assert limiter.is_blocked(LOGIN_SCOPE, "alice")
+    # 场景之间互不影响
+    assert not limiter.is_blocked(WECHAT_SCOPE, "alice")
+
+    clock.now += 60
+    assert not limiter.is_blocked(LOGIN_SCOPE, "alice")
+    limiter.record_failure(LOGIN_SCOPE, "alice")
+    limiter.clear(LOGIN_SCOPE, "alice")
+    assert not limiter.is_blocked(LOGIN_SCOPE, "alice")
+
+    # 撞库：大量不同用户名只保留最近的 max_keys 个
+    for index in range(1000):
+        limiter.record_failure(LOGIN_SCOPE, f"user{index}")
+    assert len(limiter.store) == 100
+    for _ in range(2):
+        limiter.record_failure(LOGIN_SCOPE, "user999")
+    assert limiter.is_blocked(LOGIN_SCOPE, "user999")
+
+
+def test_sqlite_store_shares_budget_between_workers(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "data" / "auth_limiter.db")
+    # 两个 store 模拟同一主机上的两个 worker 进程
+    worker_a = AuthFailureLimiter(SQLiteFailureStore(path, max_keys=100), limit=4, window_seconds=60, clock=clock)
+    worker_b = AuthFailureLimiter(SQLiteFailureStore(path, max_keys=100), limit=4, window_seconds=60, clock=clock)
+    # 构造时（应用导入、fork 之前）不打开连接，首次使用时才创建目录和文件
+    assert not (tmp_path / "data").exists()
+    try:
+        for limiter in (worker_a, worker_b, worker_a):
+            limiter.record_failure(LOGIN_SCOPE, "bob")
+        assert not worker_b.is_blocked(LOGIN_SCOPE, "bob")
+        assert worker_b.record_failure(LOGIN_SCOPE, "bob") == 4
+        assert worker_a.is_blocked(LOGIN_SCOPE, "bob")
+
+        # 两个窗口之后之前的失败全部滑出
+        clock.now += 121
+        assert not worker_a.is_blocked(LOGIN_SCOPE, "bob")
+        assert worker_b.record_failure(LOGIN_SCOPE, "bob") == 1
+        worker_a.clear(LOGIN_SCOPE, "bob")
+        assert worker_b.store.count(LOGIN_SCOPE, "bob", clock.now, 60) == 0
+
+        for index in range(150):
+            worker_a.record_failure(LOGIN_SCOPE, f"user{index}")
+        worker_a.store._prune(clock.now, 60)
+        assert len(worker_b.store) == 100
+    finally:
+        worker_a.store.close()
+        worker_b.store.close()
+
+
+
+@pytest.mark.parametrize("make_store", [
+    lambda tmp_path: MemoryFailureStore(max_keys=100),
+    lambda tmp_path: SQLiteFailureStore(str(tmp_path / "auth_limiter.db"), max_keys=100),
+])
+def test_failures_before_window_boundary_still_count(tmp_path, make_store):
+    clock = FakeClock()
+    clock.now = 60 * 20_000 + 59
+    limiter = AuthFailureLimiter(make_store(tmp_path), limit=5, window_seconds=60, clock=clock)
+    for _ in range(4):
+        limiter.record_failure(LOGIN_SCOPE, "carol")
+
+    # 刚跨过桶边界：上一桶的失败仍几乎全部计入，固定窗口下这里会重新给满 5 次额度
+    clock.now += 2
+    allowed = 0
+    while not limiter.is_blocked(LOGIN_SCOPE, "carol"):
+        limiter.record_failure(LOGIN_SCOPE, "carol")
+        allowed += 1
+    assert allowed <= 2
+
+    # 上一桶的失败随时间按比例滑出窗口
+    clock.now += 45
+    assert not limiter.is_blocked(LOGIN_SCOPE, "carol")
@@ -0,0 +1,134 @@
+"""已认证用户缓存测试。"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, text
+
+from backend.auth_user_cache import auth_user_cache
+from backend.models import Department, User, UserRole
+from backend.security import create_access_token, get_password_hash
+
+
+def auth_header(username: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': username})}"}
+
+
+def create_user(test_db, username: str, role=UserRole.EMPLOYEE, department_id=None) -> User:
+    user = User(
+        username=username,
+        password_hash=get_password_hash("Password123"),
+        real_name=username,
+        role=role,
+        department_id=department_id,
+        is_active=True,
+    )
+    test_db.add(user)
+    test_db.commit()
+    test_db.refresh(user)
+    return user
+
+
+class _UserLookups:
+    """统计按用户名查询 users 表的语句数"""
+
+    def __init__(self, test_db):
+        self.engine = test_db.get_bind()
+        self.count = 0
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        if "FROM users" in statement and "users.username = ?" in statement:
+            self.count += 1
+
+
+def test_current_user_served_from_cache_until_user_changes(client, test_db):
+    department = Department(name="研发部")
+    test_db.add(department)
+    test_db.commit()
+    admin = create_user(test_db, "cache_admin", role=UserRole.ADMIN)
+    employee_id = create_user(test_db, "cache_employee", department_id=department.id).id
+    admin_headers = auth_header(admin.username)
+    headers = auth_header("cache_employee")
+    test_db.expunge_all()
+
+    before = auth_user_cache.stats()
+    with _UserLookups(test_db) as lookups:
+        for _ in range(3):
+            response = client.get("/api/users/me", headers=headers)
+            assert response.status_code == 200
+            assert response.json()["real_name"] == "cache_employee"
+    assert lookups.count == 1
+    after = auth_user_cache.stats()
+    assert after["hits"] - before["hits"] == 2
+    assert after["misses"] - before["misses"] == 1
+
+    # 还原后的用户仍可懒加载关联、修改后随会话提交
+    test_db.expunge_all()
+    restored = auth_user_cache.get_user(test_db, "cache_employee")
+    assert restored.department.name == "研发部"
+    restored.phone = "13900000000"
+    test_db.commit()
+    test_db.expunge_all()
+    assert test_db.query(User).filter(User.id == employee_id).one().phone == "13900000000"
+
+    # 管理员禁用后立即生效
+    updated = client.put(
+        f"/api/users/{employee_id}", json={"is_active": False}, headers=admin_headers
+    )
+    assert updated.status_code == 200
+    assert client.get("/api/users/me", headers=headers).status_code == 400
+
+    client.put(f"/api/users/{employee_id}", json={"is_active": True}, headers=admin_headers)
+    assert client.get("/api/users/me", headers=headers).status_code == 200
+    assert client.delete(f"/api/users/{employee_id}", headers=admin_headers).status_code == 204
+    assert client.get("/api/users/me", headers=headers).status_code == 401
+
+    stats = client.get("/api/auth/user-cache", headers=admin_headers).json()
+    assert stats["enabled"] is True
+    assert 0 < stats["hit_rate"] <= 1
+
+
+def test_password_change_invalidates_and_cache_can_be_disabled(client, test_db, monkeypatch):
+    user = create_user(test_db, "cache_password_user")
+    username, old_hash = user.username, user.password_hash
+    headers = auth_header(username)
+    assert client.get("/api/users/me", headers=headers).status_code == 200
+
+    response = client.post(
+        "/api/users/me/change-password",
+        json={"old_password": "Password123", "new_password": "Password456"},
+        headers=headers,
+    )
+    assert response.status_code == 204
+    test_db.expunge_all()
+    assert auth_user_cache.get_user(test_db, username).password_hash != old_hash
+
+    monkeypatch.setattr(auth_user_cache, "enabled", False)
+    with _UserLookups(test_db) as lookups:
+        for _ in range(2):
+            assert client.get("/api/users/me", headers=headers).status_code == 200
+    assert lookups.count == 2
+
+
+def test_writes_from_other_workers_are_seen_after_version_check(client, test_db, monkeypatch):
+    monkeypatch.setattr(auth_user_cache, "check_interval_seconds", 3600)
+    create_user(test_db, "cache_remote_user")
+    headers = auth_header("cache_remote_user")
+    assert client.get("/api/users/me", headers=headers).json()["real_name"] == "cache_remote_user"
+
+    # 模拟其他 worker 进程的写入：不经过本进程的 ORM 事件，只改变 users 表的版本
+    test_db.execute(
+        text("UPDATE users SET real_name = '改名', updated_at = :now WHERE username = 'cache_remote_user'"),
+        {"now": datetime.now() + timedelta(seconds=1)},
+    )
+    test_db.commit()
+    assert client.get("/api/users/me", headers=headers).json()["real_name"] == "cache_remote_user"
+
+    monkeypatch.setattr(auth_user_cache, "check_interval_seconds", 0)
+    assert client.get("/api/users/me", headers=headers).json()["real_name"] == "改名"
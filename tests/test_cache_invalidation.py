@@ -0,0 +1,40 @@
+"""缓存失效通知测试。"""
+
+from backend.cache_invalidation import ALL_ROWS, watch_tables
+from backend.models import Holiday
+
+notified = []
+holiday_watch = watch_tables((Holiday,), notified.append, row_keys=lambda target: (target.date,))
+
+
+def test_row_writes_notify_after_commit_and_are_dropped_on_rollback(test_db):
+    notified.clear()
+    engine = test_db.get_bind()
+
+    test_db.add(Holiday(date="2026-10-01", name="国庆节", type="holiday"))
+    test_db.flush()
+    assert holiday_watch.is_dirty(test_db)
+    assert notified == []
+    test_db.commit()
+    assert not holiday_watch.is_dirty(test_db)
+    assert [{(change.engine, change.table, change.key) for change in changes} for changes in notified] == [
+        {(engine, "holidays", "2026-10-01")}
+    ]
+
+    notified.clear()
+    test_db.add(Holiday(date="2026-10-02", name="国庆节", type="holiday"))
+    test_db.flush()
+    test_db.rollback()
+    assert not holiday_watch.is_dirty(test_db)
+    test_db.commit()
+    assert notified == []
+
+
+def test_bulk_update_notifies_all_rows(test_db):
+    test_db.add(Holiday(date="2026-10-03", name="国庆节", type="holiday"))
+    test_db.commit()
+    notified.clear()
+
+    test_db.query(Holiday).filter(Holiday.date == "2026-10-03").update({Holiday.name: "国庆"})
+    test_db.commit()
+    assert [{change.key for change in changes} for changes in notified] == [{ALL_ROWS}]
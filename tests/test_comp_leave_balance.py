@@ -1,7 +1,10 @@
 """加班调休余额跨年结转回归测试。"""
 
+import random
 from datetime import datetime
 
+from sqlalchemy import event
+
 from backend.models import (
     CompLeaveAdjustment,
     LeaveApplication,
@@ -14,6 +17,7 @@ from backend.models import (
     User,
     UserRole,
 )
+from backend.leave_balance import compute_comp_leave, compute_comp_leave_bulk
 from backend.routers.leave import validate_comp_leave_balance
 from backend.security import create_access_token, get_password_hash
 
@@ -103,3 +107,78 @@ def test_comp_leave_views_and_validation_use_yearly_carryover_balance(client, te
         days=2.0,
         year=2026,
     )
+
+
+def test_bulk_comp_leave_matches_per_user_computation(test_db):
+    """批量计算与逐人计算结果一致，且查询次数与人数无关。"""
+    rng = random.Random(7)
+    comp_leave_type = LeaveType(name="加班调休", is_active=True)
+    other_type = LeaveType(name="事假", is_active=True)
+    users = [
+        User(
+            username=f"bulk_comp_user_{index}",
+            password_hash="x",
+            real_name=f"批量调休{index}",
+            role=UserRole.EMPLOYEE,
+            is_active=True,
+        )
+        for index in range(12)
+    ]
+    test_db.add_all([comp_leave_type, other_type, *users])
+    test_db.flush()
+
+    statuses = [LeaveStatus.APPROVED, LeaveStatus.PENDING, LeaveStatus.REJECTED, LeaveStatus.CANCELLED]
+    # 最后两人没有任何记录，验证零值
+    for user in users[:-2]:
+        for index in range(rng.randint(1, 6)):
+            start = datetime(rng.choice([2024, 2025, 2026]), rng.randint(1, 12), rng.randint(1, 28), 18, 0)
+            test_db.add(OvertimeApplication(
+                user_id=user.id,
+                start_time=start,
+                end_time=start.replace(hour=22),
+                hours=4.0,
+                days=rng.choice([0.5, 1.0, 1.5]),
+                reason=f"加班{index}",
+                status=rng.choice([OvertimeStatus.APPROVED, OvertimeStatus.PENDING]),
+                overtime_type=rng.choice([OvertimeType.ACTIVE, OvertimeType.PASSIVE]),
+            ))
+        for index in range(rng.randint(0, 4)):
+            start = datetime(rng.choice([2024, 2025, 2026]), rng.randint(1, 12), rng.randint(1, 28), 9, 0)
+            test_db.add(LeaveApplication(
+                user_id=user.id,
+                start_date=start,
+                end_date=start.replace(hour=17),
+                days=rng.choice([0.5, 1.0, 2.0]),
+                reason=f"{user.username}请假{index}",
+                status=rng.choice(statuses),
+                leave_type_id=rng.choice([comp_leave_type.id, other_type.id]),
+            ))
+        for index in range(rng.randint(0, 2)):
+            test_db.add(CompLeaveAdjustment(
+                user_id=user.id,
+                days=rng.choice([-1.0, 0.5, 3.0]),
+                effective_date=datetime(rng.choice([2024, 2025, 2026]), rng.randint(1, 12), 1),
+                reason="调整",
+            ))
+    test_db.commit()
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = test_db.get_bind()
+    for yearly_reset, year in [(False, 2026), (False, 2025), (False, None), (True, 2026), (True, 2024)]:
+        expected = {
+            user.id: compute_comp_leave(test_db, user, yearly_reset=yearly_reset, year=year)
+            for user in users
+        }
+        statements.clear()
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            actual = compute_comp_leave_bulk(test_db, users, yearly_reset=yearly_reset, year=year)
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+        assert actual == expected, (yearly_reset, year)
+        # 请假类型 + 快照 + 每个快照年份分组（至多两组）加班/请假/调整各一次
+        assert len(statements) <= 8
@@ -0,0 +1,102 @@
+"""流式 Excel 导出测试。"""
+
+import asyncio
+from datetime import date, datetime
+from io import BytesIO
+
+from openpyxl import load_workbook
+
+from backend.attendance_matrix import iter_daily_matrices, load_daily_matrix
+from backend.holiday_calendar import holiday_calendar
+from backend.models import Attendance, AttendanceStatus, User, UserRole
+from backend.security import create_access_token, get_password_hash
+from backend.services.excel_export import build_excel_stream
+
+
+async def read_body(response) -> bytes:
+    chunks = []
+    async for chunk in response.body_iterator:
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def test_build_excel_stream_consumes_rows_lazily():
+    consumed = []
+
+    def rows():
+        for index in range(3000):
+            consumed.append(index)
+            yield [f"用户{index}", index, "" if index % 2 else None]
+
+    response = build_excel_stream("明细", ["姓名", "序号", "备注"], rows(), "明细导出")
+    assert len(consumed) == 3000
+    assert "filename*=UTF-8''%E6%98%8E%E7%BB%86%E5%AF%BC%E5%87%BA.xlsx" in response.headers["content-disposition"]
+
+    body = asyncio.run(read_body(response))
+    sheet = load_workbook(BytesIO(body), read_only=True)["明细"]
+    values = list(sheet.iter_rows(values_only=True))
+    assert values[0] == ("姓名", "序号", "备注")
+    assert values[-1][:2] == ("用户2999", 2999)
+    assert len(values) == 3001
+
+
+def create_user(test_db, username: str, role: UserRole, enable_attendance: bool = True) -> User:
+    user = User(
+        username=username,
+        password_hash=get_password_hash("Password123"),
+        real_name=username,
+        role=role,
+        is_active=True,
+        enable_attendance=enable_attendance,
+    )
+    test_db.add(user)
+    test_db.commit()
+    test_db.refresh(user)
+    return user
+
+
+def test_daily_export_streams_batched_matrix_rows(client, test_db):
+    admin = create_user(test_db, "export_admin", UserRole.ADMIN, enable_attendance=False)
+    users = [create_user(test_db, f"export_user_{i}", UserRole.EMPLOYEE) for i in range(5)]
+    test_db.add_all([
+        Attendance(
+            user_id=users[0].id,
+            date=datetime(2026, 7, 4),
+            checkin_time=datetime(2026, 7, 4, 9, 0),
+            checkin_status=AttendanceStatus.OVERTIME_PUNCH.value,
+        ),
+        Attendance(
+            user_id=users[3].id,
+            date=datetime(2026, 7, 1),
+            checkin_time=datetime(2026, 7, 1, 9, 20),
+            checkout_time=datetime(2026, 7, 1, 18, 0),
+            is_late=True,
+        ),
+    ])
+    test_db.commit()
+
+    start, end = date(2026, 7, 1), date(2026, 7, 5)
+    workdays = holiday_calendar.list_workdays(test_db, start, end)
+    # 极小批次下各批展示日期一致（含其他批次用户的非工作日加班列）
+    batches = list(iter_daily_matrices(test_db, users, start, end, workdays, max_cells=8))
+    assert len(batches) == 3
+    assert all(batch.dates == batches[0].dates for batch in batches)
+    assert date(2026, 7, 4) in batches[0].dates
+    whole = load_daily_matrix(test_db, users, start, end, workdays)
+    assert [s.model_dump() for batch in batches for s in batch.to_statistics()] == [
+        s.model_dump() for s in whole.to_statistics()
+    ]
+
+    token = create_access_token(data={"sub": admin.username})
+    response = client.get(
+        "/api/statistics/attendance/daily/export?start_date=2026-07-01&end_date=2026-07-05",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    sheet = load_workbook(BytesIO(response.content), read_only=True)["每日详细"]
+    rows = list(sheet.iter_rows(values_only=True))
+    assert len(rows) == 1 + len(users) * 4
+    late_row = next(row for row in rows if row[1] == "export_user_3" and row[3] == "2026-07-01")
+    assert late_row[6:] == ("迟到", "正常", "是", "否", "否")
+    overtime_row = next(row for row in rows if row[1] == "export_user_0" and row[3] == "2026-07-04")
+    assert overtime_row[5:8] == ("非工作日", "加班", "-")
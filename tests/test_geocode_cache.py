@@ -0,0 +1,178 @@
+"""逆地理编码持久化缓存测试。"""
+
+import asyncio
+import math
+import sqlite3
+import threading
+
+from backend import geocode_cache as geocode_cache_module
+from backend.config import settings
+from backend.geocode_cache import GeocodeCache
+from backend.models import User, UserRole
+from backend.routers import attendance
+from backend.security import create_access_token, get_password_hash
+from backend.utils import geohash
+
+
+def _cache(path, **overrides) -> GeocodeCache:
+    options = dict(max_entries=100, memory_entries=4, ttl_seconds=3600, sweep_interval_seconds=600)
+    options.update(overrides)
+    return GeocodeCache(str(path), **options)
+
+
+def test_cache_survives_restart_expires_and_stays_bounded(tmp_path, monkeypatch):
+    path = tmp_path / "geocode.db"
+    first = _cache(path)
+    first.set(31.230416, 121.473701, "上海市黄浦区人民大道200号")
+    assert first.get(31.23042, 121.47368) == "上海市黄浦区人民大道200号"
+    first.close()
+
+    # 模拟重启：新实例从持久层读取，再次读取命中进程内缓存
+    restarted = _cache(path)
+    assert restarted.get(31.230416, 121.473701) == "上海市黄浦区人民大道200号"
+    assert restarted.get(31.230416, 121.473701) == "上海市黄浦区人民大道200号"
+    assert restarted.get(39.9, 116.4) is None
+    stats = restarted.stats()
+    assert (stats["persistent_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+
+    # 过期条目惰性失效，定期清理后从持久层删除
+    now = geocode_cache_module.time.time()
+    monkeypatch.setattr(geocode_cache_module.time, "time", lambda: now + 7200)
+    assert restarted.get(31.230416, 121.473701) is None
+    restarted.clear_expired()
+    assert restarted.stats()["persistent_entries"] == 0
+    monkeypatch.undo()
+
+    bounded = _cache(path, max_entries=10)
+    for index in range(30):
+        bounded.set(30 + index / 100, 120.0, f"地址{index}")
+    bounded.clear_expired()
+    assert bounded.stats()["persistent_entries"] == 10
+    assert bounded.stats()["memory_entries"] == 4
+    assert _cache(path).get(30.29, 120.0) == "地址29"
+    assert _cache(path).get(30.0, 120.0) is None
+    restarted.close()
+    bounded.close()
+
+
+def _offset(latitude: float, longitude: float, north_meters: float, east_meters: float):
+    return (
+        latitude + north_meters / geohash.METERS_PER_DEGREE,
+        longitude + east_meters / (geohash.METERS_PER_DEGREE * math.cos(math.radians(latitude))),
+    )
+
+
+def test_nearby_lookup_reuses_closest_address_within_radius(tmp_path):
+    path = tmp_path / "geocode.db"
+    office = (31.230416, 121.473701)
+    cache = _cache(path, radius_meters=50)
+    cache.set(*office, "办公室A")
+    cache.set(*_offset(*office, 0, 40), "办公室A东侧")
+
+    # 15 米外：旧的精确键未命中，近邻查找命中最近的条目
+    nearby = _offset(*office, 15, -5)
+    assert _cache(tmp_path / "empty.db").get(*nearby) is None
+    assert cache.get(*nearby) == "办公室A"
+    assert cache.get(*_offset(*office, 0, 32)) == "办公室A东侧"
+    assert cache.get(*_offset(*office, 120, 0)) is None
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["nearby_hits"], stats["misses"]) == (0, 2, 1)
+    cache.close()
+
+    # 重启后从持久层按 geohash 前缀查找
+    restarted = _cache(path, radius_meters=50)
+    assert restarted.get(*_offset(*office, -20, 10)) == "办公室A"
+    assert restarted.stats()["persistent_hits"] == 1
+    restarted.close()
+
+
+def test_cache_file_without_location_columns_is_upgraded(tmp_path):
+    path = tmp_path / "geocode.db"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE geocode_cache (key TEXT PRIMARY KEY, address TEXT NOT NULL, "
+        "cached_at REAL NOT NULL, expires_at REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO geocode_cache VALUES ('31.2304,121.4737', '办公室A', 0, 9999999999)")
+    conn.commit()
+    conn.close()
+
+    cache = _cache(path, radius_meters=50)
+    assert cache.get(*_offset(31.2304, 121.4737, 10, 10)) == "办公室A"
+    cache.close()
+
+
+def test_async_helpers_keep_sqlite_off_the_event_loop(tmp_path, monkeypatch):
+    cache = _cache(tmp_path / "geocode.db")
+    monkeypatch.setattr(geocode_cache_module, "geocode_cache", cache)
+    disk_threads = []
+    for name in ("get_from_disk", "set_on_disk"):
+        original = getattr(cache, name)
+
+        def traced(*args, _original=original):
+            disk_threads.append(threading.get_ident())
+            return _original(*args)
+
+        monkeypatch.setattr(cache, name, traced)
+
+    async def scenario():
+        loop_thread = threading.get_ident()
+        assert await geocode_cache_module.aget_cached_address(31.2304, 121.4737) is None
+        await geocode_cache_module.aset_cached_address(31.2304, 121.4737, "办公室A")
+        assert len(disk_threads) == 2
+        assert loop_thread not in disk_threads
+        # 进程内命中时不再访问持久层
+        assert await geocode_cache_module.aget_cached_address(31.2304, 121.4737) == "办公室A"
+        assert len(disk_threads) == 2
+
+    asyncio.run(scenario())
+    assert cache.stats()["memory_hits"] == 1
+    assert cache.stats()["misses"] == 1
+    cache.close()
+
+
+def test_geocode_endpoints_answer_from_persisted_cache(client, test_db, tmp_path, monkeypatch):
+    user = User(
+        username="geocode_user",
+        password_hash=get_password_hash("Password123"),
+        real_name="定位用户",
+        role=UserRole.EMPLOYEE,
+        is_active=True,
+    )
+    test_db.add(user)
+    test_db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': user.username})}"}
+
+    path = tmp_path / "geocode.db"
+    previous = _cache(path)
+    previous.set(31.2304, 121.4737, "办公室A")
+    previous.set(31.2400, 121.4800, "办公室B")
+    previous.close()
+
+    async def no_network(*args):
+        raise AssertionError("缓存命中时不应调用高德地图API")
+
+    restarted = _cache(path)
+    monkeypatch.setattr(geocode_cache_module, "geocode_cache", restarted)
+    monkeypatch.setattr(settings, "AMAP_API_KEY", "test-key")
+    monkeypatch.setattr(attendance, "_fetch_reverse_geocode", no_network)
+
+    response = client.get(
+        "/api/attendance/geocode/reverse",
+        params={"latitude": 31.2304, "longitude": 121.4737},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["address"] == "办公室A"
+
+    response = client.post(
+        "/api/attendance/geocode/batch",
+        json={"locations": [
+            {"latitude": 31.2304, "longitude": 121.4737},
+            {"latitude": 31.24, "longitude": 121.48},
+        ]},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert [item["address"] for item in response.json()["results"]] == ["办公室A", "办公室B"]
+    restarted.close()
@@ -0,0 +1,127 @@
+"""节假日日历缓存测试。"""
+
+from datetime import date, timedelta
+
+from backend.holiday_calendar import (
+    count_workdays_between,
+    holiday_calendar,
+    list_workdays_between,
+)
+from backend.models import Holiday, User, UserRole
+from backend.security import create_access_token, get_password_hash
+
+
+def auth_header(user: User) -> dict:
+    token = create_access_token(data={"sub": user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def naive_workdays(start: date, end: date, overrides: dict) -> int:
+    count = 0
+    current = start
+    while current <= end:
+        holiday_type = overrides.get(current.isoformat())
+        if holiday_type == "workday":
+            count += 1
+        elif holiday_type is None and current.weekday() < 5:
+            count += 1
+        current += timedelta(days=1)
+    return count
+
+
+def test_count_workdays_matches_day_by_day_rules_across_years(test_db):
+    overrides = {
+        "2025-12-31": "company_holiday",
+        "2026-01-01": "holiday",
+        "2026-01-04": "workday",
+        "2026-10-01": "holiday",
+        "2026-10-10": "workday",
+    }
+    test_db.add_all([
+        Holiday(date=day, name="测试", type=holiday_type)
+        for day, holiday_type in overrides.items()
+    ])
+    test_db.commit()
+
+    for start, end in [
+        (date(2025, 12, 1), date(2026, 1, 31)),
+        (date(2026, 10, 1), date(2026, 10, 1)),
+        (date(2024, 2, 1), date(2027, 3, 15)),
+    ]:
+        assert holiday_calendar.count_workdays(test_db, start, end) == naive_workdays(start, end, overrides)
+
+    listed = holiday_calendar.list_workdays(test_db, date(2026, 1, 1), date(2026, 1, 5))
+    assert listed == [date(2026, 1, 2), date(2026, 1, 4), date(2026, 1, 5)]
+    assert holiday_calendar.count_workdays(test_db, date(2026, 1, 5), date(2026, 1, 1)) == 0
+
+
+def test_busday_workday_functions_honor_overrides():
+    overrides = {
+        date(2026, 2, 14): "workday",  # 周六调休上班
+        date(2026, 2, 16): "holiday",  # 周一法定假
+        date(2026, 2, 17): "company_holiday",
+        date(2026, 2, 18): "workday",  # 本就是周三，不重复计数
+    }
+    naive_overrides = {d.isoformat(): t for d, t in overrides.items()}
+
+    for start, end in [
+        (date(2026, 2, 1), date(2026, 2, 28)),
+        (date(2026, 2, 14), date(2026, 2, 14)),
+        (date(2021, 1, 1), date(2030, 12, 31)),
+    ]:
+        expected = naive_workdays(start, end, naive_overrides)
+        assert count_workdays_between(start, end, overrides) == expected
+        assert len(list_workdays_between(start, end, overrides)) == expected
+
+    assert list_workdays_between(date(2026, 2, 13), date(2026, 2, 18), overrides) == [
+        date(2026, 2, 13),
+        date(2026, 2, 14),
+        date(2026, 2, 18),
+    ]
+    assert count_workdays_between(date(2026, 2, 2), date(2026, 2, 1), overrides) == 0
+
+
+def test_holiday_writes_through_router_invalidate_calendar(client, test_db):
+    admin = User(
+        username="calendar_admin",
+        password_hash=get_password_hash("Password123"),
+        real_name="日历管理员",
+        role=UserRole.ADMIN,
+        is_active=True,
+    )
+    test_db.add(admin)
+    test_db.commit()
+    headers = auth_header(admin)
+
+    assert client.get("/api/holidays/check/2026-10-08").json()["is_workday"] is True
+
+    created = client.post(
+        "/api/holidays/",
+        json={"date": "2026-10-08", "name": "国庆节", "type": "holiday"},
+        headers=headers,
+    )
+    assert created.status_code == 200
+    check = client.get("/api/holidays/check/2026-10-08").json()
+    assert check["is_workday"] is False
+    assert check["reason"] == "法定节假日"
+    assert check["holiday_name"] == "国庆节"
+
+    updated = client.put(
+        f"/api/holidays/{created.json()['id']}",
+        json={"type": "workday", "name": "调休上班"},
+        headers=headers,
+    )
+    assert updated.status_code == 200
+    assert client.get("/api/holidays/check/2026-10-08").json()["reason"] == "调休工作日"
+
+    batch = client.post(
+        "/api/holidays/batch",
+        json={"start_date": "2026-10-12", "end_date": "2026-10-13", "name": "公司假", "type": "company_holiday"},
+        headers=headers,
+    )
+    assert batch.status_code == 200
+    assert holiday_calendar.count_workdays(test_db, date(2026, 10, 12), date(2026, 10, 16)) == 3
+
+    deleted = client.delete(f"/api/holidays/{created.json()['id']}", headers=headers)
+    assert deleted.status_code == 204
+    assert client.get("/api/holidays/check/2026-10-08").json()["reason"] == "正常工作日"
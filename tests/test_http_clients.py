@@ -0,0 +1,155 @@
+"""出站 HTTP 客户端连接复用与并发合并测试（本地桩服务器）。"""
+
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from backend import geocode_cache as geocode_cache_module
+from backend.config import settings
+from backend.geocode_cache import GeocodeCache
+from backend.http_clients import OutboundHttp, outbound_http
+from backend.routers import attendance
+from backend.services import wechat_message
+from backend.wechat_token import MemoryTokenSlot, access_token_manager
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _count(self, path):
+        with self.server.lock:
+            self.server.requests[path] = self.server.requests.get(path, 0) + 1
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self._count(url.path)
+        query = parse_qs(url.query)
+        if url.path == "/v3/geocode/regeo":
+            time.sleep(0.2)
+            self._reply({"status": "1", "regeocode": {"formatted_address": f"桩地址 {query['location'][0]}"}})
+        elif url.path == "/cgi-bin/token":
+            time.sleep(0.2)
+            self._reply({"access_token": "stub-token", "expires_in": 7200})
+        else:
+            self._reply({"errcode": 404, "errmsg": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        self._count(url.path)
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply({"errcode": 0})
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.requests = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_concurrent_geocode_lookups_share_one_upstream_call_and_connection(stub_server, monkeypatch):
+    monkeypatch.setattr(settings, "AMAP_API_KEY", "test-key")
+    monkeypatch.setattr(settings, "AMAP_API_BASE_URL", f"http://127.0.0.1:{stub_server.server_port}")
+    monkeypatch.setattr(
+        geocode_cache_module,
+        "geocode_cache",
+        GeocodeCache(None, max_entries=100, memory_entries=100, ttl_seconds=3600, sweep_interval_seconds=600),
+    )
+
+    async def scenario():
+        try:
+            same = await asyncio.gather(*(attendance._reverse_geocode_internal(31.2304, 121.4737) for _ in range(5)))
+            assert same == ["桩地址 121.4737,31.2304"] * 5
+            assert stub_server.requests["/v3/geocode/regeo"] == 1
+
+            for index in range(3):
+                await attendance._reverse_geocode_internal(30.0 + index, 120.0)
+        finally:
+            await outbound_http.aclose()
+
+    asyncio.run(scenario())
+    assert stub_server.requests["/v3/geocode/regeo"] == 4
+    # 4 次请求复用同一条 keep-alive 连接
+    assert stub_server.connections == 1
+
+
+def test_wechat_token_refreshed_once_and_connections_reused(stub_server, monkeypatch):
+    monkeypatch.setattr(settings, "WECHAT_APPID", "appid")
+    monkeypatch.setattr(settings, "WECHAT_SECRET", "secret")
+    monkeypatch.setattr(settings, "WECHAT_API_BASE_URL", f"http://127.0.0.1:{stub_server.server_port}")
+    monkeypatch.setattr(access_token_manager, "slot", MemoryTokenSlot())
+
+    def send(index):
+        return wechat_message.send_subscribe_message(f"openid-{index}", "template", "pages/index", {})
+
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            assert all(executor.map(send, range(8)))
+        assert stub_server.requests["/cgi-bin/token"] == 1
+        assert stub_server.requests["/cgi-bin/message/subscribe/send"] == 8
+
+        connections = stub_server.connections
+        for index in range(5):
+            assert send(index)
+        assert stub_server.connections == connections
+    finally:
+        asyncio.run(outbound_http.aclose())
+
+
+def test_async_clients_are_tracked_per_loop_and_all_closed():
+    http = OutboundHttp(timeout=5, max_connections=5, max_keepalive_connections=5, keepalive_expiry=5)
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever, daemon=True)
+    thread.start()
+
+    async def get_client():
+        return http.get_async_client()
+
+    try:
+        other_client = asyncio.run_coroutine_threadsafe(get_client(), other_loop).result(timeout=5)
+
+        async def scenario():
+            client = http.get_async_client()
+            # 新的事件循环使用自己的客户端，不会替换掉其他循环仍在使用的客户端
+            assert client is not other_client
+            assert http.get_async_client() is client
+            await http.aclose()
+            return client
+
+        client = asyncio.run(scenario())
+        assert client.is_closed and other_client.is_closed
+    finally:
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join(timeout=5)
+        other_loop.close()
@@ -0,0 +1,243 @@
+"""假期余额年末快照维护回归测试。"""
+
+import random
+from datetime import datetime
+
+from backend.leave_balance import (
+    ANNUAL_BALANCE_TYPE,
+    COMP_BALANCE_TYPE,
+    compute_annual_leave,
+    compute_annual_leave_bulk,
+    compute_comp_leave,
+    compute_comp_leave_bulk,
+)
+from backend.models import (
+    AnnualLeaveAdjustment,
+    CompLeaveAdjustment,
+    LeaveApplication,
+    LeaveBalanceSnapshot,
+    LeaveStatus,
+    LeaveType,
+    OvertimeApplication,
+    OvertimeStatus,
+    OvertimeType,
+    SystemSetting,
+    User,
+    UserRole,
+)
+from backend.routers.system_settings import ANNUAL_LEAVE_START_YEAR_KEY
+
+THIS_YEAR = datetime.now().year
+START_YEAR = THIS_YEAR - 5
+
+
+def _seed(test_db, user_count=6):
+    rng = random.Random(23)
+    annual_type = LeaveType(name="年假调休", is_active=True)
+    comp_type = LeaveType(name="加班调休", is_active=True)
+    test_db.add_all([
+        annual_type,
+        comp_type,
+        SystemSetting(key=ANNUAL_LEAVE_START_YEAR_KEY, value=str(START_YEAR)),
+    ])
+    users = [
+        User(
+            username=f"snapshot_user_{index}",
+            password_hash="x",
+            real_name=f"快照{index}",
+            role=UserRole.EMPLOYEE,
+            is_active=True,
+            annual_leave_days=rng.choice([5.0, 10.0, 15.0]),
+        )
+        for index in range(user_count)
+    ]
+    test_db.add_all(users)
+    test_db.flush()
+    for user in users:
+        for index in range(8):
+            start = datetime(rng.randint(START_YEAR - 1, THIS_YEAR), rng.randint(1, 12), rng.randint(1, 28), 9, 0)
+            test_db.add(LeaveApplication(
+                user_id=user.id,
+                start_date=start,
+                end_date=start.replace(hour=17),
+                days=rng.choice([0.5, 1.0, 3.0]),
+                reason=f"{user.username}请假{index}",
+                status=rng.choice([LeaveStatus.APPROVED, LeaveStatus.PENDING, LeaveStatus.REJECTED]),
+                leave_type_id=rng.choice([annual_type.id, comp_type.id]),
+            ))
+        for index in range(4):
+            start = datetime(rng.randint(START_YEAR - 1, THIS_YEAR), rng.randint(1, 12), rng.randint(1, 28), 9, 0)
+            test_db.add(OvertimeApplication(
+                user_id=user.id,
+                start_time=start,
+                end_time=start.replace(hour=18),
+                hours=8.0,
+                days=rng.choice([0.5, 1.0, 2.0]),
+                reason=f"{user.username}加班{index}",
+                status=OvertimeStatus.APPROVED,
+                overtime_type=OvertimeType.ACTIVE,
+            ))
+        test_db.add(AnnualLeaveAdjustment(
+            user_id=user.id, days=2.0, effective_date=datetime(START_YEAR - 1, 6, 1), reason="期初",
+        ))
+        test_db.add(CompLeaveAdjustment(
+            user_id=user.id, days=1.5, effective_date=datetime(START_YEAR, 3, 1), reason="期初",
+        ))
+    test_db.commit()
+    return users
+
+
+def _balances(test_db, users, start_year=START_YEAR):
+    per_user = {
+        user.id: (
+            compute_annual_leave(test_db, user, year=THIS_YEAR, start_year=start_year),
+            compute_comp_leave(test_db, user, year=THIS_YEAR),
+            compute_comp_leave(test_db, user),
+        )
+        for user in users
+    }
+    annual = compute_annual_leave_bulk(test_db, users, year=THIS_YEAR, start_year=start_year)
+    comp = compute_comp_leave_bulk(test_db, users, year=THIS_YEAR)
+    comp_total = compute_comp_leave_bulk(test_db, users)
+    assert {user.id: (annual[user.id], comp[user.id], comp_total[user.id]) for user in users} == per_user
+    return per_user
+
+
+def _from_scratch(test_db, users, start_year=START_YEAR):
+    """删除全部快照后从明细重新计算，回滚后快照恢复"""
+    test_db.query(LeaveBalanceSnapshot).delete(synchronize_session=False)
+    try:
+        return _balances(test_db, users, start_year)
+    finally:
+        test_db.rollback()
+
+
+def _snapshot_rows(test_db, user_id, balance_type):
+    return {
+        row.year: (row.id, row.closing_days)
+        for row in test_db.query(LeaveBalanceSnapshot).filter(
+            LeaveBalanceSnapshot.user_id == user_id,
+            LeaveBalanceSnapshot.balance_type == balance_type,
+        )
+    }
+
+
+def test_snapshots_are_built_on_write_and_match_full_recomputation(test_db):
+    users = _seed(test_db)
+
+    for user in users:
+        annual_years = set(_snapshot_rows(test_db, user.id, ANNUAL_BALANCE_TYPE))
+        assert annual_years == set(range(START_YEAR, THIS_YEAR))
+        comp_years = set(_snapshot_rows(test_db, user.id, COMP_BALANCE_TYPE))
+        assert max(comp_years) == THIS_YEAR - 1
+
+    assert _balances(test_db, users) == _from_scratch(test_db, users)
+
+
+def test_backdated_change_rebuilds_only_later_years(test_db):
+    users = _seed(test_db)
+    user = users[0]
+    changed_year = THIS_YEAR - 2
+    before = _snapshot_rows(test_db, user.id, ANNUAL_BALANCE_TYPE)
+    others_before = _snapshot_rows(test_db, users[1].id, ANNUAL_BALANCE_TYPE)
+
+    test_db.add(AnnualLeaveAdjustment(
+        user_id=user.id, days=3.0, effective_date=datetime(changed_year, 5, 1), reason="补录",
+    ))
+    test_db.commit()
+
+    after = _snapshot_rows(test_db, user.id, ANNUAL_BALANCE_TYPE)
+    assert set(after) == set(before)
+    for year in range(START_YEAR, changed_year):
+        assert after[year] == before[year]
+    for year in range(changed_year, THIS_YEAR):
+        assert after[year][0] != before[year][0]
+        assert after[year][1] == before[year][1] + 3.0
+    assert _snapshot_rows(test_db, users[1].id, ANNUAL_BALANCE_TYPE) == others_before
+
+    # 把请假改到更早的年份：新旧年份中较早者起均需重算
+    leave = test_db.query(LeaveApplication).filter(
+        LeaveApplication.user_id == user.id,
+        LeaveApplication.start_date >= datetime(THIS_YEAR - 1, 1, 1),
+    ).first()
+    leave.start_date = leave.start_date.replace(year=START_YEAR)
+    leave.end_date = leave.end_date.replace(year=START_YEAR)
+    test_db.commit()
+
+    assert _balances(test_db, users) == _from_scratch(test_db, users)
+
+
+def test_current_year_writes_and_rollbacks_leave_snapshots_untouched(test_db):
+    users = _seed(test_db)
+    user = users[0]
+    before = {
+        balance_type: _snapshot_rows(test_db, user.id, balance_type)
+        for balance_type in (ANNUAL_BALANCE_TYPE, COMP_BALANCE_TYPE)
+    }
+
+    test_db.add(CompLeaveAdjustment(
+        user_id=user.id, days=2.0, effective_date=datetime(THIS_YEAR, 1, 2), reason="当年调整",
+    ))
+    test_db.commit()
+    test_db.add(CompLeaveAdjustment(
+        user_id=user.id, days=2.0, effective_date=datetime(START_YEAR, 1, 2), reason="回滚调整",
+    ))
+    test_db.flush()
+    test_db.rollback()
+
+    after = {
+        balance_type: _snapshot_rows(test_db, user.id, balance_type)
+        for balance_type in (ANNUAL_BALANCE_TYPE, COMP_BALANCE_TYPE)
+    }
+    assert after == before
+    assert _balances(test_db, users) == _from_scratch(test_db, users)
+
+
+def test_settings_and_leave_type_changes_rebuild_all_users(test_db):
+    users = _seed(test_db)
+
+    setting = test_db.query(SystemSetting).filter(SystemSetting.key == ANNUAL_LEAVE_START_YEAR_KEY).one()
+    setting.value = str(START_YEAR + 2)
+    test_db.commit()
+    for user in users:
+        assert set(_snapshot_rows(test_db, user.id, ANNUAL_BALANCE_TYPE)) == set(range(START_YEAR + 2, THIS_YEAR))
+    assert {row.basis_year for row in test_db.query(LeaveBalanceSnapshot).filter(
+        LeaveBalanceSnapshot.balance_type == ANNUAL_BALANCE_TYPE
+    )} == {START_YEAR + 2}
+
+    # 停用加班调休类型后，已用调休不再计入累计
+    comp_type = test_db.query(LeaveType).filter(LeaveType.name == "加班调休").one()
+    comp_type.is_active = False
+    users[1].annual_leave_days = 20.0
+    test_db.commit()
+    assert _balances(test_db, users, START_YEAR + 2) == _from_scratch(test_db, users, START_YEAR + 2)
+
+
+def test_only_balance_leave_type_changes_rebuild_snapshots(test_db):
+    users = _seed(test_db, user_count=2)
+
+    def snapshot_ids():
+        return {row.id for row in test_db.query(LeaveBalanceSnapshot)}
+
+    before = snapshot_ids()
+
+    # 说明文字、其他请假类型的增改不影响余额，不重建快照
+    comp_type = test_db.query(LeaveType).filter(LeaveType.name == "加班调休").one()
+    comp_type.description = "加班换休"
+    sick_type = LeaveType(name="病假", is_active=True)
+    test_db.add(sick_type)
+    test_db.commit()
+    sick_type.is_active = False
+    test_db.commit()
+    assert snapshot_ids() == before
+
+    # 加班调休改名只重建调休快照
+    annual_ids = {row.id for row in test_db.query(LeaveBalanceSnapshot).filter(
+        LeaveBalanceSnapshot.balance_type == ANNUAL_BALANCE_TYPE
+    )}
+    comp_type.name = "加班调休（旧）"
+    test_db.commit()
+    after = snapshot_ids()
+    assert annual_ids <= after
+    assert after != before
+    assert _balances(test_db, users) == _from_scratch(test_db, users)
@@ -0,0 +1,205 @@
+"""请假时段批量索引测试。"""
+
+import random
+from datetime import date, datetime, timedelta
+
+from backend.leave_periods import (
+    LeaveIntervalIndex,
+    LeavePeriodIndex,
+    get_leave_period_for_date,
+    resolve_leave_period,
+)
+from backend.derived_tables import backfill_derived_tables
+from backend.models import (
+    DerivedTableBackfill,
+    LeaveApplication,
+    LeaveDaySlot,
+    LeaveStatus,
+    LeaveType,
+    User,
+    UserRole,
+)
+from backend.security import get_password_hash
+
+
+def create_user(test_db, username: str) -> User:
+    user = User(
+        username=username,
+        password_hash=get_password_hash("Password123"),
+        real_name=username,
+        role=UserRole.EMPLOYEE,
+        is_active=True,
+    )
+    test_db.add(user)
+    test_db.commit()
+    test_db.refresh(user)
+    return user
+
+
+def leave_type_id(test_db) -> int:
+    leave_type = test_db.query(LeaveType).filter(LeaveType.name == "事假").first()
+    if leave_type is None:
+        leave_type = LeaveType(name="事假", is_active=True)
+        test_db.add(leave_type)
+        test_db.commit()
+    return leave_type.id
+
+
+def add_leave(test_db, user: User, start: datetime, end: datetime, days: float,
+              status: str = LeaveStatus.APPROVED.value) -> LeaveApplication:
+    leave = LeaveApplication(
+        user_id=user.id,
+        start_date=start,
+        end_date=end,
+        days=days,
+        reason=f"测试 {start.isoformat()} {end.isoformat()} {days}",
+        status=status,
+        leave_type_id=leave_type_id(test_db),
+    )
+    test_db.add(leave)
+    return leave
+
+
+def test_half_day_rules(test_db):
+    user = create_user(test_db, "period_rules")
+    add_leave(test_db, user, datetime(2026, 3, 2, 9, 0), datetime(2026, 3, 2, 12, 0), 0.5)
+    add_leave(test_db, user, datetime(2026, 3, 3, 14, 0), datetime(2026, 3, 3, 17, 30), 0.5)
+    add_leave(test_db, user, datetime(2026, 3, 4, 9, 0), datetime(2026, 3, 6, 12, 0), 2.5)
+    add_leave(test_db, user, datetime(2026, 3, 9, 9, 0), datetime(2026, 3, 9, 17, 30), 1.0,
+              status=LeaveStatus.CANCELLED.value)
+    test_db.commit()
+
+    index = LeavePeriodIndex.load(test_db, [user.id], date(2026, 3, 1), date(2026, 3, 10))
+    assert index.get(user.id, date(2026, 3, 2)) == {
+        'has_leave': True, 'morning_leave': True, 'afternoon_leave': False, 'full_day_leave': False
+    }
+    assert index.get(user.id, date(2026, 3, 3))['afternoon_leave'] is True
+    assert index.get(user.id, date(2026, 3, 3))['morning_leave'] is False
+    assert index.get(user.id, date(2026, 3, 4))['full_day_leave'] is True
+    assert index.get(user.id, date(2026, 3, 5))['full_day_leave'] is True
+    assert index.get(user.id, date(2026, 3, 6)) == {
+        'has_leave': True, 'morning_leave': True, 'afternoon_leave': False, 'full_day_leave': False
+    }
+    assert index.get(user.id, date(2026, 3, 9))['has_leave'] is False
+    assert index.get(999, date(2026, 3, 2))['has_leave'] is False
+
+
+def test_index_matches_per_day_lookup_for_overlapping_leaves(test_db):
+    rng = random.Random(20260301)
+    users = [create_user(test_db, f"period_user_{i}") for i in range(6)]
+    hours = [(9, 0), (12, 0), (14, 0), (17, 30), (0, 0)]
+    for user in users:
+        for _ in range(12):
+            start = datetime.combine(date(2026, 2, 20) + timedelta(days=rng.randint(0, 40)), datetime.min.time())
+            start = start.replace(hour=rng.choice(hours)[0], minute=rng.choice(hours)[1])
+            end = start + timedelta(hours=rng.choice([3, 8, 24, 50, 200]))
+            add_leave(
+                test_db, user, start, end, rng.choice([0.5, 1.0, 2.0, 3.5]),
+                status=rng.choice([LeaveStatus.APPROVED.value, LeaveStatus.PENDING.value, LeaveStatus.REJECTED.value]),
+            )
+    test_db.commit()
+
+    leaves = test_db.query(LeaveApplication).filter(
+        LeaveApplication.status.notin_([LeaveStatus.REJECTED.value, LeaveStatus.CANCELLED.value])
+    ).all()
+
+    def legacy_period(user_id: int, target: date) -> dict:
+        day_start = datetime.combine(target, datetime.min.time())
+        day_end = datetime.combine(target, datetime.max.time())
+        return resolve_leave_period(
+            [
+                (leave.start_date, leave.end_date, leave.days)
+                for leave in leaves
+                if leave.user_id == user_id and leave.start_date <= day_end and leave.end_date >= day_start
+            ],
+            target,
+        )
+
+    start_day, end_day = date(2026, 3, 1), date(2026, 3, 31)
+    index = LeavePeriodIndex.load(test_db, [u.id for u in users], start_day, end_day)
+    interval_index = LeaveIntervalIndex.load(test_db, [u.id for u in users], start_day, end_day)
+    current = start_day
+    while current <= end_day:
+        for user in users:
+            expected = legacy_period(user.id, current)
+            assert index.get(user.id, current) == expected
+            assert interval_index.get(user.id, current) == expected
+            assert get_leave_period_for_date(user.id, current, test_db) == expected
+        current += timedelta(days=1)
+
+    def halves(leave_index) -> dict:
+        return {(user_id, day): halves for user_id, day, halves in leave_index.iter_halves()}
+
+    assert halves(interval_index) == halves(index)
+
+
+def test_slots_follow_leave_lifecycle(test_db):
+    user = create_user(test_db, "period_lifecycle")
+    leave = add_leave(
+        test_db, user, datetime(2026, 4, 1, 14, 0), datetime(2026, 4, 2, 12, 0), 1.0,
+        status=LeaveStatus.PENDING.value,
+    )
+    test_db.commit()
+
+    def slots() -> list:
+        return sorted(
+            (slot.date, slot.half)
+            for slot in test_db.query(LeaveDaySlot).filter(LeaveDaySlot.leave_id == leave.id)
+        )
+
+    assert slots() == [(date(2026, 4, 1), "afternoon"), (date(2026, 4, 2), "morning")]
+
+    leave.status = LeaveStatus.APPROVED.value
+    leave.end_date = datetime(2026, 4, 3, 17, 30)
+    leave.days = 2.5
+    test_db.commit()
+    assert slots() == [
+        (date(2026, 4, 1), "afternoon"),
+        (date(2026, 4, 2), "afternoon"),
+        (date(2026, 4, 2), "morning"),
+        (date(2026, 4, 3), "afternoon"),
+        (date(2026, 4, 3), "morning"),
+    ]
+    assert get_leave_period_for_date(user.id, date(2026, 4, 2), test_db)['full_day_leave'] is True
+
+    leave.status = LeaveStatus.CANCELLED.value
+    test_db.commit()
+    assert slots() == []
+    assert get_leave_period_for_date(user.id, date(2026, 4, 2), test_db)['has_leave'] is False
+
+    leave.status = LeaveStatus.PENDING.value
+    test_db.commit()
+    assert len(slots()) == 5
+
+    test_db.delete(leave)
+    test_db.commit()
+    assert test_db.query(LeaveDaySlot).count() == 0
+
+
+def test_unbackfilled_slots_fall_back_to_leave_applications(test_db):
+    user = create_user(test_db, "period_upgrade")
+    add_leave(test_db, user, datetime(2026, 5, 6, 14, 0), datetime(2026, 5, 8, 12, 0), 2.0)
+    test_db.commit()
+    # 模拟升级前的数据库：请假申请已存在，半天占用表为空且没有回填记录
+    test_db.query(LeaveDaySlot).delete(synchronize_session=False)
+    test_db.query(DerivedTableBackfill).delete(synchronize_session=False)
+    test_db.commit()
+
+    index = LeavePeriodIndex.load(test_db, [user.id], date(2026, 5, 1), date(2026, 5, 31))
+    assert isinstance(index, LeaveIntervalIndex)
+    assert index.get(user.id, date(2026, 5, 6))['afternoon_leave'] is True
+    assert index.get(user.id, date(2026, 5, 7))['full_day_leave'] is True
+    assert get_leave_period_for_date(user.id, date(2026, 5, 8), test_db) == {
+        'has_leave': True, 'morning_leave': True, 'afternoon_leave': False, 'full_day_leave': False
+    }
+
+    backfill_derived_tables(test_db.get_bind())
+    assert test_db.query(LeaveDaySlot).filter(LeaveDaySlot.user_id == user.id).count() == 4
+    assert isinstance(LeavePeriodIndex.load(test_db, [user.id], date(2026, 5, 1), date(2026, 5, 31)), LeavePeriodIndex)
+    assert get_leave_period_for_date(user.id, date(2026, 5, 7), test_db)['full_day_leave'] is True
+
+
+def test_resolve_without_leaves_is_empty():
+    assert resolve_leave_period([], date(2026, 3, 2)) == {
+        'has_leave': False, 'morning_leave': False, 'afternoon_leave': False, 'full_day_leave': False
+    }
@@ -0,0 +1,295 @@
+"""微信消息发件箱测试：审批接口只写发件箱，后台投递负责重试与死信。"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from backend import notification_outbox
+from backend.config import settings
+from backend.models import Department, NotificationOutbox, OvertimeApplication, OvertimeStatus, User, UserRole
+from backend.notification_outbox import drain_outbox
+from backend.routers import overtime as overtime_router
+from backend.security import create_access_token, get_password_hash
+from backend.services.wechat_message import WechatSendError
+
+
+@pytest.fixture
+def wechat_configured(monkeypatch):
+    monkeypatch.setattr(settings, "WECHAT_APPID", "appid")
+    monkeypatch.setattr(settings, "WECHAT_SECRET", "secret")
+    monkeypatch.setattr(settings, "WECHAT_APPROVAL_TEMPLATE_ID", "approval-template")
+    monkeypatch.setattr(settings, "WECHAT_RESULT_TEMPLATE_ID", "result-template")
+    # 测试中不启动后台投递任务，由用例直接调用 drain_outbox
+    monkeypatch.setattr(settings, "NOTIFICATION_WORKER_ENABLED", False)
+    monkeypatch.setattr(settings, "NOTIFICATION_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "NOTIFICATION_RETRY_BASE_SECONDS", 10)
+    monkeypatch.setattr(notification_outbox.random, "uniform", lambda low, high: 1.0)
+
+
+def auth_header(user: User) -> dict:
+    token = create_access_token(data={"sub": user.username}, expires_delta=timedelta(minutes=30))
+    return {"Authorization": f"Bearer {token}"}
+
+
+def create_user(test_db, username: str, role: UserRole, department_id=None, openid=None) -> User:
+    user = User(
+        username=username,
+        password_hash=get_password_hash("Password123"),
+        real_name=username,
+        role=role,
+        department_id=department_id,
+        wechat_openid=openid,
+        is_active=True,
+    )
+    test_db.add(user)
+    test_db.commit()
+    test_db.refresh(user)
+    return user
+
+
+def create_overtime(test_db, user: User) -> OvertimeApplication:
+    overtime = OvertimeApplication(
+        user_id=user.id,
+        start_time=datetime(2026, 6, 3, 18, 0),
+        end_time=datetime(2026, 6, 3, 20, 0),
+        hours=2,
+        days=0.5,
+        reason="测试",
+        status=OvertimeStatus.PENDING.value,
+    )
+    test_db.add(overtime)
+    test_db.commit()
+    return overtime
+
+
+def enqueue(test_db, overtime: OvertimeApplication) -> NotificationOutbox:
+    message = notification_outbox.enqueue_approval_notification(
+        test_db,
+        overtime,
+        approver_openid="approver-openid",
+        application_type="overtime",
+        applicant_name="张三",
+        application_item="主动加班",
+        application_time="2026-06-03 18:00",
+        reason="测试",
+    )
+    test_db.commit()
+    return message
+
+
+def test_create_overtime_writes_outbox_in_same_transaction(client, test_db, wechat_configured, monkeypatch):
+    calls = []
+    monkeypatch.setattr(notification_outbox, "send_approval_notification", lambda **kwargs: calls.append(kwargs))
+
+    dept = Department(name="发件箱部门")
+    test_db.add(dept)
+    test_db.commit()
+    head = create_user(test_db, "outbox_head", UserRole.DEPARTMENT_HEAD, dept.id, openid="head-openid")
+    dept.head_id = head.id
+    test_db.commit()
+    employee = create_user(test_db, "outbox_employee", UserRole.EMPLOYEE, dept.id)
+
+    response = client.post(
+        "/api/overtime/",
+        json={
+            "start_time": "2026-06-03T18:00:00",
+            "end_time": "2026-06-03T20:00:00",
+            "hours": 2,
+            "days": 0.5,
+            "reason": "上线",
+            "assigned_approver_id": head.id,
+        },
+        headers=auth_header(employee),
+    )
+    assert response.status_code == 201, response.text
+
+    # 接口只写入发件箱，不在请求中调用微信
+    assert calls == []
+    message = test_db.query(NotificationOutbox).one()
+    assert message.overtime_id == response.json()["id"]
+    assert message.kind == notification_outbox.APPROVAL
+    assert message.status == "pending"
+    payload = json.loads(message.payload)
+    assert payload["approver_openid"] == "head-openid"
+    assert "application_id" not in payload
+
+
+def test_concurrent_duplicate_overtime_returns_409_without_outbox_row(client, test_db, wechat_configured, monkeypatch):
+    dept = Department(name="重复提交部门")
+    test_db.add(dept)
+    test_db.commit()
+    head = create_user(test_db, "duplicate_head", UserRole.DEPARTMENT_HEAD, dept.id, openid="head-openid")
+    employee = create_user(test_db, "duplicate_employee", UserRole.EMPLOYEE, dept.id)
+    body = {
+        "start_time": "2026-06-04T18:00:00",
+        "end_time": "2026-06-04T20:00:00",
+        "hours": 2,
+        "days": 0.5,
+        "reason": "上线",
+        "assigned_approver_id": head.id,
+    }
+    assert client.post("/api/overtime/", json=body, headers=auth_header(employee)).status_code == 201
+
+    # 模拟并发请求都通过了提交前的重复检查，由唯一约束兜底
+    monkeypatch.setattr(overtime_router, "find_existing_active_overtime", lambda *args: None)
+    response = client.post("/api/overtime/", json=body, headers=auth_header(employee))
+    assert response.status_code == 409, response.text
+    assert test_db.query(NotificationOutbox).count() == 1
+
+
+def test_enqueue_skipped_without_wechat_config(test_db, monkeypatch):
+    monkeypatch.setattr(settings, "WECHAT_APPID", None)
+    employee = create_user(test_db, "outbox_unconfigured", UserRole.EMPLOYEE)
+    assert enqueue(test_db, create_overtime(test_db, employee)) is None
+    assert test_db.query(NotificationOutbox).count() == 0
+
+
+def test_drain_marks_sent_and_passes_application_id(test_db, wechat_configured):
+    employee = create_user(test_db, "outbox_sent", UserRole.EMPLOYEE)
+    overtime = create_overtime(test_db, employee)
+    message = enqueue(test_db, overtime)
+    sent = []
+
+    assert drain_outbox(test_db, sender=lambda kind, params: sent.append((kind, params)) or True) == 1
+    assert sent[0][0] == notification_outbox.APPROVAL
+    assert sent[0][1]["application_id"] == overtime.id
+    test_db.refresh(message)
+    assert message.status == "sent"
+    assert message.attempts == 1
+    assert message.claim_token is None
+    # 已发送的消息不会再次被认领
+    assert drain_outbox(test_db, sender=lambda kind, params: True) == 0
+
+
+def test_retryable_failure_backs_off_then_dead_letters(test_db, wechat_configured):
+    employee = create_user(test_db, "outbox_retry", UserRole.EMPLOYEE)
+    message = enqueue(test_db, create_overtime(test_db, employee))
+
+    def failing(kind, params):
+        raise WechatSendError("system busy", retryable=True)
+
+    now = datetime.now()
+    assert drain_outbox(test_db, sender=failing, now=now) == 1
+    test_db.refresh(message)
+    assert message.status == "pending"
+    assert message.next_attempt_at == now + timedelta(seconds=10)
+    # 未到重试时间不会被认领
+    assert drain_outbox(test_db, sender=failing, now=now + timedelta(seconds=5)) == 0
+
+    now += timedelta(seconds=10)
+    assert drain_outbox(test_db, sender=failing, now=now) == 1
+    test_db.refresh(message)
+    assert message.next_attempt_at == now + timedelta(seconds=20)
+
+    now += timedelta(seconds=20)
+    assert drain_outbox(test_db, sender=failing, now=now) == 1
+    test_db.refresh(message)
+    assert message.status == "dead"
+    assert message.attempts == 3
+    assert message.last_error == "system busy"
+
+
+def test_non_retryable_failure_dead_letters_immediately(test_db, wechat_configured):
+    employee = create_user(test_db, "outbox_fatal", UserRole.EMPLOYEE)
+    message = enqueue(test_db, create_overtime(test_db, employee))
+
+    def invalid_template(kind, params):
+        raise WechatSendError("invalid template_id (errcode: 40037)", retryable=False)
+
+    assert drain_outbox(test_db, sender=invalid_template) == 1
+    test_db.refresh(message)
+    assert message.status == "dead"
+    assert message.attempts == 1
+
+
+def test_expired_claim_is_reclaimed(test_db, wechat_configured):
+    employee = create_user(test_db, "outbox_reclaim", UserRole.EMPLOYEE)
+    message = enqueue(test_db, create_overtime(test_db, employee))
+    now = datetime.now()
+
+    # 模拟投递进程认领后崩溃：租约期内其他进程认领不到，租约到期后可重新认领
+    assert len(notification_outbox.claim_due_notifications(test_db, 10, now)) == 1
+    assert notification_outbox.claim_due_notifications(test_db, 10, now) == []
+    lease = timedelta(seconds=settings.NOTIFICATION_CLAIM_TIMEOUT_SECONDS)
+    assert drain_outbox(test_db, sender=lambda kind, params: True, now=now + lease) == 1
+    test_db.refresh(message)
+    assert message.status == "sent"
+    # 崩溃的进程尚未开始发送，只计一次尝试
+    assert message.attempts == 1
+
+
+def test_message_reclaimed_while_batch_waits_is_sent_once(test_db, wechat_configured, monkeypatch):
+    class FakeDatetime(datetime):
+        current = datetime(2026, 6, 3, 9, 0)
+
+        @classmethod
+        def now(cls, tz=None):
+            return cls.current
+
+    monkeypatch.setattr(notification_outbox, "datetime", FakeDatetime)
+    messages = [
+        enqueue(test_db, create_overtime(test_db, create_user(test_db, f"outbox_slow_{index}", UserRole.EMPLOYEE)))
+        for index in range(3)
+    ]
+    for message in messages:
+        message.next_attempt_at = FakeDatetime.current
+    test_db.commit()
+    ids = [message.overtime_id for message in messages]
+    sent = []
+    other_worker_sent = []
+
+    def other_worker_drain():
+        other_db = sessionmaker(bind=test_db.get_bind(), autoflush=False)()
+        try:
+            return drain_outbox(other_db, sender=lambda kind, params: other_worker_sent.append(params["application_id"]) or True)
+        finally:
+            other_db.close()
+
+    def slow_sender(kind, params):
+        # 上游很慢：前两条共耗时 130 秒，整批认领的 120 秒租约在第三条发送前已过期
+        sent.append(params["application_id"])
+        FakeDatetime.current += timedelta(seconds=100 if len(sent) == 1 else 30)
+        if len(sent) == 2:
+            # 另一个 worker 只能重新认领尚未开始发送的第三条，发送前已续租的消息不会被抢走
+            assert other_worker_drain() == 1
+        return True
+
+    assert drain_outbox(test_db, sender=slow_sender) == 2
+    assert sent == ids[:2]
+    assert other_worker_sent == ids[2:]
+    for message in messages:
+        test_db.refresh(message)
+        assert message.status == "sent"
+        assert message.attempts == 1
+        assert message.claim_token is None
+
+
+def test_worker_delivers_when_notified_after_commit(test_db, wechat_configured, monkeypatch):
+    employee = create_user(test_db, "outbox_worker", UserRole.EMPLOYEE)
+    overtime = create_overtime(test_db, employee)
+    delivered = []
+    monkeypatch.setattr(notification_outbox, "send_outbox_message", lambda kind, params: delivered.append(params) or True)
+    worker = notification_outbox.NotificationWorker(
+        sessionmaker(bind=test_db.get_bind(), autoflush=False),
+        batch_size=10,
+        poll_interval=60,
+    )
+    monkeypatch.setattr(notification_outbox, "notification_worker", worker)
+
+    async def scenario():
+        await worker.start()
+        try:
+            await asyncio.sleep(0.1)
+            # 提交事务后由 after_commit 唤醒，无需等待 60 秒的轮询间隔
+            await asyncio.to_thread(enqueue, test_db, overtime)
+            for _ in range(50):
+                if delivered:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            await worker.stop()
+
+    asyncio.run(scenario())
+    assert [params["application_id"] for params in delivered] == [overtime.id]
@@ -0,0 +1,63 @@
+"""登录密码校验线程池与 bcrypt 成本因子重算测试。"""
+
+import threading
+
+from passlib.context import CryptContext
+
+from backend import security
+from backend.config import settings
+from backend.models import User, UserRole
+
+
+def _create_user(test_db, username: str, password_hash: str) -> int:
+    user = User(
+        username=username,
+        password_hash=password_hash,
+        real_name=username,
+        role=UserRole.EMPLOYEE,
+        is_active=True,
+    )
+    test_db.add(user)
+    test_db.commit()
+    return user.id
+
+
+def _stored_hash(test_db, user_id: int) -> str:
+    test_db.expire_all()
+    return test_db.query(User).filter(User.id == user_id).one().password_hash
+
+
+def test_login_rehashes_password_when_cost_factor_changes(client, test_db):
+    legacy_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("Password123")
+    user_id = _create_user(test_db, "rehash_user", legacy_hash)
+
+    wrong = client.post("/api/auth/login", json={"username": "rehash_user", "password": "wrong-pass"})
+    assert wrong.status_code == 401
+    assert _stored_hash(test_db, user_id) == legacy_hash
+
+    response = client.post("/api/auth/login", json={"username": "rehash_user", "password": "Password123"})
+    assert response.status_code == 200
+    rehashed = _stored_hash(test_db, user_id)
+    assert rehashed != legacy_hash
+    assert rehashed.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+    assert security.verify_password("Password123", rehashed)
+
+    # 已是当前成本的哈希不再重算
+    assert client.post("/api/auth/login", json={"username": "rehash_user", "password": "Password123"}).status_code == 200
+    assert _stored_hash(test_db, user_id) == rehashed
+
+
+def test_login_verifies_password_on_dedicated_pool(client, test_db, monkeypatch):
+    _create_user(test_db, "pool_user", security.get_password_hash("Password123"))
+    threads = []
+    original = security.verify_password_and_rehash
+
+    def record_thread(plain_password, hashed_password):
+        threads.append(threading.current_thread().name)
+        return original(plain_password, hashed_password)
+
+    monkeypatch.setattr(security, "verify_password_and_rehash", record_thread)
+    response = client.post("/api/auth/login", json={"username": "pool_user", "password": "Password123"})
+    assert response.status_code == 200
+    assert len(threads) == 1
+    assert threads[0].startswith("password-hash")
@@ -0,0 +1,119 @@
+"""热点查询执行计划测试：日期区间条件应走索引而不是全表扫描。"""
+
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from sqlalchemy import event
+
+from backend.attendance_rollups import collect_user_counters
+from backend.models import Attendance, User, UserRole
+from backend.security import create_access_token, get_password_hash
+
+
+def auth_header(user: User) -> dict:
+    token = create_access_token(data={"sub": user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def create_user(test_db, username: str, role=UserRole.EMPLOYEE) -> User:
+    user = User(
+        username=username,
+        password_hash=get_password_hash("Password123"),
+        real_name=username,
+        role=role,
+        is_active=True,
+    )
+    test_db.add(user)
+    test_db.commit()
+    test_db.refresh(user)
+    return user
+
+
+@contextmanager
+def captured_statements(test_db):
+    """记录期间执行的 SELECT 语句及参数"""
+    engine = test_db.get_bind()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def query_plans(test_db, statements, table: str):
+    """对访问 table 的语句执行 EXPLAIN QUERY PLAN，返回该表相关的计划行"""
+    connection = test_db.connection().connection.driver_connection
+    plans = []
+    for statement, parameters in statements:
+        if f"FROM {table}" not in statement:
+            continue
+        rows = connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+        plans.append([row[-1] for row in rows if f" {table}" in row[-1]])
+    return plans
+
+
+def assert_uses_index(plans, expected: str):
+    """每条目标查询都以索引检索（SEARCH）访问该表，且计划中包含 expected（索引名或索引条件）"""
+    assert plans, "未捕获到目标查询"
+    for details in plans:
+        assert details, "未找到目标表的执行计划"
+        assert any(detail.startswith("SEARCH") and expected in detail for detail in details), details
+
+
+def test_attendance_date_range_uses_user_date_index(client, test_db):
+    user = create_user(test_db, "plan_employee")
+    test_db.add(Attendance(user_id=user.id, date=datetime(2026, 3, 2), work_hours=8.0))
+    test_db.commit()
+
+    with captured_statements(test_db) as statements:
+        response = client.get(
+            "/api/attendance/my",
+            params={"start_date": "2026-03-01", "end_date": "2026-03-31"},
+            headers=auth_header(user),
+        )
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    # (user_id, date) 唯一约束对应 SQLite 自动索引，按索引条件断言
+    assert_uses_index(query_plans(test_db, statements, "attendances"), "(user_id=? AND date>? AND date<?)")
+
+
+def test_overtime_range_queries_use_composite_index(client, test_db):
+    admin = create_user(test_db, "plan_admin", role=UserRole.ADMIN)
+    employee = create_user(test_db, "plan_overtime_user")
+    headers = auth_header(admin)
+
+    with captured_statements(test_db) as statements:
+        detail = client.get(
+            f"/api/statistics/user/{employee.id}/overtime-details",
+            params={"start_date": "2026-03-01", "end_date": "2026-03-31"},
+            headers=headers,
+        )
+        passive = client.get(
+            "/api/vacation/passive-overtime/detail",
+            params={"user_id": employee.id, "year": 2026, "month": 3},
+            headers=headers,
+        )
+    assert detail.status_code == 200
+    assert passive.status_code == 200
+    assert_uses_index(
+        query_plans(test_db, statements, "overtime_applications"),
+        "idx_overtime_applications_user_status_start",
+    )
+
+
+def test_leave_overlap_query_uses_composite_index(test_db):
+    user = create_user(test_db, "plan_leave_user")
+
+    # 1月15日起的区间：首尾月份走明细查询，跨月请假走延续查询
+    with captured_statements(test_db) as statements:
+        collect_user_counters(test_db, [user.id], date(2026, 1, 15), date(2026, 3, 10))
+    assert_uses_index(
+        query_plans(test_db, statements, "leave_applications"),
+        "idx_leave_applications_user_status_dates",
+    )
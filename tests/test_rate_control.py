@@ -0,0 +1,188 @@
+"""高德地图调用限速、配额与熔断测试。"""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from backend import geocode_cache as geocode_cache_module
+from backend.config import settings
+from backend.geocode_cache import GeocodeCache
+from backend.models import User, UserRole
+from backend.rate_control import CircuitBreaker, DailyQuota, TokenBucket
+from backend.routers import attendance
+from backend.security import create_access_token, get_password_hash
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_quota_and_breaker_state_machine():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=2, max_wait=1.0, clock=clock)
+    # 突发 2 个立即放行，之后按 0.5 秒间隔排队，等待超过 1 秒的拒绝
+    assert [bucket.reserve() for _ in range(5)] == [0.0, 0.0, 0.5, 1.0, None]
+    clock.now += 1.0
+    assert bucket.reserve() == 0.5
+    assert bucket.stats()["rejected"] == 1
+
+    quota = DailyQuota(limit=2)
+    assert quota.try_consume() and quota.try_consume()
+    assert not quota.try_consume()
+    quota.refund()
+    assert quota.try_consume()
+
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.is_open() and not breaker.allow()
+    clock.now += 30
+    # 冷却结束只放行一个试探请求
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["opened"] == 2
+
+
+class _FakeAmapClient:
+    def __init__(self, fail: bool):
+        self.fail = fail
+        self.calls = []
+
+    async def get(self, url, params=None, timeout=None):
+        self.calls.append(params["location"])
+        if self.fail:
+            raise httpx.ConnectTimeout("timed out")
+        return httpx.Response(200, json={
+            "status": "1", "infocode": "10000", "regeocode": {"formatted_address": f"地址 {params['location']}"},
+        })
+
+
+def test_batch_deduplicates_and_breaker_fails_fast(client, test_db, monkeypatch):
+    admin = User(
+        username="geo_admin",
+        password_hash=get_password_hash("Password123"),
+        real_name="管理员",
+        role=UserRole.ADMIN,
+        is_active=True,
+    )
+    test_db.add(admin)
+    test_db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': admin.username})}"}
+
+    monkeypatch.setattr(settings, "AMAP_API_KEY", "test-key")
+    monkeypatch.setattr(
+        geocode_cache_module,
+        "geocode_cache",
+        GeocodeCache(None, max_entries=100, memory_entries=100, ttl_seconds=3600, sweep_interval_seconds=600),
+    )
+    monkeypatch.setattr(attendance, "amap_rate_limiter", TokenBucket(rate=0, burst=1, max_wait=0))
+    monkeypatch.setattr(attendance, "amap_daily_quota", DailyQuota(limit=100))
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    monkeypatch.setattr(attendance, "amap_circuit_breaker", breaker)
+
+    amap = _FakeAmapClient(fail=False)
+    monkeypatch.setattr(attendance, "get_async_client", lambda: amap)
+    same = {"latitude": 31.2304, "longitude": 121.4737}
+    response = client.post(
+        "/api/attendance/geocode/batch",
+        json={"locations": [same, same, {"latitude": 31.23041, "longitude": 121.47369}, {"latitude": 30.0, "longitude": 120.0}]},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    addresses = [item["address"] for item in response.json()["results"]]
+    assert addresses[:3] == ["地址 121.4737,31.2304"] * 3
+    assert len(amap.calls) == 2
+
+    # 上游超时：连续失败达到阈值后熔断，之后直接返回坐标不再请求
+    amap = _FakeAmapClient(fail=True)
+    monkeypatch.setattr(attendance, "get_async_client", lambda: amap)
+    for index in range(4):
+        response = client.get(
+            "/api/attendance/geocode/reverse",
+            params={"latitude": 40.0 + index, "longitude": 116.0},
+            headers=headers,
+        )
+        assert response.json()["address"] == f"{40.0 + index:.6f}, {116.0:.6f}"
+    assert len(amap.calls) == 2
+    assert breaker.state == CircuitBreaker.OPEN
+
+    stats = client.get("/api/attendance/geocode/stats", headers=headers).json()
+    assert stats["circuit_breaker"]["rejected"] == 2
+    assert stats["daily_quota"]["used"] == 4
+
+    # 熔断期间返回的坐标带有原因，客户端可据此区分真实地址并稍后重试
+    response = client.post(
+        "/api/attendance/geocode/batch",
+        json={"locations": [{"latitude": 45.0, "longitude": 116.0}]},
+        headers=headers,
+    )
+    assert response.json()["results"][0] == {
+        "latitude": 45.0, "longitude": 116.0, "address": "45.000000, 116.000000", "error": "circuit_open",
+    }
+
+    # 限速：令牌不足的坐标标注 rate_limited，已解析的坐标没有 error
+    monkeypatch.setattr(attendance, "amap_rate_limiter", TokenBucket(rate=0.001, burst=1, max_wait=0))
+    monkeypatch.setattr(attendance, "amap_circuit_breaker", CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    monkeypatch.setattr(attendance, "get_async_client", lambda: _FakeAmapClient(fail=False))
+    response = client.post(
+        "/api/attendance/geocode/batch",
+        json={"locations": [{"latitude": 46.0 + index, "longitude": 116.0} for index in range(3)]},
+        headers=headers,
+    )
+    errors = sorted(str(item["error"]) for item in response.json()["results"])
+    assert errors == ["None", "rate_limited", "rate_limited"]
+
+
+def test_breaker_checked_before_token_and_only_success_status_counts(monkeypatch):
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, burst=1, max_wait=0, clock=clock)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, clock=clock)
+    monkeypatch.setattr(attendance, "amap_rate_limiter", bucket)
+    monkeypatch.setattr(attendance, "amap_daily_quota", DailyQuota(limit=100))
+    monkeypatch.setattr(attendance, "amap_circuit_breaker", breaker)
+    async def _skip_cache(*args):
+        return None
+
+    monkeypatch.setattr(attendance, "aset_cached_address", _skip_cache)
+
+    class _ErrorClient:
+        def __init__(self, infocode):
+            self.infocode = infocode
+
+        async def get(self, url, params=None, timeout=None):
+            return httpx.Response(200, json={"status": "0", "infocode": self.infocode, "info": "错误"})
+
+    # 参数类错误不是上游不可用：既不计成功也不计失败
+    monkeypatch.setattr(attendance, "get_async_client", lambda: _ErrorClient("20000"))
+    with pytest.raises(HTTPException):
+        asyncio.run(attendance._fetch_reverse_geocode(31.0, 121.0, "key"))
+    assert breaker.stats()["successes"] == 0 and breaker.stats()["failures"] == 0
+
+    # 限流类错误计入熔断
+    clock.now += 1
+    monkeypatch.setattr(attendance, "get_async_client", lambda: _ErrorClient("10003"))
+    with pytest.raises(HTTPException):
+        asyncio.run(attendance._fetch_reverse_geocode(31.0, 121.0, "key"))
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # 冷却结束：试探名额被占用时被拒绝的调用不消耗令牌
+    clock.now += 60
+    assert breaker.allow()
+    tokens_before = bucket.stats()["granted"]
+    with pytest.raises(attendance.GeocodeThrottled) as throttled:
+        asyncio.run(attendance._fetch_reverse_geocode(31.0, 121.0, "key"))
+    assert throttled.value.reason == attendance.GEOCODE_CIRCUIT_OPEN
+    assert bucket.stats()["granted"] == tokens_before
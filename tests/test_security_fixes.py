@@ -1,5 +1,8 @@
+import asyncio
 from datetime import datetime, timedelta
 
+import pytest
+
 from backend.models import (
     Attendance,
     Department,
@@ -12,6 +15,7 @@ from backend.models import (
     UserRole,
     VicePresidentDepartment,
 )
+from backend.auth_limiter import auth_failure_limiter
 from backend.security import create_access_token, get_password_hash
 
 
@@ -85,6 +89,35 @@ def test_login_failures_are_rate_limited(client, test_db):
     assert response.status_code == 429
 
 
+def test_login_limiter_runs_off_the_event_loop(client, test_db, monkeypatch):
+    create_user(test_db, "threaded_limit_user", UserRole.EMPLOYEE)
+    calls = []
+
+    class LoopCheckingStore:
+        # SQLite 存储是阻塞 I/O：确认登录接口不在事件循环线程中调用存储
+        def _called(self, name):
+            with pytest.raises(RuntimeError):
+                asyncio.get_running_loop()
+            calls.append(name)
+
+        def count(self, scope, key, now, window):
+            self._called("count")
+            return 0
+
+        def record(self, scope, key, now, window):
+            self._called("record")
+            return 1
+
+        def clear(self, scope, key):
+            self._called("clear")
+
+    monkeypatch.setattr(auth_failure_limiter, "store", LoopCheckingStore())
+    client.post("/api/auth/login", json={"username": "threaded_limit_user", "password": "wrong"})
+    client.post("/api/auth/login", json={"username": "threaded_limit_user", "password": "Password123"})
+
+    assert calls == ["count", "record", "count", "clear"]
+
+
 def test_department_list_requires_authentication(client, test_db):
     test_db.add(Department(name="内部部门"))
     test_db.commit()
@@ -0,0 +1,165 @@
+"""考勤统计批量聚合回归测试。"""
+
+from datetime import date, datetime
+
+from sqlalchemy import event
+
+from backend.auth_user_cache import auth_user_cache
+from backend.models import (
+    Attendance,
+    LeaveApplication,
+    LeaveStatus,
+    LeaveType,
+    OvertimeApplication,
+    OvertimeStatus,
+    OvertimeType,
+    User,
+    UserRole,
+)
+from backend.routers.statistics import aggregate_user_statistics
+from backend.security import create_access_token, get_password_hash
+
+
+def auth_header(user: User) -> dict:
+    token = create_access_token(data={"sub": user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def create_user(test_db, username: str, role: UserRole = UserRole.EMPLOYEE) -> User:
+    user = User(
+        username=username,
+        password_hash=get_password_hash("Password123"),
+        real_name=username,
+        role=role,
+        is_active=True,
+        enable_attendance=True,
+    )
+    test_db.add(user)
+    test_db.commit()
+    test_db.refresh(user)
+    return user
+
+
+def seed_user_records(test_db, user: User, annual: LeaveType, sick: LeaveType) -> None:
+    test_db.add_all([
+        Attendance(user_id=user.id, date=datetime(2026, 7, 1), is_late=True, work_hours=8.0),
+        Attendance(user_id=user.id, date=datetime(2026, 7, 2), is_early_leave=True, work_hours=7.5),
+        Attendance(user_id=user.id, date=datetime(2026, 8, 3), work_hours=8.0),
+        LeaveApplication(
+            user_id=user.id,
+            start_date=datetime(2026, 7, 6, 9, 0),
+            end_date=datetime(2026, 7, 7, 17, 30),
+            days=2.0,
+            reason="年假",
+            status=LeaveStatus.APPROVED.value,
+            leave_type_id=annual.id,
+        ),
+        LeaveApplication(
+            user_id=user.id,
+            start_date=datetime(2026, 7, 8, 9, 0),
+            end_date=datetime(2026, 7, 8, 12, 0),
+            days=0.5,
+            reason="病假",
+            status=LeaveStatus.APPROVED.value,
+            leave_type_id=sick.id,
+        ),
+        LeaveApplication(
+            user_id=user.id,
+            start_date=datetime(2026, 7, 9, 9, 0),
+            end_date=datetime(2026, 7, 9, 17, 30),
+            days=1.0,
+            reason="待审批不计入",
+            status=LeaveStatus.PENDING.value,
+            leave_type_id=annual.id,
+        ),
+        OvertimeApplication(
+            user_id=user.id,
+            start_time=datetime(2026, 7, 4, 9, 0),
+            end_time=datetime(2026, 7, 4, 18, 0),
+            hours=8.0,
+            days=1.0,
+            reason="主动加班",
+            status=OvertimeStatus.APPROVED.value,
+            overtime_type=OvertimeType.ACTIVE,
+        ),
+        OvertimeApplication(
+            user_id=user.id,
+            start_time=datetime(2026, 7, 5, 9, 0),
+            end_time=datetime(2026, 7, 5, 12, 0),
+            hours=3.0,
+            days=0.5,
+            reason="被动加班",
+            status=OvertimeStatus.APPROVED.value,
+            overtime_type=OvertimeType.PASSIVE,
+        ),
+    ])
+    test_db.commit()
+
+
+def test_aggregate_user_statistics_matches_per_user_rules(test_db):
+    user = create_user(test_db, "agg_user")
+    idle = create_user(test_db, "agg_idle")
+    annual = LeaveType(name="年假调休", is_active=True)
+    sick = LeaveType(name="病假", is_active=False)
+    test_db.add_all([annual, sick])
+    test_db.commit()
+    seed_user_records(test_db, user, annual, sick)
+
+    result = aggregate_user_statistics(
+        test_db, [user.id, idle.id], date(2026, 7, 1), date(2026, 7, 31)
+    )
+
+    assert result[user.id]["present_days"] == 2
+    assert result[user.id]["late_days"] == 1
+    assert result[user.id]["early_leave_days"] == 1
+    assert result[user.id]["work_hours"] == 15.5
+    assert result[user.id]["leave_days"] == 2.5
+    assert result[user.id]["leave_count"] == 2
+    assert result[user.id]["leave_type_breakdown"] == [
+        {"leave_type_id": annual.id, "leave_type_name": "年假调休", "total_days": 2.0, "total_count": 1},
+        {"leave_type_id": sick.id, "leave_type_name": "未分类", "total_days": 0.5, "total_count": 1},
+    ]
+    assert result[user.id]["active_overtime_days"] == 1.0
+    assert result[user.id]["passive_overtime_count"] == 1
+    assert result[idle.id]["present_days"] == 0
+    assert result[idle.id]["leave_type_breakdown"] == []
+
+
+def test_attendance_statistics_query_count_is_independent_of_user_count(client, test_db, monkeypatch):
+    # 用户缓存按时间间隔检查其他 worker 的修改，固定为不检查，避免造数耗时不同导致查询次数波动
+    monkeypatch.setattr(auth_user_cache, "check_interval_seconds", 3600)
+    admin = create_user(test_db, "agg_admin", UserRole.ADMIN)
+    annual = LeaveType(name="年假调休", is_active=True)
+    sick = LeaveType(name="病假", is_active=True)
+    test_db.add_all([annual, sick])
+    test_db.commit()
+
+    engine = test_db.get_bind()
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def request_query_count() -> int:
+        statements.clear()
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            response = client.get(
+                "/api/statistics/attendance?start_date=2026-07-01&end_date=2026-07-31",
+                headers=auth_header(admin),
+            )
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+        assert response.status_code == 200
+        return len(statements)
+
+    # 预热进程级缓存（节假日日历等），只比较稳定状态下的查询次数
+    request_query_count()
+    seed_user_records(test_db, create_user(test_db, "agg_first"), annual, sick)
+    small = request_query_count()
+
+    for index in range(5):
+        seed_user_records(test_db, create_user(test_db, f"agg_more_{index}"), annual, sick)
+    large = request_query_count()
+
+    assert large == small
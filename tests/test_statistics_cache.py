@@ -0,0 +1,165 @@
+"""统计结果缓存测试。"""
+
+import threading
+import time
+from datetime import datetime
+
+from backend.models import Attendance, Department, Holiday, User, UserRole
+from backend.security import create_access_token, get_password_hash
+from backend.statistics_cache import StatisticsCache, statistics_cache
+
+
+def auth_header(user: User) -> dict:
+    token = create_access_token(data={"sub": user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def create_user(test_db, username: str, role=UserRole.EMPLOYEE, department_id=None) -> User:
+    user = User(
+        username=username,
+        password_hash=get_password_hash("Password123"),
+        real_name=username,
+        role=role,
+        department_id=department_id,
+        is_active=True,
+    )
+    test_db.add(user)
+    test_db.commit()
+    test_db.refresh(user)
+    return user
+
+
+def test_period_statistics_cached_until_tracked_table_changes(client, test_db):
+    admin = create_user(test_db, "cache_admin", role=UserRole.ADMIN)
+    employee = create_user(test_db, "cache_employee")
+    headers = auth_header(admin)
+    params = {"start_date": "2026-03-02", "end_date": "2026-03-06"}
+
+    before = statistics_cache.stats()
+    first = client.get("/api/statistics/period", params=params, headers=headers)
+    second = client.get("/api/statistics/period", params=params, headers=headers)
+    assert first.status_code == 200
+    assert first.json() == second.json()
+    after = statistics_cache.stats()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+    assert first.json()["attendance_rate"] == 0
+
+    test_db.add(Attendance(user_id=employee.id, date=datetime(2026, 3, 2), work_hours=8.0))
+    test_db.commit()
+    refreshed = client.get("/api/statistics/period", params=params, headers=headers).json()
+    assert refreshed["attendance_rate"] > 0
+
+    test_db.add(Holiday(date="2026-03-03", name="公司假", type="company_holiday"))
+    test_db.commit()
+    with_holiday = client.get("/api/statistics/period", params=params, headers=headers).json()
+    assert with_holiday["attendance_rate"] > refreshed["attendance_rate"]
+
+    # 批量删除不触发模型事件，同样需要失效
+    test_db.query(Attendance).filter(Attendance.user_id == employee.id).delete(synchronize_session=False)
+    test_db.commit()
+    assert client.get("/api/statistics/period", params=params, headers=headers).json()["attendance_rate"] == 0
+
+    stats = client.get("/api/statistics/cache", headers=headers).json()
+    assert stats["hits"] >= 1 and stats["misses"] >= 4
+
+
+def test_cache_key_separates_viewer_scope(client, test_db):
+    sales = Department(name="销售部")
+    ops = Department(name="运营部")
+    test_db.add_all([sales, ops])
+    test_db.commit()
+    sales_head = create_user(test_db, "sales_head", role=UserRole.DEPARTMENT_HEAD, department_id=sales.id)
+    ops_head = create_user(test_db, "ops_head", role=UserRole.DEPARTMENT_HEAD, department_id=ops.id)
+    create_user(test_db, "sales_staff", department_id=sales.id)
+    create_user(test_db, "ops_staff", department_id=ops.id)
+    params = {"start_date": "2026-03-02", "end_date": "2026-03-06"}
+
+    sales_view = client.get("/api/statistics/attendance", params=params, headers=auth_header(sales_head)).json()
+    ops_view = client.get(
+        "/api/statistics/attendance",
+        params={**params, "department_id": sales.id},
+        headers=auth_header(ops_head),
+    ).json()
+    assert {item["department"] for item in sales_view} == {"销售部"}
+    assert {item["department"] for item in ops_view} == {"运营部"}
+
+    columnar = client.get(
+        "/api/statistics/attendance/daily",
+        params={**params, "format": "columnar"},
+        headers=auth_header(sales_head),
+    ).json()
+    nested = client.get("/api/statistics/attendance/daily", params=params, headers=auth_header(sales_head)).json()
+    assert columnar["format"] == "columnar"
+    assert "statistics" in nested
+
+
+def test_concurrent_identical_requests_compute_once(test_db):
+    cache = StatisticsCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"value": 42}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute(test_db, ("k",), compute)))
+        for _ in range(8)
+    ]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()["coalesced"] < 7 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [{"value": 42}] * 8
+    assert cache.stats() == {"hits": 0, "misses": 1, "coalesced": 7, "entries": 1, "weight": 1}
+    assert cache.get_or_compute(test_db, ("k",), compute) == {"value": 42}
+    assert cache.stats()["hits"] == 1
+
+
+def test_result_computed_across_a_write_is_not_stored(test_db):
+    cache = StatisticsCache()
+
+    def compute_with_concurrent_write():
+        cache.bump(["attendances"])
+        return "stale"
+
+    assert cache.get_or_compute(test_db, ("k",), compute_with_concurrent_write) == "stale"
+    assert cache.stats()["entries"] == 0
+    assert cache.get_or_compute(test_db, ("k",), lambda: "fresh") == "fresh"
+    assert cache.get_or_compute(test_db, ("k",), lambda: "unused") == "fresh"
+
+
+def test_entries_evicted_by_estimated_weight(test_db):
+    cache = StatisticsCache(max_entries=100, max_weight=1000)
+
+    def rows(count):
+        return lambda: ["cell"] * count
+
+    cache.get_or_compute(test_db, ("small",), rows(10), weight=len)
+    cache.get_or_compute(test_db, ("daily", 1), rows(600), weight=len)
+    assert cache.stats()["weight"] == 610
+    # 超过体积上限时淘汰最久未使用的项
+    cache.get_or_compute(test_db, ("small",), rows(10), weight=len)
+    cache.get_or_compute(test_db, ("daily", 2), rows(500), weight=len)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["weight"] == 510
+
+    # 单个结果超过上限时不缓存，也不挤掉已有项
+    cache.get_or_compute(test_db, ("daily", 3), rows(5000), weight=len)
+    assert cache.stats()["entries"] == 2
+    misses = cache.stats()["misses"]
+    cache.get_or_compute(test_db, ("small",), rows(10), weight=len)
+    assert cache.stats()["misses"] == misses
@@ -0,0 +1,102 @@
+"""系统设置缓存测试。"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, update
+
+from backend.models import SystemSetting, User, UserRole
+from backend.routers.system_settings import (
+    get_annual_leave_start_year,
+    is_comp_leave_yearly_reset_enabled,
+    is_gm_auto_approve_enabled,
+)
+from backend.security import create_access_token, get_password_hash
+from backend.system_settings_cache import (
+    ANNUAL_LEAVE_START_YEAR_KEY,
+    GM_AUTO_APPROVE_KEY,
+    SystemSettings,
+    system_settings_cache,
+)
+
+
+def _count_statements(test_db):
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(test_db.get_bind(), "before_cursor_execute", count_statement)
+    return statements, lambda: event.remove(test_db.get_bind(), "before_cursor_execute", count_statement)
+
+
+def test_settings_loaded_once_and_refreshed_after_update(client, test_db):
+    admin = User(
+        username="settings_admin",
+        password_hash=get_password_hash("Password123"),
+        real_name="设置管理员",
+        role=UserRole.ADMIN,
+        is_active=True,
+    )
+    test_db.add(admin)
+    test_db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': admin.username})}"}
+
+    statements, stop = _count_statements(test_db)
+    try:
+        assert get_annual_leave_start_year(test_db) == 2025
+        assert is_gm_auto_approve_enabled(test_db) is False
+        assert is_comp_leave_yearly_reset_enabled(test_db) is False
+    finally:
+        stop()
+    # 版本检查 + 整表载入，之后的读取不再查询
+    assert len(statements) == 2
+
+    response = client.put(
+        "/api/system-settings/",
+        json={"auto_approve_gm_level": True, "annual_leave_start_year": 2023},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["auto_approve_gm_level"] is True
+    assert is_gm_auto_approve_enabled(test_db) is True
+    assert get_annual_leave_start_year(test_db) == 2023
+    assert client.get("/api/system-settings/", headers=headers).json() == {
+        "auto_approve_gm_level": True,
+        "comp_leave_yearly_reset": False,
+        "annual_leave_yearly_reset": False,
+        "annual_leave_start_year": 2023,
+    }
+
+
+def test_other_process_writes_detected_by_version_check(test_db, monkeypatch):
+    test_db.add(SystemSetting(key=GM_AUTO_APPROVE_KEY, value="false"))
+    test_db.commit()
+    assert system_settings_cache.get(test_db) == SystemSettings()
+
+    # 模拟其他进程直接写库：本进程没有提交事件，缓存在检查间隔内保持不变
+    with test_db.get_bind().begin() as connection:
+        connection.execute(
+            update(SystemSetting.__table__)
+            .where(SystemSetting.__table__.c.key == GM_AUTO_APPROVE_KEY)
+            .values(value="true", updated_at=datetime.now() + timedelta(seconds=1))
+        )
+    assert is_gm_auto_approve_enabled(test_db) is False
+
+    monkeypatch.setattr(system_settings_cache, "check_interval_seconds", 0)
+    statements, stop = _count_statements(test_db)
+    try:
+        assert is_gm_auto_approve_enabled(test_db) is True
+        # 版本未变时只做一次版本检查
+        assert is_gm_auto_approve_enabled(test_db) is True
+    finally:
+        stop()
+    assert len(statements) == 3
+
+
+def test_uncommitted_setting_visible_in_own_session_only_until_rollback(test_db):
+    assert get_annual_leave_start_year(test_db) == 2025
+    test_db.add(SystemSetting(key=ANNUAL_LEAVE_START_YEAR_KEY, value="2021"))
+    test_db.flush()
+    assert get_annual_leave_start_year(test_db) == 2021
+    test_db.rollback()
+    assert get_annual_leave_start_year(test_db) == 2025
@@ -0,0 +1,174 @@
+"""微信 access_token 管理测试：进程内单次刷新、多 worker 共享 SQLite 存储、后台提前刷新。"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.wechat_token import (
+    FOREGROUND_REFRESH_MARGIN_SECONDS,
+    REFRESH_RETRY_SECONDS,
+    AccessTokenManager,
+    MemoryTokenSlot,
+    SQLiteTokenSlot,
+)
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingFetcher:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        time.sleep(self.delay)
+        return f"token-{calls}", 7200
+
+
+def make_manager(slot, fetcher, clock=time.time, **kwargs):
+    return AccessTokenManager(
+        slot,
+        refresh_ahead_seconds=kwargs.pop("refresh_ahead_seconds", 600),
+        lease_seconds=kwargs.pop("lease_seconds", 5),
+        fetcher=fetcher,
+        clock=clock,
+        **kwargs,
+    )
+
+
+def test_concurrent_threads_refresh_once():
+    fetcher = CountingFetcher(delay=0.1)
+    manager = make_manager(MemoryTokenSlot(), fetcher)
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        tokens = list(executor.map(lambda _: manager.get_token("appid"), range(16)))
+
+    assert tokens == ["token-1"] * 16
+    assert fetcher.calls == 1
+
+
+def test_workers_share_token_through_sqlite_slot(tmp_path):
+    path = str(tmp_path / "wechat_token.db")
+    fetcher_a, fetcher_b = CountingFetcher(), CountingFetcher()
+    # 两个 manager 各自打开同一个文件，模拟同一主机上的两个 worker 进程
+    worker_a = make_manager(SQLiteTokenSlot(path), fetcher_a)
+    worker_b = make_manager(SQLiteTokenSlot(path), fetcher_b)
+    try:
+        assert worker_a.get_token("appid") == "token-1"
+        assert worker_b.get_token("appid") == "token-1"
+        assert (fetcher_a.calls, fetcher_b.calls) == (1, 0)
+    finally:
+        worker_a.close()
+        worker_b.close()
+
+
+def test_worker_waits_for_lease_holder_instead_of_fetching(tmp_path):
+    path = str(tmp_path / "wechat_token.db")
+    holder_slot = SQLiteTokenSlot(path)
+    fetcher = CountingFetcher()
+    waiter = make_manager(SQLiteTokenSlot(path), fetcher)
+    try:
+        # 另一个 worker 已取得刷新租约，正在调用微信接口
+        assert holder_slot.try_lease("appid", time.time(), 5)
+        assert not holder_slot.try_lease("appid", time.time(), 5)
+        timer = threading.Timer(0.3, holder_slot.store, args=("appid", "holder-token", time.time() + 7200))
+        timer.start()
+        assert waiter.get_token("appid") == "holder-token"
+        assert fetcher.calls == 0
+        timer.join()
+    finally:
+        holder_slot.close()
+        waiter.close()
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    path = str(tmp_path / "wechat_token.db")
+    clock = FakeClock()
+    crashed_slot = SQLiteTokenSlot(path)
+    fetcher = CountingFetcher()
+    manager = make_manager(SQLiteTokenSlot(path), fetcher, clock=clock)
+    try:
+        assert crashed_slot.try_lease("appid", clock.now - 10, 5)
+        assert manager.get_token("appid") == "token-1"
+        assert fetcher.calls == 1
+    finally:
+        crashed_slot.close()
+        manager.close()
+
+
+def test_release_keeps_lease_taken_over_by_another_worker(tmp_path):
+    path = str(tmp_path / "wechat_token.db")
+    now = time.time()
+    slow_slot, next_slot, third_slot = SQLiteTokenSlot(path), SQLiteTokenSlot(path), SQLiteTokenSlot(path)
+    try:
+        # 第一个 worker 的刷新超过租约时长，租约到期后被第二个 worker 接手
+        assert slow_slot.try_lease("appid", now - 10, 5)
+        assert next_slot.try_lease("appid", now, 5)
+        slow_slot.store("appid", "slow-token", now + 7200)
+        slow_slot.release_lease("appid")
+        assert not third_slot.try_lease("appid", now, 5)
+
+        next_slot.release_lease("appid")
+        assert third_slot.try_lease("appid", now, 5)
+    finally:
+        slow_slot.close()
+        next_slot.close()
+        third_slot.close()
+
+
+def test_invalidate_only_clears_matching_token():
+    slot = MemoryTokenSlot()
+    fetcher = CountingFetcher()
+    manager = make_manager(slot, fetcher)
+
+    assert manager.get_token("appid") == "token-1"
+    # 其他 worker 已换成新 token 后，旧 token 的失效通知不应清除新 token
+    slot.store("appid", "token-new", time.time() + 7200)
+    manager.invalidate("appid", "token-1")
+    assert manager.get_token("appid") == "token-new"
+
+    manager.invalidate("appid", "token-new")
+    assert manager.get_token("appid") == "token-2"
+    assert fetcher.calls == 2
+
+
+def test_background_refresh_ahead_of_expiry():
+    clock = FakeClock()
+    slot = MemoryTokenSlot()
+    fetcher = CountingFetcher()
+    manager = make_manager(slot, fetcher, clock=clock, refresh_ahead_seconds=600)
+
+    assert manager.get_token("appid") == "token-1"
+    # 下次检查时间为过期前 600 秒
+    assert manager.refresh_ahead("appid") == 7200 - 600
+    assert fetcher.calls == 1
+
+    clock.now += 7200 - 500
+    # 剩余 500 秒：请求线程仍直接使用旧 token，后台任务负责刷新
+    assert 500 > FOREGROUND_REFRESH_MARGIN_SECONDS
+    assert manager.get_token("appid") == "token-1"
+    assert fetcher.calls == 1
+    assert manager.refresh_ahead("appid") == 7200 - 600
+    assert manager.get_token("appid") == "token-2"
+
+
+def test_failed_refresh_keeps_unexpired_token_and_retries_later():
+    clock = FakeClock()
+    slot = MemoryTokenSlot()
+    slot.store("appid", "old-token", clock.now + 100)
+    manager = make_manager(slot, lambda: None, clock=clock)
+
+    assert manager.get_token("appid") == "old-token"
+    assert manager.refresh_ahead("appid") == REFRESH_RETRY_SECONDS
+
+    clock.now += 200
+    assert manager.get_token("appid") is None